@@ -0,0 +1,309 @@
+"""API JSON de solo lectura (v1) con restaurantes, platos, categorías y mesas.
+
+Pensada para los quioscos y las aplicaciones de terceros que antes leían el
+HTML de ``lista_platos`` y ``detalle_restaurante``:
+
+- Las filas se leen con ``values()``, sin instanciar modelos, y solo con las
+  columnas pedidas en ``?fields=id,nombre,...`` (por defecto, todas).
+- Los listados se paginan por cursor (``KeysetPaginator``): ``?cursor=`` con
+  el valor de ``siguiente``/``anterior`` de la respuesta y ``?limite=``.
+- Se serializa con ``orjson`` si está instalado (si no, con ``json``) y las
+  respuestas se comprimen con gzip cuando el cliente lo acepta.
+- Las respuestas se guardan en la caché de menús (``cache_menus.py``), con la
+  misma versión (``Restaurante.updated_at``) que las páginas HTML equivalentes.
+
+Los errores de parámetros devuelven 400 con ``{"error": "..."}``.
+"""
+
+import json
+from decimal import Decimal
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max, Min, Q
+from django.http import HttpResponse
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from .cache_menus import pagina_cacheada, version_listados, version_restaurante
+from .models import Mesa, Plato, Restaurante
+from .paginacion import KeysetPaginator, por_pagina_defecto
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa el json de la biblioteca estándar
+    orjson = None
+
+MAX_POR_PAGINA = 500
+CENTIMO = Decimal("0.01")
+
+# Nombre en la API -> ruta para values()
+CAMPOS_RESTAURANTE = {
+    "id": "id",
+    "nombre": "nombre",
+    "telefono": "telefono",
+    "calle": "direccion__calle",
+    "numero": "direccion__numero",
+    "ciudad": "direccion__ciudad",
+    "codigo_postal": "direccion__codigo_postal",
+    "provincia": "direccion__provincia",
+    "updated_at": "updated_at",
+}
+CAMPOS_PLATO = {
+    "id": "id",
+    "nombre": "nombre",
+    "precio": "precio",
+    "categoria": "categoria",
+    "restaurante": "restaurante_id",
+    "restaurante_nombre": "restaurante__nombre",
+    "updated_at": "updated_at",
+}
+# Campos que no son columnas: se rellenan con una consulta aparte
+ETIQUETAS = "etiquetas"
+DETALLE_RESTAURANTE = ("platos", "mesas")
+
+ORDENES_PLATO = {
+    "id": ("id",),
+    "precio": ("precio", "id"),
+    "-precio": ("-precio", "id"),
+    "nombre": ("nombre", "id"),
+}
+
+
+class ErrorApi(Exception):
+    """Parámetro no válido: se responde 400 con el mensaje."""
+
+
+def _por_defecto(valor):
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError
+
+
+def a_json(datos) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(datos, default=_por_defecto)
+    return json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def respuesta_json(datos, status: int = 200) -> HttpResponse:
+    return HttpResponse(a_json(datos), content_type="application/json", status=status)
+
+
+def vista_api(version):
+    """Solo GET, caché de menús con ``version(**kwargs)``, gzip y errores ``ErrorApi`` como 400."""
+
+    def decorador(vista):
+        @wraps(vista)
+        def controlada(request, *args, **kwargs):
+            try:
+                return vista(request, *args, **kwargs)
+            except ErrorApi as exc:
+                return respuesta_json({"error": str(exc)}, status=400)
+
+        return gzip_page(require_GET(pagina_cacheada(version)(controlada)))
+
+    return decorador
+
+
+def _campos_pedidos(request, disponibles, extras=()):
+    """Campos de ``?fields=`` en el orden pedido; sin el parámetro, todos."""
+    todos = [*disponibles, *extras]
+    pedidos = request.GET.get("fields")
+    if not pedidos:
+        return todos
+    campos = list(dict.fromkeys(c.strip() for c in pedidos.split(",") if c.strip()))
+    desconocidos = [c for c in campos if c not in todos]
+    if desconocidos or not campos:
+        raise ErrorApi(f"Campos no válidos: {', '.join(desconocidos) or '(vacío)'}. Disponibles: {', '.join(todos)}.")
+    return campos
+
+
+def _entero(request, nombre, defecto=None, minimo=1, maximo=None):
+    valor = request.GET.get(nombre)
+    if not valor:
+        return defecto
+    try:
+        numero = int(valor)
+    except ValueError:
+        raise ErrorApi(f"{nombre} debe ser un número entero.")
+    if numero < minimo or (maximo is not None and numero > maximo):
+        raise ErrorApi(f"{nombre} debe estar entre {minimo} y {maximo}." if maximo else f"{nombre} debe ser >= {minimo}.")
+    return numero
+
+
+def _filas(qs, campos, disponibles, orden=()):
+    """``values()`` con las rutas de ``campos`` más las de ``orden`` (para el cursor)."""
+    rutas = [disponibles[c] for c in campos if c in disponibles]
+    return qs.values(*dict.fromkeys([*rutas, *(o.lstrip("-") for o in orden)]))
+
+
+def _renombrar(filas, campos, disponibles):
+    return [{c: fila[disponibles[c]] for c in campos if c in disponibles} for fila in filas]
+
+
+def _pagina(request, qs, campos, disponibles, orden):
+    limite = _entero(request, "limite", por_pagina_defecto(), maximo=MAX_POR_PAGINA)
+    pagina = KeysetPaginator(_filas(qs, campos, disponibles, orden), orden, limite).pagina(request.GET.get("cursor"))
+    return pagina, _renombrar(pagina.object_list, campos, disponibles)
+
+
+def _con_etiquetas(resultados, ids):
+    """Añade a cada plato la lista de slugs de sus etiquetas (una consulta para todos)."""
+    por_plato = {i: [] for i in ids}
+    relaciones = (
+        Plato.etiquetas.through.objects.filter(plato_id__in=ids)
+        .order_by("etiqueta__slug").values_list("plato_id", "etiqueta__slug")
+    )
+    for plato_id, slug in relaciones:
+        por_plato[plato_id].append(slug)
+    for fila, plato_id in zip(resultados, ids):
+        fila[ETIQUETAS] = por_plato[plato_id]
+    return resultados
+
+
+def _sobre(resultados, pagina):
+    return {"resultados": resultados, "siguiente": pagina.cursor_siguiente, "anterior": pagina.cursor_anterior}
+
+
+# ------------------------------------------------------------------ vistas
+
+
+@vista_api(version_listados)
+def restaurantes(request):
+    """
+    GET api/v1/restaurantes/?fields=&ciudad=&cursor=&limite=
+
+    SQL:
+      SELECT r.id, r.nombre, ..., d.ciudad, ...
+        FROM restaurante_restaurante r
+        JOIN restaurante_direccion d ON r.direccion_id=d.id
+       WHERE r.id > %s
+       ORDER BY r.id
+       LIMIT %s;
+    """
+    campos = _campos_pedidos(request, CAMPOS_RESTAURANTE)
+    qs = Restaurante.objects.all()
+    if request.GET.get("ciudad"):
+        qs = qs.filter(direccion__ciudad=request.GET["ciudad"])
+    pagina, resultados = _pagina(request, qs, campos, CAMPOS_RESTAURANTE, ("id",))
+    return respuesta_json(_sobre(resultados, pagina))
+
+
+@vista_api(lambda id: version_restaurante(id))
+def restaurante(request, id: int):
+    """
+    GET api/v1/restaurantes/<id>/?fields=
+
+    Los campos del restaurante más ``platos`` (con etiquetas) y ``mesas``
+    (total y activas).
+
+    SQL:
+      SELECT r.id, r.nombre, ..., d.ciudad, ... FROM restaurante_restaurante r
+        JOIN restaurante_direccion d ON r.direccion_id=d.id WHERE r.id=%s;
+      SELECT id, nombre, precio, categoria FROM restaurante_plato WHERE restaurante_id=%s ORDER BY nombre, id;
+      SELECT plato_id, e.slug FROM restaurante_plato_etiquetas ... WHERE plato_id IN (...);
+      SELECT COUNT(*), COUNT(*) FILTER (WHERE activa) FROM restaurante_mesa WHERE restaurante_id=%s;
+    """
+    campos = _campos_pedidos(request, CAMPOS_RESTAURANTE, DETALLE_RESTAURANTE)
+    fila = _filas(Restaurante.objects.filter(pk=id), campos, CAMPOS_RESTAURANTE).first()
+    if fila is None:
+        return respuesta_json({"error": "No existe ese restaurante."}, status=404)
+    datos = _renombrar([fila], campos, CAMPOS_RESTAURANTE)[0]
+    if "platos" in campos:
+        campos_plato = ("id", "nombre", "precio", "categoria")
+        platos = list(
+            Plato.objects.filter(restaurante_id=id).order_by("nombre", "id").values(*campos_plato)
+        )
+        datos["platos"] = _con_etiquetas(platos, [p["id"] for p in platos])
+    if "mesas" in campos:
+        datos["mesas"] = Mesa.objects.filter(restaurante_id=id).aggregate(
+            total=Count("id"), activas=Count("id", filter=Q(activa=True)),
+        )
+    return respuesta_json(datos)
+
+
+@vista_api(version_listados)
+def platos(request):
+    """
+    GET api/v1/platos/?fields=&restaurante=&categoria=&orden=id|precio|-precio|nombre&cursor=&limite=
+
+    SQL:
+      SELECT p.id, p.nombre, p.precio, ..., r.nombre
+        FROM restaurante_plato p
+        JOIN restaurante_restaurante r ON p.restaurante_id=r.id
+       WHERE p.categoria=%s AND (p.precio > %s OR (p.precio = %s AND p.id > %s))
+       ORDER BY p.precio, p.id
+       LIMIT %s;
+      SELECT plato_id, e.slug FROM restaurante_plato_etiquetas ... WHERE plato_id IN (...);
+    """
+    campos = _campos_pedidos(request, CAMPOS_PLATO, (ETIQUETAS,))
+    orden = ORDENES_PLATO.get(request.GET.get("orden", "id"))
+    if orden is None:
+        raise ErrorApi(f"orden debe ser uno de: {', '.join(ORDENES_PLATO)}.")
+    qs = Plato.objects.all()
+    restaurante_id = _entero(request, "restaurante")
+    if restaurante_id:
+        qs = qs.filter(restaurante_id=restaurante_id)
+    if request.GET.get("categoria"):
+        qs = qs.filter(categoria=request.GET["categoria"])
+    pagina, resultados = _pagina(request, qs, campos, CAMPOS_PLATO, orden)
+    if ETIQUETAS in campos:
+        _con_etiquetas(resultados, [f["id"] for f in pagina.object_list])
+    return respuesta_json(_sobre(resultados, pagina))
+
+
+@vista_api(version_listados)
+def categorias(request):
+    """
+    GET api/v1/categorias/
+
+    SQL:
+      SELECT categoria, COUNT(id), COUNT(DISTINCT restaurante_id), MIN(precio), MAX(precio)
+        FROM restaurante_plato
+       GROUP BY categoria
+       ORDER BY categoria;
+    """
+    filas = (
+        Plato.objects.values("categoria")
+        .annotate(
+            platos=Count("id"), restaurantes=Count("restaurante", distinct=True),
+            precio_min=Min("precio"), precio_max=Max("precio"),
+        )
+        .order_by("categoria")
+    )
+    resultados = []
+    for fila in filas:
+        # SQLite devuelve MIN/MAX de decimales como float: se vuelven a redondear al céntimo
+        for campo in ("precio_min", "precio_max"):
+            fila[campo] = fila[campo].quantize(CENTIMO)
+        resultados.append(fila)
+    return respuesta_json({"resultados": resultados})
+
+
+@vista_api(version_listados)
+def mesas(request):
+    """
+    GET api/v1/mesas/?restaurante=&cursor=&limite=
+
+    Número de mesas (total y activas) por restaurante.
+
+    SQL:
+      SELECT restaurante_id, COUNT(id), COUNT(id) FILTER (WHERE activa)
+        FROM restaurante_mesa
+       WHERE restaurante_id > %s
+       GROUP BY restaurante_id
+       ORDER BY restaurante_id
+       LIMIT %s;
+    """
+    qs = Mesa.objects.all()
+    restaurante_id = _entero(request, "restaurante")
+    if restaurante_id:
+        qs = qs.filter(restaurante_id=restaurante_id)
+    qs = qs.values("restaurante_id").annotate(total=Count("id"), activas=Count("id", filter=Q(activa=True)))
+    limite = _entero(request, "limite", por_pagina_defecto(), maximo=MAX_POR_PAGINA)
+    pagina = KeysetPaginator(qs, ("restaurante_id",), limite).pagina(request.GET.get("cursor"))
+    resultados = [
+        {"restaurante": f["restaurante_id"], "total": f["total"], "activas": f["activas"]} for f in pagina.object_list
+    ]
+    return respuesta_json(_sobre(resultados, pagina))
@@ -0,0 +1,165 @@
+"""Archivo de reservas y pedidos antiguos.
+
+``Reserva``, ``Pedido`` y ``LineaPedido`` solo crecen, y los listados y
+recuentos del día a día pagan por años de historia. ``archivar`` mueve las
+filas anteriores al horizonte (``ARCHIVO_DIAS``) a ``ReservaArchivada``,
+``PedidoArchivado`` y ``LineaPedidoArchivada``, con el mismo id, y
+``restaurar`` las devuelve para un rango de fechas.
+
+Se mueve por tramos de ``lote`` ids, cada uno en su transacción: se copian
+las filas con ``bulk_create`` y se borran las originales con un ``DELETE``
+directo, sin señales. Lo derivado se trata aquí a mano:
+
+- Los resúmenes de ventas y las estadísticas de clientes no cambian: un
+  pedido archivado sigue siendo una venta. ``ventas.reconstruir`` y
+  ``estadisticas.recalcular`` suman también las tablas del archivo.
+- El contador de reservas abiertas de cada restaurante solo cuenta las de
+  ``Reserva`` de hoy en adelante, así que se resta (o se suma al restaurar)
+  con ``contadores.sumar`` si alguna lo era.
+- El tablero y la caché de reservas activas solo miran de hoy en adelante.
+- ``PedidoArchivado.reserva_id`` no es una clave foránea: al borrar una
+  reserva (viva o archivada) ``soltar_reservas`` lo pone a NULL, y
+  ``restaurar`` también quita los que no encuentra en ninguna de las dos tablas.
+
+Para informes históricos, ``exportacion.py`` lee las dos tablas (``archivo=True``).
+"""
+
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+from . import contadores
+from .basedatos import borrar_por_id, por_tramos
+from .models import LineaPedido, LineaPedidoArchivada, Pedido, PedidoArchivado, Reserva, ReservaArchivada
+
+LOTE = 1000
+
+CAMPOS_RESERVA = ("id", "cliente_id", "mesa_id", "fecha", "hora", "estado", "notas", "creado_por_id")
+CAMPOS_PEDIDO = ("id", "cliente_id", "restaurante_id", "reserva_id", "total", "fecha", "creado_por_id")
+CAMPOS_LINEA = ("id", "pedido_id", "plato_id", "cantidad", "precio_unitario", "comentario", "descuento_porcentaje")
+
+
+def horizonte(dias: int | None = None) -> datetime.date:
+    """Primer día que no se archiva."""
+    dias = getattr(settings, "ARCHIVO_DIAS", 365) if dias is None else dias
+    return datetime.date.today() - datetime.timedelta(days=dias)
+
+
+def soltar_reservas(ids):
+    """Quita de los pedidos archivados las reservas ``ids``, que se van a borrar o ya se han borrado."""
+    return PedidoArchivado.objects.filter(reserva_id__in=ids).update(reserva_id=None)
+
+
+def _copiar(filas, destino):
+    destino.objects.bulk_create([destino(**fila) for fila in filas])
+
+
+def _reservas_abiertas(filas) -> Counter:
+    """Reservas abiertas de ``filas`` por restaurante (quita ``mesa__restaurante_id`` de cada fila)."""
+    por_restaurante = Counter()
+    for fila in filas:
+        restaurante_id = fila.pop("mesa__restaurante_id")
+        if contadores.reserva_abierta(fila["estado"], fila["fecha"]):
+            por_restaurante[restaurante_id] += 1
+    return por_restaurante
+
+
+def _mover_reservas(qs, origen, destino, signo):
+    filas = list(qs.values(*CAMPOS_RESERVA, "mesa__restaurante_id"))
+    abiertas = _reservas_abiertas(filas)
+    _copiar(filas, destino)
+    borrar_por_id(origen, [f["id"] for f in filas])
+    for restaurante_id, n in abiertas.items():
+        contadores.sumar(restaurante_id, "num_reservas_abiertas", signo * n)
+    return len(filas)
+
+
+def _mover_pedidos(qs, origen, destino, lineas_origen, lineas_destino):
+    filas = list(qs.values(*CAMPOS_PEDIDO))
+    ids = [f["id"] for f in filas]
+    lineas = list(lineas_origen.objects.filter(pedido_id__in=ids).values(*CAMPOS_LINEA))
+    _copiar(filas, destino)
+    _copiar(lineas, lineas_destino)
+    borrar_por_id(lineas_origen, [l["id"] for l in lineas])
+    borrar_por_id(origen, ids)
+    return len(ids)
+
+
+def archivar(antes_de: datetime.date | None = None, lote: int = LOTE, progreso=None) -> dict:
+    """Mueve al archivo los pedidos (con sus líneas) y las reservas anteriores a ``antes_de``.
+
+    Las reservas con un pedido que sigue vivo se quedan hasta que se archive
+    el pedido. Devuelve ``{"pedidos": n, "reservas": n}``.
+    """
+    antes_de = antes_de or horizonte()
+    pedidos = por_tramos(
+        Pedido.objects.filter(fecha__lt=antes_de), lote,
+        lambda qs: _mover_pedidos(qs, Pedido, PedidoArchivado, LineaPedido, LineaPedidoArchivada),
+        progreso, "pedidos",
+    )
+    reservas = por_tramos(
+        Reserva.objects.filter(fecha__lt=antes_de, pedido__isnull=True), lote,
+        lambda qs: _mover_reservas(qs, Reserva, ReservaArchivada, -1),
+        progreso, "reservas",
+    )
+    return {"pedidos": pedidos, "reservas": reservas}
+
+
+def restaurar(desde: datetime.date | None = None, hasta: datetime.date | None = None, lote: int = LOTE,
+              progreso=None) -> dict:
+    """Devuelve a las tablas vivas lo archivado entre ``desde`` y ``hasta`` (incluidas).
+
+    Las reservas de los pedidos restaurados vuelven con ellos aunque sean de
+    otra fecha. Si una reserva choca con otra viva en la misma mesa, fecha y
+    hora, el tramo falla con ``IntegrityError`` y no se mueve nada de él.
+    """
+    filtro = {}
+    if desde:
+        filtro["fecha__gte"] = desde
+    if hasta:
+        filtro["fecha__lte"] = hasta
+
+    restauradas = por_tramos(
+        ReservaArchivada.objects.filter(**filtro), lote,
+        lambda qs: _mover_reservas(qs, ReservaArchivada, Reserva, 1),
+        progreso, "reservas",
+    )
+
+    def mover_pedidos(qs):
+        nonlocal restauradas
+        reservas = ReservaArchivada.objects.filter(pk__in=qs.exclude(reserva_id=None).values("reserva_id"))
+        restauradas += _mover_reservas(reservas, ReservaArchivada, Reserva, 1)
+        # Reservas borradas sin pasar por soltar_reservas (p. ej. con SQL directo)
+        qs.exclude(reserva_id=None).exclude(reserva_id__in=Reserva.objects.values("pk")).update(reserva_id=None)
+        return _mover_pedidos(qs, PedidoArchivado, Pedido, LineaPedidoArchivada, LineaPedido)
+
+    pedidos = por_tramos(PedidoArchivado.objects.filter(**filtro), lote, mover_pedidos, progreso, "pedidos")
+    return {"pedidos": pedidos, "reservas": restauradas}
+
+
+def proteger_ids():
+    """Evita que SQLite reutilice en ``Reserva``/``Pedido``/``LineaPedido`` un id que está en el archivo.
+
+    Solo hace falta tras cargar filas con su id (``copias.restaurar_copia``), que
+    deja la secuencia en el mayor id de la tabla viva; por lo demás, con
+    AUTOINCREMENT SQLite no vuelve a dar un id ya usado.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for vivo, archivo in (
+            (Reserva, ReservaArchivada), (Pedido, PedidoArchivado), (LineaPedido, LineaPedidoArchivada),
+        ):
+            # La tabla no tiene fila en sqlite_sequence hasta su primer INSERT
+            cursor.execute(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT %s, 0 "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)",
+                [vivo._meta.db_table, vivo._meta.db_table],
+            )
+            cursor.execute(
+                f"UPDATE sqlite_sequence SET seq = MAX(seq, (SELECT COALESCE(MAX(id), 0) FROM {archivo._meta.db_table})) "
+                "WHERE name = %s",
+                [vivo._meta.db_table],
+            )
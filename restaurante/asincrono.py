@@ -0,0 +1,20 @@
+"""Utilidades para las vistas asíncronas (ver ``views.py``).
+
+Las consultas de esas vistas usan la interfaz asíncrona del ORM. No van en
+paralelo: Django las ejecuta una tras otra en un único hilo para el ORM
+(``thread_sensitive``), así que lo que se gana es que el bucle de eventos
+atiende otras peticiones mientras tanto. El render sigue
+siendo síncrono: las plantillas heredan de ``base.html``, que lee el usuario y
+la sesión, así que se hace en un hilo con ``sync_to_async`` para no bloquear el
+bucle de eventos.
+"""
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import render
+
+arender = sync_to_async(render)
+
+
+async def alistar(qs) -> list:
+    """Evalúa el queryset sin bloquear (incluye ``prefetch_related``)."""
+    return [obj async for obj in qs]
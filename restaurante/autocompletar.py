@@ -0,0 +1,146 @@
+"""Autocompletado de clientes y direcciones para los formularios.
+
+Los ``<select>`` con ``Cliente.objects.all()`` pintaban todos los clientes en
+cada formulario. Con ``AutocompletarField`` el ``<select>`` solo lleva las
+opciones ya elegidas; ``static/js/script.js`` añade un buscador que pide el
+resto a la vista ``autocompletar`` según se escribe. Esa vista busca en los
+índices FTS5 de ``busqueda.py`` (con índice de prefijos, ver la migración
+``0011``) y devuelve como mucho ``LIMITE_MAXIMO`` resultados.
+
+Cada fuente solo responde a quien puede usar alguno de los formularios que la
+usan (``Fuente.permisos``); al resto la vista le devuelve 403.
+
+Al validar, el campo solo consulta el id enviado (``get(pk=...)`` o
+``filter(pk__in=...)`` en el múltiple), nunca la lista entera.
+"""
+
+from django import forms
+from django.urls import reverse
+
+from .busqueda import buscar
+from .models import Cliente, Direccion
+
+LIMITE = 10
+LIMITE_MAXIMO = 50
+MINIMO_CARACTERES = 2
+
+
+def _clientes(usuario, filtros):
+    qs = Cliente.objects.all()
+    if "sin_perfil" in filtros:
+        qs = qs.filter(perfilcliente__isnull=True)
+    if "propios" in filtros:
+        # Igual que ReservaCreateForm: si el usuario ha creado clientes, solo esos
+        propios = qs.filter(creado_por=usuario)
+        if propios.exists():
+            qs = propios
+    return qs
+
+
+def _direcciones(usuario, filtros):
+    qs = Direccion.objects.all()
+    if "libres" in filtros:
+        qs = qs.filter(restaurante__isnull=True)
+    return qs
+
+
+class Fuente:
+    def __init__(self, modelo, queryset, permisos, columnas_privadas=(), permiso=None):
+        self.modelo = modelo
+        # Basta con tener uno: son los de las vistas con formularios que la usan
+        self.permisos = tuple(permisos)
+        # ``queryset(usuario, filtros)`` con los filtros de la URL ya aplicados
+        self.queryset = queryset
+        # Columnas del índice que solo se buscan con ``permiso`` (el email de
+        # los clientes no se mostraba en los select a cualquier usuario)
+        self.columnas_privadas = columnas_privadas
+        self.permiso = permiso
+
+    def permitida(self, usuario) -> bool:
+        return any(usuario.has_perm(permiso) for permiso in self.permisos)
+
+    def buscar(self, usuario, texto, filtros=(), limite=LIMITE):
+        if len(texto.strip()) < MINIMO_CARACTERES:
+            return []
+        qs = self.queryset(usuario, set(filtros))
+        if self.columnas_privadas and not usuario.has_perm(self.permiso):
+            resultados = buscar(qs, nombre=texto)
+        else:
+            resultados = buscar(qs, texto)
+        return [{"id": obj.pk, "texto": str(obj)} for obj in resultados[:limite]]
+
+
+FUENTES = {
+    "clientes": Fuente(
+        Cliente, _clientes,
+        permisos=(
+            "restaurante.view_cliente", "restaurante.add_reserva", "restaurante.change_reserva",
+            "restaurante.add_perfilcliente", "restaurante.add_restaurante", "restaurante.change_restaurante",
+        ),
+        columnas_privadas=("email",), permiso="restaurante.view_cliente",
+    ),
+    "direcciones": Fuente(
+        Direccion, _direcciones,
+        permisos=("restaurante.view_direccion", "restaurante.add_restaurante", "restaurante.change_restaurante"),
+    ),
+}
+FILTROS = {"sin_perfil", "propios", "libres"}
+
+
+# ----------------------------------------------------------------------------
+# Widgets y campos
+# ----------------------------------------------------------------------------
+
+
+class _SoloElegidas:
+    """Mezcla para ``Select``: pinta solo las opciones elegidas y la URL de búsqueda."""
+
+    def __init__(self, fuente, filtros=(), attrs=None):
+        super().__init__(attrs)
+        self.fuente = fuente
+        self.filtros = tuple(filtros)
+
+    def get_context(self, name, value, attrs):
+        attrs = dict(attrs or {})
+        url = reverse("autocompletar", args=[self.fuente])
+        if self.filtros:
+            url += "?" + "&".join(f"{f}=1" for f in self.filtros)
+        attrs["data-autocompletar"] = url
+        return super().get_context(name, value, attrs)
+
+    def optgroups(self, name, value, attrs=None):
+        campo = self.choices.field
+        ids = [v for v in value if str(v).isdigit()]
+        elegidas = campo.queryset.filter(pk__in=ids) if ids else []
+        completas = self.choices
+        self.choices = [(campo.prepare_value(obj), campo.label_from_instance(obj)) for obj in elegidas]
+        if not self.allow_multiple_selected and campo.empty_label is not None:
+            self.choices.insert(0, ("", campo.empty_label))
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = completas
+
+
+class AutocompletarSelect(_SoloElegidas, forms.Select):
+    pass
+
+
+class AutocompletarSelectMultiple(_SoloElegidas, forms.SelectMultiple):
+    pass
+
+
+class AutocompletarField(forms.ModelChoiceField):
+    """``ModelChoiceField`` que se rellena con ``autocompletar`` en lugar de listar el queryset."""
+
+    def __init__(self, fuente, queryset=None, filtros=(), **kwargs):
+        queryset = FUENTES[fuente].modelo.objects.all() if queryset is None else queryset
+        kwargs.setdefault("widget", AutocompletarSelect(fuente, filtros))
+        super().__init__(queryset, **kwargs)
+
+
+class AutocompletarMultipleField(forms.ModelMultipleChoiceField):
+    def __init__(self, fuente, queryset=None, filtros=(), **kwargs):
+        queryset = FUENTES[fuente].modelo.objects.all() if queryset is None else queryset
+        kwargs.setdefault("widget", AutocompletarSelectMultiple(fuente, filtros))
+        super().__init__(queryset, **kwargs)
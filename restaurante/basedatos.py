@@ -0,0 +1,65 @@
+"""Alias de base de datos para informes y lectura de los PRAGMA de SQLite.
+
+Con ``SQLITE_LECTURA=True`` (ver ``settings.py``) existe la conexión
+``lectura``: el mismo fichero abierto en solo lectura. Los informes que solo
+leen mucho (listados de pedidos, clientes frecuentes, exportaciones) piden
+sus consultas a ``alias_lectura()``, así no ocupan las conexiones que usan
+las escrituras y un error en ellos no puede modificar nada. Sin ese alias
+todo va a ``default``.
+
+``por_tramos`` y ``borrar_por_id`` son la base de los movimientos y borrados
+masivos (``archivo.py``, ``borrado.py``): transacciones cortas que no dejan
+a las demás escrituras esperando, y ``DELETE`` directos sin señales.
+"""
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+LECTURA = "lectura"
+
+# PRAGMA que se consultan en ``pragmas()`` (los de settings.SQLITE_PRAGMAS y query_only)
+PRAGMAS = ("journal_mode", "synchronous", "cache_size", "mmap_size", "busy_timeout", "temp_store", "query_only")
+
+
+def alias_lectura() -> str:
+    return LECTURA if LECTURA in settings.DATABASES else DEFAULT_DB_ALIAS
+
+
+def pragmas(alias: str = DEFAULT_DB_ALIAS) -> dict:
+    """Valor actual de cada PRAGMA en la conexión ``alias`` (para comprobar el perfil)."""
+    with connections[alias].cursor() as cursor:
+        valores = {}
+        for nombre in PRAGMAS:
+            cursor.execute(f"PRAGMA {nombre}")
+            fila = cursor.fetchone()
+            # mmap_size no devuelve nada en las bases en memoria
+            valores[nombre] = fila[0] if fila else None
+    return valores
+
+
+def borrar_por_id(modelo, ids):
+    """``DELETE`` por id sin señales ni borrado en cascada (quien llama ya ha tratado los hijos)."""
+    if not ids:
+        return
+    tabla = connection.ops.quote_name(modelo._meta.db_table)
+    marcas = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {tabla} WHERE id IN ({marcas})", list(ids))
+
+
+def por_tramos(qs, lote, mover, progreso=None, nombre=""):
+    """Aplica ``mover`` a ``qs`` por tramos de ``lote`` ids, cada uno en su transacción.
+
+    ``mover`` recibe el queryset del tramo y devuelve cuántas filas ha tratado;
+    tiene que sacarlas de ``qs`` (borrarlas o moverlas), porque cada tramo
+    vuelve a pedir las primeras. Llama a ``progreso(nombre, total)`` tras cada tramo.
+    """
+    total = 0
+    while True:
+        with transaction.atomic():
+            ids = list(qs.order_by("pk").values_list("pk", flat=True)[:lote])
+            if not ids:
+                return total
+            total += mover(qs.model.objects.filter(pk__in=ids))
+        if progreso:
+            progreso(nombre, total)
@@ -0,0 +1,356 @@
+"""Medición de las vistas: latencia, consultas SQL y tamaño de respuesta por URL.
+
+``casos()`` da una URL concreta (con ids reales de la base de datos) para cada
+nombre de ``restaurante/urls.py``; ``urls_sin_caso()`` sirve para comprobar que
+no se queda ninguna fuera al añadir rutas. Lo usa el comando
+``benchmark_vistas``, que además genera los datos y compara con una línea base.
+
+``carga_wsgi()`` y ``carga_asgi()`` lanzan muchas peticiones a la vez contra
+los manejadores WSGI y ASGI de Django (en el mismo proceso, sin servidor ni
+red) para comparar su rendimiento con concurrencia; lo usa ``benchmark_asgi``.
+"""
+
+import asyncio
+import io
+import json
+import os
+import re
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, get_resolver, reverse
+
+from .middleware import CABECERA
+from .models import Cliente, Direccion, Mesa, PerfilCliente, Plato, Reserva, Restaurante, Tarea
+
+FORMATO = 1
+
+# Vistas asíncronas de views.py: las que compara benchmark_asgi
+VISTAS_ASINCRONAS = ("buscar_simple", "buscar_platos", "lista_platos", "detalle_restaurante", "mesas_libres")
+
+
+def _palabra(texto, defecto):
+    palabras = re.findall(r"\w{3,20}", texto or "")
+    return palabras[0] if palabras else defecto
+
+
+def datos_de_ejemplo():
+    """Ids y textos reales para rellenar los parámetros de las URLs (el primero de cada tabla)."""
+    restaurante = Restaurante.objects.order_by("pk").first()
+    plato = Plato.objects.order_by("pk").first()
+    reserva = Reserva.objects.order_by("pk").first()
+    cliente = Cliente.objects.order_by("pk").first()
+    return {
+        "restaurante": restaurante.pk if restaurante else 0,
+        "nombre_restaurante": _palabra(restaurante.nombre if restaurante else "", "Casa"),
+        "direccion": Direccion.objects.order_by("pk").values_list("pk", flat=True).first() or 0,
+        "cliente": cliente.pk if cliente else 0,
+        "texto_cliente": _palabra(cliente.nombre if cliente else "", "Mar")[:3],
+        "plato": plato.pk if plato else 0,
+        "restaurante_plato": plato.restaurante_id if plato else 0,
+        "texto_plato": _palabra(plato.nombre if plato else "", "Salmorejo"),
+        "categoria": plato.categoria if plato else "principal",
+        "reserva": reserva.pk if reserva else 0,
+        "fecha": (reserva.fecha if reserva else None),
+        "perfil": PerfilCliente.objects.order_by("pk").values_list("pk", flat=True).first() or 0,
+        "mesa": Mesa.objects.order_by("pk").values_list("pk", flat=True).first() or 0,
+        "tarea": Tarea.objects.order_by("pk").values_list("pk", flat=True).first() or 0,
+    }
+
+
+def casos(datos):
+    """``[(nombre de la URL, ruta)]`` de todas las vistas.
+
+    Se piden con GET salvo las que tienen cuerpo en ``cuerpos()``, que se
+    envían por POST como JSON.
+    """
+    r, d, c, p = datos["restaurante"], datos["direccion"], datos["cliente"], datos["plato"]
+    reserva, perfil = datos["reserva"], datos["perfil"]
+    fecha = datos["fecha"].isoformat() if datos["fecha"] else "2030-01-01"
+    rutas = [
+        ("index", reverse("index")),
+        ("crud_restaurante:listar", reverse("crud_restaurante:listar")),
+        ("crud_restaurante:crear", reverse("crud_restaurante:crear")),
+        ("crud_restaurante:detalle", reverse("crud_restaurante:detalle", args=[r])),
+        ("crud_restaurante:editar", reverse("crud_restaurante:editar", args=[r])),
+        ("crud_restaurante:eliminar", reverse("crud_restaurante:eliminar", args=[r])),
+        ("crud_clientes:listar", reverse("crud_clientes:listar")),
+        ("crud_clientes:crear", reverse("crud_clientes:crear")),
+        ("crud_clientes:editar", reverse("crud_clientes:editar", args=[c])),
+        ("crud_clientes:eliminar", reverse("crud_clientes:eliminar", args=[c])),
+        ("crud_platos:listar", reverse("crud_platos:listar")),
+        ("crud_platos:crear", reverse("crud_platos:crear")),
+        ("crud_platos:editar", reverse("crud_platos:editar", args=[p])),
+        ("crud_platos:eliminar", reverse("crud_platos:eliminar", args=[p])),
+        ("restaurantes_listar", reverse("restaurantes_listar")),
+        ("restaurantes_crear", reverse("restaurantes_crear")),
+        ("restaurantes_editar", reverse("restaurantes_editar", args=[r])),
+        ("restaurantes_eliminar", reverse("restaurantes_eliminar", args=[r])),
+        ("direccion_listar", reverse("direccion_listar")),
+        ("direccion_crear", reverse("direccion_crear")),
+        ("direccion_editar", reverse("direccion_editar", args=[d])),
+        ("direccion_eliminar", reverse("direccion_eliminar", args=[d])),
+        ("detalle_restaurante", reverse("detalle_restaurante", args=[r])),
+        ("lista_platos", reverse("lista_platos")),
+        ("platos_por_categoria", reverse("platos_por_categoria", args=[datos["categoria"]])),
+        ("buscar_platos", reverse("buscar_platos", args=[datos["texto_plato"], 5])),
+        ("lista_pedidos", reverse("lista_pedidos")),
+        ("pedidos_crear", reverse("pedidos_crear")),
+        ("reservas_listar", reverse("reservas_listar")),
+        ("reservas_crear", reverse("reservas_crear")),
+        ("reservas_editar", reverse("reservas_editar", args=[reserva])),
+        ("reservas_eliminar", reverse("reservas_eliminar", args=[reserva])),
+        ("mesas_libres", reverse("mesas_libres") + f"?restaurante={r}&fecha={fecha}&hora=21:00"),
+        ("tablero_reservas", reverse("tablero_reservas", args=[r]) + f"?fecha={fecha}"),
+        # Sin esperar eventos: mide abrir y cerrar la conexión
+        ("tablero_eventos", reverse("tablero_eventos", args=[r]) + "?segundos=0"),
+        ("pedidos_sin_lineas", reverse("pedidos_sin_lineas")),
+        ("clientes_frecuentes", reverse("clientes_frecuentes")),
+        ("exportar", reverse("exportar", args=["pedidos"]) + f"?restaurante={r}&formato=jsonl"),
+        # Tres letras: la búsqueda por prefijo, como al empezar a escribir
+        ("autocompletar", reverse("autocompletar", args=["clientes"]) + f"?q={datos['texto_cliente']}"),
+        ("tareas_listar", reverse("tareas_listar")),
+        ("tarea_estado", reverse("tarea_estado", args=[datos["tarea"]])),
+        # Sin fichero (no es una exportación terminada): redirige al estado
+        ("tarea_descargar", reverse("tarea_descargar", args=[datos["tarea"]])),
+        ("perfil_listar", reverse("perfil_listar")),
+        ("perfil_crear", reverse("perfil_crear")),
+        ("perfil_editar", reverse("perfil_editar", args=[perfil])),
+        ("perfil_eliminar", reverse("perfil_eliminar", args=[perfil])),
+        ("buscar_simple", reverse("buscar_simple", args=[datos["texto_plato"]])),
+        (
+            "restaurante_busqueda_avanzada",
+            reverse("restaurante_busqueda_avanzada") + f"?nombre={datos['nombre_restaurante']}",
+        ),
+        ("registrar_usuario", reverse("registrar_usuario")),
+        ("plato_crear", reverse("plato_crear")),
+        ("reserva_crear", reverse("reserva_crear")),
+        ("mis_reservas", reverse("mis_reservas")),
+        ("api_v1:restaurantes", reverse("api_v1:restaurantes")),
+        ("api_v1:restaurante", reverse("api_v1:restaurante", args=[r])),
+        ("api_v1:platos", reverse("api_v1:platos") + "?fields=id,nombre,precio,restaurante_nombre,etiquetas&orden=precio&limite=100"),
+        ("api_v1:categorias", reverse("api_v1:categorias")),
+        ("api_v1:mesas", reverse("api_v1:mesas")),
+    ]
+    return rutas
+
+
+def cuerpos(datos):
+    """Cuerpo JSON de los casos que se piden por POST (cada repetición crea filas nuevas)."""
+    pedido = {
+        "cliente": datos["cliente"], "restaurante": datos["restaurante_plato"],
+        "lineas": [{"plato": datos["plato"], "cantidad": 2}, {"plato": datos["plato"], "descuento_porcentaje": 10}],
+    }
+    # Un lote típico de sincronización del TPV
+    return {"pedidos_crear": {"pedidos": [pedido] * 50}}
+
+
+def nombres_de_urls(patrones=None, prefijo=""):
+    """Nombres (con espacio de nombres) de todas las rutas de ``restaurante.urls``."""
+    if patrones is None:
+        patrones = get_resolver("restaurante.urls").url_patterns
+    nombres = set()
+    for patron in patrones:
+        if isinstance(patron, URLResolver):
+            espacio = f"{prefijo}{patron.namespace}:" if patron.namespace else prefijo
+            nombres |= nombres_de_urls(patron.url_patterns, espacio)
+        elif isinstance(patron, URLPattern) and patron.name:
+            nombres.add(prefijo + patron.name)
+    return nombres
+
+
+def urls_sin_caso(datos):
+    return nombres_de_urls() - {nombre for nombre, _ in casos(datos)}
+
+
+def _percentil(valores, p):
+    """Percentil por rango más cercano (sin interpolar) sobre una lista ordenada."""
+    indice = max(0, min(len(valores) - 1, round(p / 100 * len(valores) + 0.5) - 1))
+    return valores[indice]
+
+
+def medir(cliente, ruta, repeticiones: int = 10, calentamiento: int = 1, cuerpo=None):
+    """Pide ``ruta`` varias veces y resume latencia, consultas y tamaño de la última respuesta.
+
+    Con ``cuerpo`` la petición es un POST con ese JSON.
+    """
+    for _ in range(calentamiento):
+        _pedir(cliente, ruta, cuerpo)
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        respuesta, consultas, tamano = _pedir(cliente, ruta, cuerpo)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    return {
+        "ruta": ruta,
+        "estado": respuesta.status_code,
+        "p50_ms": round(statistics.median(tiempos), 2),
+        "p95_ms": round(_percentil(tiempos, 95), 2),
+        "consultas": consultas,
+        "bytes": tamano,
+    }
+
+
+def contenido(respuesta) -> bytes:
+    """Cuerpo completo de la respuesta, también si es un flujo asíncrono (SSE)."""
+    if not respuesta.streaming:
+        return respuesta.content
+    if respuesta.is_async:
+        async def leer():
+            return [trozo async for trozo in respuesta.streaming_content]
+
+        return b"".join(async_to_sync(leer)())
+    return b"".join(respuesta.streaming_content)
+
+
+def _pedir(cliente, ruta, cuerpo=None):
+    with CaptureQueriesContext(connection) as capturadas:
+        if cuerpo is None:
+            respuesta = cliente.get(ruta)
+        else:
+            respuesta = cliente.post(ruta, cuerpo, content_type="application/json")
+        tamano = len(contenido(respuesta))
+    # La cabecera del middleware cuenta todas las conexiones; si no está, las de la principal
+    consultas = int(respuesta[CABECERA]) if CABECERA in respuesta else len(capturadas)
+    return respuesta, consultas, tamano
+
+
+def comparar(actual, base, umbral: float = 0.25, margen_ms: float = 1.0):
+    """Diferencias con la línea base por URL.
+
+    Una URL empeora si hace más consultas o si su p50 crece más de ``umbral``
+    (relativo) y más de ``margen_ms`` (para no marcar ruido en vistas de 1 ms).
+    """
+    filas = {}
+    for nombre, medida in actual.items():
+        anterior = base.get(nombre)
+        if anterior is None:
+            filas[nombre] = {"nueva": True, "empeora": False}
+            continue
+        delta_p50 = medida["p50_ms"] - anterior["p50_ms"]
+        relativo = delta_p50 / anterior["p50_ms"] if anterior["p50_ms"] else 0.0
+        delta_consultas = medida["consultas"] - anterior["consultas"]
+        filas[nombre] = {
+            "nueva": False,
+            "delta_p50": relativo,
+            "delta_consultas": delta_consultas,
+            "delta_bytes": medida["bytes"] - anterior["bytes"],
+            "empeora": delta_consultas > 0 or (relativo > umbral and delta_p50 > margen_ms),
+        }
+    return filas
+
+
+def cargar_linea_base(ruta):
+    if not ruta or not os.path.exists(ruta):
+        return None
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def guardar_resultados(ruta, resultados, parametros):
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(
+            {"formato": FORMATO, "parametros": parametros, "vistas": resultados},
+            f, ensure_ascii=False, indent=2, sort_keys=True,
+        )
+        f.write("\n")
+
+
+# ----------------------------------------------------------------------------
+# Carga concurrente: WSGI frente a ASGI
+# ----------------------------------------------------------------------------
+
+
+def _resumen_carga(tiempos, estados, duracion):
+    tiempos.sort()
+    return {
+        "peticiones": len(tiempos),
+        "por_segundo": round(len(tiempos) / duracion, 1) if duracion else 0.0,
+        "p50_ms": round(statistics.median(tiempos), 2),
+        "p95_ms": round(_percentil(tiempos, 95), 2),
+        "errores": sum(1 for e in estados if e >= 400),
+    }
+
+
+def carga_wsgi(ruta, peticiones: int, concurrencia: int, cookie: str = ""):
+    """``peticiones`` GET a ``ruta`` con ``concurrencia`` hilos, como un servidor WSGI con hilos."""
+    handler = WSGIHandler()
+    partes = urlsplit(ruta)
+
+    def pedir(_):
+        estado = []
+        environ = {
+            "REQUEST_METHOD": "GET", "PATH_INFO": partes.path, "QUERY_STRING": partes.query,
+            "SERVER_NAME": "testserver", "SERVER_PORT": "80", "HTTP_HOST": "testserver", "HTTP_COOKIE": cookie,
+            "wsgi.url_scheme": "http", "wsgi.input": io.BytesIO(), "wsgi.errors": io.StringIO(),
+            "wsgi.multithread": True, "wsgi.multiprocess": False, "wsgi.run_once": False,
+        }
+        inicio = time.perf_counter()
+        respuesta = handler(environ, lambda status, headers, exc_info=None: estado.append(int(status[:3])))
+        try:
+            for _ in respuesta:
+                pass
+        finally:
+            respuesta.close()
+        return (time.perf_counter() - inicio) * 1000, estado[0]
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        resultados = list(pool.map(pedir, range(peticiones)))
+    duracion = time.perf_counter() - inicio
+    return _resumen_carga([t for t, _ in resultados], [e for _, e in resultados], duracion)
+
+
+def carga_asgi(ruta, peticiones: int, concurrencia: int, cookie: str = ""):
+    """``peticiones`` GET a ``ruta`` con ``concurrencia`` tareas en un solo bucle de eventos, como un servidor ASGI."""
+    handler = ASGIHandler()
+    partes = urlsplit(ruta)
+    cabeceras = [(b"host", b"testserver")] + ([(b"cookie", cookie.encode())] if cookie else [])
+
+    async def pedir(semaforo):
+        async with semaforo:
+            terminada = asyncio.Event()
+            mensajes = [{"type": "http.request", "body": b"", "more_body": False}]
+            estado = []
+
+            async def receive():
+                if mensajes:
+                    return mensajes.pop()
+                # Django escucha una posible desconexión mientras responde
+                await terminada.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(mensaje):
+                if mensaje["type"] == "http.response.start":
+                    estado.append(mensaje["status"])
+                elif not mensaje.get("more_body"):
+                    terminada.set()
+
+            scope = {
+                "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+                "scheme": "http", "path": partes.path, "raw_path": partes.path.encode(),
+                "query_string": partes.query.encode(), "root_path": "", "headers": cabeceras,
+                "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+            }
+            inicio = time.perf_counter()
+            await handler(scope, receive, send)
+            terminada.set()
+            return (time.perf_counter() - inicio) * 1000, estado[0]
+
+    async def todas():
+        semaforo = asyncio.Semaphore(concurrencia)
+        return await asyncio.gather(*(pedir(semaforo) for _ in range(peticiones)))
+
+    inicio = time.perf_counter()
+    resultados = asyncio.run(todas())
+    duracion = time.perf_counter() - inicio
+    return _resumen_carga([t for t, _ in resultados], [e for _, e in resultados], duracion)
@@ -0,0 +1,135 @@
+"""Borrado por tramos de un restaurante y de todo lo que cuelga de él.
+
+``restaurante.delete()`` recoge en memoria todas las mesas, reservas, pedidos
+y líneas del restaurante, envía sus señales una a una y lo borra todo en una
+sola transacción: con años de historia tarda minutos y, mientras, ninguna otra
+petición puede escribir en SQLite. ``borrar_restaurante`` lo hace por tramos
+de ``lote`` ids (``basedatos.por_tramos``), cada uno en su transacción, con
+``DELETE`` directos y tratando a mano lo derivado:
+
+- Las estadísticas de los clientes con pedidos del restaurante se recalculan
+  en cada tramo (``estadisticas.recalcular``).
+- Los contadores del restaurante se descuentan con ``contadores.sumar``, así
+  que ``reconciliar_contadores`` no encuentra nada que corregir a medias.
+- Los platos salen del índice de búsqueda y se renuevan la caché y la ETag de
+  la ficha.
+- Las líneas de pedidos de otros restaurantes con platos de este (no debería
+  haberlas) se borran con el ORM, para que sus señales descuenten las ventas;
+  las archivadas, con un ``ventas.reconstruir`` de sus días.
+- Los resúmenes de ventas y los favoritos se van con el restaurante al final.
+
+Cada fase vuelve a consultar lo que queda, así que si el proceso se corta (o
+alguien crea una reserva en una mesa a medio borrar y falla la clave foránea)
+basta con volver a lanzarlo. Lo usa la tarea ``borrar_restaurante`` de
+``tareas.py``.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+
+from . import archivo, busqueda, condicional, contadores, estadisticas, ventas
+from .basedatos import borrar_por_id, por_tramos
+from .models import (
+    LineaPedido, LineaPedidoArchivada, Mesa, Pedido, PedidoArchivado, Plato, Reserva, ReservaArchivada, Restaurante,
+)
+
+LOTE = 500
+
+
+def pendiente(restaurante_id) -> dict:
+    """Filas que quedan por borrar del restaurante (para calcular el progreso)."""
+    return {
+        "pedidos": (
+            Pedido.objects.filter(restaurante_id=restaurante_id).count()
+            + PedidoArchivado.objects.filter(restaurante_id=restaurante_id).count()
+        ),
+        "reservas": (
+            Reserva.objects.filter(mesa__restaurante_id=restaurante_id).count()
+            + ReservaArchivada.objects.filter(mesa__restaurante_id=restaurante_id).count()
+        ),
+        "platos": Plato.objects.filter(restaurante_id=restaurante_id).count(),
+        "mesas": Mesa.objects.filter(restaurante_id=restaurante_id).count(),
+    }
+
+
+def _borrar_pedidos(qs, lineas_modelo):
+    filas = list(qs.values_list("id", "cliente_id"))
+    ids = [pedido_id for pedido_id, _ in filas]
+    borrar_por_id(lineas_modelo, list(lineas_modelo.objects.filter(pedido_id__in=ids).values_list("id", flat=True)))
+    borrar_por_id(qs.model, ids)
+    estadisticas.recalcular({cliente_id for _, cliente_id in filas})
+    return len(ids)
+
+
+def _borrar_reservas(qs, restaurante_id):
+    ids = list(qs.values_list("id", flat=True))
+    if qs.model is Reserva:
+        abiertas = contadores.reservas_abiertas(qs).count()
+        # Como el SET_NULL de Pedido.reserva (los pedidos propios ya no están)
+        Pedido.objects.filter(reserva_id__in=ids).update(reserva=None)
+        contadores.sumar(restaurante_id, "num_reservas_abiertas", -abiertas)
+    # Los pedidos archivados de otros restaurantes con estas reservas
+    archivo.soltar_reservas(ids)
+    borrar_por_id(qs.model, ids)
+    return len(ids)
+
+
+def _borrar_platos(qs, restaurante_id):
+    ids = list(qs.values_list("id", flat=True))
+    LineaPedido.objects.filter(plato_id__in=ids).delete()
+    archivadas = LineaPedidoArchivada.objects.filter(plato_id__in=ids)
+    fechas = set(archivadas.values_list("pedido__fecha", flat=True))
+    archivadas.delete()
+    for fecha in sorted(fechas):
+        ventas.reconstruir(desde=fecha, hasta=fecha)
+    Plato.etiquetas.through.objects.filter(plato_id__in=ids).delete()
+    borrar_por_id(Plato, ids)
+    busqueda.desindexar(Plato, ids)
+    contadores.sumar(restaurante_id, "num_platos", -len(ids))
+    return len(ids)
+
+
+def _borrar_mesas(qs, restaurante_id):
+    ids = list(qs.values_list("id", flat=True))
+    activas = qs.filter(activa=True).count()
+    borrar_por_id(Mesa, ids)
+    contadores.sumar(restaurante_id, "num_mesas_activas", -activas)
+    return len(ids)
+
+
+def borrar_restaurante(restaurante_id, lote: int = LOTE, progreso=None) -> dict:
+    """Borra el restaurante por tramos; devuelve las filas borradas de cada tipo.
+
+    ``progreso(fase, hechos)`` recibe el total de filas borradas hasta el
+    momento, sumando todas las fases (el total esperado lo da ``pendiente``).
+    """
+    borrados = Counter()
+
+    def fase(nombre, qs, borrar):
+        antes = sum(borrados.values())
+        aviso = (lambda _, n: progreso(nombre, antes + n)) if progreso else None
+        borrados[nombre] += por_tramos(qs, lote, borrar, aviso, nombre)
+
+    # De las hojas a la raíz: cada fase deja sin hijos a la siguiente
+    fase("pedidos", Pedido.objects.filter(restaurante_id=restaurante_id),
+         lambda qs: _borrar_pedidos(qs, LineaPedido))
+    fase("pedidos", PedidoArchivado.objects.filter(restaurante_id=restaurante_id),
+         lambda qs: _borrar_pedidos(qs, LineaPedidoArchivada))
+    fase("reservas", Reserva.objects.filter(mesa__restaurante_id=restaurante_id),
+         lambda qs: _borrar_reservas(qs, restaurante_id))
+    fase("reservas", ReservaArchivada.objects.filter(mesa__restaurante_id=restaurante_id),
+         lambda qs: _borrar_reservas(qs, restaurante_id))
+    fase("platos", Plato.objects.filter(restaurante_id=restaurante_id),
+         lambda qs: _borrar_platos(qs, restaurante_id))
+    fase("mesas", Mesa.objects.filter(restaurante_id=restaurante_id),
+         lambda qs: _borrar_mesas(qs, restaurante_id))
+    condicional.tocar_restaurantes([restaurante_id])
+
+    with transaction.atomic():
+        # Solo quedan el restaurante, sus favoritos y sus resúmenes de ventas
+        restaurante = Restaurante.objects.filter(pk=restaurante_id).first()
+        if restaurante is not None:
+            restaurante.delete()
+    contadores.invalidar_reservas_activas()
+    return dict(borrados)
@@ -0,0 +1,207 @@
+"""Búsqueda de texto completo sobre tablas virtuales FTS5 de SQLite.
+
+Cada modelo buscable tiene su tabla ``restaurante_fts_<modelo>`` cuyo ``rowid``
+es el id del objeto. El tokenizador ``unicode61 remove_diacritics 2`` quita las
+tildes al indexar y al consultar, así que "jamon" encuentra "Jamón". Cada
+palabra buscada se trata como prefijo ("jam" encuentra "jamón") y los
+resultados se ordenan por relevancia (bm25, columna ``rank`` de FTS5). Las
+tablas de clientes y direcciones, que usa el autocompletado de los
+formularios, tienen además índice de prefijos de 2 y 3 letras.
+
+Los índices se mantienen al día con las señales de ``signals.py``; para datos
+ya existentes está el comando ``indexar_busqueda``. Fuera de SQLite se vuelve
+a los ``icontains`` de siempre.
+"""
+
+import re
+from abc import ABC, abstractmethod
+from functools import reduce
+from operator import and_, or_
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Cliente, Direccion, Plato, Restaurante
+
+_PALABRA = re.compile(r"\w+", re.UNICODE)
+
+
+class Indice(ABC):
+    def __init__(self, modelo, columnas, respaldo):
+        self.modelo = modelo
+        self.tabla = f"restaurante_fts_{modelo._meta.model_name}"
+        # columna FTS -> campos del ORM para el respaldo con icontains
+        self.columnas = columnas
+        self.respaldo = respaldo
+
+    @abstractmethod
+    def documento(self, obj) -> list[str]:
+        """Textos de ``obj`` para cada columna de la tabla FTS, en el orden de ``columnas``."""
+
+    def preparar(self, qs):
+        """QuerySet con lo necesario para ``documento()`` sin consultas extra."""
+        return qs
+
+
+class IndicePlato(Indice):
+    def documento(self, plato):
+        return [plato.nombre, " ".join(e.nombre for e in plato.etiquetas.all())]
+
+    def preparar(self, qs):
+        return qs.prefetch_related("etiquetas")
+
+
+class IndiceCliente(Indice):
+    def documento(self, cliente):
+        return [cliente.nombre, cliente.email]
+
+
+class IndiceDireccion(Indice):
+    def documento(self, direccion):
+        return [f"{direccion.calle} {direccion.numero}", direccion.ciudad, direccion.codigo_postal]
+
+
+class IndiceRestaurante(Indice):
+    def documento(self, restaurante):
+        d = restaurante.direccion
+        return [restaurante.nombre, restaurante.telefono, f"{d.calle} {d.ciudad} {d.codigo_postal}"]
+
+    def preparar(self, qs):
+        return qs.select_related("direccion")
+
+
+INDICES = {
+    Plato: IndicePlato(Plato, ["nombre", "etiquetas"], {"nombre": ["nombre"], "etiquetas": ["etiquetas__nombre"]}),
+    Cliente: IndiceCliente(Cliente, ["nombre", "email"], {"nombre": ["nombre"], "email": ["email"]}),
+    Direccion: IndiceDireccion(
+        Direccion,
+        ["calle", "ciudad", "codigo_postal"],
+        {"calle": ["calle"], "ciudad": ["ciudad"], "codigo_postal": ["codigo_postal"]},
+    ),
+    Restaurante: IndiceRestaurante(
+        Restaurante,
+        ["nombre", "telefono", "direccion"],
+        {
+            "nombre": ["nombre"],
+            "telefono": ["telefono"],
+            "direccion": ["direccion__calle", "direccion__ciudad", "direccion__codigo_postal"],
+        },
+    ),
+}
+
+
+def fts_disponible() -> bool:
+    return connection.vendor == "sqlite"
+
+
+def _expresion(texto: str) -> str | None:
+    palabras = _PALABRA.findall(texto or "")
+    if not palabras:
+        return None
+    return " ".join(f'"{p}"*' for p in palabras)
+
+
+def construir_consulta(texto: str = "", **por_columna) -> str | None:
+    """Traduce el texto del usuario a sintaxis MATCH de FTS5.
+
+    ``texto`` busca en todas las columnas; ``por_columna`` restringe cada
+    término a su columna y todos se combinan con AND.
+    """
+    partes = []
+    if texto:
+        expr = _expresion(texto)
+        if expr is None:
+            return None
+        partes.append(f"({expr})")
+    for columna, valor in por_columna.items():
+        if not valor:
+            continue
+        expr = _expresion(valor)
+        if expr is None:
+            return None
+        partes.append(f"{columna} : ({expr})")
+    return " AND ".join(partes) or None
+
+
+def buscar(qs, texto: str = "", **por_columna):
+    """Filtra ``qs`` por el índice de su modelo y ordena por relevancia."""
+    indice = INDICES[qs.model]
+    consulta = construir_consulta(texto, **por_columna)
+    if consulta is None:
+        return qs.none()
+
+    if not fts_disponible():
+        return _buscar_respaldo(qs, indice, texto, por_columna)
+
+    # Un solo JOIN con la tabla FTS: SQLite resuelve el MATCH una vez y va a
+    # cada fila por su id; ``rank`` sale de esa misma búsqueda
+    tabla = indice.tabla
+    pk = f'"{qs.model._meta.db_table}"."{qs.model._meta.pk.column}"'
+    return qs.extra(
+        tables=[tabla],
+        where=[f"{tabla}.rowid = {pk}", f"{tabla} MATCH %s"],
+        params=[consulta],
+        select={"relevancia": f"{tabla}.rank"},
+    ).order_by("relevancia", "pk")
+
+
+def _buscar_respaldo(qs, indice, texto, por_columna):
+    def contiene(columnas, valor):
+        campos = [c for col in columnas for c in indice.respaldo[col]]
+        return reduce(or_, (Q(**{f"{c}__icontains": valor}) for c in campos))
+
+    condiciones = []
+    if texto:
+        condiciones.append(contiene(indice.columnas, texto))
+    for columna, valor in por_columna.items():
+        if valor:
+            condiciones.append(contiene([columna], valor))
+    return qs.filter(reduce(and_, condiciones)).distinct()
+
+
+# ----------------------------------------------------------------------------
+# Mantenimiento del índice
+# ----------------------------------------------------------------------------
+
+
+def _escribir(indice, objetos):
+    filas = [(obj.pk, *indice.documento(obj)) for obj in objetos]
+    if not filas:
+        return
+    columnas = ", ".join(indice.columnas)
+    marcas = ", ".join(["%s"] * (len(indice.columnas) + 1))
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {indice.tabla} WHERE rowid = %s", [(f[0],) for f in filas])
+        cursor.executemany(f"INSERT INTO {indice.tabla} (rowid, {columnas}) VALUES ({marcas})", filas)
+
+
+def indexar(modelo, ids):
+    """(Re)indexa los objetos de ``modelo`` con esos ids."""
+    if not fts_disponible() or not ids:
+        return
+    indice = INDICES[modelo]
+    _escribir(indice, indice.preparar(modelo.objects.filter(pk__in=list(ids))))
+
+
+def desindexar(modelo, ids):
+    if not fts_disponible() or not ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {INDICES[modelo].tabla} WHERE rowid = %s", [(i,) for i in ids])
+
+
+def reconstruir(modelo, lote: int = 1000, progreso=None):
+    """Vacía y rellena el índice de ``modelo`` recorriendo la tabla por lotes de id."""
+    indice = INDICES[modelo]
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {indice.tabla}")
+    ultimo, total = 0, 0
+    while True:
+        objetos = list(indice.preparar(modelo.objects.filter(pk__gt=ultimo).order_by("pk"))[:lote])
+        if not objetos:
+            return total
+        _escribir(indice, objetos)
+        ultimo = objetos[-1].pk
+        total += len(objetos)
+        if progreso:
+            progreso(total)
@@ -0,0 +1,120 @@
+"""Caché de las páginas públicas de menús y restaurantes.
+
+La versión de lo que se cachea es la misma marca que usan las peticiones
+condicionales (ver ``condicional.py``): ``Restaurante.updated_at``, que los
+receptores de ``signals.py`` actualizan con ``condicional.tocar_restaurantes``
+al cambiar platos, mesas, direcciones o clientes frecuentes. Así un cambio se
+apunta con un solo UPDATE y lo ven a la vez la ETag y las claves de la caché:
+
+- La ficha de un restaurante y su fragmento ``includes/restaurante_item.html``
+  (compartido por la ficha y el listado) dependen de su ``updated_at``.
+- Los listados que mezclan restaurantes (platos, categorías, restaurantes)
+  dependen del ``updated_at`` más reciente y del número de restaurantes.
+
+Las etiquetas no son de ningún restaurante: un cambio en ellas renueva el
+testigo ``menu:todo`` (ver ``versiones.py``), que va en todas las claves. Una
+página cacheada se sirve entera sin llegar a la vista; leer la versión cuesta
+una consulta por índice, la misma del validador cuando la vista también es
+``condicional``.
+"""
+
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+
+from . import versiones
+from .condicional import huella_validada, validador_restaurante, validador_restaurantes
+
+TODO = "menu:todo"
+CABECERA = "X-Cache-Pagina"
+
+
+def segundos():
+    return getattr(settings, "MENU_CACHE_SEGUNDOS", 600)
+
+
+def _version(huella) -> str:
+    return f"{versiones.leer(TODO)}:{huella or ''}"
+
+
+def version_listados() -> str:
+    return _version(validador_restaurantes()[1])
+
+
+def version_restaurante(restaurante_id) -> str:
+    validado = validador_restaurante(restaurante_id)
+    return _version(validado and validado[1])
+
+
+def tocar_todo():
+    versiones.renovar(TODO)
+
+
+def pagina_cacheada(version):
+    """Cachea la respuesta entera de una vista GET sin datos del usuario.
+
+    ``version(**kwargs)`` recibe los argumentos de la URL y devuelve la
+    versión de la que depende la página. Si la vista está además dentro de
+    ``condicional``, en su lugar se usa la huella que ya ha calculado su
+    validador, sin volver a consultar. Solo se guardan respuestas 200 que
+    no ponen cookies; la cabecera ``X-Cache-Pagina`` indica HIT o MISS. Sirve
+    también para vistas asíncronas: entonces ``version`` se llama en un hilo
+    (puede consultar la caché o la base de datos) y la página se lee y se
+    guarda con ``aget``/``aset``.
+    """
+
+    def decorador(vista):
+        def clave(request, kwargs):
+            huella = huella_validada(request)
+            marca = _version(huella) if huella else version(**kwargs)
+            ruta = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            return f"pagina:{vista.__module__}.{vista.__name__}:{marca}:{ruta}"
+
+        def desde_cache(guardada):
+            contenido, tipo = guardada
+            response = HttpResponse(contenido, content_type=tipo)
+            response[CABECERA] = "HIT"
+            return response
+
+        def cacheable(response):
+            return response.status_code == 200 and not response.streaming and not response.cookies
+
+        if iscoroutinefunction(vista):
+
+            @wraps(vista)
+            async def envoltura_async(request, *args, **kwargs):
+                if request.method not in ("GET", "HEAD"):
+                    return await vista(request, *args, **kwargs)
+                clave_pagina = await sync_to_async(clave)(request, kwargs)
+                guardada = await cache.aget(clave_pagina)
+                if guardada is not None:
+                    return desde_cache(guardada)
+                response = await vista(request, *args, **kwargs)
+                if cacheable(response):
+                    await cache.aset(clave_pagina, (response.content, response["Content-Type"]), segundos())
+                response[CABECERA] = "MISS"
+                return response
+
+            return envoltura_async
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return vista(request, *args, **kwargs)
+            clave_pagina = clave(request, kwargs)
+            guardada = cache.get(clave_pagina)
+            if guardada is not None:
+                return desde_cache(guardada)
+            response = vista(request, *args, **kwargs)
+            if cacheable(response):
+                cache.set(clave_pagina, (response.content, response["Content-Type"]), segundos())
+            response[CABECERA] = "MISS"
+            return response
+
+        return envoltura
+
+    return decorador
@@ -0,0 +1,118 @@
+"""Peticiones condicionales (ETag / Last-Modified) para las páginas públicas.
+
+Cada vista decorada con ``condicional`` tiene un validador que, con una sola
+consulta sobre ``updated_at``, devuelve la última modificación de lo que
+muestra la página y una huella. Si el navegador o el proxy ya tienen esa
+versión, la respuesta es un 304 sin cuerpo y la vista no llega a ejecutarse.
+
+Las páginas también dependen de filas que no son suyas (la ficha de un
+restaurante muestra su dirección, platos, mesas y clientes frecuentes). Para
+que el validador siga siendo una consulta barata, los receptores de
+``signals.py`` llaman a ``tocar_restaurantes`` cuando cambia alguna de ellas,
+y así ``Restaurante.updated_at`` resume todo lo que enseña su ficha. Es la
+única marca por restaurante: la caché de páginas (``cache_menus.py``) la usa
+también como versión. Los borrados no dejan fecha: por eso las huellas de los
+listados incluyen también el número de filas.
+"""
+
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import Plato, Restaurante
+
+
+def tocar_restaurantes(ids):
+    """Marca como modificados esos restaurantes (sin señales: es un ``update``).
+
+    Cambia a la vez su ETag y sus claves en la caché de menús.
+    """
+    ids = {i for i in ids if i is not None}
+    if ids:
+        Restaurante.objects.filter(pk__in=ids).update(updated_at=timezone.now())
+
+
+def huella_validada(request):
+    """Huella que ya ha calculado ``condicional`` para esta petición, o ``None``."""
+    return getattr(request, "_validador_condicional", (None, None))[1]
+
+
+def _huella(*partes) -> str:
+    return hashlib.md5(":".join(str(p) for p in partes).encode()).hexdigest()
+
+
+def condicional(validador):
+    """Responde 304 si la página no ha cambiado desde la versión del cliente.
+
+    ``validador(**kwargs)`` recibe los argumentos de la URL y devuelve
+    ``(ultima_modificacion, huella)``, o ``None`` si no hay nada que validar.
+    Se llama una vez por petición: ``condition`` lo usa para la ETag y para
+    Last-Modified. Las respuestas llevan ``Cache-Control: no-cache`` para que
+    el cliente revalide siempre en vez de suponer que siguen frescas. Con
+    vistas asíncronas el validador se ejecuta en un hilo.
+    """
+
+    def decorador(vista):
+        def _validar(request, *args, **kwargs):
+            if not hasattr(request, "_validador_condicional"):
+                request._validador_condicional = validador(**kwargs) or (None, None)
+            return request._validador_condicional
+
+        condicionada = condition(
+            etag_func=lambda request, *args, **kwargs: _validar(request, *args, **kwargs)[1],
+            last_modified_func=lambda request, *args, **kwargs: _validar(request, *args, **kwargs)[0],
+        )(vista)
+
+        def sin_cache(request, response):
+            if request.method in ("GET", "HEAD") and response.status_code in (200, 304):
+                patch_cache_control(response, no_cache=True)
+            return response
+
+        if iscoroutinefunction(vista):
+
+            @wraps(vista)
+            async def envoltura_async(request, *args, **kwargs):
+                # condition() llama al validador de forma síncrona: se calcula
+                # antes en un hilo y _validar lo encuentra ya en la petición
+                request._validador_condicional = await sync_to_async(validador)(**kwargs) or (None, None)
+                return sin_cache(request, await condicionada(request, *args, **kwargs))
+
+            return envoltura_async
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            return sin_cache(request, condicionada(request, *args, **kwargs))
+
+        return envoltura
+
+    return decorador
+
+
+# ------------------------------------------------------------- validadores
+
+
+def validador_restaurantes():
+    datos = Restaurante.objects.aggregate(ultima=Max("updated_at"), n=Count("pk"))
+    return datos["ultima"], _huella("restaurantes", datos["ultima"], datos["n"])
+
+
+def validador_restaurante(id):
+    ultima = Restaurante.objects.filter(pk=id).values_list("updated_at", flat=True).first()
+    if ultima is None:
+        return None
+    return ultima, _huella("restaurante", id, ultima)
+
+
+def validador_categoria(categoria):
+    datos = Plato.objects.filter(categoria=categoria).aggregate(
+        plato=Max("updated_at"), restaurante=Max("restaurante__updated_at"), n=Count("pk"),
+    )
+    if not datos["n"]:
+        return None
+    ultima = max(datos["plato"], datos["restaurante"])
+    return ultima, _huella("categoria", categoria, datos["plato"], datos["restaurante"], datos["n"])
@@ -0,0 +1,227 @@
+"""Contadores: los cacheados de la cabecera y los guardados en ``Restaurante``.
+
+El número de reservas activas (de hoy en adelante) se guardaba en la sesión
+y se recontaba en cada visita a ``index``. Ahora vive en la caché con una
+clave por día, de modo que caduca sola a medianoche, y las señales de
+``Reserva`` la borran cuando cambia alguna reserva.
+
+Cada restaurante guarda además cuántos platos, mesas activas, clientes
+frecuentes y reservas abiertas (no canceladas, de hoy en adelante) tiene, para
+que los listados no tengan que contar con JOIN y GROUP BY. Las señales de
+``signals.py`` suman o restan con ``F()`` en cada alta, baja o cambio, y
+``reconciliar`` (comando o tarea ``reconciliar_contadores``) corrige por lotes
+lo que se haya desviado, por ejemplo tras cargas con ``bulk_create``, que no
+lanzan señales. Las reservas de ayer dejan de ser abiertas sin que nada las
+toque: los trabajadores de ``tareas.py`` dejan programada esa tarea para cada
+medianoche.
+"""
+
+import datetime
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import Mesa, Plato, Reserva, Restaurante
+
+
+def _clave(fecha):
+    return f"reservas_activas:{fecha.isoformat()}"
+
+
+def reservas_activas() -> int:
+    hoy = datetime.date.today()
+    total = cache.get(_clave(hoy))
+    if total is None:
+        total = Reserva.objects.filter(fecha__gte=hoy).count()
+        cache.set(_clave(hoy), total, getattr(settings, "RESERVAS_ACTIVAS_CACHE_SEGUNDOS", 300))
+    return total
+
+
+def invalidar_reservas_activas():
+    cache.delete(_clave(datetime.date.today()))
+
+
+# ----------------------------------------------------------------------------
+# Contadores de Restaurante
+# ----------------------------------------------------------------------------
+
+CONTADORES = ("num_platos", "num_mesas_activas", "num_clientes_frecuentes", "num_reservas_abiertas")
+Favorito = Restaurante.clientes_frecuentes.through
+
+
+def reserva_abierta(estado, fecha) -> bool:
+    """Si la reserva cuenta en ``num_reservas_abiertas``: no cancelada y de hoy en adelante."""
+    return estado != "cancelada" and fecha >= datetime.date.today()
+
+
+def reservas_abiertas(qs):
+    """Las reservas de ``qs`` que cumplen ``reserva_abierta``."""
+    return qs.exclude(estado="cancelada").filter(fecha__gte=datetime.date.today())
+
+
+def sumar(restaurante_id, campo, delta):
+    """Suma ``delta`` al contador del restaurante (un UPDATE, sin señales ni ``updated_at``)."""
+    if restaurante_id is not None and delta:
+        Restaurante.objects.filter(pk=restaurante_id).update(**{campo: F(campo) + delta})
+
+
+def _mover(campo, anterior, nuevo):
+    """Pasa una fila contada de un restaurante a otro (o la da de alta o de baja si uno es ``None``)."""
+    if anterior != nuevo:
+        sumar(anterior, campo, -1)
+        sumar(nuevo, campo, 1)
+
+
+# ------------------------------ Plato ------------------------------
+
+
+def plato_antes_de_guardar(plato):
+    plato._contador_anterior = None
+    if plato.pk:
+        plato._contador_anterior = Plato.objects.filter(pk=plato.pk).values_list("restaurante_id", flat=True).first()
+
+
+def plato_guardado(plato):
+    _mover("num_platos", getattr(plato, "_contador_anterior", None), plato.restaurante_id)
+
+
+def plato_borrado(plato):
+    sumar(plato.restaurante_id, "num_platos", -1)
+
+
+# ------------------------------ Mesa -------------------------------
+
+
+def _mesa_contada(restaurante_id, activa):
+    return restaurante_id if activa else None
+
+
+def mesa_antes_de_guardar(mesa):
+    mesa._contador_anterior = None
+    if mesa.pk:
+        fila = Mesa.objects.filter(pk=mesa.pk).values_list("restaurante_id", "activa").first()
+        mesa._contador_anterior = _mesa_contada(*fila) if fila else None
+
+
+def mesa_guardada(mesa):
+    _mover("num_mesas_activas", getattr(mesa, "_contador_anterior", None), _mesa_contada(mesa.restaurante_id, mesa.activa))
+
+
+def mesa_borrada(mesa):
+    if mesa.activa:
+        sumar(mesa.restaurante_id, "num_mesas_activas", -1)
+
+
+# ----------------------------- Reserva -----------------------------
+
+
+def reserva_antes_de_guardar(reserva):
+    reserva._contador_anterior = None
+    if reserva.pk:
+        fila = Reserva.objects.filter(pk=reserva.pk).values_list("mesa__restaurante_id", "estado", "fecha").first()
+        if fila and reserva_abierta(fila[1], fila[2]):
+            reserva._contador_anterior = fila[0]
+
+
+def reserva_guardada(reserva, restaurante_id):
+    nuevo = restaurante_id if reserva_abierta(reserva.estado, reserva.fecha) else None
+    _mover("num_reservas_abiertas", getattr(reserva, "_contador_anterior", None), nuevo)
+
+
+def reserva_borrada(reserva, restaurante_id):
+    if reserva_abierta(reserva.estado, reserva.fecha):
+        sumar(restaurante_id, "num_reservas_abiertas", -1)
+
+
+# ------------------------ Clientes frecuentes ------------------------
+
+
+def favoritos_cambiados(instance, action, reverse, pk_set):
+    """Receptor de ``m2m_changed`` de ``clientes_frecuentes`` (en los dos sentidos).
+
+    ``clear()`` no dice qué filas quita y ``remove()`` informa de las pedidas
+    aunque no existan, así que las que se van a quitar se leen antes.
+    """
+    if action in ("pre_clear", "pre_remove"):
+        propio, otro = ("cliente", "restaurante") if reverse else ("restaurante", "cliente")
+        filas = Favorito.objects.filter(**{propio: instance.pk})
+        if action == "pre_remove":
+            filas = filas.filter(**{f"{otro}__in": pk_set})
+        instance._favoritos_quitados = list(filas.values_list("restaurante_id", flat=True))
+    elif action in ("post_clear", "post_remove"):
+        _sumar_favoritos(instance, reverse, instance._favoritos_quitados, -1)
+    elif action == "post_add" and pk_set:
+        # pk_set solo trae las que de verdad se añadieron
+        _sumar_favoritos(instance, reverse, pk_set, 1)
+
+
+def _sumar_favoritos(instance, reverse, restaurantes, signo):
+    if reverse:
+        # cliente.restaurantes_favoritos: una fila por restaurante afectado
+        for restaurante_id in restaurantes:
+            sumar(restaurante_id, "num_clientes_frecuentes", signo)
+    else:
+        sumar(instance.pk, "num_clientes_frecuentes", signo * len(restaurantes))
+
+
+def cliente_antes_de_borrar(cliente):
+    # El borrado en cascada de sus filas de favoritos no lanza m2m_changed
+    restaurantes = Favorito.objects.filter(cliente=cliente.pk).values("restaurante_id")
+    Restaurante.objects.filter(pk__in=restaurantes).update(num_clientes_frecuentes=F("num_clientes_frecuentes") - 1)
+
+
+# -------------------------- Reconciliación --------------------------
+
+
+def _contar(qs, campo):
+    """Subconsulta con el número de filas de ``qs`` por restaurante (0 si no hay)."""
+    filas = qs.filter(**{campo: OuterRef("pk")}).order_by().values(campo).annotate(n=Count("*")).values("n")
+    return Coalesce(Subquery(filas, output_field=IntegerField()), Value(0))
+
+
+def contadores_reales():
+    """Expresiones que cuentan de verdad cada contador, para ``annotate``."""
+    return {
+        "num_platos": _contar(Plato.objects.all(), "restaurante"),
+        "num_mesas_activas": _contar(Mesa.objects.filter(activa=True), "restaurante"),
+        "num_clientes_frecuentes": _contar(Favorito.objects.all(), "restaurante"),
+        "num_reservas_abiertas": _contar(reservas_abiertas(Reserva.objects.all()), "mesa__restaurante"),
+    }
+
+
+def reconciliar(lote: int = 1000, progreso=None) -> int:
+    """Recalcula los contadores por tramos de ``lote`` restaurantes; devuelve cuántos estaban mal.
+
+    Cada tramo es una consulta que compara lo guardado con lo contado y un
+    ``bulk_update`` de los que difieren. Con escrituras concurrentes puede
+    quedar alguna diferencia que se corrige en la siguiente pasada.
+    """
+    reales = {f"real_{campo}": expr for campo, expr in contadores_reales().items()}
+    desviado = Q()
+    for campo in CONTADORES:
+        desviado |= ~Q(**{campo: F(f"real_{campo}")})
+
+    ultimo, revisados, corregidos = 0, 0, 0
+    while True:
+        ids = list(
+            Restaurante.objects.filter(pk__gt=ultimo).order_by("pk").values_list("pk", flat=True)[:lote]
+        )
+        if not ids:
+            return corregidos
+        mal = list(
+            Restaurante.objects.filter(pk__gte=ids[0], pk__lte=ids[-1])
+            .annotate(**reales).filter(desviado).only("pk", *CONTADORES)
+        )
+        for restaurante in mal:
+            for campo in CONTADORES:
+                setattr(restaurante, campo, getattr(restaurante, f"real_{campo}"))
+        with transaction.atomic():
+            Restaurante.objects.bulk_update(mal, CONTADORES)
+        ultimo = ids[-1]
+        revisados += len(ids)
+        corregidos += len(mal)
+        if progreso:
+            progreso(revisados)
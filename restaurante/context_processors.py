@@ -0,0 +1,10 @@
+from . import contadores
+
+
+def contadores_cabecera(request):
+    """Datos de la cabecera de ``base.html``.
+
+    Se pasa la función sin llamarla: la plantilla solo la evalúa (y consulta
+    la caché) si la página llega a mostrarlo.
+    """
+    return {"total_reservas_activas": contadores.reservas_activas}
@@ -0,0 +1,388 @@
+"""Copias de seguridad por modelo en JSONL troceado y restauración reanudable.
+
+Una copia es un directorio con un ``manifiesto.json`` y, por cada modelo, una
+serie de ficheros ``<app.modelo>.<n>.jsonl`` (``.jsonl.gz`` si va comprimida)
+de como mucho ``lote`` filas. Cada línea es un registro con el mismo formato que
+``dumpdata`` (``{"model", "pk", "fields"}``), así que se puede leer con los
+serializadores de Django. El manifiesto se reescribe tras cada fichero, de modo
+que una copia interrumpida continúa desde el último id guardado.
+
+La restauración inserta con ``bulk_create`` en orden de dependencias y apunta
+los ficheros ya cargados en ``restauracion.json``; después vuelca las relaciones
+muchos a muchos y recalcula lo derivado (índice de búsqueda, resúmenes de
+ventas, contadores de restaurantes y estadísticas de clientes), ya que
+``bulk_create`` no dispara señales.
+
+El ``backups/backup.json`` de siempre (un único array de ``dumpdata``) se
+convierte a este formato leyéndolo por trozos, sin cargarlo entero.
+"""
+
+import contextlib
+import datetime
+import gzip
+import json
+import os
+
+from django.contrib.auth.models import Group
+from django.core import serializers
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import archivo, busqueda, contadores, estadisticas, ventas
+from .models import (
+    Cliente, Direccion, Etiqueta, LineaPedido, LineaPedidoArchivada, Mesa, Pedido, PedidoArchivado, PerfilCliente,
+    Plato, Reserva, ReservaArchivada, Restaurante, Usuario,
+)
+
+FORMATO = 1
+LOTE = 5000
+MANIFIESTO = "manifiesto.json"
+PUNTO_CONTROL = "restauracion.json"
+
+# Orden de dependencias: cada modelo solo apunta (por FK) a los anteriores.
+# ResumenVentasDiario no se copia: se recalcula al restaurar.
+MODELOS = [
+    Group, Usuario, Direccion, Restaurante, Etiqueta, Mesa, Plato, Cliente, PerfilCliente, Reserva, Pedido,
+    LineaPedido, ReservaArchivada, PedidoArchivado, LineaPedidoArchivada,
+]
+
+# Grupos y usuarios apuntan a permisos, cuyos ids cambian entre bases de datos
+CLAVES_NATURALES = {Group, Usuario}
+
+
+def etiqueta(modelo) -> str:
+    return modelo._meta.label_lower
+
+
+def _m2m(modelo):
+    """Campos muchos a muchos con tabla intermedia automática (las explícitas se copian como modelo)."""
+    return [f for f in modelo._meta.many_to_many if f.remote_field.through._meta.auto_created]
+
+
+# ----------------------------------------------------------------------------
+# Ficheros
+# ----------------------------------------------------------------------------
+
+
+def _abrir(ruta, modo="rt"):
+    if ruta.endswith(".gz"):
+        return gzip.open(ruta, modo, encoding="utf-8")
+    return open(ruta, modo, encoding="utf-8")
+
+
+def _escribir_json(ruta, datos):
+    """Escribe a un temporal y lo renombra, para no dejar nunca un JSON a medias."""
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta)
+
+
+def _leer_json(ruta, defecto=None):
+    if not os.path.exists(ruta):
+        return defecto
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class _Codificador(DjangoJSONEncoder):
+    """Como el de ``dumpdata`` pero sin recortar los microsegundos."""
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _escribir_trozo(directorio, nombre, registros):
+    temporal = os.path.join(directorio, "." + nombre)  # conserva la extensión (.gz)
+    codificador = _Codificador(ensure_ascii=False, separators=(",", ":"))
+    with _abrir(temporal, "wt") as f:
+        for registro in registros:
+            f.write(codificador.encode(registro) + "\n")
+    os.replace(temporal, os.path.join(directorio, nombre))
+
+
+def _leer_trozo(directorio, nombre):
+    with _abrir(os.path.join(directorio, nombre)) as f:
+        for linea in f:
+            if linea.strip():
+                yield json.loads(linea)
+
+
+def leer_array_json(ruta, tamano: int = 1 << 16):
+    """Recorre los elementos de un fichero con un array JSON sin cargarlo entero."""
+    decodificador = json.JSONDecoder()
+    with open(ruta, encoding="utf-8") as f:
+        buffer, pos, empezado = "", 0, False
+        while True:
+            bloque = f.read(tamano)
+            buffer = buffer[pos:] + bloque
+            pos = 0
+            while True:
+                while pos < len(buffer) and (buffer[pos].isspace() or buffer[pos] == ","):
+                    pos += 1
+                if pos < len(buffer) and not empezado:
+                    if buffer[pos] != "[":
+                        raise ValueError("El fichero no contiene un array JSON.")
+                    empezado, pos = True, pos + 1
+                    continue
+                if pos < len(buffer) and buffer[pos] == "]":
+                    return
+                try:
+                    elemento, pos = decodificador.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    break  # elemento incompleto: hace falta otro bloque
+                yield elemento
+            if not bloque:
+                if buffer[pos:].strip():
+                    raise ValueError("Array JSON truncado.")
+                return
+
+
+def _nombre_trozo(modelo_etiqueta, numero, comprimida):
+    return f"{modelo_etiqueta}.{numero:05d}.jsonl" + (".gz" if comprimida else "")
+
+
+# ----------------------------------------------------------------------------
+# Copia
+# ----------------------------------------------------------------------------
+
+
+def crear_copia(directorio, lote: int = LOTE, comprimir: bool = False, progreso=None):
+    """Copia los modelos de ``MODELOS`` a ``directorio``, continuando una copia a medias si la hay.
+
+    Cada modelo se recorre por tramos de id, así que la copia no es una foto
+    instantánea: conviene hacerla sin escrituras en curso.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    ruta_manifiesto = os.path.join(directorio, MANIFIESTO)
+    manifiesto = _leer_json(ruta_manifiesto)
+    if manifiesto is not None and manifiesto.get("completa"):
+        raise ValueError(f"{directorio} ya contiene una copia completa.")
+    if manifiesto is None:
+        manifiesto = {
+            "formato": FORMATO,
+            "creada": datetime.datetime.now().isoformat(timespec="seconds"),
+            "comprimida": comprimir,
+            "lote": lote,
+            "modelos": {},
+            "completa": False,
+        }
+    comprimida, lote = manifiesto["comprimida"], manifiesto["lote"]
+
+    for modelo in MODELOS:
+        datos = manifiesto["modelos"].setdefault(
+            etiqueta(modelo), {"ficheros": [], "filas": 0, "ultimo_pk": None, "completo": False}
+        )
+        if datos["completo"]:
+            continue
+        qs = modelo._default_manager.order_by("pk").prefetch_related(*(f.name for f in _m2m(modelo)))
+        while True:
+            tramo = qs if datos["ultimo_pk"] is None else qs.filter(pk__gt=datos["ultimo_pk"])
+            objetos = list(tramo[:lote])
+            if not objetos:
+                break
+            registros = serializers.serialize(
+                "python", objetos, use_natural_foreign_keys=modelo in CLAVES_NATURALES
+            )
+            nombre = _nombre_trozo(etiqueta(modelo), len(datos["ficheros"]) + 1, comprimida)
+            _escribir_trozo(directorio, nombre, registros)
+            datos["ficheros"].append(nombre)
+            datos["filas"] += len(objetos)
+            datos["ultimo_pk"] = objetos[-1].pk
+            _escribir_json(ruta_manifiesto, manifiesto)
+            if progreso:
+                progreso(etiqueta(modelo), datos["filas"])
+        datos["completo"] = True
+        _escribir_json(ruta_manifiesto, manifiesto)
+
+    manifiesto["completa"] = True
+    _escribir_json(ruta_manifiesto, manifiesto)
+    return manifiesto
+
+
+def importar_fixture(ruta, directorio, lote: int = LOTE, comprimir: bool = False):
+    """Convierte un fixture de ``dumpdata`` (como ``backups/backup.json``) en una copia troceada.
+
+    Se lee dos veces: la primera solo guarda permisos y tipos de contenido para
+    traducir los ids de permisos de grupos y usuarios a claves naturales. Los
+    modelos que no están en ``MODELOS`` (sesiones, log del admin...) se ignoran.
+    Devuelve el manifiesto y el número de registros ignorados por modelo.
+    """
+    tipos, permisos = {}, {}
+    for registro in leer_array_json(ruta):
+        if registro["model"] == "contenttypes.contenttype":
+            tipos[registro["pk"]] = (registro["fields"]["app_label"], registro["fields"]["model"])
+        elif registro["model"] == "auth.permission":
+            permisos[registro["pk"]] = (registro["fields"]["codename"], registro["fields"]["content_type"])
+
+    def permiso_natural(pk):
+        if pk not in permisos:
+            return pk
+        codename, tipo = permisos[pk]
+        return [codename, *tipos[tipo]] if tipo in tipos else pk
+
+    os.makedirs(directorio, exist_ok=True)
+    manifiesto = {
+        "formato": FORMATO,
+        "creada": datetime.datetime.now().isoformat(timespec="seconds"),
+        "origen": os.path.basename(ruta),
+        "comprimida": comprimir,
+        "lote": lote,
+        "modelos": {
+            etiqueta(m): {"ficheros": [], "filas": 0, "ultimo_pk": None, "completo": True} for m in MODELOS
+        },
+        "completa": False,
+    }
+    pendientes = {etiqueta(m): [] for m in MODELOS}
+    ignorados = {}
+
+    def volcar(modelo_etiqueta):
+        datos = manifiesto["modelos"][modelo_etiqueta]
+        nombre = _nombre_trozo(modelo_etiqueta, len(datos["ficheros"]) + 1, comprimir)
+        _escribir_trozo(directorio, nombre, pendientes[modelo_etiqueta])
+        datos["ficheros"].append(nombre)
+        datos["filas"] += len(pendientes[modelo_etiqueta])
+        datos["ultimo_pk"] = pendientes[modelo_etiqueta][-1]["pk"]
+        pendientes[modelo_etiqueta] = []
+
+    for registro in leer_array_json(ruta):
+        modelo_etiqueta = registro["model"]
+        if modelo_etiqueta not in pendientes:
+            ignorados[modelo_etiqueta] = ignorados.get(modelo_etiqueta, 0) + 1
+            continue
+        campos = registro["fields"]
+        for campo in ("permissions", "user_permissions"):
+            if campo in campos:
+                campos[campo] = [permiso_natural(pk) for pk in campos[campo]]
+        pendientes[modelo_etiqueta].append(registro)
+        if len(pendientes[modelo_etiqueta]) >= lote:
+            volcar(modelo_etiqueta)
+    for modelo_etiqueta, registros in pendientes.items():
+        if registros:
+            volcar(modelo_etiqueta)
+
+    manifiesto["completa"] = True
+    _escribir_json(os.path.join(directorio, MANIFIESTO), manifiesto)
+    return manifiesto, ignorados
+
+
+# ----------------------------------------------------------------------------
+# Restauración
+# ----------------------------------------------------------------------------
+
+
+@contextlib.contextmanager
+def fechas_tal_cual(modelo, objetos=()):
+    """Desactiva ``auto_now``/``auto_now_add`` para que ``bulk_create`` guarde las fechas de la copia.
+
+    Los ``objetos`` que no traen alguna de esas fechas (copias anteriores al
+    campo, filas del generador) reciben la hora actual, como harían sin esto.
+    """
+    campos = [f for f in modelo._meta.concrete_fields if getattr(f, "auto_now", False) or getattr(f, "auto_now_add", False)]
+    originales = [(f, f.auto_now, f.auto_now_add) for f in campos]
+    ahora = timezone.now()
+    for objeto in objetos:
+        for f in campos:
+            if getattr(objeto, f.attname) is None:
+                setattr(objeto, f.attname, ahora)
+    try:
+        for f in campos:
+            f.auto_now = f.auto_now_add = False
+        yield
+    finally:
+        for f, auto_now, auto_now_add in originales:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+def _cargar_filas(modelo, registros):
+    nombres_m2m = {f.name for f in _m2m(modelo)}
+    sin_m2m = (
+        {**r, "fields": {k: v for k, v in r["fields"].items() if k not in nombres_m2m}} for r in registros
+    )
+    objetos = [d.object for d in serializers.deserialize("python", sin_m2m, ignorenonexistent=True)]
+    with fechas_tal_cual(modelo, objetos):
+        # ignore_conflicts: al reanudar, el trozo puede estar ya insertado en parte
+        modelo._default_manager.bulk_create(objetos, ignore_conflicts=True)
+    return len(objetos)
+
+
+def _cargar_relaciones(modelo, registros):
+    campos = _m2m(modelo)
+    nombres = {f.name for f in campos}
+    solo_m2m = (
+        {"model": r["model"], "pk": r["pk"], "fields": {k: v for k, v in r["fields"].items() if k in nombres}}
+        for r in registros
+    )
+    filas = {f.name: [] for f in campos}
+    for deserializado in serializers.deserialize("python", solo_m2m):
+        for nombre, ids in (deserializado.m2m_data or {}).items():
+            filas[nombre].extend((deserializado.object.pk, i) for i in ids)
+    total = 0
+    for campo in campos:
+        through = campo.remote_field.through
+        origen, destino = campo.m2m_field_name() + "_id", campo.m2m_reverse_field_name() + "_id"
+        through._default_manager.bulk_create(
+            [through(**{origen: a, destino: b}) for a, b in filas[campo.name]], ignore_conflicts=True
+        )
+        total += len(filas[campo.name])
+    return total
+
+
+def base_vacia() -> bool:
+    return not any(m._default_manager.exists() for m in MODELOS)
+
+
+def restaurar_copia(directorio, progreso=None):
+    """Restaura una copia completa, continuando por donde se quedó si se interrumpió.
+
+    Fases: filas de cada modelo (en el orden de ``MODELOS``), relaciones muchos a
+    muchos y datos derivados. Cada fichero se carga en su propia transacción y se
+    anota en ``restauracion.json``.
+    """
+    manifiesto = _leer_json(os.path.join(directorio, MANIFIESTO))
+    if manifiesto is None:
+        raise ValueError(f"No hay {MANIFIESTO} en {directorio}.")
+    if not manifiesto.get("completa"):
+        raise ValueError("La copia está incompleta; termínela con copia_seguridad antes de restaurarla.")
+
+    ruta_control = os.path.join(directorio, PUNTO_CONTROL)
+    control = _leer_json(ruta_control, {"filas": [], "relaciones": [], "derivados": False})
+    hechos = {fase: set(control[fase]) for fase in ("filas", "relaciones")}
+
+    def fase(nombre, cargar, modelos):
+        for modelo in modelos:
+            for fichero in manifiesto["modelos"].get(etiqueta(modelo), {}).get("ficheros", []):
+                if fichero in hechos[nombre]:
+                    continue
+                with transaction.atomic():
+                    n = cargar(modelo, _leer_trozo(directorio, fichero))
+                control[nombre].append(fichero)
+                hechos[nombre].add(fichero)
+                _escribir_json(ruta_control, control)
+                if progreso:
+                    progreso(nombre, fichero, n)
+
+    fase("filas", _cargar_filas, MODELOS)
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), MODELOS):
+            cursor.execute(sql)
+    archivo.proteger_ids()
+    fase("relaciones", _cargar_relaciones, [m for m in MODELOS if _m2m(m)])
+
+    if not control["derivados"]:
+        if busqueda.fts_disponible():
+            for modelo in busqueda.INDICES:
+                busqueda.reconstruir(modelo)
+        ventas.reconstruir()
+        contadores.reconciliar()
+        estadisticas.reconstruir()
+        control["derivados"] = True
+        _escribir_json(ruta_control, control)
+        if progreso:
+            progreso("derivados", None, None)
+    return manifiesto
+
@@ -0,0 +1,119 @@
+"""Motor de disponibilidad de mesas para las reservas.
+
+Una reserva ocupa su mesa desde ``hora`` durante ``RESERVA_DURACION_MINUTOS``
+(ajuste en settings, 90 minutos por defecto). Para saber qué mesas están libres
+se carga de una sola vez la ocupación del día (una consulta) y se construye un
+índice en memoria: por cada mesa, la lista ordenada de minutos de inicio. Cada
+comprobación es entonces una búsqueda binaria en vez de un ``exists()`` por mesa.
+"""
+
+from bisect import bisect_right
+from collections import defaultdict
+
+from django.conf import settings
+
+from .asincrono import alistar
+from .models import Mesa, Reserva
+
+ESTADO_CANCELADA = "cancelada"
+
+
+def duracion_reserva() -> int:
+    """Minutos que una reserva mantiene ocupada la mesa."""
+    return getattr(settings, "RESERVA_DURACION_MINUTOS", 90)
+
+
+def a_minutos(hora) -> int:
+    return hora.hour * 60 + hora.minute
+
+
+class IndiceOcupacion:
+    """Índice de ocupación por mesa y día construido con una sola consulta.
+
+    ``self._inicios[(mesa_id, fecha)]`` guarda los minutos de inicio ordenados
+    de las reservas no canceladas de esa mesa en ese día.
+    """
+
+    def __init__(self, reservas, duracion: int | None = None):
+        self.duracion = duracion if duracion is not None else duracion_reserva()
+        self._inicios = defaultdict(list)
+        for mesa_id, fecha, hora in reservas:
+            self._inicios[(mesa_id, fecha)].append(a_minutos(hora))
+        for inicios in self._inicios.values():
+            inicios.sort()
+
+    @staticmethod
+    def ocupacion_del_dia(fecha, restaurante=None, mesas=None, excluir=None):
+        """Queryset ``(mesa_id, fecha, hora)`` de un día, acotado a un restaurante o a unas mesas.
+
+        SQL:
+          SELECT r.mesa_id, r.fecha, r.hora FROM restaurante_reserva r
+            JOIN restaurante_mesa m ON m.id=r.mesa_id
+           WHERE r.fecha=%s AND m.restaurante_id=%s AND NOT r.estado='cancelada';
+        """
+        qs = Reserva.objects.filter(fecha=fecha).exclude(estado=ESTADO_CANCELADA)
+        if restaurante is not None:
+            qs = qs.filter(mesa__restaurante=restaurante)
+        if mesas is not None:
+            qs = qs.filter(mesa__in=mesas)
+        if excluir is not None:
+            qs = qs.exclude(pk=excluir.pk if hasattr(excluir, "pk") else excluir)
+        return qs.values_list("mesa_id", "fecha", "hora")
+
+    @classmethod
+    def para_dia(cls, fecha, restaurante=None, mesas=None, excluir=None, duracion: int | None = None):
+        """Carga la ocupación de un día (ver ``ocupacion_del_dia``)."""
+        return cls(cls.ocupacion_del_dia(fecha, restaurante, mesas, excluir), duracion=duracion)
+
+    def libre(self, mesa_id: int, fecha, hora) -> bool:
+        """``True`` si la ventana [hora, hora + duración) no pisa otra reserva.
+
+        Una reserva que empieza en ``s`` ocupa [s, s + duración): hay choque si
+        algún ``s`` cumple ``inicio - duración < s < inicio + duración``.
+        """
+        inicios = self._inicios.get((mesa_id, fecha))
+        if not inicios:
+            return True
+        inicio = a_minutos(hora)
+        i = bisect_right(inicios, inicio - self.duracion)
+        return i == len(inicios) or inicios[i] >= inicio + self.duracion
+
+    def mesas_libres(self, mesas, fecha, hora):
+        return [m for m in mesas if self.libre(m.id, fecha, hora)]
+
+    def solapes(self) -> int:
+        """Número de reservas que pisan a la anterior de su misma mesa."""
+        return sum(
+            1
+            for inicios in self._inicios.values()
+            for anterior, siguiente in zip(inicios, inicios[1:])
+            if siguiente - anterior < self.duracion
+        )
+
+
+def mesas_libres(restaurante, fecha, hora, duracion: int | None = None):
+    """Mesas activas del restaurante libres en esa fecha y hora.
+
+    Dos consultas en total (mesas y ocupación del día), sin importar cuántas
+    mesas o reservas haya.
+    """
+    mesas = list(Mesa.objects.filter(restaurante=restaurante, activa=True).order_by("numero"))
+    if not mesas:
+        return []
+    indice = IndiceOcupacion.para_dia(fecha, restaurante=restaurante, duracion=duracion)
+    return indice.mesas_libres(mesas, fecha, hora)
+
+
+async def amesas_libres(restaurante, fecha, hora, duracion: int | None = None):
+    """Versión asíncrona de ``mesas_libres`` (mismas dos consultas, sin bloquear el bucle)."""
+    mesas = await alistar(Mesa.objects.filter(restaurante=restaurante, activa=True).order_by("numero"))
+    if not mesas:
+        return []
+    ocupacion = await alistar(IndiceOcupacion.ocupacion_del_dia(fecha, restaurante=restaurante))
+    return IndiceOcupacion(ocupacion, duracion=duracion).mesas_libres(mesas, fecha, hora)
+
+
+def mesa_disponible(mesa, fecha, hora, excluir=None) -> bool:
+    """Comprueba una sola mesa; ``excluir`` permite ignorar la reserva que se edita."""
+    indice = IndiceOcupacion.para_dia(fecha, mesas=[mesa], excluir=excluir)
+    return indice.libre(mesa.id, fecha, hora)
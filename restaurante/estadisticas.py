@@ -0,0 +1,104 @@
+"""Mantenimiento de ``EstadisticaCliente`` (pedidos, gasto, último pedido y restaurante habitual).
+
+A diferencia del resumen de ventas, aquí no basta con sumar deltas: al borrar
+un pedido no se sabe restando cuál era el último ni el restaurante habitual.
+Cada cambio recalcula solo los clientes afectados con ``recalcular``, que hace
+dos consultas agrupadas para todo el conjunto (y otras dos sobre los pedidos
+archivados) y un upsert, así que un lote de pedidos del TPV (ver
+``pedidos.py``) o un tramo de ``reconstruir`` cuestan lo mismo que un pedido
+suelto.
+"""
+
+import threading
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from .models import Cliente, EstadisticaCliente, Pedido, PedidoArchivado
+
+CAMPOS = ("num_pedidos", "total_gastado", "ultimo_pedido", "restaurante_favorito")
+
+_local = threading.local()
+
+
+def clientes_en_borrado() -> set:
+    if not hasattr(_local, "borrando"):
+        _local.borrando = set()
+    return _local.borrando
+
+
+def recalcular(cliente_ids):
+    """Vuelve a calcular la estadística de esos clientes; borra la de los que ya no tienen pedidos."""
+    # Los pedidos de un cliente que se está borrando avisan en cascada: su
+    # estadística se va con él y no hay que volver a crearla
+    ids = set(cliente_ids) - clientes_en_borrado() - {None}
+    if not ids:
+        return
+    # Los pedidos archivados (ver archivo.py) siguen contando
+    totales, por_restaurante = {}, Counter()
+    for modelo in (Pedido, PedidoArchivado):
+        pedidos = modelo.objects.filter(cliente_id__in=ids).order_by()
+        for f in pedidos.values("cliente_id").annotate(n=Count("id"), t=Sum("total"), ultimo=Max("fecha")):
+            n, t, ultimo = totales.get(f["cliente_id"], (0, 0, f["ultimo"]))
+            totales[f["cliente_id"]] = (n + f["n"], t + (f["t"] or 0), max(ultimo, f["ultimo"]))
+        for f in pedidos.values("cliente_id", "restaurante_id").annotate(n=Count("id")):
+            por_restaurante[(f["cliente_id"], f["restaurante_id"])] += f["n"]
+    favoritos = {}
+    # Más pedidos primero; si empatan, el restaurante de id menor
+    for (cliente_id, restaurante_id), n in sorted(por_restaurante.items(), key=lambda c: (c[0][0], -c[1], c[0][1])):
+        favoritos.setdefault(cliente_id, restaurante_id)
+
+    filas = [
+        EstadisticaCliente(
+            cliente_id=cliente_id, num_pedidos=n, total_gastado=t, ultimo_pedido=ultimo,
+            restaurante_favorito_id=favoritos.get(cliente_id),
+        )
+        for cliente_id, (n, t, ultimo) in totales.items()
+    ]
+    if filas:
+        EstadisticaCliente.objects.bulk_create(
+            filas, update_conflicts=True, unique_fields=["cliente"], update_fields=CAMPOS,
+        )
+    sin_pedidos = ids - totales.keys()
+    if sin_pedidos:
+        EstadisticaCliente.objects.filter(cliente_id__in=sin_pedidos).delete()
+
+
+# ------------------------------ Señales ------------------------------
+
+
+def pedido_antes_de_guardar(pedido):
+    pedido._cliente_anterior = None
+    if pedido.pk:
+        pedido._cliente_anterior = Pedido.objects.filter(pk=pedido.pk).values_list("cliente_id", flat=True).first()
+
+
+def pedido_guardado(pedido):
+    recalcular({pedido.cliente_id, getattr(pedido, "_cliente_anterior", None)})
+
+
+def pedido_borrado(pedido):
+    recalcular({pedido.cliente_id})
+
+
+# --------------------------- Reconstrucción ---------------------------
+
+
+def reconstruir(lote: int = 2000, progreso=None) -> int:
+    """Recalcula las estadísticas de todos los clientes por tramos de ``lote`` ids.
+
+    Cada tramo va en su transacción; conviene ejecutarlo sin escrituras
+    concurrentes de pedidos.
+    """
+    ultimo, procesados = 0, 0
+    while True:
+        ids = list(Cliente.objects.filter(pk__gt=ultimo).order_by("pk").values_list("pk", flat=True)[:lote])
+        if not ids:
+            return procesados
+        with transaction.atomic():
+            recalcular(ids)
+        ultimo = ids[-1]
+        procesados += len(ids)
+        if progreso:
+            progreso(procesados)
@@ -0,0 +1,206 @@
+"""Exportación en streaming de pedidos, reservas y clientes a CSV o JSONL.
+
+Las filas se leen por lotes con paginación por id (``pk > último``) y
+``values()``, sin instanciar modelos ni cargar la tabla entera, y se van
+escribiendo según se generan. La memoria usada depende del tamaño del lote,
+no del de la tabla. Lo usan la vista ``exportar`` (``StreamingHttpResponse``)
+el comando ``exportar_datos`` y la tarea ``exportar`` (``tareas.py``), que lo
+escribe en un fichero en segundo plano.
+
+Con ``archivo=True`` salen también, después de las vivas, las reservas y los
+pedidos archivados (ver ``archivo.py``), para informes históricos.
+"""
+
+import csv
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .basedatos import alias_lectura
+from .models import Cliente, LineaPedido, LineaPedidoArchivada, Pedido, PedidoArchivado, Reserva, ReservaArchivada
+
+FORMATOS = ("csv", "jsonl")
+LOTE = 1000
+
+
+def _por_lotes(qs, campos, lote):
+    ultimo = 0
+    while True:
+        filas = list(qs.filter(pk__gt=ultimo).order_by("pk").values(*campos)[:lote])
+        if not filas:
+            return
+        yield filas
+        ultimo = filas[-1]["id"]
+
+
+class Exportacion(ABC):
+    """Define qué columnas y filas salen para un modelo."""
+
+    modelo = None
+    # Tabla con las filas archivadas (ver archivo.py), si el modelo tiene
+    modelo_archivo = None
+    campos = ()
+
+    def __init__(self, restaurante=None, desde=None, hasta=None, lote: int = LOTE, alias=None, archivo=False,
+                 progreso=None):
+        self.restaurante = restaurante
+        self.desde = desde
+        self.hasta = hasta
+        self.lote = lote
+        # Conexión de solo lectura si está configurada (ver basedatos.py)
+        self.alias = alias or alias_lectura()
+        self.archivo = archivo
+        # progreso(filas leídas) tras cada lote
+        self.progreso = progreso
+        self.leidas = 0
+
+    @abstractmethod
+    def queryset(self, modelo):
+        """Filas de ``modelo`` (el vivo o el del archivo, con los mismos campos) con los filtros."""
+
+    def querysets(self):
+        """Las filas vivas y, con ``archivo``, después las archivadas."""
+        modelos = [self.modelo]
+        if self.archivo and self.modelo_archivo:
+            modelos.append(self.modelo_archivo)
+        return [self.queryset(modelo).using(self.alias) for modelo in modelos]
+
+    def contar(self) -> int:
+        return sum(qs.count() for qs in self.querysets())
+
+    def lotes(self, qs):
+        for lote in _por_lotes(qs, self.campos, self.lote):
+            yield lote
+            self.leidas += len(lote)
+            if self.progreso:
+                self.progreso(self.leidas)
+
+    @property
+    def columnas(self):
+        return list(self.campos)
+
+    def filas(self):
+        for qs in self.querysets():
+            for lote in self.lotes(qs):
+                yield from lote
+
+    def filas_csv(self):
+        yield from self.filas()
+
+
+class ExportacionPedidos(Exportacion):
+    modelo = Pedido
+    modelo_archivo = PedidoArchivado
+    lineas = {Pedido: LineaPedido, PedidoArchivado: LineaPedidoArchivada}
+    campos = (
+        "id", "fecha", "restaurante_id", "restaurante__nombre", "cliente_id",
+        "cliente__nombre", "reserva_id", "total",
+    )
+    campos_linea = ("pedido_id", "plato_id", "plato__nombre", "cantidad", "precio_unitario", "descuento_porcentaje", "comentario")
+
+    def queryset(self, modelo):
+        qs = modelo.objects.all()
+        if self.restaurante:
+            qs = qs.filter(restaurante_id=self.restaurante)
+        if self.desde:
+            qs = qs.filter(fecha__gte=self.desde)
+        if self.hasta:
+            qs = qs.filter(fecha__lte=self.hasta)
+        return qs
+
+    def filas(self):
+        """Un pedido por fila con sus líneas en ``lineas`` (una consulta de líneas por lote)."""
+        for qs in self.querysets():
+            for lote in self.lotes(qs):
+                lineas = defaultdict(list)
+                consulta = (
+                    self.lineas[qs.model].objects.using(self.alias).filter(pedido_id__in=[p["id"] for p in lote])
+                    .order_by("pedido_id", "id")
+                    .values(*self.campos_linea)
+                )
+                for linea in consulta:
+                    lineas[linea.pop("pedido_id")].append(linea)
+                for pedido in lote:
+                    pedido["lineas"] = lineas.get(pedido["id"], [])
+                    yield pedido
+
+    @property
+    def columnas(self):
+        return list(self.campos) + [f"linea_{c}" for c in self.campos_linea[1:]]
+
+    def filas_csv(self):
+        """En CSV se repiten los datos del pedido en cada una de sus líneas."""
+        for pedido in self.filas():
+            lineas = pedido.pop("lineas") or [{}]
+            for linea in lineas:
+                fila = dict(pedido)
+                fila.update({f"linea_{k}": v for k, v in linea.items()})
+                yield fila
+
+
+class ExportacionReservas(Exportacion):
+    modelo = Reserva
+    modelo_archivo = ReservaArchivada
+    campos = (
+        "id", "fecha", "hora", "estado", "mesa_id", "mesa__numero", "mesa__restaurante_id",
+        "cliente_id", "cliente__nombre", "notas", "creado_por_id",
+    )
+
+    def queryset(self, modelo):
+        qs = modelo.objects.all()
+        if self.restaurante:
+            qs = qs.filter(mesa__restaurante_id=self.restaurante)
+        if self.desde:
+            qs = qs.filter(fecha__gte=self.desde)
+        if self.hasta:
+            qs = qs.filter(fecha__lte=self.hasta)
+        return qs
+
+
+class ExportacionClientes(Exportacion):
+    """Clientes; con restaurante, los que lo tienen como favorito. Fechas sobre el alta."""
+
+    modelo = Cliente
+    campos = ("id", "nombre", "email", "telefono", "fecha_registro", "creado_por_id")
+
+    def queryset(self, modelo):
+        qs = modelo.objects.all()
+        if self.restaurante:
+            qs = qs.filter(restaurantes_favoritos=self.restaurante)
+        if self.desde:
+            qs = qs.filter(fecha_registro__date__gte=self.desde)
+        if self.hasta:
+            qs = qs.filter(fecha_registro__date__lte=self.hasta)
+        return qs
+
+
+EXPORTACIONES = {
+    "pedidos": ExportacionPedidos,
+    "reservas": ExportacionReservas,
+    "clientes": ExportacionClientes,
+}
+
+
+class _Eco:
+    """Pseudo-fichero para csv.writer: devuelve lo escrito en vez de guardarlo."""
+
+    def write(self, valor):
+        return valor
+
+
+def generar_csv(exportacion):
+    escritor = csv.DictWriter(_Eco(), fieldnames=exportacion.columnas, extrasaction="ignore")
+    yield escritor.writeheader()
+    for fila in exportacion.filas_csv():
+        yield escritor.writerow(fila)
+
+
+def generar_jsonl(exportacion):
+    codificador = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    for fila in exportacion.filas():
+        yield codificador.encode(fila) + "\n"
+
+
+def generar(exportacion, formato: str):
+    return generar_csv(exportacion) if formato == "csv" else generar_jsonl(exportacion)
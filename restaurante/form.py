@@ -3,6 +3,8 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import Group
 from django.utils import timezone
 from .models import Restaurante, Direccion, Cliente, Plato, PerfilCliente, Mesa, Reserva, Usuario
+from .autocompletar import AutocompletarField, AutocompletarMultipleField
+from .disponibilidad import mesa_disponible
 from datetime import date
 from django.db.models import Q
 import re
@@ -33,12 +35,7 @@ class RegistroForm(UserCreationForm):
             user.save()
 
             # Asignar automáticamente un grupo según el rol (si existen)
-            rol_grupo_map = {
-                Usuario.ROL_ADMINISTRADOR: "Administradores",
-                Usuario.ROL_GERENTE: "Gerentes",
-                Usuario.ROL_EMPLEADO: "Empleados",
-            }
-            nombre_grupo = rol_grupo_map.get(user.rol)
+            nombre_grupo = Usuario.GRUPOS_POR_ROL.get(user.rol)
             if nombre_grupo:
                 grupo, _ = Group.objects.get_or_create(name=nombre_grupo)
                 user.groups.add(grupo)
@@ -52,8 +49,8 @@ class RegistroForm(UserCreationForm):
 class RestauranteForm(forms.Form):
     nombre = forms.CharField(label='Nombre', max_length=100, required=True)
     telefono = forms.CharField(label='Teléfono', max_length=20, required=True)
-    direccion = forms.ModelChoiceField(queryset=Direccion.objects.all(), required=True, empty_label=None)
-    clientes_frecuentes = forms.ModelMultipleChoiceField(queryset=Cliente.objects.all(), required=False)
+    direccion = AutocompletarField("direcciones", required=True, empty_label=None)
+    clientes_frecuentes = AutocompletarMultipleField("clientes", required=False)
 
     def clean(self):
         cleaned = super().clean()
@@ -75,8 +72,8 @@ class RestauranteForm(forms.Form):
 class RestauranteCreateForm(forms.Form):
     nombre = forms.CharField(label='Nombre', max_length=100, required=True)
     telefono = forms.CharField(label='Teléfono', max_length=20, required=True)
-    direccion = forms.ModelChoiceField(queryset=Direccion.objects.all(), required=True, empty_label=None)
-    clientes_frecuentes = forms.ModelMultipleChoiceField(queryset=Cliente.objects.all(), required=False)
+    direccion = AutocompletarField("direcciones", filtros=["libres"], required=True, empty_label=None)
+    clientes_frecuentes = AutocompletarMultipleField("clientes", required=False)
 
     def clean_direccion(self):
         direccion = self.cleaned_data.get('direccion')
@@ -111,19 +108,22 @@ class RestauranteCreateForm(forms.Form):
 
 # --- Formularios de Reserva ---
 class ReservaForm(forms.Form):
-    cliente = forms.ModelChoiceField(queryset=Cliente.objects.all(), required=True)
+    cliente = AutocompletarField("clientes", required=True)
     mesa = forms.ModelChoiceField(queryset=Mesa.objects.none(), required=True)
     fecha = forms.DateField(label='Fecha', widget=forms.SelectDateWidget())
     hora = forms.TimeField(label='Hora', widget=forms.TimeInput(format='%H:%M'))
     notas = forms.CharField(label='Notas', widget=forms.Textarea(), required=False)
 
     def __init__(self, *args, **kwargs):
+        # Reserva que se está editando, para no chocar consigo misma
+        self.reserva = kwargs.pop("reserva", None)
         super().__init__(*args, **kwargs)
         self.fields['mesa'].queryset = Mesa.objects.filter(activa=True)
 
     def clean(self):
         cleaned = super().clean()
         fecha = cleaned.get("fecha")
+        hora = cleaned.get("hora")
         mesa = cleaned.get("mesa")
 
         #Validación: fecha no puede ser pasada
@@ -134,12 +134,16 @@ class ReservaForm(forms.Form):
         if mesa and not mesa.activa:
             self.add_error("mesa", "No puede reservar una mesa que no está activa.")
 
+        #Validación: la mesa no puede estar ocupada a esa hora
+        if mesa and fecha and hora and not mesa_disponible(mesa, fecha, hora, excluir=self.reserva):
+            self.add_error("mesa", "La mesa ya está reservada en esa franja horaria.")
+
         return cleaned
 
 
 
 class ReservaCreateForm(forms.Form):
-    cliente = forms.ModelChoiceField(queryset=Cliente.objects.all(), required=True)
+    cliente = AutocompletarField("clientes", filtros=["propios"], required=True)
     mesa = forms.ModelChoiceField(queryset=Mesa.objects.none(), required=True)
     fecha = forms.DateField(label='Fecha', widget=forms.SelectDateWidget())
     hora = forms.TimeField(label='Hora', widget=forms.TimeInput(format='%H:%M'))
@@ -165,6 +169,7 @@ class ReservaCreateForm(forms.Form):
         hora = cleaned.get("hora")
         fecha = cleaned.get("fecha")
         cliente = cleaned.get("cliente")
+        mesa = cleaned.get("mesa")
 
         #Validaci
         if hora and (hora.hour < 12 or hora.hour > 23):
@@ -176,6 +181,10 @@ class ReservaCreateForm(forms.Form):
                 self.add_error("cliente", "Ya tienes una reserva en esa fecha y hora.")
                 self.add_error("hora", "Esta hora ya está reservada por este cliente.")
 
+        #Validacion: la mesa no puede estar ocupada a esa hora
+        if mesa and fecha and hora and not mesa_disponible(mesa, fecha, hora):
+            self.add_error("mesa", "La mesa ya está reservada en esa franja horaria.")
+
         return cleaned
 
 
@@ -185,15 +194,17 @@ class ReservaCreateForm(forms.Form):
 
 
 class PerfilClienteCreateForm(forms.Form):
-    cliente = forms.ModelChoiceField(queryset=Cliente.objects.none(), required=True)
+    cliente = AutocompletarField("clientes", filtros=["sin_perfil"], required=True)
     alergias = forms.CharField(label='Alergias', widget=forms.Textarea(), required=False)
     preferencias = forms.CharField(label='Preferencias', widget=forms.Textarea(), required=False)
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        used = PerfilCliente.objects.values_list('cliente_id', flat=True)
-        self.fields['cliente'].queryset = Cliente.objects.exclude(id__in=used)
-        
+    def clean_cliente(self):
+        # Solo se mira el cliente enviado, no la lista de todos los perfiles
+        cliente = self.cleaned_data.get('cliente')
+        if cliente and PerfilCliente.objects.filter(cliente=cliente).exists():
+            raise forms.ValidationError('Ese cliente ya tiene perfil.')
+        return cliente
+
 
     def clean(self):
         cleaned = super().clean()
@@ -352,4 +363,34 @@ class RestauranteBusquedaAvanzadaForm(forms.Form):
         required=False,
         label="Dirección (Calle, Ciudad o C.P.)",
         widget=forms.TextInput(attrs={'placeholder': 'Ej. Sevilla o 41001'})
-    )
\ No newline at end of file
+    )
+
+class ClientesFrecuentesFiltroForm(forms.Form):
+    """
+    Orden y filtros del listado de clientes frecuentes; todos salen de
+    EstadisticaCliente, con índice, así que no se agrupan los pedidos.
+    """
+    ORDENES = {
+        "nombre": ("cliente__nombre", "cliente_id"),
+        "gasto": ("-total_gastado", "cliente_id"),
+        "pedidos": ("-num_pedidos", "cliente_id"),
+        "recientes": ("-ultimo_pedido", "cliente_id"),
+        "inactivos": ("ultimo_pedido", "cliente_id"),
+    }
+
+    orden = forms.ChoiceField(
+        required=False,
+        choices=[
+            ("nombre", "Nombre"),
+            ("gasto", "Más gasto"),
+            ("pedidos", "Más pedidos"),
+            ("recientes", "Último pedido más reciente"),
+            ("inactivos", "Más tiempo sin pedir"),
+        ],
+    )
+    min_pedidos = forms.IntegerField(required=False, min_value=1, label="Pedidos mínimos")
+    min_gasto = forms.DecimalField(required=False, min_value=0, max_digits=12, decimal_places=2, label="Gasto mínimo")
+    sin_pedir_dias = forms.IntegerField(
+        required=False, min_value=1, label="Sin pedir desde hace (días)",
+        widget=forms.NumberInput(attrs={"placeholder": "Ej. 90"}),
+    )
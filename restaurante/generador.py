@@ -0,0 +1,297 @@
+"""Generación de datos sintéticos a escala de producción (lo usa ``generar_datos``).
+
+Las funciones de este módulo solo producen filas (diccionarios con los nombres
+de columna del ORM, ``restaurante_id`` incluido): no importan modelos ni tocan
+la base de datos, así que pueden ejecutarse en procesos aparte y el proceso
+principal se encarga de insertarlas.
+
+Todo es determinista: cada trozo usa su propia semilla derivada de la global,
+del tipo de fila y del número de trozo, de modo que el resultado no depende de
+cuántos procesos se usen ni del orden en que terminen. Los ids se asignan a
+partir de los máximos existentes (``Plan.base``), lo que permite que una fila
+apunte a otra generada en otro trozo sin consultar la base de datos.
+"""
+
+import datetime
+import hashlib
+import random
+from dataclasses import dataclass, field
+from decimal import Decimal
+from math import gcd
+
+from faker import Faker
+
+CATEGORIAS = ["entrante", "principal", "postre", "bebida"]
+ESTADOS_RESERVA = ["pendiente"] * 3 + ["confirmada"] * 5 + ["cancelada"]
+ROLES = ["ADMINISTRADOR", "GERENTE", "EMPLEADO", "CLIENTE"]
+# Separadas 90 minutos (la duración por defecto de una reserva), así no se solapan
+FRANJAS = [
+    datetime.time(12, 30), datetime.time(14, 0), datetime.time(15, 30),
+    datetime.time(20, 0), datetime.time(21, 30), datetime.time(23, 0),
+]
+ETIQUETAS = [
+    "vegano", "vegetariano", "sin gluten", "sin lactosa", "picante", "casero", "de temporada", "ecológico",
+    "del mar", "a la brasa", "frito", "al horno", "para compartir", "infantil", "tradicional", "de autor",
+    "km 0", "ligero", "con frutos secos", "con marisco",
+]
+PLATOS = [
+    "Salmorejo", "Gazpacho", "Croquetas de jamón", "Tortilla de patatas", "Paella valenciana", "Arroz negro",
+    "Pulpo a la gallega", "Calamares fritos", "Patatas bravas", "Ensaladilla rusa", "Rabo de toro",
+    "Secreto ibérico", "Bacalao al pil pil", "Fabada asturiana", "Cocido madrileño", "Pisto manchego",
+    "Flamenquín", "Boquerones en vinagre", "Gambas al ajillo", "Pimientos de padrón", "Tarta de queso",
+    "Flan casero", "Arroz con leche", "Torrijas", "Crema catalana", "Churros con chocolate", "Sangría",
+    "Tinto de verano", "Caña", "Agua mineral",
+]
+NOTAS = ["", "", "", "Cumpleaños", "Terraza si es posible", "Trona para bebé", "Alergia al marisco", "Mesa tranquila"]
+
+
+@dataclass
+class Plan:
+    semilla: int = 42
+    usuarios: int = 20
+    etiquetas: int = 20
+    restaurantes: int = 100
+    mesas_por_restaurante: int = 10
+    platos_por_restaurante: int = 25
+    clientes: int = 5000
+    reservas: int = 20000
+    pedidos: int = 20000
+    lineas_por_pedido: int = 4
+    desde: datetime.date = None
+    dias: int = 365
+    locale: str = "es_ES"
+    password: str = ""
+    # Último id existente por tabla: los nuevos empiezan en base + 1
+    base: dict = field(default_factory=dict)
+    nombres_etiqueta_usados: frozenset = frozenset()
+
+    def __post_init__(self):
+        if self.desde is None:
+            self.desde = datetime.date.today() - datetime.timedelta(days=self.dias - 30)
+
+    @property
+    def capacidad_reservas(self) -> int:
+        return self.restaurantes * self.mesas_por_restaurante * self.dias * len(FRANJAS)
+
+    def id(self, tabla, indice) -> int:
+        return self.base.get(tabla, 0) + indice + 1
+
+    # Reglas fijas (sin azar) para que un trozo sepa cómo es una fila de otro
+
+    def precio(self, plato_indice) -> Decimal:
+        return Decimal(250 + (plato_indice * 7919) % 2250) / 100
+
+    def estado_de_reserva(self, n) -> str:
+        return ESTADOS_RESERVA[(n * 40503 + self.semilla) % len(ESTADOS_RESERVA)]
+
+    def cliente_de_reserva(self, n) -> int:
+        return (n * 2654435761 + self.semilla) % self.clientes
+
+    def hueco_de_reserva(self, n):
+        """(mesa, día, franja) de la reserva ``n``: una permutación de los huecos, sin repetidos."""
+        capacidad = self.capacidad_reservas
+        paso = _coprimo(capacidad, 1_000_003 + self.semilla)
+        hueco = (n * paso + self.semilla) % capacidad
+        hueco, franja = divmod(hueco, len(FRANJAS))
+        mesa, dia = divmod(hueco, self.dias)
+        return mesa, dia, franja
+
+    def fecha_alta(self, fake):
+        """Fecha y hora en los tres años anteriores a ``desde`` (sin zona: USE_TZ está desactivado)."""
+        inicio = datetime.datetime.combine(self.desde - datetime.timedelta(days=3 * 365), datetime.time())
+        return fake.date_time_between_dates(inicio, datetime.datetime.combine(self.desde, datetime.time()))
+
+    def usuario(self, rnd):
+        """Id de un usuario generado (o ``None``), para ``creado_por``."""
+        if not self.usuarios or rnd.random() < 0.3:
+            return None
+        return self.id("usuario", rnd.randrange(self.usuarios))
+
+
+def _coprimo(n, candidato):
+    while gcd(n, candidato) != 1:
+        candidato += 1
+    return candidato
+
+
+def semilla(base, tipo, trozo) -> int:
+    digest = hashlib.sha256(f"{base}:{tipo}:{trozo}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def _azar(plan, tipo, trozo):
+    s = semilla(plan.semilla, tipo, trozo)
+    fake = Faker(plan.locale)
+    fake.seed_instance(s)
+    return random.Random(s), fake
+
+
+def trozos(total, lote):
+    return [(i, min(i + lote, total)) for i in range(0, total, lote)]
+
+
+# ----------------------------------------------------------------------------
+# Generadores por trozo: (plan, trozo, inicio, fin) -> {tabla: [filas]}
+# ----------------------------------------------------------------------------
+
+
+def generar_usuarios(plan, trozo, inicio, fin):
+    rnd, fake = _azar(plan, "usuario", trozo)
+    filas = []
+    for i in range(inicio, fin):
+        pk = plan.id("usuario", i)
+        nombre, apellido = fake.first_name(), fake.last_name()
+        rol = ROLES[i % len(ROLES)]
+        filas.append(dict(
+            id=pk, username=f"{fake.user_name()}{pk}", first_name=nombre, last_name=apellido,
+            email=f"usuario{pk}@example.com", password=plan.password, rol=rol,
+            is_staff=rol == "ADMINISTRADOR", date_joined=plan.fecha_alta(fake),
+        ))
+    return {"usuario": filas}
+
+
+def generar_etiquetas(plan, trozo, inicio, fin):
+    rnd, fake = _azar(plan, "etiqueta", trozo)
+    filas = []
+    for i in range(inicio, fin):
+        pk = plan.id("etiqueta", i)
+        nombre = ETIQUETAS[i] if i < len(ETIQUETAS) else f"{fake.word()} {pk}"
+        if nombre in plan.nombres_etiqueta_usados:
+            nombre = f"{nombre} {pk}"
+        filas.append(dict(
+            id=pk, nombre=nombre, slug=f"{fake.slug(nombre)}-{pk}", descripcion=fake.sentence(),
+            color=rnd.choice(["verde", "rojo", "azul", "amarillo", "gris"]),
+        ))
+    return {"etiqueta": filas}
+
+
+def generar_clientes(plan, trozo, inicio, fin):
+    """Clientes y, para unos dos tercios, su perfil."""
+    rnd, fake = _azar(plan, "cliente", trozo)
+    clientes, perfiles = [], []
+    for i in range(inicio, fin):
+        pk = plan.id("cliente", i)
+        clientes.append(dict(
+            id=pk, nombre=fake.name(), email=f"{fake.user_name()}.{pk}@example.com",
+            telefono=fake.phone_number()[:20], creado_por_id=plan.usuario(rnd),
+            fecha_registro=plan.fecha_alta(fake),
+        ))
+        if rnd.random() < 0.66:
+            perfiles.append(dict(
+                cliente_id=pk, alergias=rnd.choice(["", "", "", "Gluten", "Lactosa", "Frutos secos", "Marisco"]),
+                preferencias=rnd.choice(["", "", "Terraza", "Interior", "Sin ruido"]),
+                recibe_noticias=rnd.random() < 0.4,
+            ))
+    return {"cliente": clientes, "perfilcliente": perfiles}
+
+
+def generar_restaurantes(plan, trozo, inicio, fin):
+    """Restaurantes con su dirección, mesas, platos (con etiquetas) y clientes frecuentes."""
+    rnd, fake = _azar(plan, "restaurante", trozo)
+    tablas = {t: [] for t in ("direccion", "restaurante", "mesa", "plato", "plato_etiquetas", "clientes_frecuentes")}
+    for i in range(inicio, fin):
+        pk = plan.id("restaurante", i)
+        direccion = plan.id("direccion", i)
+        tablas["direccion"].append(dict(
+            id=direccion, calle=fake.street_name()[:120], numero=rnd.randint(1, 200), ciudad=fake.city()[:80],
+            codigo_postal=fake.postcode(), provincia=fake.state()[:80],
+        ))
+        tablas["restaurante"].append(dict(
+            id=pk, nombre=f"{rnd.choice(['Casa', 'Bar', 'Mesón', 'Taberna', 'Restaurante'])} {fake.last_name()}",
+            telefono=fake.phone_number()[:20], direccion_id=direccion,
+        ))
+        for k in range(plan.mesas_por_restaurante):
+            tablas["mesa"].append(dict(
+                id=plan.id("mesa", i * plan.mesas_por_restaurante + k), restaurante_id=pk, numero=k + 1,
+                activa=rnd.random() < 0.95,
+            ))
+        for k in range(plan.platos_por_restaurante):
+            indice = i * plan.platos_por_restaurante + k
+            plato = plan.id("plato", indice)
+            tablas["plato"].append(dict(
+                id=plato, restaurante_id=pk, nombre=rnd.choice(PLATOS), precio=plan.precio(indice),
+                categoria=rnd.choice(CATEGORIAS),
+            ))
+            if plan.etiquetas:
+                for e in rnd.sample(range(plan.etiquetas), min(plan.etiquetas, rnd.randint(0, 3))):
+                    tablas["plato_etiquetas"].append(dict(plato_id=plato, etiqueta_id=plan.id("etiqueta", e)))
+        if plan.clientes:
+            for c in rnd.sample(range(plan.clientes), min(plan.clientes, rnd.randint(0, 5))):
+                tablas["clientes_frecuentes"].append(dict(restaurante_id=pk, cliente_id=plan.id("cliente", c)))
+    return tablas
+
+
+def _reserva(plan, n):
+    """Cliente, mesa, fecha y hora de la reserva ``n`` (fijos, los comparten reservas y pedidos)."""
+    mesa, dia, franja = plan.hueco_de_reserva(n)
+    return dict(
+        cliente_id=plan.id("cliente", plan.cliente_de_reserva(n)),
+        mesa_id=plan.id("mesa", mesa),
+        restaurante_indice=mesa // plan.mesas_por_restaurante,
+        fecha=plan.desde + datetime.timedelta(days=dia),
+        hora=FRANJAS[franja],
+    )
+
+
+def generar_reservas(plan, trozo, inicio, fin):
+    rnd, fake = _azar(plan, "reserva", trozo)
+    filas = []
+    for n in range(inicio, fin):
+        datos = _reserva(plan, n)
+        del datos["restaurante_indice"]
+        filas.append(dict(
+            id=plan.id("reserva", n), estado=plan.estado_de_reserva(n), notas=rnd.choice(NOTAS),
+            creado_por_id=plan.usuario(rnd), **datos,
+        ))
+    return {"reserva": filas}
+
+
+def generar_pedidos(plan, trozo, inicio, fin):
+    """Pedidos con sus líneas; los pares salen de la reserva del mismo número si existe y no está cancelada."""
+    rnd, fake = _azar(plan, "pedido", trozo)
+    pedidos, lineas = [], []
+    for n in range(inicio, fin):
+        pk = plan.id("pedido", n)
+        if n < plan.reservas and n % 2 == 0 and plan.estado_de_reserva(n) != "cancelada":
+            reserva = _reserva(plan, n)
+            cliente, restaurante, fecha = reserva["cliente_id"], reserva["restaurante_indice"], reserva["fecha"]
+            reserva_id = plan.id("reserva", n)
+        else:
+            cliente = plan.id("cliente", rnd.randrange(plan.clientes))
+            restaurante = rnd.randrange(plan.restaurantes)
+            fecha = plan.desde + datetime.timedelta(days=rnd.randint(0, plan.dias - 1))
+            reserva_id = None
+
+        total = Decimal("0")
+        if plan.platos_por_restaurante:
+            for _ in range(rnd.randint(1, max(1, plan.lineas_por_pedido))):
+                indice = restaurante * plan.platos_por_restaurante + rnd.randrange(plan.platos_por_restaurante)
+                cantidad = rnd.choice([1, 1, 1, 2, 2, 3, 4])
+                descuento = rnd.choice([0] * 8 + [10, 20])
+                precio = plan.precio(indice)
+                total += (precio * cantidad * (100 - descuento) / 100).quantize(Decimal("0.01"))
+                lineas.append(dict(
+                    pedido_id=pk, plato_id=plan.id("plato", indice), cantidad=cantidad, precio_unitario=precio,
+                    descuento_porcentaje=descuento, comentario=rnd.choice(["", "", "", "Sin sal", "Poco hecho"]),
+                ))
+        pedidos.append(dict(
+            id=pk, cliente_id=cliente, restaurante_id=plan.id("restaurante", restaurante), reserva_id=reserva_id,
+            fecha=fecha, total=total, creado_por_id=plan.usuario(rnd),
+        ))
+    return {"pedido": pedidos, "lineapedido": lineas}
+
+
+GENERADORES = [
+    ("usuarios", generar_usuarios),
+    ("etiquetas", generar_etiquetas),
+    ("clientes", generar_clientes),
+    ("restaurantes", generar_restaurantes),
+    ("reservas", generar_reservas),
+    ("pedidos", generar_pedidos),
+]
+
+
+def generar_trozo(args):
+    """Punto de entrada de los procesos: ``(nombre_generador, plan, trozo, inicio, fin)``."""
+    nombre, plan, trozo, inicio, fin = args
+    return dict(GENERADORES)[nombre](plan, trozo, inicio, fin)
@@ -0,0 +1,40 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurante import archivo
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve a las tablas de archivo las reservas y pedidos (con sus líneas) de hace más de ARCHIVO_DIAS "
+        "días, por lotes, o con --restaurar los devuelve a las tablas vivas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dias", type=int, help="Archiva lo anterior a hoy menos estos días (por defecto ARCHIVO_DIAS).")
+        parser.add_argument("--lote", type=int, default=archivo.LOTE, help="Filas por transacción.")
+        parser.add_argument("--restaurar", action="store_true", help="Devuelve lo archivado entre --desde y --hasta.")
+        parser.add_argument("--desde", help="Con --restaurar: fecha inicial AAAA-MM-DD (incluida).")
+        parser.add_argument("--hasta", help="Con --restaurar: fecha final AAAA-MM-DD (incluida).")
+
+    def handle(self, *args, **opts):
+        if opts["lote"] < 1:
+            raise CommandError("--lote debe ser mayor que 0.")
+        progreso = (lambda nombre, n: self.stdout.write(f"  {n} {nombre}...")) if opts["verbosity"] > 1 else None
+
+        if opts["restaurar"]:
+            try:
+                desde = datetime.date.fromisoformat(opts["desde"]) if opts["desde"] else None
+                hasta = datetime.date.fromisoformat(opts["hasta"]) if opts["hasta"] else None
+            except ValueError as exc:
+                raise CommandError(f"Fecha no válida: {exc}")
+            movidos = archivo.restaurar(desde=desde, hasta=hasta, lote=opts["lote"], progreso=progreso)
+            accion = "Restaurados"
+        else:
+            if opts["dias"] is not None and opts["dias"] < 0:
+                raise CommandError("--dias no puede ser negativo.")
+            antes_de = archivo.horizonte(opts["dias"])
+            movidos = archivo.archivar(antes_de=antes_de, lote=opts["lote"], progreso=progreso)
+            accion = f"Archivados (anteriores a {antes_de})"
+        self.stdout.write(self.style.SUCCESS(f"{accion}: {movidos['pedidos']} pedidos y {movidos['reservas']} reservas."))
@@ -0,0 +1,105 @@
+import re
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from restaurante import benchmark
+from restaurante.models import Usuario
+
+SIN_CACHE = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el rendimiento con concurrencia de las vistas asíncronas servidas por WSGI (un hilo por "
+        "petición) y por ASGI (un bucle de eventos), con los manejadores de Django en el mismo proceso y "
+        "sobre una base de datos de prueba rellenada con generar_datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurantes", type=int, default=50)
+        parser.add_argument("--clientes", type=int, default=2000)
+        parser.add_argument("--reservas", type=int, default=5000)
+        parser.add_argument("--pedidos", type=int, default=5000)
+        parser.add_argument("--semilla", type=int, default=42)
+        parser.add_argument("--desde", default="2030-01-01", help="Primer día de reservas y pedidos generados.")
+        parser.add_argument("--peticiones", type=int, default=200, help="Peticiones por URL y modo.")
+        parser.add_argument("--concurrencia", type=int, default=16, help="Peticiones en vuelo a la vez.")
+        parser.add_argument("--solo", help="Expresión regular: mide solo las URLs cuyo nombre coincida.")
+        parser.add_argument(
+            "--sin-cache", action="store_true",
+            help="Desactiva la caché (páginas y fragmentos de menús) para medir las consultas de verdad.",
+        )
+        parser.add_argument(
+            "--bd-actual", action="store_true",
+            help="Usa la base de datos configurada tal cual (sin crear la de prueba ni generar datos).",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["peticiones"] < 1 or opts["concurrencia"] < 1:
+            raise CommandError("--peticiones y --concurrencia deben ser mayores que 0.")
+
+        setup_test_environment()
+        bases = None
+        try:
+            if not opts["bd_actual"]:
+                bases = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+                call_command(
+                    "generar_datos",
+                    restaurantes=opts["restaurantes"], clientes=opts["clientes"], reservas=opts["reservas"],
+                    pedidos=opts["pedidos"], semilla=opts["semilla"], desde=opts["desde"],
+                    stdout=self.stdout if opts["verbosity"] > 1 else StringIO(),
+                )
+            ajustes = {"PRESUPUESTO_CONSULTAS_ESTRICTO": False}
+            if opts["sin_cache"]:
+                ajustes["CACHES"] = SIN_CACHE
+            with override_settings(**ajustes):
+                resultados = self._medir(opts)
+        finally:
+            if bases is not None:
+                teardown_databases(bases, verbosity=0)
+            teardown_test_environment()
+        self._informe(resultados)
+
+    def _medir(self, opts):
+        usuario = Usuario.objects.filter(username="benchmark").first()
+        if usuario is None:
+            usuario = Usuario.objects.create_superuser("benchmark", "benchmark@example.com", None)
+        cliente = Client()
+        cliente.force_login(usuario)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}"
+
+        filtro = re.compile(opts["solo"]) if opts["solo"] else None
+        resultados = {}
+        for nombre, ruta in benchmark.casos(benchmark.datos_de_ejemplo()):
+            if nombre not in benchmark.VISTAS_ASINCRONAS or (filtro and not filtro.search(nombre)):
+                continue
+            # Calentamiento de los dos modos antes de medir (caché, conexiones, plantillas)
+            benchmark.carga_wsgi(ruta, opts["concurrencia"], opts["concurrencia"], cookie)
+            benchmark.carga_asgi(ruta, opts["concurrencia"], opts["concurrencia"], cookie)
+            resultados[nombre] = {
+                "wsgi": benchmark.carga_wsgi(ruta, opts["peticiones"], opts["concurrencia"], cookie),
+                "asgi": benchmark.carga_asgi(ruta, opts["peticiones"], opts["concurrencia"], cookie),
+            }
+            if opts["verbosity"] > 1:
+                self.stdout.write(f"  {nombre}: {resultados[nombre]}")
+        return resultados
+
+    def _informe(self, resultados):
+        cabecera = f"{'URL':<24} {'modo':<5} {'pet/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'errores':>8}"
+        self.stdout.write(cabecera)
+        self.stdout.write("-" * len(cabecera))
+        for nombre, modos in resultados.items():
+            for modo, m in modos.items():
+                linea = (
+                    f"{nombre:<24} {modo:<5} {m['por_segundo']:>8.1f} {m['p50_ms']:>9.2f} "
+                    f"{m['p95_ms']:>9.2f} {m['errores']:>8}"
+                )
+                self.stdout.write(self.style.WARNING(linea) if m["errores"] else linea)
+            wsgi, asgi = modos["wsgi"]["por_segundo"], modos["asgi"]["por_segundo"]
+            if wsgi:
+                self.stdout.write(f"{'':<24} ASGI/WSGI: {asgi / wsgi:.2f}x")
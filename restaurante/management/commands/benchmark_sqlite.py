@@ -0,0 +1,173 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Lo que hacía la configuración anterior: diario DELETE, synchronous FULL,
+# transacciones DEFERRED y el timeout de 5 s del módulo sqlite3
+CLASICO = {
+    "pragmas": {"journal_mode": "DELETE", "synchronous": "FULL"},
+    "transacciones": "DEFERRED",
+    "timeout": 5.0,
+}
+
+ESQUEMA = """
+CREATE TABLE mesa (id INTEGER PRIMARY KEY, restaurante_id INTEGER NOT NULL, numero INTEGER NOT NULL);
+CREATE TABLE reserva (
+    id INTEGER PRIMARY KEY, mesa_id INTEGER NOT NULL REFERENCES mesa (id), fecha TEXT NOT NULL,
+    hora TEXT NOT NULL, estado TEXT NOT NULL, notas TEXT NOT NULL
+);
+CREATE INDEX reserva_fecha ON reserva (fecha, mesa_id);
+"""
+
+# Lectura: el tablero de un restaurante para un día. Escritura: comprobar la
+# mesa y reservar, como reservar_mesa (lee y luego escribe en la transacción).
+LECTURA = """
+SELECT r.id, r.hora, r.estado, m.numero FROM reserva r JOIN mesa m ON m.id = r.mesa_id
+WHERE m.restaurante_id = ? AND r.fecha = ? ORDER BY r.hora
+"""
+COMPROBAR = "SELECT COUNT(*) FROM reserva WHERE mesa_id = ? AND fecha = ? AND hora = ?"
+RESERVAR = "INSERT INTO reserva (mesa_id, fecha, hora, estado, notas) VALUES (?, ?, ?, 'pendiente', '')"
+
+
+def perfil_actual():
+    opciones = settings.DATABASES["default"].get("OPTIONS", {})
+    return {
+        "pragmas": settings.SQLITE_PRAGMAS,
+        "transacciones": opciones.get("transaction_mode") or "DEFERRED",
+        "timeout": opciones.get("timeout", 5.0),
+    }
+
+
+def conectar(ruta, perfil):
+    conexion = sqlite3.connect(ruta, timeout=perfil["timeout"], isolation_level=None, check_same_thread=False)
+    for nombre, valor in perfil["pragmas"].items():
+        conexion.execute(f"PRAGMA {nombre} = {valor}")
+    return conexion
+
+
+def percentil(tiempos, p):
+    if not tiempos:
+        return 0.0
+    tiempos = sorted(tiempos)
+    return tiempos[min(len(tiempos) - 1, int(len(tiempos) * p))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara lecturas y escrituras concurrentes en SQLite con la configuración clásica (diario DELETE, "
+        "transacciones DEFERRED) y con el perfil de settings.SQLITE_PRAGMAS (WAL, BEGIN IMMEDIATE...), sobre "
+        "una base de datos temporal con mesas y reservas."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--segundos", type=float, default=5.0, help="Duración de cada medición.")
+        parser.add_argument("--lectores", type=int, default=8, help="Hilos que leen el tablero de un día.")
+        parser.add_argument("--escritores", type=int, default=4, help="Hilos que crean reservas.")
+        parser.add_argument("--restaurantes", type=int, default=50)
+        parser.add_argument("--reservas", type=int, default=50000, help="Reservas iniciales.")
+        parser.add_argument("--semilla", type=int, default=0)
+
+    def handle(self, *args, **opts):
+        if opts["segundos"] <= 0 or opts["lectores"] < 0 or opts["escritores"] < 0:
+            raise CommandError("--segundos debe ser mayor que 0 y los hilos no pueden ser negativos.")
+        if opts["lectores"] + opts["escritores"] == 0:
+            raise CommandError("Hace falta al menos un lector o un escritor.")
+
+        for nombre, perfil in (("clasico", CLASICO), ("actual", perfil_actual())):
+            with tempfile.TemporaryDirectory() as carpeta:
+                ruta = os.path.join(carpeta, "benchmark.sqlite3")
+                self._rellenar(ruta, perfil, opts)
+                resultado = self._medir(ruta, perfil, opts)
+            self._informe(nombre, perfil, resultado, opts["segundos"])
+
+    def _rellenar(self, ruta, perfil, opts):
+        rnd = random.Random(opts["semilla"])
+        conexion = conectar(ruta, perfil)
+        conexion.executescript(ESQUEMA)
+        mesas = [(r * 20 + n, r, n) for r in range(opts["restaurantes"]) for n in range(1, 21)]
+        conexion.execute("BEGIN")
+        conexion.executemany("INSERT INTO mesa (id, restaurante_id, numero) VALUES (?, ?, ?)", mesas)
+        conexion.executemany(
+            RESERVAR,
+            (
+                (rnd.choice(mesas)[0], f"2030-01-{rnd.randint(1, 28):02d}", f"{rnd.randint(12, 23)}:00")
+                for _ in range(opts["reservas"])
+            ),
+        )
+        conexion.execute("COMMIT")
+        conexion.close()
+
+    def _medir(self, ruta, perfil, opts):
+        fin = time.perf_counter() + opts["segundos"]
+        resultado = {"lecturas": [], "escrituras": [], "bloqueos": 0}
+        cerrojo = threading.Lock()
+        inicio = threading.Barrier(opts["lectores"] + opts["escritores"])
+
+        def lector(semilla):
+            rnd = random.Random(semilla)
+            conexion, tiempos = conectar(ruta, perfil), []
+            inicio.wait()
+            while time.perf_counter() < fin:
+                t = time.perf_counter()
+                try:
+                    conexion.execute(LECTURA, (rnd.randrange(opts["restaurantes"]), f"2030-01-{rnd.randint(1, 28):02d}")).fetchall()
+                except sqlite3.OperationalError:
+                    with cerrojo:
+                        resultado["bloqueos"] += 1
+                    continue
+                tiempos.append(time.perf_counter() - t)
+            conexion.close()
+            with cerrojo:
+                resultado["lecturas"].extend(tiempos)
+
+        def escritor(semilla):
+            rnd = random.Random(semilla)
+            conexion, tiempos = conectar(ruta, perfil), []
+            inicio.wait()
+            while time.perf_counter() < fin:
+                mesa = rnd.randrange(opts["restaurantes"] * 20)
+                fecha, hora = f"2030-02-{rnd.randint(1, 28):02d}", f"{rnd.randint(12, 23)}:00"
+                t = time.perf_counter()
+                try:
+                    conexion.execute(f"BEGIN {perfil['transacciones']}")
+                    if not conexion.execute(COMPROBAR, (mesa, fecha, hora)).fetchone()[0]:
+                        conexion.execute(RESERVAR, (mesa, fecha, hora))
+                    conexion.execute("COMMIT")
+                except sqlite3.OperationalError:
+                    # "database is locked": con DEFERRED, al pasar de leer a escribir
+                    if conexion.in_transaction:
+                        conexion.execute("ROLLBACK")
+                    with cerrojo:
+                        resultado["bloqueos"] += 1
+                    continue
+                tiempos.append(time.perf_counter() - t)
+            conexion.close()
+            with cerrojo:
+                resultado["escrituras"].extend(tiempos)
+
+        hilos = [threading.Thread(target=lector, args=(n,)) for n in range(opts["lectores"])]
+        hilos += [threading.Thread(target=escritor, args=(1000 + n,)) for n in range(opts["escritores"])]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        return resultado
+
+    def _informe(self, nombre, perfil, resultado, segundos):
+        pragmas = ", ".join(f"{k}={v}" for k, v in perfil["pragmas"].items())
+        self.stdout.write(f"{nombre}: {pragmas}, BEGIN {perfil['transacciones']}")
+        for tipo in ("lecturas", "escrituras"):
+            tiempos = resultado[tipo]
+            media = statistics.mean(tiempos) * 1000 if tiempos else 0.0
+            self.stdout.write(
+                f"  {tipo:<10} {len(tiempos) / segundos:>9.0f}/s  media {media:7.2f} ms  "
+                f"p95 {percentil(tiempos, 0.95) * 1000:7.2f} ms"
+            )
+        self.stdout.write(f"  bloqueos   {resultado['bloqueos']} (database is locked)")
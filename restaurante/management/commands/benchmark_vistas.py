@@ -0,0 +1,138 @@
+import os
+import re
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from restaurante import benchmark, tareas
+from restaurante.models import Tarea, Usuario
+
+LINEA_BASE = os.path.join(settings.BASE_DIR, "benchmarks", "vistas.json")
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide todas las URLs de restaurante/urls.py con el cliente de pruebas sobre una base de datos "
+        "de prueba rellenada con generar_datos: latencia p50/p95, consultas SQL y tamaño de la respuesta. "
+        "Compara con una línea base guardada en JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurantes", type=int, default=50)
+        parser.add_argument("--clientes", type=int, default=2000)
+        parser.add_argument("--reservas", type=int, default=5000)
+        parser.add_argument("--pedidos", type=int, default=5000)
+        parser.add_argument("--semilla", type=int, default=42)
+        parser.add_argument("--desde", default="2030-01-01", help="Primer día de reservas y pedidos generados.")
+        parser.add_argument("--repeticiones", type=int, default=10)
+        parser.add_argument("--calentamiento", type=int, default=1)
+        parser.add_argument("--solo", help="Expresión regular: mide solo las URLs cuyo nombre coincida.")
+        parser.add_argument("--linea-base", default=LINEA_BASE, help="JSON con la línea base a comparar.")
+        parser.add_argument(
+            "--guardar-linea-base", action="store_true", help="Guarda los resultados como nueva línea base."
+        )
+        parser.add_argument("--salida", help="Guarda también los resultados en este JSON.")
+        parser.add_argument("--umbral", type=float, default=0.25, help="Empeoramiento relativo de p50 tolerado.")
+        parser.add_argument(
+            "--bd-actual", action="store_true",
+            help="Usa la base de datos configurada tal cual (sin crear la de prueba ni generar datos).",
+        )
+        parser.add_argument("--estricto", action="store_true", help="Termina con error si alguna URL empeora.")
+
+    def handle(self, *args, **opts):
+        if opts["repeticiones"] < 1:
+            raise CommandError("--repeticiones debe ser mayor que 0.")
+        parametros = {
+            k: opts[k] for k in ("restaurantes", "clientes", "reservas", "pedidos", "semilla", "desde", "repeticiones")
+        }
+        if opts["bd_actual"]:
+            parametros = {"bd_actual": True, "repeticiones": opts["repeticiones"]}
+
+        setup_test_environment()
+        bases = None
+        try:
+            if not opts["bd_actual"]:
+                bases = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+                call_command(
+                    "generar_datos",
+                    restaurantes=opts["restaurantes"], clientes=opts["clientes"], reservas=opts["reservas"],
+                    pedidos=opts["pedidos"], semilla=opts["semilla"], desde=opts["desde"],
+                    stdout=self.stdout if opts["verbosity"] > 1 else StringIO(),
+                )
+            with override_settings(PRESUPUESTO_CONSULTAS_ESTRICTO=False):
+                resultados = self._medir(opts)
+        finally:
+            if bases is not None:
+                teardown_databases(bases, verbosity=0)
+            teardown_test_environment()
+
+        base = benchmark.cargar_linea_base(opts["linea_base"])
+        comparacion = benchmark.comparar(resultados, base["vistas"], opts["umbral"]) if base else {}
+        self._informe(resultados, comparacion)
+        if base and base.get("parametros") != parametros:
+            self.stdout.write(self.style.WARNING("La línea base se midió con otros parámetros: compare con cuidado."))
+
+        if opts["salida"]:
+            benchmark.guardar_resultados(opts["salida"], resultados, parametros)
+        if opts["guardar_linea_base"]:
+            benchmark.guardar_resultados(opts["linea_base"], resultados, parametros)
+            self.stdout.write(self.style.SUCCESS(f"Línea base guardada en {opts['linea_base']}."))
+
+        peores = sorted(nombre for nombre, fila in comparacion.items() if fila["empeora"])
+        if peores:
+            mensaje = f"Empeoran {len(peores)} URLs respecto a la línea base: {', '.join(peores)}"
+            if opts["estricto"]:
+                raise CommandError(mensaje)
+            self.stdout.write(self.style.WARNING(mensaje))
+
+    def _medir(self, opts):
+        usuario = Usuario.objects.filter(username="benchmark").first()
+        if usuario is None:
+            usuario = Usuario.objects.create_superuser("benchmark", "benchmark@example.com", None)
+        cliente = Client()
+        cliente.force_login(usuario)
+        if not Tarea.objects.exists():
+            # Las páginas de tareas necesitan una (no hace falta ejecutarla)
+            tareas.encolar("reconciliar_contadores", creado_por=usuario)
+
+        datos = benchmark.datos_de_ejemplo()
+        sin_caso = benchmark.urls_sin_caso(datos)
+        if sin_caso:
+            self.stdout.write(self.style.WARNING(f"URLs sin caso de benchmark: {', '.join(sorted(sin_caso))}"))
+
+        filtro = re.compile(opts["solo"]) if opts["solo"] else None
+        cuerpos = benchmark.cuerpos(datos)
+        resultados = {}
+        for nombre, ruta in benchmark.casos(datos):
+            if filtro and not filtro.search(nombre):
+                continue
+            resultados[nombre] = benchmark.medir(
+                cliente, ruta, opts["repeticiones"], opts["calentamiento"], cuerpo=cuerpos.get(nombre),
+            )
+            if opts["verbosity"] > 1:
+                self.stdout.write(f"  {nombre}: {resultados[nombre]}")
+        return resultados
+
+    def _informe(self, resultados, comparacion):
+        cabecera = f"{'URL':<32} {'estado':>6} {'p50 ms':>9} {'p95 ms':>9} {'SQL':>5} {'bytes':>9}"
+        if comparacion:
+            cabecera += f" {'Δp50':>8} {'ΔSQL':>5}"
+        self.stdout.write(cabecera)
+        self.stdout.write("-" * len(cabecera))
+        for nombre, m in resultados.items():
+            linea = (
+                f"{nombre:<32} {m['estado']:>6} {m['p50_ms']:>9.2f} {m['p95_ms']:>9.2f} "
+                f"{m['consultas']:>5} {m['bytes']:>9}"
+            )
+            fila = comparacion.get(nombre)
+            if fila and not fila["nueva"]:
+                linea += f" {fila['delta_p50']:>+8.0%} {fila['delta_consultas']:>+5}"
+                if fila["empeora"]:
+                    linea = self.style.WARNING(linea)
+            elif fila:
+                linea += f" {'nueva':>8}"
+            self.stdout.write(linea)
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurante import copias
+
+
+class Command(BaseCommand):
+    help = (
+        "Copia los datos de la aplicación a un directorio de ficheros JSONL por modelo y por trozos. "
+        "Si el directorio tiene una copia a medias, la continúa. Con --desde-fixture convierte un "
+        "fixture de dumpdata (p. ej. backups/backup.json) a este formato."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directorio", help="Directorio de la copia.")
+        parser.add_argument("--lote", type=int, default=copias.LOTE, help="Filas por fichero.")
+        parser.add_argument("--comprimir", action="store_true", help="Comprime cada fichero con gzip.")
+        parser.add_argument("--desde-fixture", dest="fixture", help="Fixture JSON de dumpdata a convertir.")
+
+    def handle(self, *args, **opts):
+        if opts["fixture"]:
+            try:
+                manifiesto, ignorados = copias.importar_fixture(
+                    opts["fixture"], opts["directorio"], lote=opts["lote"], comprimir=opts["comprimir"]
+                )
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"No se pudo convertir {opts['fixture']}: {exc}")
+            for modelo, n in sorted(ignorados.items()):
+                self.stdout.write(f"  Ignorado {modelo}: {n} registros")
+        else:
+            try:
+                manifiesto = copias.crear_copia(
+                    opts["directorio"],
+                    lote=opts["lote"],
+                    comprimir=opts["comprimir"],
+                    progreso=(
+                        (lambda modelo, n: self.stdout.write(f"  {modelo}: {n}..."))
+                        if opts["verbosity"] > 1 else None
+                    ),
+                )
+            except ValueError as exc:
+                raise CommandError(str(exc))
+
+        for modelo, datos in manifiesto["modelos"].items():
+            self.stdout.write(f"  {modelo}: {datos['filas']} filas en {len(datos['ficheros'])} ficheros")
+        self.stdout.write(self.style.SUCCESS(f"Copia completa en {opts['directorio']}."))
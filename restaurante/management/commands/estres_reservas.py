@@ -0,0 +1,86 @@
+import datetime
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from restaurante.disponibilidad import IndiceOcupacion
+from restaurante.models import Cliente, Direccion, Mesa, Reserva, Restaurante
+from restaurante.reservas import MesaNoDisponible, reservar_mesa
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de estrés: lanza muchas reservas concurrentes sobre pocas mesas "
+        "y comprueba que ninguna mesa queda reservada dos veces."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hilos", type=int, default=16)
+        parser.add_argument("--reservas", type=int, default=400, help="Intentos de reserva en total.")
+        parser.add_argument("--mesas", type=int, default=10)
+        parser.add_argument("--franjas", type=int, default=12, help="Horas distintas entre las 12:00 y las 23:00.")
+        parser.add_argument("--semilla", type=int, default=0)
+        parser.add_argument("--conservar", action="store_true", help="No borrar los datos creados al terminar.")
+
+    def handle(self, *args, **opts):
+        if opts["hilos"] < 1 or opts["reservas"] < 1 or opts["mesas"] < 1 or opts["franjas"] < 1:
+            raise CommandError("Todos los tamaños deben ser mayores que 0.")
+
+        rnd = random.Random(opts["semilla"])
+        direccion = Direccion.objects.create(
+            calle="Calle Estrés", numero=1, ciudad="Sevilla", codigo_postal="41001", provincia="Sevilla"
+        )
+        restaurante = Restaurante.objects.create(nombre="Estrés reservas", telefono="600000000", direccion=direccion)
+        Mesa.objects.bulk_create(
+            Mesa(restaurante=restaurante, numero=n) for n in range(1, opts["mesas"] + 1)
+        )
+        mesas = list(Mesa.objects.filter(restaurante=restaurante))
+        clientes = [
+            Cliente.objects.create(nombre=f"Cliente estrés {n}", email=f"estres{restaurante.pk}.{n}@example.com")
+            for n in range(opts["hilos"])
+        ]
+        fecha = datetime.date.today() + datetime.timedelta(days=30)
+        paso = max(1, (11 * 60) // opts["franjas"])
+        horas = [datetime.time(12 + (i * paso) // 60, (i * paso) % 60) for i in range(opts["franjas"])]
+        intentos = [(rnd.choice(clientes), rnd.choice(mesas), rnd.choice(horas)) for _ in range(opts["reservas"])]
+
+        def reservar(args):
+            cliente, mesa, hora = args
+            try:
+                reservar_mesa(cliente, mesa, fecha, hora, notas="estrés")
+                return "ok"
+            except MesaNoDisponible:
+                return "conflicto"
+            except Exception as exc:  # se informa al final, no se detiene la prueba
+                return f"error: {exc}"
+            finally:
+                connections.close_all()
+
+        try:
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=opts["hilos"]) as pool:
+                resultados = list(pool.map(reservar, intentos))
+            duracion = time.perf_counter() - inicio
+
+            ok = resultados.count("ok")
+            conflictos = resultados.count("conflicto")
+            errores = [r for r in resultados if r.startswith("error")]
+            guardadas = Reserva.objects.filter(mesa__restaurante=restaurante).count()
+            solapes = IndiceOcupacion.para_dia(fecha, restaurante=restaurante).solapes()
+
+            self.stdout.write(f"Intentos: {len(resultados)} en {duracion:.2f}s ({len(resultados) / duracion:.1f} reservas/s)")
+            self.stdout.write(f"Confirmadas: {ok} | Conflictos: {conflictos} ({conflictos / len(resultados):.1%}) | Errores: {len(errores)}")
+            for error in sorted(set(errores)):
+                self.stdout.write(f"  {error}")
+            self.stdout.write(f"Reservas guardadas: {guardadas} | Solapes detectados: {solapes}")
+
+            if solapes or guardadas != ok:
+                raise CommandError("Se han guardado reservas solapadas: el servicio no es seguro.")
+            self.stdout.write(self.style.SUCCESS("Sin reservas duplicadas."))
+        finally:
+            if not opts["conservar"]:
+                Cliente.objects.filter(pk__in=[c.pk for c in clientes]).delete()
+                direccion.delete()
@@ -0,0 +1,41 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurante.exportacion import EXPORTACIONES, FORMATOS, LOTE, generar
+
+
+class Command(BaseCommand):
+    help = "Exporta pedidos (con sus líneas), reservas o clientes a CSV o JSONL en streaming."
+
+    def add_arguments(self, parser):
+        parser.add_argument("modelo", choices=sorted(EXPORTACIONES))
+        parser.add_argument("--formato", choices=FORMATOS, default="csv")
+        parser.add_argument("--restaurante", type=int, help="Id del restaurante.")
+        parser.add_argument("--desde", help="Fecha inicial AAAA-MM-DD (incluida).")
+        parser.add_argument("--hasta", help="Fecha final AAAA-MM-DD (incluida).")
+        parser.add_argument("--lote", type=int, default=LOTE, help="Filas leídas por consulta.")
+        parser.add_argument(
+            "--archivo", action="store_true", help="Incluye las reservas y pedidos archivados (informes históricos).",
+        )
+        parser.add_argument("--salida", help="Fichero de salida (por defecto, la salida estándar).")
+
+    def handle(self, *args, **opts):
+        try:
+            desde = datetime.date.fromisoformat(opts["desde"]) if opts["desde"] else None
+            hasta = datetime.date.fromisoformat(opts["hasta"]) if opts["hasta"] else None
+        except ValueError as exc:
+            raise CommandError(f"Fecha no válida: {exc}")
+
+        exportacion = EXPORTACIONES[opts["modelo"]](
+            restaurante=opts["restaurante"], desde=desde, hasta=hasta, lote=opts["lote"], archivo=opts["archivo"],
+        )
+        trozos = generar(exportacion, opts["formato"])
+        if not opts["salida"]:
+            for trozo in trozos:
+                self.stdout.write(trozo, ending="")
+            return
+        with open(opts["salida"], "w", encoding="utf-8", newline="") as salida:
+            for trozo in trozos:
+                salida.write(trozo)
+        self.stderr.write(self.style.SUCCESS(f"Exportado a {opts['salida']}."))
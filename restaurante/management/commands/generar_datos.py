@@ -0,0 +1,159 @@
+import datetime
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from restaurante import busqueda, contadores, estadisticas, generador, ventas
+from restaurante.copias import fechas_tal_cual
+from restaurante.models import (
+    Cliente, Direccion, Etiqueta, LineaPedido, Mesa, Pedido, PerfilCliente, Plato, Reserva, Restaurante, Usuario,
+)
+
+# Tabla del generador -> modelo, en el orden en que se insertan dentro de un trozo
+TABLAS = {
+    "usuario": Usuario,
+    "etiqueta": Etiqueta,
+    "cliente": Cliente,
+    "perfilcliente": PerfilCliente,
+    "direccion": Direccion,
+    "restaurante": Restaurante,
+    "mesa": Mesa,
+    "plato": Plato,
+    "plato_etiquetas": Plato.etiquetas.through,
+    "clientes_frecuentes": Restaurante.clientes_frecuentes.through,
+    "reserva": Reserva,
+    "pedido": Pedido,
+    "lineapedido": LineaPedido,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sintéticos realistas (Faker) para todos los modelos, por lotes y de forma "
+        "determinista a partir de una semilla. Escala de producción, por ejemplo: "
+        "--restaurantes 5000 --clientes 2000000 --reservas 3000000 --pedidos 3000000 --procesos 4"
+    )
+
+    def add_arguments(self, parser):
+        plan = generador.Plan()
+        parser.add_argument("--semilla", type=int, default=plan.semilla)
+        parser.add_argument("--usuarios", type=int, default=plan.usuarios)
+        parser.add_argument("--etiquetas", type=int, default=plan.etiquetas)
+        parser.add_argument("--restaurantes", type=int, default=plan.restaurantes)
+        parser.add_argument("--mesas", type=int, default=plan.mesas_por_restaurante, help="Mesas por restaurante.")
+        parser.add_argument("--platos", type=int, default=plan.platos_por_restaurante, help="Platos por restaurante.")
+        parser.add_argument("--clientes", type=int, default=plan.clientes)
+        parser.add_argument("--reservas", type=int, default=plan.reservas)
+        parser.add_argument("--pedidos", type=int, default=plan.pedidos)
+        parser.add_argument("--lineas", type=int, default=plan.lineas_por_pedido, help="Máximo de líneas por pedido.")
+        parser.add_argument("--dias", type=int, default=plan.dias, help="Días que abarcan reservas y pedidos.")
+        parser.add_argument(
+            "--desde", help="Primer día AAAA-MM-DD (por defecto, hace --dias días menos 30: hay reservas futuras)."
+        )
+        parser.add_argument("--lote", type=int, default=5000, help="Filas principales por trozo e inserción.")
+        parser.add_argument("--procesos", type=int, default=1, help="Procesos que generan filas en paralelo.")
+        parser.add_argument("--password", default="restaurante", help="Contraseña de los usuarios generados.")
+        parser.add_argument(
+            "--sin-derivados", action="store_true",
+            help="No recalcular el índice de búsqueda, los resúmenes de ventas, los contadores ni las estadísticas al terminar.",
+        )
+
+    def handle(self, *args, **opts):
+        try:
+            desde = datetime.date.fromisoformat(opts["desde"]) if opts["desde"] else None
+        except ValueError as exc:
+            raise CommandError(f"Fecha no válida: {exc}")
+        cantidades = ("usuarios", "etiquetas", "restaurantes", "mesas", "platos", "clientes", "reservas", "pedidos")
+        if any(opts[c] < 0 for c in cantidades) or opts["lote"] < 1 or opts["procesos"] < 1 or opts["dias"] < 1:
+            raise CommandError("Las cantidades no pueden ser negativas y lote, procesos y días deben ser mayores que 0.")
+        if (opts["reservas"] or opts["pedidos"]) and not (opts["clientes"] and opts["restaurantes"]):
+            raise CommandError("Para generar reservas o pedidos hacen falta clientes y restaurantes.")
+
+        plan = generador.Plan(
+            semilla=opts["semilla"], usuarios=opts["usuarios"], etiquetas=opts["etiquetas"],
+            restaurantes=opts["restaurantes"], mesas_por_restaurante=opts["mesas"],
+            platos_por_restaurante=opts["platos"], clientes=opts["clientes"], reservas=opts["reservas"],
+            pedidos=opts["pedidos"], lineas_por_pedido=opts["lineas"], desde=desde, dias=opts["dias"],
+            password=make_password(opts["password"]),
+            base={t: m.objects.aggregate(m=Max("pk"))["m"] or 0 for t, m in TABLAS.items() if not m._meta.auto_created},
+            nombres_etiqueta_usados=frozenset(Etiqueta.objects.values_list("nombre", flat=True)),
+        )
+        if plan.reservas > plan.capacidad_reservas:
+            raise CommandError(
+                f"Caben como mucho {plan.capacidad_reservas} reservas sin solapes; aumente --dias, --mesas o --restaurantes."
+            )
+
+        cantidades = {
+            "usuarios": plan.usuarios, "etiquetas": plan.etiquetas, "clientes": plan.clientes,
+            "restaurantes": plan.restaurantes, "reservas": plan.reservas, "pedidos": plan.pedidos,
+        }
+        # Un trozo de restaurantes arrastra sus mesas y platos: se reduce para que ocupe como un lote
+        por_restaurante = 1 + plan.mesas_por_restaurante + plan.platos_por_restaurante
+        pool = ProcessPoolExecutor(max_workers=opts["procesos"]) if opts["procesos"] > 1 else None
+        try:
+            for nombre, _ in generador.GENERADORES:
+                lote = max(1, opts["lote"] // por_restaurante) if nombre == "restaurantes" else opts["lote"]
+                tareas = [
+                    (nombre, plan, trozo, inicio, fin)
+                    for trozo, (inicio, fin) in enumerate(generador.trozos(cantidades[nombre], lote))
+                ]
+                if tareas:
+                    self._generar(nombre, tareas, pool, opts)
+        finally:
+            if pool:
+                pool.shutdown()
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), list(TABLAS.values())):
+                cursor.execute(sql)
+
+        if not opts["sin_derivados"]:
+            inicio = time.perf_counter()
+            if busqueda.fts_disponible():
+                for modelo in busqueda.INDICES:
+                    busqueda.reconstruir(modelo, lote=opts["lote"])
+            ventas.reconstruir(lote=opts["lote"])
+            contadores.reconciliar()
+            estadisticas.reconstruir(lote=opts["lote"])
+            self.stdout.write(f"Datos derivados recalculados en {time.perf_counter() - inicio:.1f}s")
+        self.stdout.write(self.style.SUCCESS("Datos generados."))
+
+    def _generar(self, nombre, tareas, pool, opts):
+        inicio, filas = time.perf_counter(), {}
+        for trozo in self._resultados(tareas, pool, 2 * opts["procesos"]):
+            with transaction.atomic():
+                for tabla, modelo in TABLAS.items():
+                    if trozo.get(tabla):
+                        objetos = [modelo(**f) for f in trozo[tabla]]
+                        with fechas_tal_cual(modelo, objetos):
+                            modelo.objects.bulk_create(objetos, batch_size=1000)
+                        filas[tabla] = filas.get(tabla, 0) + len(trozo[tabla])
+            if opts["verbosity"] > 1:
+                self.stdout.write(f"  {nombre}: {filas}")
+        duracion = time.perf_counter() - inicio
+        total = sum(filas.values())
+        detalle = ", ".join(f"{tabla} {n}" for tabla, n in filas.items())
+        self.stdout.write(f"{nombre}: {total} filas en {duracion:.1f}s ({total / max(duracion, 1e-9):.0f} filas/s) [{detalle}]")
+
+    def _resultados(self, tareas, pool, maximo):
+        """Resultados en orden de trozo, con pocos trozos en vuelo para no acumular memoria."""
+        if pool is None:
+            yield from map(generador.generar_trozo, tareas)
+            return
+        en_vuelo, pendientes = deque(), iter(tareas)
+        for tarea in pendientes:
+            en_vuelo.append(pool.submit(generador.generar_trozo, tarea))
+            if len(en_vuelo) >= maximo:
+                break
+        while en_vuelo:
+            resultado = en_vuelo.popleft().result()
+            siguiente = next(pendientes, None)
+            if siguiente is not None:
+                en_vuelo.append(pool.submit(generador.generar_trozo, siguiente))
+            yield resultado
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from restaurante import busqueda
+
+
+class Command(BaseCommand):
+    help = "Reconstruye los índices de búsqueda FTS5 (platos, clientes, direcciones y restaurantes) por lotes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=1000, help="Filas por lote.")
+        parser.add_argument(
+            "--modelo",
+            choices=[m._meta.model_name for m in busqueda.INDICES],
+            action="append",
+            help="Limitar a un modelo (se puede repetir).",
+        )
+
+    def handle(self, *args, **opts):
+        if not busqueda.fts_disponible():
+            raise CommandError("La búsqueda FTS5 solo está disponible con SQLite.")
+
+        for modelo in busqueda.INDICES:
+            nombre = modelo._meta.model_name
+            if opts["modelo"] and nombre not in opts["modelo"]:
+                continue
+            with transaction.atomic():
+                total = busqueda.reconstruir(
+                    modelo,
+                    lote=opts["lote"],
+                    progreso=(lambda n: self.stdout.write(f"  {nombre}: {n}...")) if opts["verbosity"] > 1 else None,
+                )
+            self.stdout.write(self.style.SUCCESS(f"{nombre}: {total} filas indexadas."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from restaurante import contadores, tareas
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula los contadores de cada restaurante (platos, mesas activas, clientes frecuentes y "
+        "reservas abiertas) por lotes y corrige los que se hayan desviado, por ejemplo tras una carga masiva."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=1000, help="Restaurantes por lote.")
+        parser.add_argument(
+            "--en-cola", action="store_true", help="Encola una tarea para trabajar_tareas en vez de hacerlo aquí.",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["en_cola"]:
+            tarea = tareas.encolar("reconciliar_contadores", lote=opts["lote"])
+            self.stdout.write(self.style.SUCCESS(f"Encolada la tarea {tarea.pk}."))
+            return
+
+        corregidos = contadores.reconciliar(
+            lote=opts["lote"],
+            progreso=(lambda n: self.stdout.write(f"  {n} restaurantes...")) if opts["verbosity"] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Contadores corregidos en {corregidos} restaurantes."))
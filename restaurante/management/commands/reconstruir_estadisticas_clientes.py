@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from restaurante import estadisticas, tareas
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula EstadisticaCliente (pedidos, gasto, último pedido y restaurante habitual) por lotes "
+        "de clientes, por ejemplo después de una importación masiva de pedidos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=2000, help="Clientes por lote.")
+        parser.add_argument(
+            "--en-cola", action="store_true", help="Encola una tarea para trabajar_tareas en vez de hacerlo aquí.",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["en_cola"]:
+            tarea = tareas.encolar("reconstruir_estadisticas", lote=opts["lote"])
+            self.stdout.write(self.style.SUCCESS(f"Encolada la tarea {tarea.pk}."))
+            return
+
+        total = estadisticas.reconstruir(
+            lote=opts["lote"],
+            progreso=(lambda n: self.stdout.write(f"  {n} clientes...")) if opts["verbosity"] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Estadísticas recalculadas para {total} clientes."))
@@ -0,0 +1,40 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurante import tareas, ventas
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula ResumenVentasDiario por lotes de pedidos (todo o un rango de fechas), "
+        "por ejemplo después de una importación masiva."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Fecha inicial AAAA-MM-DD (incluida).")
+        parser.add_argument("--hasta", help="Fecha final AAAA-MM-DD (incluida).")
+        parser.add_argument("--lote", type=int, default=5000, help="Pedidos por lote.")
+        parser.add_argument(
+            "--en-cola", action="store_true", help="Encola una tarea para trabajar_tareas en vez de hacerlo aquí.",
+        )
+
+    def handle(self, *args, **opts):
+        try:
+            desde = datetime.date.fromisoformat(opts["desde"]) if opts["desde"] else None
+            hasta = datetime.date.fromisoformat(opts["hasta"]) if opts["hasta"] else None
+        except ValueError as exc:
+            raise CommandError(f"Fecha no válida: {exc}")
+
+        if opts["en_cola"]:
+            tarea = tareas.encolar("reconstruir_ventas", desde=opts["desde"], hasta=opts["hasta"], lote=opts["lote"])
+            self.stdout.write(self.style.SUCCESS(f"Encolada la tarea {tarea.pk}."))
+            return
+
+        total = ventas.reconstruir(
+            desde=desde,
+            hasta=hasta,
+            lote=opts["lote"],
+            progreso=(lambda n: self.stdout.write(f"  {n} pedidos...")) if opts["verbosity"] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Resúmenes recalculados a partir de {total} pedidos."))
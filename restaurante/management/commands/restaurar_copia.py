@@ -0,0 +1,52 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurante import copias
+
+
+class Command(BaseCommand):
+    help = (
+        "Restaura una copia hecha con copia_seguridad sobre una base de datos recién migrada. "
+        "Si se interrumpe, vuelva a lanzarlo con --reanudar. También acepta un fixture JSON de "
+        "dumpdata (como backups/backup.json), que antes se convierte a un directorio junto a él."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("origen", help="Directorio de la copia o fixture .json.")
+        parser.add_argument(
+            "--reanudar", action="store_true",
+            help="Continúa una restauración interrumpida aunque la base de datos ya tenga datos.",
+        )
+        parser.add_argument("--lote", type=int, default=copias.LOTE, help="Filas por fichero al convertir un fixture.")
+
+    def handle(self, *args, **opts):
+        directorio = opts["origen"]
+        if not opts["reanudar"] and not copias.base_vacia():
+            raise CommandError(
+                "La base de datos ya tiene datos. Restaure sobre una base recién migrada "
+                "o use --reanudar para continuar una restauración interrumpida."
+            )
+
+        if os.path.isfile(directorio):
+            fixture, directorio = directorio, os.path.splitext(directorio)[0] + "-jsonl"
+            if not os.path.exists(os.path.join(directorio, copias.MANIFIESTO)):
+                try:
+                    _, ignorados = copias.importar_fixture(fixture, directorio, lote=opts["lote"])
+                except (OSError, ValueError) as exc:
+                    raise CommandError(f"No se pudo convertir {fixture}: {exc}")
+                self.stdout.write(f"Convertido {fixture} a {directorio} (ignorados: {sum(ignorados.values())}).")
+
+        try:
+            manifiesto = copias.restaurar_copia(
+                directorio,
+                progreso=(
+                    (lambda fase, fichero, n: self.stdout.write(f"  {fase}: {fichero or ''} {'' if n is None else n}"))
+                    if opts["verbosity"] > 1 else None
+                ),
+            )
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        filas = sum(d["filas"] for d in manifiesto["modelos"].values())
+        self.stdout.write(self.style.SUCCESS(f"Restauradas {filas} filas desde {directorio}."))
@@ -0,0 +1,78 @@
+import multiprocessing
+import os
+import signal
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from restaurante import tareas
+
+
+def _parada():
+    """Con SIGINT o SIGTERM se termina la tarea en curso y se sale (devuelve el ``parar`` de ``trabajar``)."""
+    pedida = []
+
+    def pedir(*_):
+        pedida.append(True)
+
+    signal.signal(signal.SIGINT, pedir)
+    signal.signal(signal.SIGTERM, pedir)
+    return lambda: bool(pedida)
+
+
+def _avisar(tarea, estado):
+    sys.stdout.write(f"Tarea {tarea.pk} ({tarea.tipo}, intento {tarea.intentos}): {estado}\n")
+    sys.stdout.flush()
+
+
+def trabajador(una_vez, espera, avisar):
+    """Bucle de cada proceso hijo (con ``--procesos``)."""
+    tareas.trabajar(una_vez=una_vez, espera=espera, parar=_parada(), aviso=_avisar if avisar else None)
+
+
+class Command(BaseCommand):
+    help = (
+        "Ejecuta las tareas en segundo plano encoladas en la base de datos (borrado de restaurantes, "
+        "exportaciones, reconstrucción de estadísticas, ventas y contadores). Con --procesos N arranca N "
+        "trabajadores; con Ctrl+C o SIGTERM terminan la tarea en curso y salen."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--procesos", type=int, default=1, help="Trabajadores en paralelo.")
+        parser.add_argument("--una-vez", action="store_true", help="Termina cuando no quedan tareas disponibles.")
+        parser.add_argument(
+            "--espera", type=float, help="Segundos entre consultas con la cola vacía (por defecto TAREAS_ESPERA).",
+        )
+
+    def handle(self, *args, **opts):
+        if opts["procesos"] < 1 or (opts["espera"] is not None and opts["espera"] < 0):
+            raise CommandError("--procesos debe ser mayor que 0 y --espera no puede ser negativo.")
+        avisar = opts["verbosity"] > 0
+
+        if opts["procesos"] == 1:
+            ejecutadas = tareas.trabajar(
+                una_vez=opts["una_vez"], espera=opts["espera"], parar=_parada(), aviso=_avisar if avisar else None,
+            )
+            self.stdout.write(self.style.SUCCESS(f"Tareas ejecutadas: {ejecutadas}."))
+            return
+
+        # Cada proceso abre sus propias conexiones: no deben heredar las del padre
+        connections.close_all()
+        procesos = [
+            multiprocessing.Process(target=trabajador, args=(opts["una_vez"], opts["espera"], avisar))
+            for _ in range(opts["procesos"])
+        ]
+        for proceso in procesos:
+            proceso.start()
+
+        def reenviar(senal, _):
+            for proceso in procesos:
+                if proceso.is_alive():
+                    os.kill(proceso.pid, senal)
+
+        signal.signal(signal.SIGINT, reenviar)
+        signal.signal(signal.SIGTERM, reenviar)
+        for proceso in procesos:
+            proceso.join()
+        self.stdout.write(self.style.SUCCESS(f"Terminados {len(procesos)} trabajadores."))
@@ -0,0 +1,149 @@
+"""Middleware de instrumentación de consultas SQL.
+
+Cuenta las consultas que hace cada petición (vista + plantilla), las agrupa por
+"forma" (el SQL con sus parámetros sin sustituir) y avisa cuando:
+
+- la vista supera su presupuesto (``PRESUPUESTO_CONSULTAS``, por nombre de URL
+  con ``"default"`` como valor general), o
+- la misma forma se repite ``N_MAS_1_UMBRAL`` veces o más, la firma típica de
+  un N+1 (un ``for`` en la plantilla que dispara una consulta por fila).
+
+El total va en la cabecera ``X-Consultas-SQL``. Con
+``PRESUPUESTO_CONSULTAS_ESTRICTO = True`` (pensado para los tests) en vez de
+avisar en el log se lanza ``PresupuestoConsultasExcedido``.
+
+Con ASGI el ORM no usa la conexión del hilo del bucle de eventos sino la del
+hilo de ``sync_to_async``. Por eso el contador de la petición va en una
+``ContextVar`` (que ``sync_to_async`` copia al hilo) y ``_contar`` está
+instalado en todas las conexiones, se abran en el hilo que se abran.
+"""
+
+import logging
+import re
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger("restaurante.consultas")
+
+CABECERA = "X-Consultas-SQL"
+_LISTA_IN = re.compile(r"IN \((?:%s, )*%s\)")
+
+
+class PresupuestoConsultasExcedido(Exception):
+    """Una vista ha superado su presupuesto de consultas o tiene un N+1."""
+
+
+def forma_consulta(sql: str) -> str:
+    """Normaliza el SQL para que ``IN (%s, %s)`` e ``IN (%s)`` cuenten igual."""
+    return _LISTA_IN.sub("IN (...)", sql)
+
+
+class ContadorConsultas:
+    """``execute_wrapper`` que cuenta consultas y sus formas."""
+
+    def __init__(self):
+        self.total = 0
+        self.formas = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        self.formas[forma_consulta(sql)] += 1
+        return execute(sql, params, many, context)
+
+    def repetidas(self, umbral: int):
+        return [(sql, n) for sql, n in self.formas.most_common() if n >= umbral]
+
+
+_contador = ContextVar("contador_consultas", default=None)
+
+
+def _contar(execute, sql, params, many, context):
+    contador = _contador.get()
+    if contador is None:
+        return execute(sql, params, many, context)
+    return contador(execute, sql, params, many, context)
+
+
+def instalar(conexion):
+    if _contar not in conexion.execute_wrappers:
+        conexion.execute_wrappers.append(_contar)
+
+
+def _conexion_creada(sender, connection, **kwargs):
+    instalar(connection)
+
+
+# Las conexiones de los hilos de sync_to_async se crean durante la petición
+connection_created.connect(_conexion_creada, dispatch_uid="restaurante.middleware.contar")
+
+
+def presupuesto_para(nombre_url: str | None) -> int | None:
+    presupuestos = getattr(settings, "PRESUPUESTO_CONSULTAS", {})
+    if nombre_url and nombre_url in presupuestos:
+        return presupuestos[nombre_url]
+    return presupuestos.get("default")
+
+
+class PresupuestoConsultasMiddleware:
+    # Admite los dos modos para no obligar a Django a pasar las vistas
+    # asíncronas por un hilo cuando se sirve con ASGI
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        contador, marca = self._empezar()
+        try:
+            response = self.get_response(request)
+        finally:
+            _contador.reset(marca)
+        return self._terminar(request, response, contador)
+
+    async def __acall__(self, request):
+        contador, marca = self._empezar()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _contador.reset(marca)
+        return self._terminar(request, response, contador)
+
+    def _empezar(self):
+        # Las conexiones de este hilo pueden ser anteriores a la señal
+        for conexion in connections.all(initialized_only=True):
+            instalar(conexion)
+        contador = ContadorConsultas()
+        return contador, _contador.set(contador)
+
+    def _terminar(self, request, response, contador):
+        response[CABECERA] = str(contador.total)
+        match = getattr(request, "resolver_match", None)
+        nombre_url = match.view_name if match else None
+        self.revisar(nombre_url or request.path, contador, presupuesto_para(nombre_url))
+        return response
+
+    def revisar(self, vista: str, contador: ContadorConsultas, presupuesto: int | None):
+        problemas = []
+        if presupuesto is not None and contador.total > presupuesto:
+            problemas.append(f"{vista}: {contador.total} consultas (presupuesto {presupuesto})")
+
+        umbral = getattr(settings, "N_MAS_1_UMBRAL", 5)
+        for sql, veces in contador.repetidas(umbral):
+            problemas.append(f"{vista}: posible N+1, {veces} veces la misma consulta: {sql[:200]}")
+
+        if not problemas:
+            return
+        if getattr(settings, "PRESUPUESTO_CONSULTAS_ESTRICTO", False):
+            raise PresupuestoConsultasExcedido("\n".join(problemas))
+        for problema in problemas:
+            logger.warning(problema)
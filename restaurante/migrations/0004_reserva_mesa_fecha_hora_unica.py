@@ -0,0 +1,38 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:21
+
+from django.db import migrations, models
+
+
+def cancelar_duplicadas(apps, schema_editor):
+    """Deja una sola reserva no cancelada por mesa, fecha y hora (la más antigua) para poder crear la restricción.
+
+    Las demás se cancelan con una nota, en vez de borrarse, para que se puedan revisar.
+    """
+    from django.db.models import F, OuterRef, Subquery
+
+    Reserva = apps.get_model("restaurante", "Reserva")
+    vivas = Reserva.objects.exclude(estado="cancelada")
+    misma_franja = vivas.filter(mesa_id=OuterRef("mesa_id"), fecha=OuterRef("fecha"), hora=OuterRef("hora"))
+    duplicadas = vivas.annotate(
+        primera=Subquery(misma_franja.order_by("pk").values("pk")[:1])
+    ).exclude(primera=F("pk"))
+    for reserva in duplicadas.order_by("pk"):
+        nota = f"[Cancelada al migrar: duplicaba la reserva {reserva.primera}]"
+        reserva.estado = "cancelada"
+        reserva.notas = f"{reserva.notas}\n{nota}" if reserva.notas else nota
+        reserva.save(update_fields=["estado", "notas"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurante', '0003_add_creado_por_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(cancelar_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='reserva',
+            constraint=models.UniqueConstraint(condition=models.Q(('estado', 'cancelada'), _negated=True), fields=('mesa', 'fecha', 'hora'), name='reserva_mesa_fecha_hora_unica'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Tablas virtuales FTS5 para la búsqueda de texto completo (solo SQLite).
+# Se rellenan desde sus tablas con SQL, como haría "indexar_busqueda".
+
+from django.db import migrations
+
+TABLAS = {
+    "restaurante_fts_plato": "nombre, etiquetas",
+    "restaurante_fts_cliente": "nombre, email",
+    "restaurante_fts_restaurante": "nombre, telefono, direccion",
+}
+RELLENAR = {
+    "restaurante_fts_plato": (
+        "SELECT p.id, p.nombre, COALESCE(("
+        "SELECT group_concat(e.nombre, ' ') FROM restaurante_plato_etiquetas pe "
+        "JOIN restaurante_etiqueta e ON e.id = pe.etiqueta_id WHERE pe.plato_id = p.id), '') "
+        "FROM restaurante_plato p"
+    ),
+    "restaurante_fts_cliente": "SELECT id, nombre, email FROM restaurante_cliente",
+    "restaurante_fts_restaurante": (
+        "SELECT r.id, r.nombre, r.telefono, d.calle || ' ' || d.ciudad || ' ' || d.codigo_postal "
+        "FROM restaurante_restaurante r JOIN restaurante_direccion d ON d.id = r.direccion_id"
+    ),
+}
+
+
+def crear_tablas(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for tabla, columnas in TABLAS.items():
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {tabla} USING fts5("
+            f"{columnas}, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(f"DELETE FROM {tabla}")
+        schema_editor.execute(f"INSERT INTO {tabla} (rowid, {columnas}) {RELLENAR[tabla]}")
+
+
+def borrar_tablas(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for tabla in TABLAS:
+        schema_editor.execute(f"DROP TABLE IF EXISTS {tabla}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurante", "0004_reserva_mesa_fecha_hora_unica"),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_tablas, borrar_tablas),
+    ]
@@ -0,0 +1,82 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:26
+
+import datetime
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def rellenar_fechas(apps, schema_editor):
+    """Fecha de los pedidos que ya existían: la de su reserva o, si no tienen, la de hoy.
+
+    Pedido no guarda cuándo se creó (la columna ``creado`` se quitó en la 0002),
+    así que para los pedidos sin reserva no hay un dato mejor que el día de la migración.
+    """
+    from django.db.models import OuterRef, Subquery
+
+    Pedido = apps.get_model("restaurante", "Pedido")
+    Reserva = apps.get_model("restaurante", "Reserva")
+    Pedido.objects.filter(reserva__isnull=False).update(
+        fecha=Subquery(Reserva.objects.filter(pk=OuterRef("reserva_id")).values("fecha")[:1])
+    )
+    Pedido.objects.filter(fecha__isnull=True).update(fecha=datetime.date.today())
+
+
+def rellenar_resumenes(apps, schema_editor):
+    """Calcula los resúmenes de los pedidos que ya existían."""
+    from django.db.models import Count, Sum
+
+    Pedido = apps.get_model("restaurante", "Pedido")
+    LineaPedido = apps.get_model("restaurante", "LineaPedido")
+    ResumenVentasDiario = apps.get_model("restaurante", "ResumenVentasDiario")
+
+    lineas = {
+        (f["pedido__restaurante_id"], f["pedido__fecha"]): (f["n"], f["u"] or 0)
+        for f in LineaPedido.objects.values("pedido__restaurante_id", "pedido__fecha")
+        .annotate(n=Count("id"), u=Sum("cantidad")).order_by()
+    }
+    ResumenVentasDiario.objects.bulk_create(
+        ResumenVentasDiario(
+            restaurante_id=f["restaurante_id"], fecha=f["fecha"], num_pedidos=f["n"], total=f["t"] or 0,
+            num_lineas=lineas.get((f["restaurante_id"], f["fecha"]), (0, 0))[0],
+            unidades=lineas.get((f["restaurante_id"], f["fecha"]), (0, 0))[1],
+        )
+        for f in Pedido.objects.values("restaurante_id", "fecha").annotate(n=Count("id"), t=Sum("total")).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurante', '0005_indices_busqueda_fts'),
+    ]
+
+    operations = [
+        # Primero sin valor, para no poner a todos los pedidos antiguos la fecha de hoy
+        migrations.AddField(
+            model_name='pedido',
+            name='fecha',
+            field=models.DateField(null=True),
+        ),
+        migrations.RunPython(rellenar_fechas, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='pedido',
+            name='fecha',
+            field=models.DateField(default=datetime.date.today),
+        ),
+        migrations.CreateModel(
+            name='ResumenVentasDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('num_pedidos', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('num_lineas', models.IntegerField(default=0)),
+                ('unidades', models.IntegerField(default=0)),
+                ('restaurante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_ventas', to='restaurante.restaurante')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('restaurante', 'fecha'), name='resumen_ventas_restaurante_fecha_unico')],
+            },
+        ),
+        migrations.RunPython(rellenar_resumenes, migrations.RunPython.noop),
+    ]
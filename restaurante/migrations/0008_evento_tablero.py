@@ -0,0 +1,25 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurante', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoTablero',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('restaurante_id', models.PositiveIntegerField()),
+                ('datos', models.JSONField()),
+                ('creado', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['restaurante_id', 'id'], name='evento_tablero_rest_id_idx')],
+            },
+        ),
+    ]
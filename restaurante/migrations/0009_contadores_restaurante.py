@@ -0,0 +1,62 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:55
+
+from django.db import migrations, models
+
+
+def rellenar_contadores(apps, schema_editor):
+    """Cuenta platos, mesas activas, clientes frecuentes y reservas abiertas de los restaurantes que ya existían."""
+    from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+    from django.db.models.functions import Coalesce
+
+    Restaurante = apps.get_model("restaurante", "Restaurante")
+    Plato = apps.get_model("restaurante", "Plato")
+    Mesa = apps.get_model("restaurante", "Mesa")
+    Reserva = apps.get_model("restaurante", "Reserva")
+    Favorito = Restaurante.clientes_frecuentes.through
+
+    def contar(qs, campo):
+        filas = qs.filter(**{campo: OuterRef("pk")}).order_by().values(campo).annotate(n=Count("*")).values("n")
+        return Coalesce(Subquery(filas, output_field=IntegerField()), Value(0))
+
+    Restaurante.objects.update(
+        num_platos=contar(Plato.objects.all(), "restaurante"),
+        num_mesas_activas=contar(Mesa.objects.filter(activa=True), "restaurante"),
+        num_clientes_frecuentes=contar(Favorito.objects.all(), "restaurante"),
+        num_reservas_abiertas=contar(Reserva.objects.exclude(estado="cancelada"), "mesa__restaurante"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurante', '0008_evento_tablero'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurante',
+            name='num_clientes_frecuentes',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='restaurante',
+            name='num_mesas_activas',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='restaurante',
+            name='num_platos',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='restaurante',
+            name='num_reservas_abiertas',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='restaurante',
+            name='nombre',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.RunPython(rellenar_contadores, migrations.RunPython.noop),
+    ]
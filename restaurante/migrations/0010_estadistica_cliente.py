@@ -0,0 +1,50 @@
+# Generated by Django 5.1.15 on 2026-10-18 16:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def rellenar_estadisticas(apps, schema_editor):
+    """Calcula las estadísticas de los clientes que ya tenían pedidos."""
+    from django.db.models import Count, Max, Sum
+
+    Pedido = apps.get_model("restaurante", "Pedido")
+    EstadisticaCliente = apps.get_model("restaurante", "EstadisticaCliente")
+
+    favoritos = {}
+    for f in (
+        Pedido.objects.values("cliente_id", "restaurante_id").annotate(n=Count("id"))
+        .order_by("cliente_id", "-n", "restaurante_id")
+    ):
+        favoritos.setdefault(f["cliente_id"], f["restaurante_id"])
+    EstadisticaCliente.objects.bulk_create(
+        EstadisticaCliente(
+            cliente_id=f["cliente_id"], num_pedidos=f["n"], total_gastado=f["t"] or 0, ultimo_pedido=f["ultimo"],
+            restaurante_favorito_id=favoritos.get(f["cliente_id"]),
+        )
+        for f in Pedido.objects.values("cliente_id").annotate(n=Count("id"), t=Sum("total"), ultimo=Max("fecha")).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurante', '0009_contadores_restaurante'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaCliente',
+            fields=[
+                ('cliente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estadistica', serialize=False, to='restaurante.cliente')),
+                ('num_pedidos', models.IntegerField(default=0)),
+                ('total_gastado', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('ultimo_pedido', models.DateField(null=True)),
+                ('restaurante_favorito', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='restaurante.restaurante')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['total_gastado'], name='estadistica_total_idx'), models.Index(fields=['num_pedidos'], name='estadistica_pedidos_idx'), models.Index(fields=['ultimo_pedido'], name='estadistica_ultimo_idx')],
+            },
+        ),
+        migrations.RunPython(rellenar_estadisticas, migrations.RunPython.noop),
+    ]
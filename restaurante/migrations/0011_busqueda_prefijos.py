@@ -0,0 +1,49 @@
+# Índices de prefijos para el autocompletado (solo SQLite): la tabla FTS5 de
+# clientes se vuelve a crear con prefix='2 3' y se añade la de direcciones.
+# Las dos se rellenan desde sus tablas con SQL, como haría "indexar_busqueda".
+
+from django.db import migrations
+
+OPCIONES = "tokenize='unicode61 remove_diacritics 2'"
+PREFIJOS = "prefix='2 3'"
+RELLENAR = {
+    "restaurante_fts_cliente": (
+        "rowid, nombre, email", "SELECT id, nombre, email FROM restaurante_cliente",
+    ),
+    "restaurante_fts_direccion": (
+        "rowid, calle, ciudad, codigo_postal",
+        "SELECT id, calle || ' ' || numero, ciudad, codigo_postal FROM restaurante_direccion",
+    ),
+}
+
+
+def _crear(schema_editor, tabla, columnas, opciones):
+    schema_editor.execute(f"DROP TABLE IF EXISTS {tabla}")
+    schema_editor.execute(f"CREATE VIRTUAL TABLE {tabla} USING fts5({columnas}, {opciones})")
+    destino, origen = RELLENAR[tabla]
+    schema_editor.execute(f"INSERT INTO {tabla} ({destino}) {origen}")
+
+
+def crear_prefijos(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    _crear(schema_editor, "restaurante_fts_cliente", "nombre, email", f"{OPCIONES}, {PREFIJOS}")
+    _crear(schema_editor, "restaurante_fts_direccion", "calle, ciudad, codigo_postal", f"{OPCIONES}, {PREFIJOS}")
+
+
+def quitar_prefijos(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS restaurante_fts_direccion")
+    _crear(schema_editor, "restaurante_fts_cliente", "nombre, email", OPCIONES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurante", "0010_estadistica_cliente"),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_prefijos, quitar_prefijos),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurante', '0011_busqueda_prefijos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mesa',
+            index=models.Index(condition=models.Q(('activa', True)), fields=['restaurante', 'numero'], name='mesa_activa_rest_num_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plato',
+            index=models.Index(fields=['categoria', 'nombre'], name='plato_categoria_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plato',
+            index=models.Index(fields=['restaurante', 'nombre'], name='plato_restaurante_nombre_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plato',
+            index=models.Index(fields=['precio'], name='plato_precio_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['-fecha', '-hora'], name='reserva_fecha_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['creado_por', '-fecha', '-hora'], name='reserva_creador_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reserva',
+            index=models.Index(fields=['cliente', 'fecha', 'hora'], name='reserva_cliente_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurante', '0012_indices_compuestos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PedidoArchivado',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('reserva_id', models.IntegerField(blank=True, null=True)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('fecha', models.DateField()),
+                ('archivado', models.DateTimeField(auto_now_add=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurante.cliente')),
+                ('creado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('restaurante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurante.restaurante')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LineaPedidoArchivada',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('cantidad', models.PositiveIntegerField(default=1)),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=6)),
+                ('comentario', models.CharField(blank=True, max_length=120)),
+                ('descuento_porcentaje', models.PositiveIntegerField(default=0)),
+                ('plato', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurante.plato')),
+                ('pedido', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='restaurante.pedidoarchivado')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReservaArchivada',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('fecha', models.DateField()),
+                ('hora', models.TimeField()),
+                ('estado', models.CharField(max_length=20)),
+                ('notas', models.TextField(blank=True)),
+                ('archivada', models.DateTimeField(auto_now_add=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurante.cliente')),
+                ('creado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('mesa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='restaurante.mesa')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pedidoarchivado',
+            index=models.Index(fields=['fecha'], name='pedido_archivado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pedidoarchivado',
+            index=models.Index(fields=['cliente', 'restaurante'], name='pedido_archivado_cliente_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reservaarchivada',
+            index=models.Index(fields=['fecha'], name='reserva_archivada_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 17:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurante', '0014_tareas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='pedidoarchivado',
+            index=models.Index(fields=['reserva_id'], name='pedido_archivado_reserva_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:05
+
+import datetime
+
+from django.db import migrations
+
+
+def recontar_reservas_abiertas(apps, schema_editor):
+    """``num_reservas_abiertas`` pasa a contar solo las no canceladas de hoy en adelante."""
+    from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+    from django.db.models.functions import Coalesce
+
+    Restaurante = apps.get_model("restaurante", "Restaurante")
+    Reserva = apps.get_model("restaurante", "Reserva")
+    abiertas = (
+        Reserva.objects.exclude(estado="cancelada").filter(fecha__gte=datetime.date.today())
+        .filter(mesa__restaurante=OuterRef("pk")).order_by().values("mesa__restaurante")
+        .annotate(n=Count("*")).values("n")
+    )
+    Restaurante.objects.update(
+        num_reservas_abiertas=Coalesce(Subquery(abiertas, output_field=IntegerField()), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurante', '0015_pedido_archivado_reserva'),
+    ]
+
+    operations = [
+        migrations.RunPython(recontar_reservas_abiertas, migrations.RunPython.noop),
+    ]
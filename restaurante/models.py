@@ -1,6 +1,9 @@
+import datetime
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.db.models import Q
+from django.utils import timezone
 
 
 class Usuario(AbstractUser):
@@ -16,6 +19,14 @@ class Usuario(AbstractUser):
         (ROL_CLIENTE, "Cliente"),
     ]
 
+    # Grupo al que se añade cada rol al registrarse (ver RegistroForm.save) y
+    # del que se deduce el rol mostrado (ver permisos.rol_de)
+    GRUPOS_POR_ROL = {
+        ROL_ADMINISTRADOR: "Administradores",
+        ROL_GERENTE: "Gerentes",
+        ROL_EMPLEADO: "Empleados",
+    }
+
     rol = models.CharField(max_length=20, choices=ROL_CHOICES, default=ROL_CLIENTE)
 
 
@@ -26,6 +37,7 @@ class Direccion(models.Model):
     ciudad = models.CharField(max_length=80)
     codigo_postal = models.CharField(max_length=10)
     provincia = models.CharField(max_length=80)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self): 
         return f"{self.calle} {self.numero}, {self.ciudad}"
@@ -59,22 +71,13 @@ class RestauranteQuerySet(models.QuerySet):
     """QuerySet con filtros reutilizables para búsquedas avanzadas."""
 
     def advanced_filter(self, nombre: str | None = None, telefono: str | None = None, direccion: str | None = None):
-        qs = self.select_related("direccion").all()
-
-        if nombre:
-            qs = qs.filter(nombre__icontains=nombre)
-
-        if telefono:
-            qs = qs.filter(telefono__icontains=telefono)
+        """Busca en el índice de texto completo (ver ``busqueda.py``), por relevancia."""
+        from .busqueda import buscar
 
-        if direccion:
-            qs = qs.filter(
-                Q(direccion__calle__icontains=direccion)
-                | Q(direccion__ciudad__icontains=direccion)
-                | Q(direccion__codigo_postal__icontains=direccion)
-            )
-
-        return qs
+        qs = self.select_related("direccion").all()
+        if not (nombre or telefono or direccion):
+            return qs
+        return buscar(qs, nombre=nombre, telefono=telefono, direccion=direccion)
 
 
 class RestauranteManager(models.Manager):
@@ -87,10 +90,20 @@ class RestauranteManager(models.Manager):
         return self.get_queryset().advanced_filter(nombre=nombre, telefono=telefono, direccion=direccion)
 
 class Restaurante(models.Model):
-    nombre = models.CharField(max_length=100)
+    nombre = models.CharField(max_length=100, db_index=True)
     telefono = models.CharField(max_length=20)
     direccion = models.OneToOneField(Direccion, on_delete=models.CASCADE)
     clientes_frecuentes = models.ManyToManyField(Cliente, blank=True, related_name="restaurantes_favoritos")
+    # También se actualiza al cambiar su dirección, platos, mesas o clientes
+    # frecuentes (ver condicional.py): es el validador de su ficha
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Contadores mantenidos por señales (ver contadores.py); se corrigen con
+    # "python manage.py reconciliar_contadores"
+    num_platos = models.IntegerField(default=0, editable=False)
+    num_mesas_activas = models.IntegerField(default=0, editable=False)
+    num_clientes_frecuentes = models.IntegerField(default=0, editable=False)
+    # No canceladas y de hoy en adelante; se pone al día cada medianoche (ver tareas.py)
+    num_reservas_abiertas = models.IntegerField(default=0, editable=False)
 
     # Registrar el manager personalizado directamente en la clase
     objects = RestauranteManager()
@@ -103,6 +116,7 @@ class Etiqueta(models.Model):
     descripcion = models.TextField(blank=True)
     color = models.CharField(max_length=10, default="verde")
     slug = models.SlugField(unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     def __str__(self): 
         return self.nombre
@@ -113,6 +127,19 @@ class Plato(models.Model):
     precio = models.DecimalField(max_digits=6, decimal_places=2)
     categoria = models.CharField(max_length=20, default="principal")
     etiquetas = models.ManyToManyField(Etiqueta, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Validador de platos_por_categoria (ver condicional.py)
+            models.Index(fields=["categoria", "updated_at"], name="plato_categoria_updated_idx"),
+            # platos_por_categoria (WHERE categoria ORDER BY nombre)
+            models.Index(fields=["categoria", "nombre"], name="plato_categoria_nombre_idx"),
+            # PlatoForm.clean (nombre repetido en el restaurante) y detalle_restaurante
+            models.Index(fields=["restaurante", "nombre"], name="plato_restaurante_nombre_idx"),
+            # lista_platos y la API (ORDER BY precio LIMIT 100)
+            models.Index(fields=["precio"], name="plato_precio_idx"),
+        ]
     
     def __str__(self): 
         return self.nombre
@@ -121,6 +148,18 @@ class Mesa(models.Model):
     restaurante = models.ForeignKey(Restaurante, on_delete=models.CASCADE)
     numero = models.PositiveIntegerField()
     activa = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Mesas activas de los formularios de reserva y de disponibilidad.py
+            # (WHERE activa [AND restaurante] ORDER BY numero). Parcial porque
+            # Django escribe "WHERE activa", sin "= 1", y así no usaría un
+            # índice que empezase por activa.
+            models.Index(
+                fields=["restaurante", "numero"], condition=Q(activa=True), name="mesa_activa_rest_num_idx",
+            ),
+        ]
     
     def __str__(self): 
         return f"Mesa {self.numero}"
@@ -140,6 +179,24 @@ class Reserva(models.Model):
         related_name="reservas_creadas",
     )
 
+    class Meta:
+        constraints = [
+            # Una mesa no puede tener dos reservas vivas a la misma fecha y hora
+            models.UniqueConstraint(
+                fields=["mesa", "fecha", "hora"],
+                condition=~Q(estado="cancelada"),
+                name="reserva_mesa_fecha_hora_unica",
+            ),
+        ]
+        indexes = [
+            # reservas_listar (keyset por -fecha, -hora, id), disponibilidad y tablero por fecha
+            models.Index(fields=["-fecha", "-hora"], name="reserva_fecha_hora_idx"),
+            # lista_mis_reservas (WHERE creado_por ORDER BY -fecha, -hora, id)
+            models.Index(fields=["creado_por", "-fecha", "-hora"], name="reserva_creador_fecha_idx"),
+            # ReservaCreateForm.clean (cliente con otra reserva a esa fecha y hora)
+            models.Index(fields=["cliente", "fecha", "hora"], name="reserva_cliente_fecha_idx"),
+        ]
+
     def __str__(self): 
         return f"Reserva {self.cliente.nombre} {self.fecha} {self.hora}"
 
@@ -148,6 +205,7 @@ class Pedido(models.Model):
     restaurante = models.ForeignKey(Restaurante, on_delete=models.CASCADE)
     reserva = models.OneToOneField(Reserva, on_delete=models.SET_NULL, null=True, blank=True) #este codigo es para borrar la reserva pero el pedido lo dejaria "guardado" teni pensado crea una pagina de merma, o desperdicios, y con este codigo podria hacerlo.
     total = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    fecha = models.DateField(default=datetime.date.today)
     platos = models.ManyToManyField("Plato", through="LineaPedido")
     creado_por = models.ForeignKey(
         Usuario,
@@ -171,3 +229,206 @@ class LineaPedido(models.Model):
     
     def __str__(self): 
         return f"{self.cantidad}x {self.plato.nombre}"
+
+
+class ResumenVentasDiario(models.Model):
+    """Acumulado de ventas por restaurante y día.
+
+    Lo mantienen las señales de ``Pedido`` y ``LineaPedido`` (ver ``ventas.py``)
+    para que los resúmenes no tengan que recorrer toda la tabla de pedidos. Se
+    puede recalcular con ``python manage.py reconstruir_resumen_ventas``.
+    """
+
+    restaurante = models.ForeignKey(Restaurante, on_delete=models.CASCADE, related_name="resumenes_ventas")
+    fecha = models.DateField()
+    num_pedidos = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    num_lineas = models.IntegerField(default=0)
+    unidades = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["restaurante", "fecha"], name="resumen_ventas_restaurante_fecha_unico"),
+        ]
+
+    def __str__(self):
+        return f"Ventas {self.restaurante_id} {self.fecha}"
+
+
+class EstadisticaCliente(models.Model):
+    """Pedidos, gasto, último pedido y restaurante habitual de cada cliente con pedidos.
+
+    La mantienen las señales de ``Pedido`` (ver ``estadisticas.py``) para que
+    ``clientes_frecuentes`` no agrupe toda la tabla de pedidos. Los índices
+    permiten ordenar por gasto o pedidos y filtrar por fecha del último pedido.
+    Se puede recalcular con ``python manage.py reconstruir_estadisticas_clientes``.
+    """
+
+    cliente = models.OneToOneField(Cliente, on_delete=models.CASCADE, primary_key=True, related_name="estadistica")
+    num_pedidos = models.IntegerField(default=0)
+    total_gastado = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    ultimo_pedido = models.DateField(null=True)
+    # El restaurante con más pedidos del cliente (el de id menor si empatan)
+    restaurante_favorito = models.ForeignKey(
+        Restaurante, on_delete=models.SET_NULL, null=True, related_name="+",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["total_gastado"], name="estadistica_total_idx"),
+            models.Index(fields=["num_pedidos"], name="estadistica_pedidos_idx"),
+            models.Index(fields=["ultimo_pedido"], name="estadistica_ultimo_idx"),
+        ]
+
+    def __str__(self):
+        return f"Estadística {self.cliente_id}"
+
+
+class EventoTablero(models.Model):
+    """Cambio de una reserva pendiente de enviar a los tableros en directo.
+
+    Solo lo usa el reparto ``"bd"`` de ``tablero.py`` (varios procesos): cada
+    conexión SSE lee los eventos con id mayor que el último que envió. Se
+    borran solos pasada una hora. ``restaurante_id`` no es una clave foránea
+    para poder avisar del borrado de las reservas de un restaurante borrado.
+    """
+
+    restaurante_id = models.PositiveIntegerField()
+    datos = models.JSONField()
+    creado = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["restaurante_id", "id"], name="evento_tablero_rest_id_idx")]
+
+    def __str__(self):
+        return f"Evento {self.pk} del restaurante {self.restaurante_id}"
+
+
+# ----------------------------------------------------------------------------
+# Archivo (ver archivo.py)
+# ----------------------------------------------------------------------------
+
+
+class ReservaArchivada(models.Model):
+    """Reserva pasada movida fuera de ``Reserva`` por ``archivar``; conserva su id."""
+
+    id = models.IntegerField(primary_key=True)
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name="+")
+    mesa = models.ForeignKey(Mesa, on_delete=models.CASCADE, related_name="+")
+    fecha = models.DateField()
+    hora = models.TimeField()
+    estado = models.CharField(max_length=20)
+    notas = models.TextField(blank=True)
+    creado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    archivada = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["fecha"], name="reserva_archivada_fecha_idx")]
+
+    def __str__(self):
+        return f"Reserva archivada {self.id}"
+
+
+class PedidoArchivado(models.Model):
+    """Pedido pasado movido fuera de ``Pedido``; sigue contando en ventas y estadísticas."""
+
+    id = models.IntegerField(primary_key=True)
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name="+")
+    restaurante = models.ForeignKey(Restaurante, on_delete=models.CASCADE, related_name="+")
+    # Id de la reserva, que puede estar en Reserva o en ReservaArchivada; al
+    # borrarla se pone a NULL (archivo.soltar_reservas), como el SET_NULL de Pedido
+    reserva_id = models.IntegerField(null=True, blank=True)
+    total = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    fecha = models.DateField()
+    creado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    archivado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["fecha"], name="pedido_archivado_fecha_idx"),
+            # estadisticas.recalcular agrupa por cliente
+            models.Index(fields=["cliente", "restaurante"], name="pedido_archivado_cliente_idx"),
+            # archivo.soltar_reservas, en cada borrado de reserva
+            models.Index(fields=["reserva_id"], name="pedido_archivado_reserva_idx"),
+        ]
+
+    def __str__(self):
+        return f"Pedido archivado {self.id}"
+
+
+class LineaPedidoArchivada(models.Model):
+    id = models.IntegerField(primary_key=True)
+    pedido = models.ForeignKey(PedidoArchivado, on_delete=models.CASCADE, related_name="lineas")
+    plato = models.ForeignKey(Plato, on_delete=models.CASCADE, related_name="+")
+    cantidad = models.PositiveIntegerField(default=1)
+    precio_unitario = models.DecimalField(max_digits=6, decimal_places=2)
+    comentario = models.CharField(max_length=120, blank=True)
+    descuento_porcentaje = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Línea archivada {self.id}"
+
+
+# ----------------------------------------------------------------------------
+# Cola de tareas en segundo plano (ver tareas.py)
+# ----------------------------------------------------------------------------
+
+
+class Tarea(models.Model):
+    """Trabajo encolado por una vista o un comando que ejecuta ``trabajar_tareas``.
+
+    Mientras un trabajador la ejecuta la tiene reservada hasta
+    ``bloqueada_hasta``; si el proceso muere, otro la retoma al caducar.
+    """
+
+    PENDIENTE = "pendiente"
+    EN_CURSO = "en_curso"
+    HECHA = "hecha"
+    FALLIDA = "fallida"
+    ESTADOS = [
+        (PENDIENTE, "Pendiente"),
+        (EN_CURSO, "En curso"),
+        (HECHA, "Hecha"),
+        (FALLIDA, "Fallida"),
+    ]
+
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=3)
+    # Progreso: unidades hechas de ``total`` (filas, clientes...) y qué se está haciendo
+    hechos = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(null=True, blank=True)
+    mensaje = models.CharField(max_length=200, blank=True)
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    creada = models.DateTimeField(auto_now_add=True)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    empezada = models.DateTimeField(null=True, blank=True)
+    terminada = models.DateTimeField(null=True, blank=True)
+    trabajador = models.CharField(max_length=100, blank=True)
+    bloqueada_hasta = models.DateTimeField(null=True, blank=True)
+    creado_por = models.ForeignKey(Usuario, on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+
+    class Meta:
+        indexes = [
+            # tareas.tomar: pendientes ya disponibles y en curso con la reserva caducada
+            models.Index(fields=["estado", "disponible_desde"], name="tarea_estado_disponible_idx"),
+            models.Index(fields=["creado_por", "-id"], name="tarea_creador_idx"),
+        ]
+
+    @property
+    def acabada(self) -> bool:
+        return self.estado in (self.HECHA, self.FALLIDA)
+
+    @property
+    def porcentaje(self):
+        if self.estado == self.HECHA:
+            return 100
+        if not self.total:
+            return None
+        return min(100, self.hechos * 100 // self.total)
+
+    def __str__(self):
+        return f"Tarea {self.pk} ({self.tipo}, {self.estado})"
@@ -0,0 +1,133 @@
+"""Paginación por cursor (keyset) para los listados del CRUD.
+
+En vez de ``OFFSET`` (que obliga a recorrer todas las filas anteriores) cada
+página se pide con un ``WHERE`` sobre los valores de ordenación de la última
+fila vista, así que la página 1 y la página 10.000 cuestan lo mismo. La
+ordenación debe terminar en un campo único (normalmente ``id``) para que el
+cursor sea estable.
+
+Uso::
+
+    pagina = KeysetPaginator(qs, ("-fecha", "-hora", "id")).pagina(request.GET.get("cursor"))
+    # pagina.object_list, pagina.cursor_siguiente, pagina.cursor_anterior
+"""
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+SIGUIENTE = "s"
+ANTERIOR = "a"
+
+
+def por_pagina_defecto() -> int:
+    return getattr(settings, "PAGINACION_POR_PAGINA", 50)
+
+
+def codificar_cursor(valores, direccion: str) -> str:
+    datos = json.dumps({"v": [v if isinstance(v, (int, type(None))) else str(v) for v in valores], "d": direccion})
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str):
+    """Devuelve ``(valores, direccion)`` o ``None`` si el cursor no es válido."""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        return list(datos["v"]), datos["d"]
+    except (binascii.Error, ValueError, KeyError, TypeError):
+        return None
+
+
+@dataclass
+class PaginaKeyset:
+    object_list: list
+    cursor_siguiente: str | None
+    cursor_anterior: str | None
+
+    @property
+    def has_next(self) -> bool:
+        return self.cursor_siguiente is not None
+
+    @property
+    def has_previous(self) -> bool:
+        return self.cursor_anterior is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, orden, por_pagina: int | None = None):
+        self.queryset = queryset
+        self.orden = [(campo.lstrip("-"), campo.startswith("-")) for campo in orden]
+        self.por_pagina = por_pagina or por_pagina_defecto()
+
+    def _filtro(self, valores, hacia_atras: bool) -> Q:
+        """Comparación lexicográfica ``(c1, c2, ...) > (v1, v2, ...)`` expresada con Q.
+
+        Para cada campo se usa ``gt`` o ``lt`` según su sentido de ordenación
+        (invertido al ir hacia atrás), con igualdad en los campos previos.
+        """
+        condiciones = []
+        for i, (campo, descendente) in enumerate(self.orden):
+            lookup = "lt" if descendente != hacia_atras else "gt"
+            iguales = {nombre: valor for (nombre, _), valor in zip(self.orden[:i], valores)}
+            condiciones.append(Q(**iguales, **{f"{campo}__{lookup}": valores[i]}))
+        return reduce(or_, condiciones)
+
+    def _valores(self, fila):
+        valores = []
+        for campo, _ in self.orden:
+            if isinstance(fila, dict):
+                valores.append(fila[campo])
+                continue
+            valor = fila
+            for parte in campo.split("__"):
+                valor = getattr(valor, parte)
+            valores.append(valor)
+        return valores
+
+    def _orden_sql(self, hacia_atras: bool):
+        return [f"{'-' if descendente != hacia_atras else ''}{campo}" for campo, descendente in self.orden]
+
+    def pagina(self, cursor: str | None = None) -> PaginaKeyset:
+        decodificado = decodificar_cursor(cursor) if cursor else None
+        if decodificado and len(decodificado[0]) != len(self.orden):
+            decodificado = None
+        hacia_atras = bool(decodificado) and decodificado[1] == ANTERIOR
+
+        qs = self.queryset.order_by(*self._orden_sql(hacia_atras))
+        try:
+            if decodificado:
+                qs = qs.filter(self._filtro(decodificado[0], hacia_atras))
+            filas = list(qs[: self.por_pagina + 1])
+        except (ValidationError, ValueError, TypeError):
+            # Cursor manipulado con valores que no encajan en el campo
+            return self.pagina(None)
+
+        hay_mas = len(filas) > self.por_pagina
+        filas = filas[: self.por_pagina]
+        if hacia_atras:
+            filas.reverse()
+
+        if not filas:
+            return PaginaKeyset([], None, None)
+
+        hay_siguiente = hay_mas if not hacia_atras else True
+        hay_anterior = hay_mas if hacia_atras else bool(decodificado)
+        return PaginaKeyset(
+            object_list=filas,
+            cursor_siguiente=codificar_cursor(self._valores(filas[-1]), SIGUIENTE) if hay_siguiente else None,
+            cursor_anterior=codificar_cursor(self._valores(filas[0]), ANTERIOR) if hay_anterior else None,
+        )
@@ -0,0 +1,221 @@
+"""Alta de pedidos con sus líneas, de uno en uno o por lotes (TPV).
+
+``registrar_pedidos`` recibe los pedidos ya decodificados del JSON y los guarda
+con un número fijo de consultas, tenga el lote uno o quinientos pedidos:
+
+1. Una consulta por tabla referenciada (platos, clientes, restaurantes y
+   reservas) para validar todos los ids del lote a la vez y tomar el precio
+   actual de cada plato, que se copia en ``precio_unitario``.
+2. Un ``bulk_create`` de los pedidos, con el total ya calculado, y otro de
+   todas las líneas.
+3. Un ``ventas.aplicar`` por restaurante y día y un ``estadisticas.recalcular``
+   de los clientes del lote: ``bulk_create`` no lanza señales, así que lo
+   derivado se actualiza aquí una vez por lote en lugar de pedido a pedido.
+
+Todo va en la misma transacción: si un pedido no es válido no se guarda
+ninguno y ``PedidoInvalido`` lleva los errores de cada posición del lote.
+"""
+
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from . import estadisticas, ventas
+from .models import Cliente, LineaPedido, Pedido, Plato, Reserva, Restaurante
+
+CENTIMO = Decimal("0.01")
+LARGO_COMENTARIO = LineaPedido._meta.get_field("comentario").max_length
+
+
+class PedidoInvalido(Exception):
+    """Algún pedido del lote no es válido; ``errores`` es ``{posición: {campo: mensaje}}``."""
+
+    def __init__(self, errores):
+        super().__init__("Hay pedidos no válidos en el lote.")
+        self.errores = errores
+
+
+def importe_linea(precio, cantidad, descuento) -> Decimal:
+    """Importe de una línea con su descuento, redondeado al céntimo (igual que ``generador``)."""
+    return (precio * cantidad * (100 - descuento) / 100).quantize(CENTIMO)
+
+
+def _entero(valor, minimo=None, maximo=None):
+    if isinstance(valor, bool) or not isinstance(valor, (int, str)):
+        raise ValueError
+    valor = int(valor)
+    if (minimo is not None and valor < minimo) or (maximo is not None and valor > maximo):
+        raise ValueError
+    return valor
+
+
+def _leer(datos, indice, errores):
+    """Normaliza un pedido del JSON o anota sus errores de formato; no consulta la base de datos."""
+    fallos = {}
+    if not isinstance(datos, dict):
+        errores[indice] = {"pedido": "Cada pedido debe ser un objeto."}
+        return None
+    pedido = {}
+    for campo in ("cliente", "restaurante"):
+        try:
+            pedido[campo] = _entero(datos.get(campo), minimo=1)
+        except ValueError:
+            fallos[campo] = "Debe ser un id."
+    try:
+        pedido["reserva"] = None if datos.get("reserva") is None else _entero(datos["reserva"], minimo=1)
+    except ValueError:
+        fallos["reserva"] = "Debe ser un id o null."
+    try:
+        fecha = datos.get("fecha")
+        pedido["fecha"] = datetime.date.fromisoformat(fecha) if fecha else datetime.date.today()
+    except (TypeError, ValueError):
+        fallos["fecha"] = "Debe ser una fecha AAAA-MM-DD."
+
+    lineas = datos.get("lineas")
+    maximo = getattr(settings, "PEDIDOS_LINEAS_MAXIMO", 100)
+    if not isinstance(lineas, list) or not lineas:
+        fallos["lineas"] = "Debe ser una lista con al menos una línea."
+    elif len(lineas) > maximo:
+        fallos["lineas"] = f"Como mucho {maximo} líneas por pedido."
+    else:
+        pedido["lineas"] = []
+        for n, linea in enumerate(lineas):
+            if not isinstance(linea, dict):
+                fallos[f"lineas[{n}]"] = "Cada línea debe ser un objeto."
+                continue
+            leida = {}
+            for campo, minimo, maximo_campo, defecto in (
+                ("plato", 1, None, None), ("cantidad", 1, 1000, 1), ("descuento_porcentaje", 0, 100, 0),
+            ):
+                try:
+                    leida[campo] = _entero(linea.get(campo, defecto), minimo, maximo_campo)
+                except ValueError:
+                    fallos[f"lineas[{n}].{campo}"] = "Valor no válido."
+            comentario = linea.get("comentario", "")
+            if not isinstance(comentario, str) or len(comentario) > LARGO_COMENTARIO:
+                fallos[f"lineas[{n}].comentario"] = f"Texto de {LARGO_COMENTARIO} caracteres como mucho."
+            leida["comentario"] = comentario
+            pedido["lineas"].append(leida)
+
+    if fallos:
+        errores[indice] = fallos
+        return None
+    return pedido
+
+
+def _comprobar_referencias(pedidos, errores):
+    """Valida los ids de todo el lote con una consulta por tabla; devuelve los precios de los platos."""
+    ids_platos = {linea["plato"] for p in pedidos.values() for linea in p["lineas"]}
+    platos = {
+        fila["id"]: (fila["precio"], fila["restaurante_id"])
+        for fila in Plato.objects.filter(pk__in=ids_platos).values("id", "precio", "restaurante_id")
+    }
+    clientes = set(Cliente.objects.filter(pk__in={p["cliente"] for p in pedidos.values()}).values_list("pk", flat=True))
+    restaurantes = set(
+        Restaurante.objects.filter(pk__in={p["restaurante"] for p in pedidos.values()}).values_list("pk", flat=True)
+    )
+    ids_reservas = {p["reserva"] for p in pedidos.values() if p["reserva"] is not None}
+    reservas = {
+        fila["id"]: fila
+        for fila in Reserva.objects.filter(pk__in=ids_reservas).values("id", "mesa__restaurante_id", "pedido")
+    } if ids_reservas else {}
+
+    reservas_usadas = set()
+    for indice, pedido in pedidos.items():
+        fallos = {}
+        if pedido["cliente"] not in clientes:
+            fallos["cliente"] = "No existe."
+        if pedido["restaurante"] not in restaurantes:
+            fallos["restaurante"] = "No existe."
+        reserva = reservas.get(pedido["reserva"])
+        if pedido["reserva"] is not None:
+            if reserva is None:
+                fallos["reserva"] = "No existe."
+            elif reserva["pedido"] is not None or pedido["reserva"] in reservas_usadas:
+                fallos["reserva"] = "Ya tiene un pedido."
+            elif reserva["mesa__restaurante_id"] != pedido["restaurante"]:
+                fallos["reserva"] = "Es de otro restaurante."
+            reservas_usadas.add(pedido["reserva"])
+        for n, linea in enumerate(pedido["lineas"]):
+            plato = platos.get(linea["plato"])
+            if plato is None:
+                fallos[f"lineas[{n}].plato"] = "No existe."
+            elif plato[1] != pedido["restaurante"]:
+                fallos[f"lineas[{n}].plato"] = "Es de otro restaurante."
+        if fallos:
+            errores[indice] = fallos
+    return {id: precio for id, (precio, _) in platos.items()}
+
+
+def registrar_pedidos(datos, creado_por=None) -> list:
+    """Guarda los pedidos del lote (todos o ninguno) y los devuelve con ``pk``, ``total`` y ``num_lineas``.
+
+    Cada pedido es ``{"cliente", "restaurante", "reserva"?, "fecha"?, "lineas":
+    [{"plato", "cantidad"?, "descuento_porcentaje"?, "comentario"?}]}``. Lanza
+    ``PedidoInvalido`` con los errores de todos los pedidos a la vez.
+    """
+    maximo = getattr(settings, "PEDIDOS_LOTE_MAXIMO", 500)
+    if not isinstance(datos, list) or not datos:
+        raise PedidoInvalido({"lote": "Debe ser una lista con al menos un pedido."})
+    if len(datos) > maximo:
+        raise PedidoInvalido({"lote": f"Como mucho {maximo} pedidos por lote."})
+
+    errores = {}
+    leidos = {}
+    for indice, pedido in enumerate(datos):
+        leido = _leer(pedido, indice, errores)
+        if leido is not None:
+            leidos[indice] = leido
+
+    with transaction.atomic():
+        # Los precios se leen dentro de la transacción: el total y las líneas
+        # usan el mismo precio aunque alguien edite el plato a la vez. Los
+        # pedidos mal formados no se consultan, pero sus errores se devuelven
+        # junto con los del resto del lote.
+        precios = _comprobar_referencias(leidos, errores)
+        if errores:
+            raise PedidoInvalido(errores)
+
+        pedidos, lineas_por_pedido = [], []
+        for leido in leidos.values():
+            lineas = [
+                LineaPedido(
+                    plato_id=linea["plato"], cantidad=linea["cantidad"], precio_unitario=precios[linea["plato"]],
+                    descuento_porcentaje=linea["descuento_porcentaje"], comentario=linea["comentario"],
+                )
+                for linea in leido["lineas"]
+            ]
+            pedido = Pedido(
+                cliente_id=leido["cliente"], restaurante_id=leido["restaurante"], reserva_id=leido["reserva"],
+                fecha=leido["fecha"], creado_por=creado_por,
+                total=sum(
+                    (importe_linea(l.precio_unitario, l.cantidad, l.descuento_porcentaje) for l in lineas), Decimal("0")
+                ),
+            )
+            pedido.num_lineas = len(lineas)
+            pedidos.append(pedido)
+            lineas_por_pedido.append(lineas)
+
+        # SQLite (>= 3.35) y PostgreSQL devuelven los ids con RETURNING
+        Pedido.objects.bulk_create(pedidos)
+        todas = []
+        for pedido, lineas in zip(pedidos, lineas_por_pedido):
+            for linea in lineas:
+                linea.pedido = pedido
+            todas.extend(lineas)
+        LineaPedido.objects.bulk_create(todas)
+
+        resumen = defaultdict(lambda: [0, Decimal("0"), 0, 0])
+        for pedido, lineas in zip(pedidos, lineas_por_pedido):
+            delta = resumen[(pedido.restaurante_id, pedido.fecha)]
+            delta[0] += 1
+            delta[1] += pedido.total
+            delta[2] += len(lineas)
+            delta[3] += sum(l.cantidad for l in lineas)
+        for (restaurante_id, fecha), (n, total, lineas, unidades) in resumen.items():
+            ventas.aplicar(restaurante_id, fecha, pedidos=n, total=total, lineas=lineas, unidades=unidades)
+        estadisticas.recalcular({pedido.cliente_id for pedido in pedidos})
+    return pedidos
@@ -0,0 +1,104 @@
+"""Caché de permisos y rol de cada usuario, compartida entre peticiones.
+
+``ModelBackend`` vuelve a leer de la base de datos los permisos del usuario y
+de sus grupos en cada petición (solo los guarda en el propio objeto usuario,
+que dura lo que la petición). ``BackendPermisosCacheados`` los guarda en la
+caché de Django junto con los nombres de los grupos, con los que se calcula el
+rol que se muestra en la cabecera.
+
+La invalidación es por versiones (ver ``versiones.py``): la clave de cada
+usuario incluye un testigo propio y otro global. Cambiar los grupos o
+permisos de un usuario renueva el suyo; cambiar los permisos de un grupo (o
+borrar grupos o permisos) renueva el global, lo que descarta a la vez las
+entradas de todos los usuarios. Los receptores están en ``signals.py``.
+"""
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+
+from . import versiones
+from .models import Usuario
+
+_VERSION_GLOBAL = "permisos:version"
+
+
+def _clave_version(usuario_id):
+    return f"permisos:version:{usuario_id}"
+
+
+def _segundos():
+    return getattr(settings, "PERMISOS_CACHE_SEGUNDOS", 300)
+
+
+def invalidar_usuario(usuario_id):
+    versiones.renovar(_clave_version(usuario_id))
+
+
+def invalidar_todos():
+    versiones.renovar(_VERSION_GLOBAL)
+
+
+def _nombres_permisos(qs):
+    return {f"{ct}.{name}" for ct, name in qs.values_list("content_type__app_label", "codename")}
+
+
+def datos_de_usuario(usuario):
+    """Permisos propios, permisos de grupo y nombres de grupo de ``usuario``, desde la caché."""
+    if hasattr(usuario, "_datos_permisos"):
+        return usuario._datos_permisos
+    clave = f"permisos:{usuario.pk}:{versiones.leer(_VERSION_GLOBAL, _clave_version(usuario.pk))}"
+    datos = cache.get(clave)
+    if datos is None:
+        grupos = list(usuario.groups.values_list("name", flat=True))
+        datos = {
+            "usuario": _nombres_permisos(usuario.user_permissions.all()),
+            "grupo": _nombres_permisos(Permission.objects.filter(group__user=usuario)),
+            "grupos": grupos,
+        }
+        cache.set(clave, datos, _segundos())
+    usuario._datos_permisos = datos
+    return datos
+
+
+def rol_de(usuario) -> str:
+    """Etiqueta del rol: la del grupo si pertenece a uno de ``Usuario.GRUPOS_POR_ROL``, si no la de ``rol``."""
+    grupos = set(datos_de_usuario(usuario)["grupos"])
+    etiquetas = dict(Usuario.ROL_CHOICES)
+    for rol, grupo in Usuario.GRUPOS_POR_ROL.items():
+        if grupo in grupos:
+            return etiquetas[rol]
+    return usuario.get_rol_display()
+
+
+class BackendPermisosCacheados(ModelBackend):
+    """``ModelBackend`` que toma los permisos de ``datos_de_usuario`` en vez de consultarlos."""
+
+    def _usable(self, usuario, obj):
+        return usuario.is_active and not usuario.is_anonymous and obj is None and usuario.pk is not None
+
+    def get_user_permissions(self, user_obj, obj=None):
+        if not self._usable(user_obj, obj):
+            return set()
+        if user_obj.is_superuser:
+            return super().get_user_permissions(user_obj, obj)
+        return set(datos_de_usuario(user_obj)["usuario"])
+
+    def get_group_permissions(self, user_obj, obj=None):
+        if not self._usable(user_obj, obj):
+            return set()
+        if user_obj.is_superuser:
+            return super().get_group_permissions(user_obj, obj)
+        return set(datos_de_usuario(user_obj)["grupo"])
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not self._usable(user_obj, obj):
+            return set()
+        if user_obj.is_superuser:
+            # has_perm() ya responde True sin llegar aquí; esto solo lo usan listados de permisos
+            return super().get_all_permissions(user_obj, obj)
+        if not hasattr(user_obj, "_perm_cache"):
+            datos = datos_de_usuario(user_obj)
+            user_obj._perm_cache = set(datos["usuario"]) | set(datos["grupo"])
+        return user_obj._perm_cache
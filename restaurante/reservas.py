@@ -0,0 +1,96 @@
+"""Servicio de reservas seguro ante peticiones concurrentes.
+
+La comprobación ``exists()`` del formulario no basta cuando llegan varias
+peticiones a la vez: dos pueden pasarla y guardar las dos. Aquí la reserva se
+hace dentro de una transacción que primero *reclama* la mesa con un UPDATE
+(bloquea la fila en bases de datos con bloqueo por filas y toma el cerrojo de
+escritura en SQLite), de modo que la comprobación de disponibilidad y el INSERT
+(o el UPDATE, al editar una reserva) se ejecutan en serie para esa mesa. La
+restricción única ``reserva_mesa_fecha_hora_unica`` queda como última red de
+seguridad.
+"""
+
+import random
+import time
+
+from django.db import IntegrityError, OperationalError, transaction
+
+from .disponibilidad import mesa_disponible
+from .models import Mesa, Reserva
+
+RESTRICCION = "reserva_mesa_fecha_hora_unica"
+INTENTOS_MAXIMOS = 5
+ESPERA_BASE = 0.05  # segundos; se dobla en cada reintento
+
+
+class MesaNoDisponible(Exception):
+    """La mesa está inactiva u ocupada en esa franja horaria."""
+
+
+def _reclamar_mesa(mesa_id: int) -> bool:
+    """UPDATE sin cambios reales que bloquea la mesa hasta el fin de la transacción.
+
+    Devuelve ``False`` si la mesa no existe o no está activa.
+    """
+    return Mesa.objects.filter(pk=mesa_id, activa=True).update(activa=True) == 1
+
+
+def _choque_de_reserva(exc: IntegrityError) -> bool:
+    """Si ``exc`` es la violación de ``RESTRICCION``: cualquier otra no se arregla reintentando."""
+    mensaje = str(exc)
+    if RESTRICCION in mensaje:
+        return True
+    # SQLite no da el nombre, solo "UNIQUE constraint failed: tabla.col1, tabla.col2, ..."
+    restriccion = next(c for c in Reserva._meta.constraints if c.name == RESTRICCION)
+    tabla = Reserva._meta.db_table
+    columnas = ", ".join(f"{tabla}.{Reserva._meta.get_field(campo).column}" for campo in restriccion.fields)
+    return mensaje == f"UNIQUE constraint failed: {columnas}"
+
+
+def reservar_mesa(cliente, mesa, fecha, hora, notas="", creado_por=None, estado="pendiente", reserva=None):
+    """Crea la reserva o lanza ``MesaNoDisponible``.
+
+    Con ``reserva`` se edita esa reserva en vez de crear otra, por el mismo
+    camino: la propia reserva no cuenta como ocupación y ``creado_por`` no se
+    cambia.
+
+    Reintenta con espera exponencial cuando SQLite devuelve "database is
+    locked" o cuando otra transacción ganó la carrera y saltó la restricción
+    única (en el reintento la comprobación ya verá esa reserva); cualquier
+    otro ``IntegrityError`` se relanza. No debe llamarse dentro de otra
+    transacción: el reintento necesita empezar de cero.
+    """
+    mesa_id = mesa.pk if hasattr(mesa, "pk") else mesa
+    for intento in range(INTENTOS_MAXIMOS):
+        try:
+            with transaction.atomic():
+                if not _reclamar_mesa(mesa_id):
+                    raise MesaNoDisponible("La mesa no existe o no está activa.")
+                if not mesa_disponible(Mesa(pk=mesa_id), fecha, hora, excluir=reserva):
+                    raise MesaNoDisponible("La mesa ya está reservada en esa franja horaria.")
+                if reserva is None:
+                    return Reserva.objects.create(
+                        cliente=cliente,
+                        mesa_id=mesa_id,
+                        fecha=fecha,
+                        hora=hora,
+                        estado=estado,
+                        notas=notas,
+                        creado_por=creado_por,
+                    )
+                reserva.cliente = cliente
+                reserva.mesa_id = mesa_id
+                reserva.fecha = fecha
+                reserva.hora = hora
+                reserva.estado = estado
+                reserva.notas = notas
+                reserva.save()
+                return reserva
+        except (IntegrityError, OperationalError) as exc:
+            if isinstance(exc, OperationalError) and "locked" not in str(exc):
+                raise
+            if isinstance(exc, IntegrityError) and not _choque_de_reserva(exc):
+                raise
+            if intento == INTENTOS_MAXIMOS - 1:
+                raise MesaNoDisponible("No se pudo confirmar la reserva, inténtalo de nuevo.") from exc
+            time.sleep(ESPERA_BASE * (2 ** intento) * random.uniform(0.5, 1.5))
@@ -0,0 +1,10 @@
+def actualizar_sesion(request, **valores):
+    """Guarda en la sesión solo los valores que cambian.
+
+    Asignar una clave marca la sesión como modificada y obliga a reescribirla
+    al final de la petición (un UPDATE con el motor de base de datos) aunque el
+    valor sea el mismo; así solo se escribe cuando de verdad hay algo nuevo.
+    """
+    for clave, valor in valores.items():
+        if request.session.get(clave) != valor:
+            request.session[clave] = valor
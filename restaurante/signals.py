@@ -0,0 +1,335 @@
+"""Receptores de señales de la app.
+
+Mantienen al día las estructuras derivadas de los modelos (índices de
+búsqueda, resúmenes de ventas, estadísticas de clientes, caché de permisos, ...) cuando se guardan o
+borran objetos.
+"""
+
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.db import transaction
+from django.dispatch import receiver
+
+from . import archivo, busqueda, cache_menus, condicional, contadores, estadisticas, permisos, tablero, ventas
+from .models import (
+    Cliente, Direccion, Etiqueta, LineaPedido, Mesa, Pedido, Plato, Reserva, ReservaArchivada, Restaurante, Usuario,
+)
+
+
+# ======================= ÍNDICE DE BÚSQUEDA ========================
+
+
+@receiver(post_save, sender=Plato)
+@receiver(post_save, sender=Cliente)
+@receiver(post_save, sender=Direccion)
+@receiver(post_save, sender=Restaurante)
+def indexar_objeto(sender, instance, raw=False, **kwargs):
+    # Las cargas con loaddata (raw) se indexan después con "indexar_busqueda"
+    if not raw:
+        busqueda.indexar(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Plato)
+@receiver(post_delete, sender=Cliente)
+@receiver(post_delete, sender=Direccion)
+@receiver(post_delete, sender=Restaurante)
+def desindexar_objeto(sender, instance, **kwargs):
+    busqueda.desindexar(sender, [instance.pk])
+
+
+@receiver(m2m_changed, sender=Plato.etiquetas.through)
+def indexar_etiquetas_plato(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # etiqueta.plato_set.clear() no informa de los platos afectados
+        instance._platos_antes_de_clear = list(instance.plato_set.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if not reverse:
+            busqueda.indexar(Plato, [instance.pk])
+        elif action == "post_clear":
+            busqueda.indexar(Plato, getattr(instance, "_platos_antes_de_clear", []))
+        else:
+            busqueda.indexar(Plato, pk_set)
+
+
+@receiver(post_save, sender=Etiqueta)
+def indexar_platos_de_etiqueta(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        busqueda.indexar(Plato, instance.plato_set.values_list("pk", flat=True))
+
+
+@receiver(pre_delete, sender=Etiqueta)
+def recordar_platos_de_etiqueta(sender, instance, **kwargs):
+    instance._platos_indexados = list(instance.plato_set.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Etiqueta)
+def reindexar_platos_de_etiqueta(sender, instance, **kwargs):
+    busqueda.indexar(Plato, getattr(instance, "_platos_indexados", []))
+
+
+@receiver(post_save, sender=Direccion)
+def indexar_restaurante_de_direccion(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        busqueda.indexar(Restaurante, Restaurante.objects.filter(direccion=instance).values_list("pk", flat=True))
+
+
+# ======================= RESUMEN DE VENTAS ========================
+
+
+@receiver(pre_save, sender=Pedido)
+def ventas_pedido_antes_de_guardar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        ventas.pedido_antes_de_guardar(instance)
+
+
+@receiver(post_save, sender=Pedido)
+def ventas_pedido_guardado(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        ventas.pedido_guardado(instance, created)
+
+
+@receiver(pre_delete, sender=Pedido)
+def ventas_pedido_antes_de_borrar(sender, instance, **kwargs):
+    ventas.pedido_antes_de_borrar(instance)
+
+
+@receiver(post_delete, sender=Pedido)
+def ventas_pedido_borrado(sender, instance, **kwargs):
+    ventas.pedido_borrado(instance)
+
+
+@receiver(pre_save, sender=LineaPedido)
+def ventas_linea_antes_de_guardar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        ventas.linea_antes_de_guardar(instance)
+
+
+@receiver(post_save, sender=LineaPedido)
+def ventas_linea_guardada(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        ventas.linea_guardada(instance, created)
+
+
+@receiver(post_delete, sender=LineaPedido)
+def ventas_linea_borrada(sender, instance, **kwargs):
+    ventas.linea_borrada(instance)
+
+
+# ======================= CACHÉ DE PERMISOS ========================
+
+
+@receiver(m2m_changed, sender=Usuario.groups.through)
+@receiver(m2m_changed, sender=Usuario.user_permissions.through)
+def permisos_usuario_cambiados(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        permisos.invalidar_usuario(instance.pk)
+    elif pk_set:
+        # grupo.user_set.add(...) / permiso.user_set.remove(...)
+        for usuario_id in pk_set:
+            permisos.invalidar_usuario(usuario_id)
+    else:
+        permisos.invalidar_todos()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def permisos_grupo_cambiados(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        permisos.invalidar_todos()
+
+
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+@receiver(post_save, sender=Group)
+def grupo_o_permiso_cambiado(sender, **kwargs):
+    # Un grupo renombrado cambia el rol mostrado; uno borrado, los permisos
+    permisos.invalidar_todos()
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def usuario_cambiado(sender, instance, update_fields=None, **kwargs):
+    # is_superuser, is_active o rol; el login solo guarda last_login
+    if update_fields is None or set(update_fields) != {"last_login"}:
+        permisos.invalidar_usuario(instance.pk)
+
+
+# ===================== CONTADORES DE CABECERA =====================
+
+
+@receiver(post_save, sender=Reserva)
+@receiver(post_delete, sender=Reserva)
+def reserva_cambiada(sender, **kwargs):
+    # Tras el commit, para que nadie vuelva a cachear el valor anterior
+    transaction.on_commit(contadores.invalidar_reservas_activas)
+
+
+# ===================== TABLERO DE RESERVAS EN DIRECTO =====================
+
+
+@receiver(post_save, sender=Reserva)
+def tablero_reserva_guardada(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        # Tras el commit: el evento no debe anunciar algo que luego se deshace.
+        # robust: si falla el aviso, la reserva ya está guardada y no debe
+        # parecer un error (reservar_mesa reintentaría una reserva hecha)
+        transaction.on_commit(lambda: tablero.avisar_cambio(instance.pk, created), robust=True)
+
+
+@receiver(post_delete, sender=Reserva)
+def tablero_reserva_borrada(sender, instance, **kwargs):
+    reserva_id, restaurante_id = instance.pk, tablero.restaurante_de(instance)
+    transaction.on_commit(lambda: tablero.avisar_borrado(reserva_id, restaurante_id), robust=True)
+
+
+# ============ PETICIONES CONDICIONALES Y CACHÉ DE MENÚS PÚBLICOS ============
+# Un solo toque por restaurante (Restaurante.updated_at) que leen la ETag y la
+# caché de páginas; ver condicional.py y cache_menus.py
+
+
+@receiver(post_save, sender=Plato)
+@receiver(post_delete, sender=Plato)
+@receiver(post_save, sender=Mesa)
+@receiver(post_delete, sender=Mesa)
+def restaurante_hijo_cambiado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        condicional.tocar_restaurantes([instance.restaurante_id])
+
+
+@receiver(post_save, sender=Direccion)
+def restaurante_direccion_cambiada(sender, instance, created, raw=False, **kwargs):
+    # Al borrarla se borra su restaurante en cascada, que ya cuenta en los listados
+    if not (created or raw):
+        condicional.tocar_restaurantes(Restaurante.objects.filter(direccion=instance).values_list("pk", flat=True))
+
+
+@receiver(m2m_changed, sender=Restaurante.clientes_frecuentes.through)
+def restaurante_clientes_frecuentes_cambiados(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # cliente.restaurantes_favoritos.clear() no informa de los restaurantes afectados
+        instance._favoritos_antes_de_clear = list(instance.restaurantes_favoritos.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove"):
+        condicional.tocar_restaurantes(pk_set if reverse else [instance.pk])
+    elif action == "post_clear":
+        condicional.tocar_restaurantes(instance._favoritos_antes_de_clear if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(pre_delete, sender=Cliente)
+def restaurante_cliente_cambiado(sender, instance, created=False, raw=False, **kwargs):
+    # Las fichas muestran nombre y email de los clientes frecuentes
+    if not (created or raw):
+        condicional.tocar_restaurantes(instance.restaurantes_favoritos.values_list("pk", flat=True))
+
+
+@receiver(post_save, sender=Etiqueta)
+@receiver(post_delete, sender=Etiqueta)
+@receiver(m2m_changed, sender=Plato.etiquetas.through)
+def menu_etiquetas_cambiadas(sender, action=None, **kwargs):
+    if action in (None, "post_add", "post_remove", "post_clear"):
+        cache_menus.tocar_todo()
+
+
+# ===================== CONTADORES DE RESTAURANTE =====================
+# Las cargas con loaddata (raw) se cuentan después con "reconciliar_contadores"
+
+
+@receiver(pre_save, sender=Plato)
+def contador_plato_antes_de_guardar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        contadores.plato_antes_de_guardar(instance)
+
+
+@receiver(post_save, sender=Plato)
+def contador_plato_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        contadores.plato_guardado(instance)
+
+
+@receiver(post_delete, sender=Plato)
+def contador_plato_borrado(sender, instance, **kwargs):
+    contadores.plato_borrado(instance)
+
+
+@receiver(pre_save, sender=Mesa)
+def contador_mesa_antes_de_guardar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        contadores.mesa_antes_de_guardar(instance)
+
+
+@receiver(post_save, sender=Mesa)
+def contador_mesa_guardada(sender, instance, raw=False, **kwargs):
+    if not raw:
+        contadores.mesa_guardada(instance)
+
+
+@receiver(post_delete, sender=Mesa)
+def contador_mesa_borrada(sender, instance, **kwargs):
+    contadores.mesa_borrada(instance)
+
+
+@receiver(pre_save, sender=Reserva)
+def contador_reserva_antes_de_guardar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        contadores.reserva_antes_de_guardar(instance)
+
+
+@receiver(post_save, sender=Reserva)
+def contador_reserva_guardada(sender, instance, raw=False, **kwargs):
+    if not raw:
+        contadores.reserva_guardada(instance, tablero.restaurante_de(instance))
+
+
+@receiver(post_delete, sender=Reserva)
+def contador_reserva_borrada(sender, instance, **kwargs):
+    contadores.reserva_borrada(instance, tablero.restaurante_de(instance))
+
+
+@receiver(m2m_changed, sender=Restaurante.clientes_frecuentes.through)
+def contador_clientes_frecuentes(sender, instance, action, reverse, pk_set, **kwargs):
+    contadores.favoritos_cambiados(instance, action, reverse, pk_set)
+
+
+@receiver(pre_delete, sender=Cliente)
+def contador_cliente_antes_de_borrar(sender, instance, **kwargs):
+    contadores.cliente_antes_de_borrar(instance)
+
+
+# ===================== ESTADÍSTICAS DE CLIENTES =====================
+
+
+@receiver(pre_save, sender=Pedido)
+def estadistica_pedido_antes_de_guardar(sender, instance, raw=False, **kwargs):
+    if not raw:
+        estadisticas.pedido_antes_de_guardar(instance)
+
+
+@receiver(post_save, sender=Pedido)
+def estadistica_pedido_guardado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        estadisticas.pedido_guardado(instance)
+
+
+@receiver(post_delete, sender=Pedido)
+def estadistica_pedido_borrado(sender, instance, **kwargs):
+    estadisticas.pedido_borrado(instance)
+
+
+@receiver(pre_delete, sender=Cliente)
+def estadistica_cliente_antes_de_borrar(sender, instance, **kwargs):
+    estadisticas.clientes_en_borrado().add(instance.pk)
+
+
+@receiver(post_delete, sender=Cliente)
+def estadistica_cliente_borrado(sender, instance, **kwargs):
+    estadisticas.clientes_en_borrado().discard(instance.pk)
+
+
+# ===================== ARCHIVO =====================
+
+
+@receiver(post_delete, sender=Reserva)
+@receiver(post_delete, sender=ReservaArchivada)
+def soltar_reserva_de_pedidos_archivados(sender, instance, **kwargs):
+    archivo.soltar_reservas([instance.pk])
@@ -59,6 +59,49 @@
 		}
 	}, true);
 
+	// Select con data-autocompletar (AutocompletarField): solo traen las
+	// opciones elegidas; un buscador encima pide el resto al escribir.
+	function prepararAutocompletar(select) {
+		const buscador = document.createElement('input');
+		buscador.type = 'search';
+		buscador.className = 'form-control form-control-sm mb-1';
+		buscador.placeholder = 'Escribe para buscar…';
+		select.parentNode.insertBefore(buscador, select);
+
+		let espera = null;
+		let peticion = null;
+		buscador.addEventListener('input', function () {
+			clearTimeout(espera);
+			espera = setTimeout(async function () {
+				const texto = buscador.value.trim();
+				if (texto.length < 2) return;
+				const url = new URL(select.getAttribute('data-autocompletar'), window.location.href);
+				url.searchParams.set('q', texto);
+				if (peticion) peticion.abort();
+				peticion = new AbortController();
+				try {
+					const resp = await fetch(url, { credentials: 'same-origin', signal: peticion.signal });
+					if (!resp.ok) return;
+					const datos = await resp.json();
+					// Se quitan las no elegidas y se añaden los resultados nuevos
+					Array.from(select.options).forEach(function (op) {
+						if (!op.selected && op.value !== '') op.remove();
+					});
+					const presentes = new Set(Array.from(select.options).map(function (op) { return op.value; }));
+					datos.resultados.forEach(function (r) {
+						if (!presentes.has(String(r.id))) select.add(new Option(r.texto, r.id));
+					});
+				} catch (err) {
+					if (err.name !== 'AbortError') console.error(err);
+				}
+			}, 250);
+		});
+	}
+
+	document.addEventListener('DOMContentLoaded', function () {
+		document.querySelectorAll('select[data-autocompletar]').forEach(prepararAutocompletar);
+	});
+
 })();
 
 function confirmarBorrado(el, mensaje) {
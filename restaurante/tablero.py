@@ -0,0 +1,211 @@
+"""Tablero de reservas en directo: eventos por restaurante enviados por SSE.
+
+Las señales de ``Reserva`` (ver ``signals.py``) llaman a ``avisar_cambio``
+tras el commit, que publica un evento ``creada``, ``actualizada`` o
+``borrada`` en el reparto configurado en ``TABLERO_BROKER``:
+
+- ``"local"`` (``RepartoLocal``): en memoria del proceso. Cada conexión abierta
+  tiene su cola y publicar es repartir a las colas del restaurante. Solo ve
+  los cambios hechos en el mismo proceso, así que sirve con un único proceso
+  ASGI.
+- ``"bd"`` (``RepartoBD``): los eventos se guardan en ``EventoTablero`` y cada
+  conexión consulta los nuevos cada ``TABLERO_INTERVALO_BD`` segundos. Hace
+  de sustituto de un pub/sub externo cuando hay varios procesos o los cambios
+  llegan desde comandos.
+
+Los ids de evento crecen, así que una conexión que se corta puede pedir lo
+que se perdió con la cabecera ``Last-Event-ID`` (en el reparto local, dentro
+de los últimos ``HISTORIAL`` eventos de cada restaurante).
+"""
+
+import asyncio
+import datetime
+import itertools
+import json
+import threading
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Max
+from django.utils import timezone
+
+from .asincrono import alistar
+from .models import EventoTablero, Mesa, Reserva
+
+CREADA = "creada"
+ACTUALIZADA = "actualizada"
+BORRADA = "borrada"
+HISTORIAL = 200
+
+
+def _segundos(nombre, defecto):
+    return getattr(settings, nombre, defecto)
+
+
+class RepartoLocal:
+    """Pub/sub en memoria: una cola ``asyncio`` por conexión abierta."""
+
+    def __init__(self):
+        self._cerrojo = threading.Lock()
+        self._ids = itertools.count(1)
+        self._historial = defaultdict(lambda: deque(maxlen=HISTORIAL))
+        self._colas = defaultdict(set)
+
+    def publicar(self, restaurante_id, datos):
+        # Se llama desde hilos síncronos: las colas se rellenan desde su bucle
+        with self._cerrojo:
+            evento = {"id": next(self._ids), **datos}
+            self._historial[restaurante_id].append(evento)
+            suscritas = list(self._colas[restaurante_id])
+        for bucle, cola in suscritas:
+            bucle.call_soon_threadsafe(cola.put_nowait, evento)
+        return evento
+
+    async def escuchar(self, restaurante_id, desde=None, espera: float = 15):
+        """Eventos del restaurante según llegan; ``None`` si pasan ``espera`` segundos sin ninguno."""
+        suscripcion = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._cerrojo:
+            self._colas[restaurante_id].add(suscripcion)
+            perdidos = [e for e in self._historial[restaurante_id] if desde is not None and e["id"] > desde]
+        ultimo = desde or 0
+        try:
+            for evento in perdidos:
+                ultimo = evento["id"]
+                yield evento
+            while True:
+                try:
+                    evento = await asyncio.wait_for(suscripcion[1].get(), espera)
+                except TimeoutError:
+                    yield None
+                    continue
+                # Lo publicado mientras se leía el historial llega también por la cola
+                if evento["id"] > ultimo:
+                    ultimo = evento["id"]
+                    yield evento
+        finally:
+            with self._cerrojo:
+                self._colas[restaurante_id].discard(suscripcion)
+
+
+class RepartoBD:
+    """Eventos en la tabla ``EventoTablero``, leídos por sondeo."""
+
+    def publicar(self, restaurante_id, datos):
+        fila = EventoTablero.objects.create(restaurante_id=restaurante_id, datos=datos)
+        if fila.pk % 100 == 0:
+            EventoTablero.objects.filter(creado__lt=timezone.now() - datetime.timedelta(hours=1)).delete()
+        return {"id": fila.pk, **datos}
+
+    async def escuchar(self, restaurante_id, desde=None, espera: float = 15):
+        intervalo = _segundos("TABLERO_INTERVALO_BD", 1.0)
+        eventos = EventoTablero.objects.filter(restaurante_id=restaurante_id)
+        if desde is None:
+            desde = (await eventos.aaggregate(m=Max("id")))["m"] or 0
+        sin_eventos = 0.0
+        while True:
+            filas = await alistar(eventos.filter(id__gt=desde).order_by("id")[:100])
+            for fila in filas:
+                desde = fila.pk
+                yield {"id": fila.pk, **fila.datos}
+            if filas:
+                sin_eventos = 0.0
+                continue
+            await asyncio.sleep(intervalo)
+            sin_eventos += intervalo
+            if sin_eventos >= espera:
+                sin_eventos = 0.0
+                yield None
+
+
+REPARTOS = {"local": RepartoLocal, "bd": RepartoBD}
+_repartos = {}
+
+
+def reparto():
+    nombre = _segundos("TABLERO_BROKER", "local")
+    if nombre not in _repartos:
+        _repartos[nombre] = REPARTOS[nombre]()
+    return _repartos[nombre]
+
+
+# ----------------------------------------------------------------------------
+# Eventos de reservas
+# ----------------------------------------------------------------------------
+
+CAMPOS = ("id", "fecha", "hora", "estado", "notas", "mesa_id", "mesa__numero", "mesa__restaurante_id", "cliente__nombre")
+
+
+def _datos(fila):
+    return {
+        "reserva": fila["id"],
+        "fecha": fila["fecha"].isoformat(),
+        "hora": fila["hora"].strftime("%H:%M"),
+        "estado": fila["estado"],
+        "notas": fila["notas"],
+        "mesa": fila["mesa__numero"],
+        "cliente": fila["cliente__nombre"],
+    }
+
+
+def avisar_cambio(reserva_id, creada: bool):
+    """Publica el estado actual de la reserva (una consulta); pensado para ``on_commit``."""
+    fila = Reserva.objects.filter(pk=reserva_id).values(*CAMPOS).first()
+    if fila is not None:
+        reparto().publicar(fila["mesa__restaurante_id"], {"tipo": CREADA if creada else ACTUALIZADA, **_datos(fila)})
+
+
+def avisar_borrado(reserva_id, restaurante_id):
+    if restaurante_id is not None:
+        reparto().publicar(restaurante_id, {"tipo": BORRADA, "reserva": reserva_id})
+
+
+def restaurante_de(reserva):
+    """Restaurante de la reserva sin consultar si la mesa ya está cargada."""
+    if Reserva.mesa.is_cached(reserva):
+        return reserva.mesa.restaurante_id
+    return Mesa.objects.filter(pk=reserva.mesa_id).values_list("restaurante_id", flat=True).first()
+
+
+def reservas_del_dia(restaurante_id, fecha):
+    """Filas iniciales del tablero, en el mismo formato que los eventos."""
+    filas = (
+        Reserva.objects.filter(mesa__restaurante_id=restaurante_id, fecha=fecha)
+        .order_by("hora", "mesa__numero").values(*CAMPOS)
+    )
+    return [_datos(f) for f in filas]
+
+
+# ----------------------------------------------------------------------------
+# Flujo SSE
+# ----------------------------------------------------------------------------
+
+
+def formato_sse(evento) -> str:
+    datos = json.dumps(evento, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+
+async def flujo_sse(restaurante_id, desde=None, segundos=None):
+    """Texto SSE de los eventos del restaurante durante ``segundos`` como mucho.
+
+    Manda un comentario de latido cada ``TABLERO_LATIDO_SEGUNDOS`` para que
+    los proxies no corten la conexión por inactividad. Al terminar, el
+    navegador se reconecta con ``Last-Event-ID`` y no se pierde nada.
+    """
+    bucle = asyncio.get_running_loop()
+    if segundos is None:
+        segundos = _segundos("TABLERO_SSE_SEGUNDOS", 300)
+    fin = bucle.time() + segundos
+    latido = _segundos("TABLERO_LATIDO_SEGUNDOS", 15)
+    yield "retry: 3000\n\n"
+    eventos = reparto().escuchar(restaurante_id, desde, espera=min(latido, max(segundos, 0.01)))
+    try:
+        while bucle.time() < fin:
+            try:
+                evento = await asyncio.wait_for(anext(eventos), max(fin - bucle.time(), 0))
+            except TimeoutError:
+                break
+            yield ": latido\n\n" if evento is None else formato_sse(evento)
+    finally:
+        await eventos.aclose()
@@ -0,0 +1,307 @@
+"""Cola de tareas en segundo plano guardada en la base de datos.
+
+Lo que no cabe en una petición (borrar un restaurante con toda su historia,
+exportaciones grandes, reconstruir estadísticas, resúmenes de ventas o
+contadores) se encola como una fila de ``Tarea`` con ``encolar`` y la vista
+responde enseguida con la página de estado de la tarea. El comando
+``trabajar_tareas`` arranca uno o varios procesos que las van ejecutando:
+
+- ``tomar`` reserva una tarea con un ``UPDATE`` condicionado a su estado, así
+  que dos trabajadores no pueden llevarse la misma. La reserva dura
+  ``TAREAS_BLOQUEO_SEGUNDOS`` y cada ``avanzar`` la renueva; si el proceso
+  muere, al caducar la retoma otro. Por eso las tareas tienen que poder
+  repetirse: las de aquí trabajan por tramos y siguen donde se quedaron.
+- Si la tarea lanza una excepción se reintenta hasta ``max_intentos`` veces,
+  la primera a los ``TAREAS_ESPERA_REINTENTO`` segundos y luego el doble cada
+  vez; después queda ``fallida`` con la traza en ``error``.
+- ``avanzar`` guarda el progreso (``hechos`` de ``total`` y un mensaje) que
+  enseña la vista ``tarea_estado``.
+- Con la cola vacía, como mucho una vez cada ``LIMPIEZA_CADA`` segundos, los
+  trabajadores borran de ``TAREAS_DIR`` las exportaciones de más de
+  ``TAREAS_CONSERVAR_DIAS`` días (``limpiar_ficheros``) y dejan encolada para
+  la próxima medianoche la reconciliación de contadores
+  (``programar_reconciliacion``).
+
+No hace falta ningún servicio aparte: la cola es una tabla más de SQLite y,
+con WAL, las consultas de los trabajadores no frenan a las peticiones.
+
+Cada tipo es una función registrada con ``@tarea("tipo")`` que recibe la
+``Tarea`` y sus ``parametros`` y devuelve el ``resultado`` (JSON).
+"""
+
+import datetime
+import os
+import socket
+import time
+import traceback
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import borrado, contadores, estadisticas, ventas
+from .exportacion import EXPORTACIONES, generar
+from .models import Cliente, Pedido, PedidoArchivado, Restaurante, Tarea
+
+TIPOS = {}
+CANDIDATAS = 10
+LIMPIEZA_CADA = 3600
+
+
+class TareaPerdida(Exception):
+    """La reserva de la tarea caducó y ahora la tiene otro trabajador."""
+
+
+def tarea(tipo):
+    """Registra la función como el tipo de tarea ``tipo``."""
+
+    def registrar(funcion):
+        TIPOS[tipo] = funcion
+        return funcion
+
+    return registrar
+
+
+def _bloqueo():
+    return datetime.timedelta(seconds=getattr(settings, "TAREAS_BLOQUEO_SEGUNDOS", 300))
+
+
+def _lote():
+    return getattr(settings, "TAREAS_LOTE", borrado.LOTE)
+
+
+def encolar(tipo, creado_por=None, disponible_desde=None, **parametros) -> Tarea:
+    if tipo not in TIPOS:
+        raise ValueError(f"Tipo de tarea desconocido: {tipo}")
+    return Tarea.objects.create(
+        tipo=tipo, parametros=parametros, creado_por=creado_por,
+        max_intentos=getattr(settings, "TAREAS_INTENTOS", 3),
+        disponible_desde=disponible_desde or timezone.now(),
+    )
+
+
+def sin_terminar(tipo, **parametros):
+    """La tarea de ``tipo`` con esos parámetros que aún no ha terminado, si la hay."""
+    filtro = {f"parametros__{clave}": valor for clave, valor in parametros.items()}
+    return (
+        Tarea.objects.filter(tipo=tipo, estado__in=(Tarea.PENDIENTE, Tarea.EN_CURSO), **filtro)
+        .order_by("pk").first()
+    )
+
+
+# ----------------------------------------------------------------------------
+# Trabajadores
+# ----------------------------------------------------------------------------
+
+
+def nombre_trabajador() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _disponibles(ahora):
+    return (
+        Q(estado=Tarea.PENDIENTE, disponible_desde__lte=ahora)
+        | Q(estado=Tarea.EN_CURSO, bloqueada_hasta__lt=ahora, intentos__lt=F("max_intentos"))
+    )
+
+
+def tomar(trabajador: str) -> Tarea | None:
+    """Reserva para ``trabajador`` la tarea disponible más antigua."""
+    ahora = timezone.now()
+    # Las que se han quedado a medias en todos sus intentos (el proceso murió cada vez)
+    Tarea.objects.filter(
+        estado=Tarea.EN_CURSO, bloqueada_hasta__lt=ahora, intentos__gte=F("max_intentos"),
+    ).update(
+        estado=Tarea.FALLIDA, terminada=ahora, bloqueada_hasta=None,
+        error="El trabajador dejó de responder en todos los intentos.",
+    )
+    candidatas = list(
+        Tarea.objects.filter(_disponibles(ahora)).order_by("disponible_desde", "pk")
+        .values_list("pk", flat=True)[:CANDIDATAS]
+    )
+    for pk in candidatas:
+        # Si otro trabajador se la ha llevado entretanto, el UPDATE no cambia nada
+        tomada = Tarea.objects.filter(_disponibles(ahora), pk=pk).update(
+            estado=Tarea.EN_CURSO, trabajador=trabajador, intentos=F("intentos") + 1,
+            empezada=ahora, bloqueada_hasta=ahora + _bloqueo(),
+        )
+        if tomada:
+            return Tarea.objects.get(pk=pk)
+    return None
+
+
+def _propia(tarea):
+    return Tarea.objects.filter(pk=tarea.pk, estado=Tarea.EN_CURSO, trabajador=tarea.trabajador)
+
+
+def avanzar(tarea, hechos=None, total=None, mensaje=None):
+    """Guarda el progreso y renueva la reserva; lanza ``TareaPerdida`` si ya no es nuestra."""
+    cambios = {"bloqueada_hasta": timezone.now() + _bloqueo()}
+    if hechos is not None:
+        cambios["hechos"] = tarea.hechos = hechos
+    if total is not None:
+        cambios["total"] = tarea.total = total
+    if mensaje is not None:
+        cambios["mensaje"] = tarea.mensaje = mensaje[:200]
+    if not _propia(tarea).update(**cambios):
+        raise TareaPerdida(f"La tarea {tarea.pk} ya no es de {tarea.trabajador}.")
+
+
+def ejecutar(tarea: Tarea) -> str:
+    """Ejecuta una tarea ya tomada y guarda cómo ha ido; devuelve su estado."""
+    funcion = TIPOS.get(tarea.tipo)
+    ahora = timezone.now()
+    if funcion is None:
+        _propia(tarea).update(
+            estado=Tarea.FALLIDA, terminada=ahora, bloqueada_hasta=None,
+            error=f"Tipo de tarea desconocido: {tarea.tipo}",
+        )
+        return Tarea.FALLIDA
+    try:
+        resultado = funcion(tarea, **tarea.parametros)
+    except TareaPerdida:
+        return Tarea.EN_CURSO
+    except Exception:
+        error, ahora = traceback.format_exc(), timezone.now()
+        if tarea.intentos < tarea.max_intentos:
+            espera = getattr(settings, "TAREAS_ESPERA_REINTENTO", 30.0) * 2 ** (tarea.intentos - 1)
+            _propia(tarea).update(
+                estado=Tarea.PENDIENTE, error=error, trabajador="", bloqueada_hasta=None,
+                disponible_desde=ahora + datetime.timedelta(seconds=espera),
+            )
+            return Tarea.PENDIENTE
+        _propia(tarea).update(estado=Tarea.FALLIDA, error=error, terminada=ahora, bloqueada_hasta=None)
+        return Tarea.FALLIDA
+    _propia(tarea).update(
+        estado=Tarea.HECHA, resultado=resultado, mensaje="", terminada=timezone.now(), bloqueada_hasta=None,
+    )
+    return Tarea.HECHA
+
+
+def limpiar_ficheros(dias=None) -> int:
+    """Borra de ``TAREAS_DIR`` los ficheros de más de ``dias`` días (``TAREAS_CONSERVAR_DIAS``); devuelve cuántos."""
+    dias = getattr(settings, "TAREAS_CONSERVAR_DIAS", 7) if dias is None else dias
+    limite = time.time() - dias * 86400
+    borrados = 0
+    try:
+        entradas = list(os.scandir(settings.TAREAS_DIR))
+    except FileNotFoundError:
+        return 0
+    for entrada in entradas:
+        try:
+            if entrada.is_file() and entrada.stat().st_mtime < limite:
+                os.remove(entrada.path)
+                borrados += 1
+        except FileNotFoundError:
+            # Lo ha borrado otro trabajador a la vez
+            continue
+    return borrados
+
+
+def programar_reconciliacion():
+    """Encola ``reconciliar_contadores`` para la próxima medianoche si no lo está ya.
+
+    ``num_reservas_abiertas`` solo cuenta reservas de hoy en adelante, y al
+    cambiar de día las de ayer siguen contadas hasta que se reconcilia. Si dos
+    trabajadores la encolan a la vez, reconciliar dos veces no hace daño.
+    """
+    manana = datetime.datetime.combine(datetime.date.today() + datetime.timedelta(days=1), datetime.time.min)
+    programada = Tarea.objects.filter(
+        tipo="reconciliar_contadores", estado=Tarea.PENDIENTE, disponible_desde__gte=manana,
+    ).exists()
+    if not programada:
+        encolar("reconciliar_contadores", disponible_desde=manana)
+
+
+def trabajar(trabajador=None, una_vez=False, espera=None, parar=None, aviso=None) -> int:
+    """Toma y ejecuta tareas hasta que ``parar()`` sea cierto; devuelve cuántas ha ejecutado.
+
+    Con ``una_vez`` vuelve en cuanto no queda ninguna disponible; si no, espera
+    ``espera`` segundos (``TAREAS_ESPERA``) y vuelve a mirar. ``aviso(tarea,
+    estado)`` se llama al terminar cada una.
+    """
+    trabajador = trabajador or nombre_trabajador()
+    espera = getattr(settings, "TAREAS_ESPERA", 1.0) if espera is None else espera
+    ejecutadas, limpieza = 0, None
+    while not (parar and parar()):
+        tarea_tomada = tomar(trabajador)
+        if tarea_tomada is None:
+            if limpieza is None or time.monotonic() - limpieza >= LIMPIEZA_CADA:
+                limpiar_ficheros()
+                programar_reconciliacion()
+                limpieza = time.monotonic()
+            if una_vez:
+                break
+            time.sleep(espera)
+            continue
+        estado = ejecutar(tarea_tomada)
+        ejecutadas += 1
+        if aviso:
+            aviso(tarea_tomada, estado)
+    return ejecutadas
+
+
+# ----------------------------------------------------------------------------
+# Tipos de tarea
+# ----------------------------------------------------------------------------
+
+
+def _fecha(valor):
+    return datetime.date.fromisoformat(valor) if valor else None
+
+
+@tarea("borrar_restaurante")
+def borrar_restaurante(tarea, restaurante):
+    pendiente = borrado.pendiente(restaurante)
+    avanzar(tarea, hechos=0, total=sum(pendiente.values()), mensaje="Borrando el restaurante")
+    return borrado.borrar_restaurante(
+        restaurante, lote=_lote(), progreso=lambda fase, n: avanzar(tarea, hechos=n, mensaje=f"Borrando {fase}"),
+    )
+
+
+@tarea("exportar")
+def exportar(tarea, modelo, formato="csv", restaurante=None, desde=None, hasta=None, archivo=False):
+    """Escribe la exportación en ``TAREAS_DIR``; la descarga la vista ``tarea_descargar``."""
+    exportacion = EXPORTACIONES[modelo](
+        restaurante=restaurante, desde=_fecha(desde), hasta=_fecha(hasta), archivo=archivo,
+        progreso=lambda n: avanzar(tarea, hechos=n),
+    )
+    avanzar(tarea, hechos=0, total=exportacion.contar(), mensaje=f"Exportando {modelo}")
+    carpeta = settings.TAREAS_DIR
+    os.makedirs(carpeta, exist_ok=True)
+    nombre = f"tarea-{tarea.pk}-{modelo}.{formato}"
+    ruta = os.path.join(carpeta, nombre)
+    # Se escribe aparte y se renombra: nunca se descarga un fichero a medias
+    with open(ruta + ".parcial", "w", encoding="utf-8", newline="") as salida:
+        for trozo in generar(exportacion, formato):
+            salida.write(trozo)
+    os.replace(ruta + ".parcial", ruta)
+    return {"fichero": nombre, "filas": exportacion.leidas}
+
+
+@tarea("reconstruir_estadisticas")
+def reconstruir_estadisticas(tarea, lote=2000):
+    avanzar(tarea, hechos=0, total=Cliente.objects.count(), mensaje="Recalculando estadísticas de clientes")
+    return {"clientes": estadisticas.reconstruir(lote=lote, progreso=lambda n: avanzar(tarea, hechos=n))}
+
+
+@tarea("reconstruir_ventas")
+def reconstruir_ventas(tarea, desde=None, hasta=None, lote=5000):
+    desde, hasta = _fecha(desde), _fecha(hasta)
+    total = 0
+    for modelo in (Pedido, PedidoArchivado):
+        pedidos = modelo.objects.all()
+        if desde:
+            pedidos = pedidos.filter(fecha__gte=desde)
+        if hasta:
+            pedidos = pedidos.filter(fecha__lte=hasta)
+        total += pedidos.count()
+    avanzar(tarea, hechos=0, total=total, mensaje="Recalculando resúmenes de ventas")
+    pedidos = ventas.reconstruir(desde=desde, hasta=hasta, lote=lote, progreso=lambda n: avanzar(tarea, hechos=n))
+    return {"pedidos": pedidos}
+
+
+@tarea("reconciliar_contadores")
+def reconciliar_contadores(tarea, lote=1000):
+    avanzar(tarea, hechos=0, total=Restaurante.objects.count(), mensaje="Revisando contadores de restaurantes")
+    return {"corregidos": contadores.reconciliar(lote=lote, progreso=lambda n: avanzar(tarea, hechos=n))}
@@ -1,3 +1,1411 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.db import connection
+from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import archivo, cache_menus, contadores, estadisticas, tablero, tareas, ventas, views
+from .basedatos import alias_lectura, pragmas
+from .benchmark import casos, contenido, cuerpos, datos_de_ejemplo, medir, urls_sin_caso
+from .busqueda import buscar
+from .disponibilidad import IndiceOcupacion, mesa_disponible, mesas_libres
+from .exportacion import ExportacionPedidos
+from .form import PerfilClienteCreateForm, PlatoForm, ReservaCreateForm, ReservaForm
+from .middleware import CABECERA, PresupuestoConsultasExcedido
+from .paginacion import ANTERIOR, KeysetPaginator, codificar_cursor
+from .models import (
+    Cliente, Direccion, EstadisticaCliente, Etiqueta, EventoTablero, LineaPedido, LineaPedidoArchivada, Mesa, Pedido,
+    PedidoArchivado, PerfilCliente, Plato, Reserva, ReservaArchivada, Restaurante, ResumenVentasDiario, Tarea,
+    Usuario,
+)
+from .reservas import INTENTOS_MAXIMOS, MesaNoDisponible, reservar_mesa
+
+
+def crear_restaurante(nombre="Casa Pepe", mesas=2):
+    direccion = Direccion.objects.create(
+        calle="Calle Sierpes", numero=1, ciudad="Sevilla", codigo_postal="41001", provincia="Sevilla"
+    )
+    restaurante = Restaurante.objects.create(nombre=nombre, telefono="954000000", direccion=direccion)
+    for numero in range(1, mesas + 1):
+        Mesa.objects.create(restaurante=restaurante, numero=numero)
+    return restaurante
+
+
+class ReservarMesaTests(TestCase):
+    def setUp(self):
+        self.restaurante = crear_restaurante()
+        self.mesa = self.restaurante.mesa_set.order_by("numero").first()
+        self.cliente = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        self.fecha = datetime.date.today() + datetime.timedelta(days=7)
+
+    def test_no_reserva_franja_solapada(self):
+        reservar_mesa(self.cliente, self.mesa, self.fecha, datetime.time(20, 0))
+        with self.assertRaises(MesaNoDisponible):
+            reservar_mesa(self.cliente, self.mesa, self.fecha, datetime.time(20, 30))
+
+    def test_restriccion_unica_mesa_fecha_hora(self):
+        datos = dict(cliente=self.cliente, mesa=self.mesa, fecha=self.fecha, hora=datetime.time(21, 0))
+        Reserva.objects.create(**datos)
+        Reserva.objects.create(estado="cancelada", **datos)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Reserva.objects.create(**datos)
+
+
+    def test_solo_reintenta_el_choque_de_la_restriccion(self):
+        hora = datetime.time(21, 0)
+        Reserva.objects.create(cliente=self.cliente, mesa=self.mesa, fecha=self.fecha, hora=hora)
+        esperas = []
+        # Como si otra petición hubiera reservado entre la comprobación y el INSERT
+        with mock.patch("restaurante.reservas.mesa_disponible", return_value=True), \
+                mock.patch("restaurante.reservas.time.sleep", esperas.append):
+            with self.assertRaises(MesaNoDisponible):
+                reservar_mesa(self.cliente, self.mesa, self.fecha, hora)
+            self.assertEqual(len(esperas), INTENTOS_MAXIMOS - 1)
+            esperas.clear()
+            # Un cliente que falta no se arregla reintentando
+            with self.assertRaises(IntegrityError):
+                reservar_mesa(None, self.mesa, self.fecha, datetime.time(14, 0))
+            self.assertEqual(esperas, [])
+
+
+    def test_editar_reserva_por_el_mismo_camino(self):
+        reserva = reservar_mesa(self.cliente, self.mesa, self.fecha, datetime.time(20, 0))
+        # La propia reserva no la ocupa: se puede mover media hora
+        reservar_mesa(self.cliente, self.mesa, self.fecha, datetime.time(20, 30), reserva=reserva)
+        reserva.refresh_from_db()
+        self.assertEqual(reserva.hora, datetime.time(20, 30))
+        self.assertEqual(Reserva.objects.count(), 1)
+
+    def test_editar_reserva_que_pierde_la_carrera(self):
+        Reserva.objects.create(cliente=self.cliente, mesa=self.mesa, fecha=self.fecha, hora=datetime.time(21, 0))
+        reserva = Reserva.objects.create(
+            cliente=self.cliente, mesa=self.mesa, fecha=self.fecha, hora=datetime.time(14, 0)
+        )
+        self.client.force_login(Usuario.objects.create_superuser("admin", "admin@example.com", "x"))
+        datos = {
+            "cliente": self.cliente.pk, "mesa": self.mesa.pk, "fecha": self.fecha.isoformat(),
+            "hora": "21:00", "estado": "pendiente", "notas": "",
+        }
+        # Como si la otra reserva hubiera llegado después de validar el formulario
+        with mock.patch("restaurante.form.mesa_disponible", return_value=True), \
+                mock.patch("restaurante.reservas.mesa_disponible", return_value=True), \
+                mock.patch("restaurante.reservas.time.sleep"):
+            respuesta = self.client.post(reverse("reservas_editar", args=[reserva.pk]), datos)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn("mesa", respuesta.context["form"].errors)
+        reserva.refresh_from_db()
+        self.assertEqual(reserva.hora, datetime.time(14, 0))
+
+
+class IndiceOcupacionTests(TestCase):
+    def setUp(self):
+        self.restaurante = crear_restaurante(mesas=2)
+        self.mesa, self.otra = self.restaurante.mesa_set.order_by("numero")
+        self.cliente = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        self.fecha = datetime.date(2030, 1, 1)
+
+    def reserva(self, hora, mesa=None, estado="pendiente"):
+        return Reserva.objects.create(
+            cliente=self.cliente, mesa=mesa or self.mesa, fecha=self.fecha, hora=hora, estado=estado,
+        )
+
+    def test_ventanas_contiguas_no_se_solapan(self):
+        indice = IndiceOcupacion([(self.mesa.pk, self.fecha, datetime.time(20, 0))], duracion=90)
+        # [20:00, 21:30): termina justo cuando empieza la siguiente, o empieza cuando acaba la anterior
+        self.assertTrue(indice.libre(self.mesa.pk, self.fecha, datetime.time(21, 30)))
+        self.assertTrue(indice.libre(self.mesa.pk, self.fecha, datetime.time(18, 30)))
+        self.assertFalse(indice.libre(self.mesa.pk, self.fecha, datetime.time(21, 29)))
+        self.assertFalse(indice.libre(self.mesa.pk, self.fecha, datetime.time(18, 31)))
+        self.assertEqual(IndiceOcupacion([
+            (self.mesa.pk, self.fecha, datetime.time(20, 0)), (self.mesa.pk, self.fecha, datetime.time(21, 30)),
+        ], duracion=90).solapes(), 0)
+
+    def test_solape_parcial(self):
+        indice = IndiceOcupacion([
+            (self.mesa.pk, self.fecha, datetime.time(13, 0)), (self.mesa.pk, self.fecha, datetime.time(20, 0)),
+        ], duracion=90)
+        for hora in (datetime.time(20, 45), datetime.time(19, 0), datetime.time(14, 0), datetime.time(20, 0)):
+            with self.subTest(hora=hora):
+                self.assertFalse(indice.libre(self.mesa.pk, self.fecha, hora))
+        # Entre las dos reservas, en otra mesa u otro día sí está libre
+        self.assertTrue(indice.libre(self.mesa.pk, self.fecha, datetime.time(16, 0)))
+        self.assertTrue(indice.libre(self.otra.pk, self.fecha, datetime.time(20, 0)))
+        self.assertTrue(indice.libre(self.mesa.pk, self.fecha + datetime.timedelta(days=1), datetime.time(20, 0)))
+        indice = IndiceOcupacion([
+            (self.mesa.pk, self.fecha, datetime.time(20, 0)), (self.mesa.pk, self.fecha, datetime.time(20, 45)),
+        ], duracion=90)
+        self.assertEqual(indice.solapes(), 1)
+
+    def test_ignora_las_canceladas(self):
+        self.reserva(datetime.time(20, 0), estado="cancelada")
+        self.reserva(datetime.time(20, 0), mesa=self.otra)
+        self.assertTrue(mesa_disponible(self.mesa, self.fecha, datetime.time(20, 30)))
+        self.assertEqual(mesas_libres(self.restaurante, self.fecha, datetime.time(20, 30)), [self.mesa])
+        with self.assertNumQueries(1):
+            indice = IndiceOcupacion.para_dia(self.fecha, restaurante=self.restaurante)
+        self.assertEqual(indice.solapes(), 0)
+
+    def test_excluir_la_reserva_que_se_edita(self):
+        reserva = self.reserva(datetime.time(20, 0))
+        otra = self.reserva(datetime.time(22, 0))
+        # Moverla media hora solo choca consigo misma
+        self.assertFalse(mesa_disponible(self.mesa, self.fecha, datetime.time(20, 30)))
+        self.assertTrue(mesa_disponible(self.mesa, self.fecha, datetime.time(20, 30), excluir=reserva))
+        self.assertTrue(mesa_disponible(self.mesa, self.fecha, datetime.time(20, 30), excluir=reserva.pk))
+        # Pero no se puede llevar encima de la otra
+        self.assertFalse(mesa_disponible(self.mesa, self.fecha, datetime.time(21, 0), excluir=reserva))
+        self.assertFalse(mesa_disponible(self.mesa, self.fecha, datetime.time(21, 30)))
+        self.assertTrue(mesa_disponible(self.mesa, self.fecha, datetime.time(21, 30), excluir=otra))
+
+
+class EstresReservasTests(TransactionTestCase):
+    def test_reservas_concurrentes_sin_duplicados(self):
+        salida = StringIO()
+        call_command("estres_reservas", hilos=8, reservas=80, mesas=3, franjas=4, stdout=salida)
+        self.assertIn("Solapes detectados: 0", salida.getvalue())
+
+
+@override_settings(PRESUPUESTO_CONSULTAS_ESTRICTO=True, PRESUPUESTO_CONSULTAS={"default": 12}, N_MAS_1_UMBRAL=4)
+class PresupuestoConsultasTests(TestCase):
+    """Las vistas no deben crecer en consultas con el número de filas (N+1)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        etiqueta = Etiqueta.objects.create(nombre="vegano", slug="vegano")
+        clientes = [Cliente.objects.create(nombre=f"Cliente {i}", email=f"c{i}@example.com") for i in range(6)]
+        cls.usuario = Usuario.objects.create_user("gerente", password="x")
+        cls.usuario.user_permissions.set(Permission.objects.filter(content_type__app_label="restaurante"))
+        for i in range(6):
+            restaurante = crear_restaurante(nombre=f"Restaurante {i}", mesas=1)
+            restaurante.clientes_frecuentes.set(clientes[:3])
+            mesa = restaurante.mesa_set.get()
+            for j in range(5):
+                plato = Plato.objects.create(restaurante=restaurante, nombre=f"Plato {j}", precio=10 + j)
+                plato.etiquetas.add(etiqueta)
+                reserva = Reserva.objects.create(
+                    cliente=clientes[j], mesa=mesa, fecha=datetime.date(2030, 1, 1),
+                    hora=datetime.time(12 + j), creado_por=cls.usuario,
+                )
+                pedido = Pedido.objects.create(cliente=clientes[j], restaurante=restaurante, reserva=reserva)
+                LineaPedido.objects.create(pedido=pedido, plato=plato, precio_unitario=plato.precio)
+        for cliente in clientes:
+            PerfilCliente.objects.create(cliente=cliente)
+        cls.restaurante = restaurante
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_listados_sin_n_mas_1(self):
+        urls = [
+            reverse("restaurantes_listar"), reverse("direccion_listar"), reverse("reservas_listar"),
+            reverse("mis_reservas"), reverse("perfil_listar"), reverse("crud_clientes:listar"),
+            reverse("crud_platos:listar"), reverse("detalle_restaurante", args=[self.restaurante.pk]),
+            reverse("lista_platos"), reverse("platos_por_categoria", args=["principal"]),
+            reverse("buscar_platos", args=["Plato", 5]), reverse("lista_pedidos"),
+            reverse("pedidos_sin_lineas"), reverse("clientes_frecuentes"), reverse("buscar_simple", args=["Plato"]),
+            reverse("restaurante_busqueda_avanzada") + "?nombre=Restaurante",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(CABECERA, response)
+
+    def test_modo_estricto_lanza_al_superar_presupuesto(self):
+        with override_settings(PRESUPUESTO_CONSULTAS={"default": 12, "crud_clientes:listar": 1}):
+            with self.assertRaises(PresupuestoConsultasExcedido):
+                self.client.get(reverse("crud_clientes:listar"))
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        restaurante = crear_restaurante(mesas=3)
+        cliente = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        # Varias reservas con la misma fecha y hora: el desempate es el id
+        for dia in (1, 2, 3):
+            for hora in (13, 21):
+                for mesa in restaurante.mesa_set.all():
+                    Reserva.objects.create(
+                        cliente=cliente, mesa=mesa, fecha=datetime.date(2030, 1, dia), hora=datetime.time(hora),
+                    )
+        cls.orden = ("-fecha", "-hora", "id")
+        cls.esperado = list(Reserva.objects.order_by(*cls.orden).values_list("pk", flat=True))
+
+    def paginador(self):
+        return KeysetPaginator(Reserva.objects.all(), self.orden, por_pagina=4)
+
+    def test_adelante_y_atras(self):
+        paginas, pagina = [], self.paginador().pagina()
+        self.assertFalse(pagina.has_previous)
+        while True:
+            paginas.append([r.pk for r in pagina])
+            if not pagina.has_next:
+                break
+            pagina = self.paginador().pagina(pagina.cursor_siguiente)
+        # 18 reservas en páginas de 4: la última tiene 2 y no hay siguiente
+        self.assertEqual([len(p) for p in paginas], [4, 4, 4, 4, 2])
+        self.assertEqual(sum(paginas, []), self.esperado)
+
+        vueltas = []
+        while pagina.has_previous:
+            pagina = self.paginador().pagina(pagina.cursor_anterior)
+            vueltas.insert(0, [r.pk for r in pagina])
+            self.assertTrue(pagina.has_next)
+        self.assertEqual(vueltas, paginas[:-1])
+        self.assertFalse(pagina.has_previous)
+
+    def test_limites(self):
+        paginador = KeysetPaginator(Reserva.objects.all(), self.orden, por_pagina=len(self.esperado))
+        pagina = paginador.pagina()
+        self.assertEqual([r.pk for r in pagina], self.esperado)
+        self.assertFalse(pagina.has_next or pagina.has_previous)
+        # Un cursor más allá de la última fila da una página vacía, no un error
+        ultima = Reserva.objects.get(pk=self.esperado[-1])
+        pagina = paginador.pagina(codificar_cursor([str(ultima.fecha), str(ultima.hora), ultima.pk], "s"))
+        self.assertEqual((len(pagina), pagina.has_next, pagina.has_previous), (0, False, False))
+        # Hacia atrás desde la primera fila tampoco hay nada
+        primera = Reserva.objects.get(pk=self.esperado[0])
+        pagina = paginador.pagina(codificar_cursor([str(primera.fecha), str(primera.hora), primera.pk], ANTERIOR))
+        self.assertEqual(len(pagina), 0)
+
+    def test_cursor_manipulado_vuelve_a_la_primera_pagina(self):
+        primera = [r.pk for r in self.paginador().pagina()]
+        for cursor in (
+            "basura", "%%%", "ñ", codificar_cursor([1], "s"), codificar_cursor(["no-es-fecha", "12:00", 1], "s"),
+            codificar_cursor([[1], {"a": 1}, None], "s"), "W10", "eyJ2IjogM30",
+        ):
+            with self.subTest(cursor=cursor):
+                self.assertEqual([r.pk for r in self.paginador().pagina(cursor)], primera)
+
+    def test_vista_con_cursor_manipulado(self):
+        usuario = Usuario.objects.create_superuser("admin", "admin@example.com", "x")
+        self.client.force_login(usuario)
+        for url in (reverse("reservas_listar"), reverse("restaurantes_listar")):
+            for cursor in ("basura", codificar_cursor(["x", "y", "z"], "s")):
+                with self.subTest(url=url, cursor=cursor):
+                    self.assertEqual(self.client.get(url, {"cursor": cursor}).status_code, 200)
+
+
+class BusquedaTests(TestCase):
+    def setUp(self):
+        self.restaurante = crear_restaurante(mesas=0)
+        self.jamon = Plato.objects.create(restaurante=self.restaurante, nombre="Jamón ibérico", precio=20)
+        self.croquetas = Plato.objects.create(restaurante=self.restaurante, nombre="Croquetas", precio=8)
+
+    def test_sin_tildes_y_por_prefijo(self):
+        self.assertEqual(list(buscar(Plato.objects.all(), "jamon")), [self.jamon])
+        self.assertEqual(list(buscar(Plato.objects.all(), "croq")), [self.croquetas])
+
+    def test_indice_sigue_a_etiquetas_y_borrados(self):
+        etiqueta = Etiqueta.objects.create(nombre="Picante", slug="picante")
+        self.croquetas.etiquetas.add(etiqueta)
+        self.assertEqual(list(buscar(Plato.objects.all(), "picante")), [self.croquetas])
+        self.croquetas.delete()
+        self.assertEqual(list(buscar(Plato.objects.all(), "picante")), [])
+
+    def test_relevancia_y_filtros_previos(self):
+        jamon_jamon = Plato.objects.create(restaurante=self.restaurante, nombre="Jamón con jamón", precio=30)
+        # Más apariciones del término, más relevante (rank de bm25 más bajo)
+        self.assertEqual(list(buscar(Plato.objects.all(), "jamon")), [jamon_jamon, self.jamon])
+        resultados = buscar(Plato.objects.filter(precio__lt=25), "jamon").select_related("restaurante")
+        self.assertEqual(list(resultados), [self.jamon])
+        self.assertEqual(resultados.count(), 1)
+        self.assertIsInstance(resultados[0].relevancia, float)
+
+
+class ResumenVentasTests(TestCase):
+    def test_resumen_sigue_a_pedidos_y_lineas(self):
+        restaurante = crear_restaurante(mesas=0)
+        plato = Plato.objects.create(restaurante=restaurante, nombre="Salmorejo", precio=6)
+        cliente = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        pedido = Pedido.objects.create(cliente=cliente, restaurante=restaurante, total=12)
+        LineaPedido.objects.create(pedido=pedido, plato=plato, precio_unitario=6, cantidad=2)
+        otro = Pedido.objects.create(cliente=cliente, restaurante=restaurante, total=6)
+        LineaPedido.objects.create(pedido=otro, plato=plato, precio_unitario=6)
+        otro.delete()
+
+        resumen = ResumenVentasDiario.objects.get(restaurante=restaurante, fecha=pedido.fecha)
+        self.assertEqual((resumen.num_pedidos, resumen.total, resumen.num_lineas, resumen.unidades), (1, 12, 1, 2))
+
+        ResumenVentasDiario.objects.update(total=0)
+        call_command("reconstruir_resumen_ventas", stdout=StringIO())
+        self.assertEqual(ResumenVentasDiario.objects.get().total, 12)
+
+
+class ContadoresRestauranteTests(TestCase):
+    def contadores(self, restaurante):
+        return Restaurante.objects.filter(pk=restaurante.pk).values_list(*contadores.CONTADORES).get()
+
+    def test_contadores_siguen_a_platos_mesas_favoritos_y_reservas(self):
+        casa, otra = crear_restaurante(mesas=3), crear_restaurante("Casa Juan", mesas=1)
+        plato = Plato.objects.create(restaurante=casa, nombre="Salmorejo", precio=6)
+        Plato.objects.create(restaurante=casa, nombre="Flamenquín", precio=9)
+        plato.restaurante = otra
+        plato.save()
+        mesa = casa.mesa_set.order_by("numero").first()
+        casa.mesa_set.filter(numero=3).get().delete()
+
+        ana = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        luis = Cliente.objects.create(nombre="Luis", email="luis@example.com")
+        casa.clientes_frecuentes.add(ana, luis)
+        casa.clientes_frecuentes.remove(luis, luis)
+        otra.clientes_frecuentes.add(ana, luis)
+        luis.restaurantes_favoritos.clear()
+
+        fecha = datetime.date.today() + datetime.timedelta(days=7)
+        reserva = Reserva.objects.create(cliente=ana, mesa=mesa, fecha=fecha, hora=datetime.time(21, 0))
+        Reserva.objects.create(cliente=ana, mesa=mesa, fecha=fecha, hora=datetime.time(14, 0))
+        reserva.estado = "cancelada"
+        reserva.save()
+        mesa.activa = False
+        mesa.save()
+        self.assertEqual(self.contadores(casa), (1, 1, 1, 1))
+        self.assertEqual(self.contadores(otra), (1, 1, 1, 0))
+
+        ana.delete()
+        self.assertEqual(self.contadores(casa), (1, 1, 0, 0))
+        self.assertEqual(self.contadores(otra), (1, 1, 0, 0))
+        self.assertEqual(contadores.reconciliar(), 0)
+
+    def test_reconciliar_corrige_desviaciones(self):
+        casa = crear_restaurante(mesas=2)
+        Restaurante.objects.update(num_platos=7, num_mesas_activas=0)
+        salida = StringIO()
+        call_command("reconciliar_contadores", lote=1, stdout=salida)
+        self.assertIn("en 1 restaurantes", salida.getvalue())
+        self.assertEqual(self.contadores(casa), (0, 2, 0, 0))
+
+    def test_listado_muestra_los_contadores(self):
+        casa = crear_restaurante(mesas=2)
+        ana = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        casa.clientes_frecuentes.add(ana)
+        Reserva.objects.create(
+            cliente=ana, mesa=casa.mesa_set.first(), fecha=datetime.date(2030, 1, 1), hora=datetime.time(21, 0),
+        )
+        self.client.force_login(Usuario.objects.create_superuser("admin", "admin@example.com", "x"))
+        respuesta = self.client.get(reverse("restaurantes_listar"))
+        self.assertContains(respuesta, "<strong>Reservas abiertas (de hoy en adelante):</strong> 1", html=False)
+        self.assertContains(respuesta, "Clientes frecuentes (1):")
+
+    def test_reservas_pasadas_no_son_abiertas(self):
+        casa = crear_restaurante(mesas=1)
+        ana = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        hoy = datetime.date.today()
+        datos = dict(cliente=ana, mesa=casa.mesa_set.get(), hora=datetime.time(21, 0))
+        Reserva.objects.create(fecha=hoy - datetime.timedelta(days=1), **datos)
+        reserva = Reserva.objects.create(fecha=hoy, **datos)
+        self.assertEqual(self.contadores(casa)[3], 1)
+        # Como si hubiera pasado el día: deja de contar al reconciliar
+        Reserva.objects.filter(pk=reserva.pk).update(fecha=hoy - datetime.timedelta(days=2))
+        self.assertEqual(contadores.reconciliar(), 1)
+        self.assertEqual(self.contadores(casa)[3], 0)
+        Reserva.objects.get(pk=reserva.pk).delete()
+        self.assertEqual(self.contadores(casa)[3], 0)
+
+    def test_reconciliacion_programada_para_medianoche(self):
+        tareas.programar_reconciliacion()
+        tareas.programar_reconciliacion()
+        tarea = Tarea.objects.get()
+        manana = datetime.date.today() + datetime.timedelta(days=1)
+        self.assertEqual(tarea.tipo, "reconciliar_contadores")
+        self.assertEqual(tarea.disponible_desde, datetime.datetime.combine(manana, datetime.time.min))
+        # Hasta entonces los trabajadores no la toman
+        self.assertEqual(tareas.trabajar(una_vez=True), 0)
+
+
+class EstadisticaClienteTests(TestCase):
+    def setUp(self):
+        self.casa, self.otra = crear_restaurante(mesas=0), crear_restaurante("Casa Juan", mesas=0)
+        self.ana = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        self.luis = Cliente.objects.create(nombre="Luis", email="luis@example.com")
+
+    def pedido(self, cliente, restaurante, total, dias):
+        fecha = datetime.date.today() - datetime.timedelta(days=dias)
+        return Pedido.objects.create(cliente=cliente, restaurante=restaurante, total=total, fecha=fecha)
+
+    def estadistica(self, cliente):
+        e = EstadisticaCliente.objects.get(cliente=cliente)
+        return e.num_pedidos, e.total_gastado, (datetime.date.today() - e.ultimo_pedido).days, e.restaurante_favorito_id
+
+    def test_sigue_a_los_pedidos(self):
+        self.pedido(self.ana, self.casa, 10, dias=30)
+        self.pedido(self.ana, self.otra, 20, dias=5)
+        ultimo = self.pedido(self.ana, self.otra, 5, dias=1)
+        self.assertEqual(self.estadistica(self.ana), (3, 35, 1, self.otra.pk))
+
+        ultimo.cliente = self.luis
+        ultimo.save()
+        self.assertEqual(self.estadistica(self.ana), (2, 30, 5, self.casa.pk))
+        self.assertEqual(self.estadistica(self.luis), (1, 5, 1, self.otra.pk))
+
+        self.otra.delete()
+        self.assertEqual(self.estadistica(self.ana), (1, 10, 30, self.casa.pk))
+        self.assertFalse(EstadisticaCliente.objects.filter(cliente=self.luis).exists())
+        self.ana.delete()
+        self.assertFalse(EstadisticaCliente.objects.exists())
+
+    def test_listado_ordena_y_filtra(self):
+        self.pedido(self.ana, self.casa, 50, dias=200)
+        self.pedido(self.luis, self.casa, 10, dias=2)
+        self.client.force_login(Usuario.objects.create_superuser("admin", "admin@example.com", "x"))
+        url = reverse("clientes_frecuentes")
+        self.assertEqual([e.cliente for e in self.client.get(url).context["estadisticas"]], [self.ana, self.luis])
+        respuesta = self.client.get(url, {"orden": "gasto", "sin_pedir_dias": 90})
+        self.assertEqual([e.cliente for e in respuesta.context["estadisticas"]], [self.ana])
+        respuesta = self.client.get(url, {"orden": "recientes", "min_gasto": "5"})
+        self.assertEqual([e.cliente for e in respuesta.context["estadisticas"]], [self.luis, self.ana])
+
+    def test_reconstruir(self):
+        self.pedido(self.ana, self.casa, 10, dias=3)
+        EstadisticaCliente.objects.all().delete()
+        call_command("reconstruir_estadisticas_clientes", lote=1, stdout=StringIO())
+        self.assertEqual(self.estadistica(self.ana), (1, 10, 3, self.casa.pk))
+
+
+class AutocompletarTests(TestCase):
+    def setUp(self):
+        self.ana = Cliente.objects.create(nombre="Ana Martín", email="ana@example.com")
+        self.mar = Cliente.objects.create(nombre="Mar Ortega", email="mortega@example.com")
+        self.usuario = Usuario.objects.create_user("camarero", "c@example.com", "x")
+        self.usuario.user_permissions.set(
+            Permission.objects.filter(codename__in=["add_reserva", "change_restaurante"])
+        )
+        self.client.force_login(self.usuario)
+
+    def resultados(self, fuente, **params):
+        respuesta = self.client.get(reverse("autocompletar", args=[fuente]), params)
+        self.assertEqual(respuesta.status_code, 200)
+        return [r["texto"] for r in respuesta.json()["resultados"]]
+
+    def test_busca_por_prefijo(self):
+        self.assertEqual(self.resultados("clientes", q="mar"), ["Ana Martín", "Mar Ortega"])
+        self.assertEqual(self.resultados("clientes", q="ort"), ["Mar Ortega"])
+        self.assertEqual(self.resultados("clientes", q="m"), [])
+        self.assertEqual(self.resultados("clientes", q="mar", limite=1), ["Ana Martín"])
+        # El email solo se busca con permiso para ver clientes
+        self.assertEqual(self.resultados("clientes", q="mortega"), [])
+        self.usuario.user_permissions.add(Permission.objects.get(codename="view_cliente"))
+        self.client.force_login(Usuario.objects.get(pk=self.usuario.pk))
+        self.assertEqual(self.resultados("clientes", q="mortega"), ["Mar Ortega"])
+
+    def test_filtros_y_fuentes(self):
+        PerfilCliente.objects.create(cliente=self.ana)
+        self.assertEqual(self.resultados("clientes", q="mar", sin_perfil=1), ["Mar Ortega"])
+        restaurante = crear_restaurante(mesas=0)
+        libre = Direccion.objects.create(
+            calle="Calle Feria", numero=3, ciudad="Sevilla", codigo_postal="41003", provincia="Sevilla"
+        )
+        self.assertEqual(self.resultados("direcciones", q="sevilla", libres=1), [str(libre)])
+        self.assertEqual(len(self.resultados("direcciones", q="calle")), 2)
+        restaurante.direccion.delete()
+        self.assertEqual(self.resultados("direcciones", q="calle"), [str(libre)])
+        self.assertEqual(self.client.get(reverse("autocompletar", args=["platos"])).status_code, 404)
+
+    def test_sin_permiso_responde_403(self):
+        cliente = Usuario.objects.create_user("ana", "ana@example.com", "x", rol=Usuario.ROL_CLIENTE)
+        self.client.force_login(cliente)
+        for fuente in ("clientes", "direcciones"):
+            with self.subTest(fuente=fuente):
+                respuesta = self.client.get(reverse("autocompletar", args=[fuente]), {"q": "mar"})
+                self.assertEqual(respuesta.status_code, 403)
+        # Con permiso para reservar ve los clientes, pero no las direcciones
+        cliente.user_permissions.add(Permission.objects.get(codename="add_reserva"))
+        self.client.force_login(Usuario.objects.get(pk=cliente.pk))
+        self.assertEqual(self.resultados("clientes", q="mar"), ["Ana Martín", "Mar Ortega"])
+        respuesta = self.client.get(reverse("autocompletar", args=["direcciones"]), {"q": "calle"})
+        self.assertEqual(respuesta.status_code, 403)
+
+    def test_formulario_solo_pinta_lo_elegido(self):
+        for n in range(30):
+            Cliente.objects.create(nombre=f"Cliente {n}", email=f"c{n}@example.com")
+        html = str(ReservaForm(initial={"cliente": self.mar.pk})["cliente"])
+        self.assertIn("Mar Ortega", html)
+        self.assertNotIn("Cliente 1", html)
+        self.assertIn(reverse("autocompletar", args=["clientes"]), html)
+
+        with CaptureQueriesContext(connection) as consultas:
+            form = PerfilClienteCreateForm(data={"cliente": self.ana.pk})
+            self.assertTrue(form.is_valid())
+        self.assertEqual(len(consultas), 2)
+        PerfilCliente.objects.create(cliente=self.ana)
+        self.assertIn("cliente", PerfilClienteCreateForm(data={"cliente": self.ana.pk}).errors)
+
+
+class PerfilSqliteTests(TestCase):
+    def test_pragmas_al_conectar(self):
+        valores = pragmas()
+        self.assertEqual(valores["busy_timeout"], settings.SQLITE_PRAGMAS["busy_timeout"])
+        self.assertEqual(valores["cache_size"], settings.SQLITE_PRAGMAS["cache_size"])
+        # La base de prueba está en memoria: ahí no hay WAL
+        self.assertIn(valores["journal_mode"], ("wal", "memory"))
+        self.assertEqual(valores["query_only"], 0)
+        self.assertEqual(connection.transaction_mode, settings.DATABASES["default"]["OPTIONS"]["transaction_mode"])
+
+    def test_informes_sin_alias_de_lectura(self):
+        self.assertEqual(alias_lectura(), "default")
+        self.assertEqual(ExportacionPedidos().alias, "default")
+
+    def test_benchmark(self):
+        salida = StringIO()
+        call_command("benchmark_sqlite", segundos=0.2, lectores=2, escritores=2, restaurantes=2, reservas=100, stdout=salida)
+        self.assertIn("actual: journal_mode=WAL", salida.getvalue())
+
+
+class ArchivoTests(TestCase):
+    def setUp(self):
+        self.restaurante = crear_restaurante(mesas=2)
+        self.mesa = self.restaurante.mesa_set.first()
+        self.cliente = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        self.plato = Plato.objects.create(restaurante=self.restaurante, nombre="Salmorejo", precio=Decimal("6.00"))
+        hoy = datetime.date.today()
+        self.antigua = hoy - datetime.timedelta(days=400)
+        self.pedido_antiguo = self.pedido(self.reserva(self.antigua), self.antigua)
+        self.reserva(self.antigua, hora=datetime.time(14, 0))
+        self.reserva(self.antigua, hora=datetime.time(15, 0), estado="cancelada")
+        self.pedido(self.reserva(hoy), hoy)
+
+    def reserva(self, fecha, hora=datetime.time(21, 0), estado="pendiente"):
+        return Reserva.objects.create(cliente=self.cliente, mesa=self.mesa, fecha=fecha, hora=hora, estado=estado)
+
+    def pedido(self, reserva, fecha):
+        pedido = Pedido.objects.create(
+            cliente=self.cliente, restaurante=self.restaurante, reserva=reserva, fecha=fecha, total=Decimal("12.00"),
+        )
+        LineaPedido.objects.create(pedido=pedido, plato=self.plato, cantidad=2, precio_unitario=Decimal("6.00"))
+        return pedido
+
+    def derivados(self):
+        estadistica = EstadisticaCliente.objects.get(cliente=self.cliente)
+        return (
+            list(ResumenVentasDiario.objects.order_by("fecha").values_list("fecha", "num_pedidos", "total", "unidades")),
+            (estadistica.num_pedidos, estadistica.total_gastado, estadistica.ultimo_pedido),
+        )
+
+    def test_archivar_y_restaurar(self):
+        antes = self.derivados()
+        movidos = archivo.archivar(antes_de=datetime.date.today() - datetime.timedelta(days=30), lote=1)
+        self.assertEqual(movidos, {"pedidos": 1, "reservas": 3})
+        self.assertEqual((Pedido.objects.count(), Reserva.objects.count(), LineaPedido.objects.count()), (1, 1, 1))
+        self.assertEqual(LineaPedidoArchivada.objects.get().pedido_id, self.pedido_antiguo.pk)
+        # Lo archivado sigue en ventas y estadísticas, también al recalcular
+        self.assertEqual(self.derivados(), antes)
+        ventas.reconstruir()
+        estadisticas.reconstruir()
+        self.assertEqual(self.derivados(), antes)
+        self.assertEqual(contadores.reconciliar(), 0)
+        self.restaurante.refresh_from_db()
+        self.assertEqual(self.restaurante.num_reservas_abiertas, 1)
+
+        exportados = [f["id"] for f in ExportacionPedidos(archivo=True).filas()]
+        # Primero las vivas y después las archivadas
+        self.assertEqual(exportados, [*Pedido.objects.values_list("pk", flat=True), self.pedido_antiguo.pk])
+        self.assertEqual(len(list(ExportacionPedidos().filas())), 1)
+
+        movidos = archivo.restaurar(desde=self.antigua, hasta=self.antigua)
+        self.assertEqual(movidos, {"pedidos": 1, "reservas": 3})
+        self.assertFalse(ReservaArchivada.objects.exists() or PedidoArchivado.objects.exists())
+        self.assertEqual(Pedido.objects.get(pk=self.pedido_antiguo.pk).reserva, self.pedido_antiguo.reserva)
+        self.assertEqual(LineaPedido.objects.count(), 2)
+        self.assertEqual(self.derivados(), antes)
+        self.assertEqual(contadores.reconciliar(), 0)
+
+    def test_restaurar_pedido_con_reserva_borrada(self):
+        # Pedido antiguo con una reserva futura: se archiva el pedido y la reserva sigue viva
+        reserva = self.reserva(datetime.date.today() + datetime.timedelta(days=7))
+        pedido = self.pedido(reserva, self.antigua)
+        archivo.archivar(antes_de=datetime.date.today() - datetime.timedelta(days=30))
+        self.assertEqual(PedidoArchivado.objects.get(pk=pedido.pk).reserva_id, reserva.pk)
+        reserva.delete()
+        self.assertIsNone(PedidoArchivado.objects.get(pk=pedido.pk).reserva_id)
+        # Y si se ha borrado por otro camino, restaurar la quita igualmente
+        PedidoArchivado.objects.filter(pk=self.pedido_antiguo.pk).update(reserva_id=999999)
+
+        archivo.restaurar(desde=self.antigua, hasta=self.antigua)
+        self.assertIsNone(Pedido.objects.get(pk=pedido.pk).reserva)
+        self.assertIsNone(Pedido.objects.get(pk=self.pedido_antiguo.pk).reserva)
+        self.assertEqual(contadores.reconciliar(), 0)
+
+    def test_no_reutiliza_ids_archivados(self):
+        archivo.archivar(antes_de=datetime.date.today() + datetime.timedelta(days=1))
+        # Como tras restaurar una copia: la secuencia vuelve al mayor id vivo
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'restaurante_pedido'")
+        archivo.proteger_ids()
+        nuevo = Pedido.objects.create(cliente=self.cliente, restaurante=self.restaurante)
+        self.assertGreater(nuevo.pk, PedidoArchivado.objects.order_by("-pk").first().pk)
+
+
+@override_settings(TAREAS_ESPERA_REINTENTO=0)
+class TareasTests(TestCase):
+    def setUp(self):
+        self.restaurante = crear_restaurante(mesas=2)
+        self.otro = crear_restaurante("Otro", mesas=1)
+        self.cliente = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        plato = Plato.objects.create(restaurante=self.restaurante, nombre="Salmorejo", precio=Decimal("6.00"))
+        hoy = datetime.date.today()
+        for hora, mesa in enumerate(self.restaurante.mesa_set.all(), start=20):
+            for dias in (0, 200, 400):
+                fecha = hoy - datetime.timedelta(days=dias)
+                reserva = Reserva.objects.create(
+                    cliente=self.cliente, mesa=mesa, fecha=fecha, hora=datetime.time(hora, 0),
+                )
+                pedido = Pedido.objects.create(
+                    cliente=self.cliente, restaurante=self.restaurante, reserva=reserva, fecha=fecha,
+                    total=Decimal("12.00"),
+                )
+                LineaPedido.objects.create(pedido=pedido, plato=plato, cantidad=2, precio_unitario=Decimal("6.00"))
+        Pedido.objects.create(cliente=self.cliente, restaurante=self.otro, fecha=hoy, total=Decimal("5.00"))
+        # Los de hace 400 días, al archivo: el borrado también tiene que llegar ahí
+        archivo.archivar(antes_de=hoy - datetime.timedelta(days=300))
+        self.client.force_login(Usuario.objects.create_superuser("admin", "admin@example.com", "x"))
+
+    @override_settings(TAREAS_LOTE=2)
+    def test_eliminar_restaurante_en_segundo_plano(self):
+        url = reverse("restaurantes_eliminar", args=[self.restaurante.pk])
+        respuesta = self.client.post(url)
+        tarea = Tarea.objects.get()
+        self.assertRedirects(respuesta, reverse("tarea_estado", args=[tarea.pk]), fetch_redirect_response=False)
+        # La vista solo encola, y un segundo POST lleva a la misma tarea
+        self.assertTrue(Restaurante.objects.filter(pk=self.restaurante.pk).exists())
+        self.client.post(url)
+        self.assertEqual(Tarea.objects.count(), 1)
+
+        self.assertEqual(tareas.trabajar(una_vez=True), 1)
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, Tarea.HECHA)
+        self.assertEqual(tarea.resultado, {"pedidos": 6, "reservas": 6, "platos": 1, "mesas": 2})
+        self.assertEqual((tarea.hechos, tarea.total), (15, 15))
+        self.assertFalse(Restaurante.objects.filter(pk=self.restaurante.pk).exists())
+        self.assertFalse(
+            LineaPedido.objects.exists() or PedidoArchivado.objects.exists() or ReservaArchivada.objects.exists()
+        )
+        # Lo derivado queda como si se hubiera recalculado desde cero
+        self.assertEqual(contadores.reconciliar(), 0)
+        estadistica = EstadisticaCliente.objects.get(cliente=self.cliente)
+        self.assertEqual((estadistica.num_pedidos, estadistica.restaurante_favorito_id), (1, self.otro.pk))
+        resumenes = list(ResumenVentasDiario.objects.values_list("restaurante_id", "num_pedidos", "total"))
+        ventas.reconstruir()
+        self.assertEqual(list(ResumenVentasDiario.objects.values_list("restaurante_id", "num_pedidos", "total")), resumenes)
+
+        estado = self.client.get(reverse("tarea_estado", args=[tarea.pk]), {"formato": "json"}).json()
+        self.assertEqual((estado["estado"], estado["porcentaje"]), ("hecha", 100))
+
+    def test_exportacion_en_segundo_plano(self):
+        carpeta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, carpeta)
+        with override_settings(TAREAS_DIR=carpeta):
+            respuesta = self.client.get(
+                reverse("exportar", args=["pedidos"]), {"formato": "jsonl", "archivo": "1", "segundo_plano": "1"},
+            )
+            tarea = Tarea.objects.get(tipo="exportar")
+            estado = reverse("tarea_estado", args=[tarea.pk])
+            self.assertRedirects(respuesta, estado, fetch_redirect_response=False)
+            # Hasta que termina no hay nada que descargar
+            descarga = reverse("tarea_descargar", args=[tarea.pk])
+            self.assertRedirects(self.client.get(descarga), estado, fetch_redirect_response=False)
+            self.assertEqual(self.client.get(estado)["Refresh"], "3")
+
+            tareas.trabajar(una_vez=True)
+            respuesta = self.client.get(descarga)
+            filas = [json.loads(linea) for linea in b"".join(respuesta.streaming_content).splitlines()]
+            respuesta.close()
+
+            # Pasados TAREAS_CONSERVAR_DIAS lo borra el trabajador y ya no se ofrece la descarga
+            ruta = os.path.join(carpeta, Tarea.objects.get(pk=tarea.pk).resultado["fichero"])
+            reciente = os.path.join(carpeta, "reciente.csv")
+            open(reciente, "w").close()
+            hace_8_dias = datetime.datetime.now().timestamp() - 8 * 86400
+            os.utime(ruta, (hace_8_dias, hace_8_dias))
+            self.assertEqual(tareas.trabajar(una_vez=True), 0)
+            self.assertEqual(os.listdir(carpeta), ["reciente.csv"])
+            self.assertIsNone(self.client.get(estado, {"formato": "json"}).json()["descarga"])
+            self.assertEqual(self.client.get(descarga).status_code, 404)
+        self.assertEqual(len(filas), 7)
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.hechos, tarea.total), (Tarea.HECHA, 7, 7))
+
+        # Otro usuario no ve la tarea
+        self.client.force_login(Usuario.objects.create_user("otro", password="x"))
+        self.assertEqual(self.client.get(estado).status_code, 404)
+
+    def test_reintentos_hasta_fallar(self):
+        intentos = []
+
+        @tareas.tarea("prueba_fallida")
+        def fallar(tarea):
+            intentos.append(tarea.intentos)
+            raise RuntimeError("sin suerte")
+
+        self.addCleanup(tareas.TIPOS.pop, "prueba_fallida")
+        tarea = tareas.encolar("prueba_fallida")
+        tareas.trabajar(una_vez=True)
+        tarea.refresh_from_db()
+        self.assertEqual(intentos, list(range(1, tarea.max_intentos + 1)))
+        self.assertEqual(tarea.estado, Tarea.FALLIDA)
+        self.assertIn("sin suerte", tarea.error)
+
+        # La traza solo se enseña al personal, no al usuario que la encoló
+        url = reverse("tarea_estado", args=[tarea.pk])
+        self.assertIn("sin suerte", self.client.get(url, {"formato": "json"}).json()["error"])
+        usuario = Usuario.objects.create_user("ana", password="x")
+        Tarea.objects.filter(pk=tarea.pk).update(creado_por=usuario)
+        self.client.force_login(usuario)
+        self.assertEqual(self.client.get(url, {"formato": "json"}).json()["error"], "")
+        respuesta = self.client.get(url)
+        self.assertContains(respuesta, "La tarea ha fallado")
+        self.assertNotContains(respuesta, "sin suerte")
+
+    def test_reserva_caducada_la_retoma_otro_trabajador(self):
+        tarea = tareas.encolar("reconciliar_contadores")
+        perdida = tareas.tomar("caido")
+        self.assertIsNone(tareas.tomar("otro"))
+        Tarea.objects.filter(pk=tarea.pk).update(bloqueada_hasta=timezone.now() - datetime.timedelta(seconds=1))
+        retomada = tareas.tomar("otro")
+        self.assertEqual((retomada.pk, retomada.intentos), (tarea.pk, 2))
+        # El primero ya no puede informar de progreso ni terminarla
+        with self.assertRaises(tareas.TareaPerdida):
+            tareas.avanzar(perdida, hechos=1)
+        self.assertEqual(tareas.ejecutar(retomada), Tarea.HECHA)
+        self.assertEqual(Tarea.objects.get(pk=tarea.pk).resultado, {"corregidos": 0})
+
+
+class CopiaSeguridadTests(TransactionTestCase):
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def test_importa_backup_json_y_reanuda(self):
+        fixture = os.path.join(self.directorio, "backup.json")
+        shutil.copy(os.path.join(settings.BASE_DIR, "backups", "backup.json"), fixture)
+        call_command("restaurar_copia", fixture, lote=5, stdout=StringIO())
+        self.assertEqual(Plato.objects.count(), 13)
+        self.assertEqual(Plato.etiquetas.through.objects.count(), 12)
+        self.assertTrue(ResumenVentasDiario.objects.exists())
+
+        # Simula una interrupción: los dos últimos trozos quedan sin apuntar
+        control_ruta = os.path.join(self.directorio, "backup-jsonl", "restauracion.json")
+        with open(control_ruta, encoding="utf-8") as f:
+            control = json.load(f)
+        control["filas"] = control["filas"][:-2]
+        control["derivados"] = False
+        with open(control_ruta, "w", encoding="utf-8") as f:
+            json.dump(control, f)
+        call_command("restaurar_copia", fixture, reanudar=True, stdout=StringIO())
+        self.assertEqual(LineaPedido.objects.count(), 11)
+
+    def test_copia_y_restaura_comprimida(self):
+        restaurante = crear_restaurante()
+        cliente = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        restaurante.clientes_frecuentes.add(cliente)
+        Pedido.objects.create(cliente=cliente, restaurante=restaurante, total=10)
+        fecha_registro = Cliente.objects.get().fecha_registro
+
+        call_command("copia_seguridad", self.directorio, lote=1, comprimir=True, stdout=StringIO())
+        Direccion.objects.all().delete()
+        Cliente.objects.all().delete()
+        call_command("restaurar_copia", self.directorio, stdout=StringIO())
+
+        self.assertEqual(Mesa.objects.count(), 2)
+        self.assertEqual(Cliente.objects.get().fecha_registro, fecha_registro)
+        self.assertEqual(list(Restaurante.objects.get().clientes_frecuentes.all()), [cliente])
+        self.assertEqual(ResumenVentasDiario.objects.get().total, 10)
+
+
+class GenerarDatosTests(TestCase):
+    def test_genera_sin_solapes_y_con_totales_coherentes(self):
+        call_command(
+            "generar_datos", usuarios=3, etiquetas=5, restaurantes=3, mesas=2, platos=4, clientes=30,
+            reservas=200, pedidos=100, dias=30, lote=40, desde="2030-01-01", stdout=StringIO(),
+        )
+        self.assertEqual(Reserva.objects.count(), 200)
+        self.assertEqual(Mesa.objects.count(), 6)
+        self.assertFalse(
+            Reserva.objects.exclude(estado="cancelada").values("mesa", "fecha", "hora")
+            .annotate(n=Count("id")).filter(n__gt=1).exists()
+        )
+        pedido = Pedido.objects.exclude(reserva=None).select_related("reserva__mesa").first()
+        self.assertEqual(pedido.reserva.mesa.restaurante_id, pedido.restaurante_id)
+        self.assertEqual(ResumenVentasDiario.objects.aggregate(t=Sum("total"))["t"], Pedido.objects.aggregate(t=Sum("total"))["t"])
+        self.assertEqual(contadores.reconciliar(), 0)
+
+
+def planes_de_consultas(funcion):
+    """Ejecuta ``funcion`` y devuelve ``[(sql, [líneas de EXPLAIN QUERY PLAN])]`` de sus SELECT."""
+    consultas = []
+
+    def grabar(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith("SELECT"):
+            consultas.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(grabar):
+        funcion()
+    planes = []
+    with connection.cursor() as cursor:
+        for sql, params in consultas:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            planes.append((sql, [fila[-1] for fila in cursor.fetchall()]))
+    return planes
+
+
+class PlanesConsultaTests(TestCase):
+    """Las consultas de las vistas y formularios más usados no deben recorrer tablas enteras.
+
+    Se ejecuta el código de verdad sobre datos de generar_datos y se pide el
+    plan de cada SELECT. Falla con un ``SCAN <tabla>`` sin índice y, en los
+    listados ordenados, si SQLite tiene que ordenar con un B-tree temporal.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "generar_datos", usuarios=2, etiquetas=3, restaurantes=3, mesas=3, platos=4, clientes=20,
+            reservas=60, pedidos=20, dias=10, desde="2030-01-01", stdout=StringIO(),
+        )
+        cls.usuario = Usuario.objects.create_superuser("admin", "admin@example.com", "x")
+        Reserva.objects.filter(pk__in=Reserva.objects.values("pk")[:10]).update(creado_por=cls.usuario)
+        cls.reserva = Reserva.objects.select_related("mesa").first()
+        cls.plato = Plato.objects.first()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.usuario)
+
+    def comprobar(self, funcion, ordenado=False):
+        planes = planes_de_consultas(funcion)
+        self.assertTrue(planes)
+        for sql, plan in planes:
+            for linea in plan:
+                self.assertNotRegex(linea, r"^SCAN \w+$", f"Recorre la tabla entera:\n{sql}\n{plan}")
+                if ordenado:
+                    self.assertNotIn("TEMP B-TREE FOR ORDER BY", linea, f"Ordena sin índice:\n{sql}\n{plan}")
+        return planes
+
+    def get(self, nombre, *args, **params):
+        return lambda: self.assertEqual(self.client.get(reverse(nombre, args=args), params).status_code, 200)
+
+    def test_listados_de_reservas(self):
+        self.comprobar(self.get("reservas_listar"), ordenado=True)
+        self.comprobar(self.get("mis_reservas"), ordenado=True)
+
+    def test_platos(self):
+        self.comprobar(self.get("platos_por_categoria", self.plato.categoria), ordenado=True)
+        self.comprobar(self.get("lista_platos"), ordenado=True)
+        self.comprobar(self.get("detalle_restaurante", self.plato.restaurante_id))
+        datos = {"restaurante": self.plato.restaurante_id, "nombre": self.plato.nombre, "precio": "9.50", "categoria": "principal"}
+        self.comprobar(lambda: self.assertFalse(PlatoForm(data=datos).is_valid()))
+
+    def test_reservas_y_mesas(self):
+        r = self.reserva
+        datos = {
+            "cliente": r.cliente_id, "mesa": r.mesa_id, "hora": r.hora.strftime("%H:%M"),
+            "fecha_day": r.fecha.day, "fecha_month": r.fecha.month, "fecha_year": r.fecha.year,
+        }
+        self.comprobar(lambda: ReservaCreateForm(data=datos).is_valid())
+        self.comprobar(lambda: str(ReservaForm()["mesa"]))
+        self.comprobar(self.get(
+            "mesas_libres", restaurante=r.mesa.restaurante_id, fecha=r.fecha.isoformat(), hora="21:00",
+        ))
+        self.comprobar(self.get("tablero_reservas", r.mesa.restaurante_id, fecha=r.fecha.isoformat()))
+
+
+class BenchmarkVistasTests(TestCase):
+    def test_todas_las_urls_tienen_caso_y_responden(self):
+        call_command(
+            "generar_datos", usuarios=2, etiquetas=3, restaurantes=2, mesas=2, platos=3, clientes=10,
+            reservas=20, pedidos=20, dias=10, desde="2030-01-01", stdout=StringIO(),
+        )
+        self.client.force_login(Usuario.objects.create_superuser("admin", "admin@example.com", "x"))
+        tareas.encolar("reconciliar_contadores")
+        datos = datos_de_ejemplo()
+        self.assertEqual(urls_sin_caso(datos), set())
+        posts = cuerpos(datos)
+        for nombre, ruta in casos(datos):
+            with self.subTest(url=nombre):
+                medida = medir(self.client, ruta, repeticiones=1, calentamiento=0, cuerpo=posts.get(nombre))
+                self.assertIn(medida["estado"], (201, 200, 302) if nombre in posts else (200, 302))
+                self.assertGreater(medida["consultas"], 0)
+
+
+class PedidosCrearTests(TestCase):
+    def setUp(self):
+        self.restaurante = crear_restaurante()
+        self.otro = crear_restaurante("Casa Juan")
+        self.plato = Plato.objects.create(restaurante=self.restaurante, nombre="Salmorejo", precio="7.95")
+        self.ajeno = Plato.objects.create(restaurante=self.otro, nombre="Gazpacho", precio="5.00")
+        self.cliente = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        self.url = reverse("pedidos_crear")
+        self.client.force_login(Usuario.objects.create_superuser("admin", "admin@example.com", "x"))
+
+    def pedido(self, **cambios):
+        datos = {
+            "cliente": self.cliente.pk, "restaurante": self.restaurante.pk, "fecha": "2030-01-01",
+            "lineas": [{"plato": self.plato.pk, "cantidad": 3, "descuento_porcentaje": 10}, {"plato": self.plato.pk}],
+        }
+        return {**datos, **cambios}
+
+    def enviar(self, cuerpo):
+        return self.client.post(self.url, cuerpo, content_type="application/json")
+
+    def test_pedido_con_precio_copiado_y_total(self):
+        respuesta = self.enviar(self.pedido())
+        self.assertEqual(respuesta.status_code, 201)
+        pedido = Pedido.objects.get(pk=respuesta.json()["id"])
+        # 3 x 7.95 con 10 % = 21.465 -> 21.46 (redondeo bancario, como generador) + 7.95
+        self.assertEqual(str(pedido.total), "29.41")
+        self.assertEqual(respuesta.json(), {"id": pedido.pk, "total": "29.41", "lineas": 2})
+        self.assertEqual(set(pedido.lineapedido_set.values_list("precio_unitario", flat=True)), {Decimal("7.95")})
+        resumen = ResumenVentasDiario.objects.get(restaurante=self.restaurante, fecha=datetime.date(2030, 1, 1))
+        self.assertEqual((resumen.num_pedidos, resumen.total, resumen.num_lineas, resumen.unidades), (1, pedido.total, 2, 4))
+
+    def test_lote_con_consultas_constantes(self):
+        self.enviar({"pedidos": [self.pedido()]})
+        with CaptureQueriesContext(connection) as uno:
+            self.enviar({"pedidos": [self.pedido()]})
+        with CaptureQueriesContext(connection) as muchos:
+            respuesta = self.enviar({"pedidos": [self.pedido()] * 40})
+        self.assertEqual(respuesta.status_code, 201)
+        self.assertEqual(len(respuesta.json()["pedidos"]), 40)
+        self.assertEqual(len(muchos), len(uno))
+        resumen = ResumenVentasDiario.objects.get(restaurante=self.restaurante)
+        self.assertEqual(resumen.num_pedidos, 42)
+        self.assertEqual(resumen.total, Pedido.objects.aggregate(t=Sum("total"))["t"])
+        self.assertEqual(resumen.num_lineas, LineaPedido.objects.count())
+
+    def test_lote_invalido_no_guarda_nada(self):
+        reserva = Reserva.objects.create(
+            cliente=self.cliente, mesa=self.otro.mesa_set.first(), fecha=datetime.date(2030, 1, 1), hora=datetime.time(21, 0),
+        )
+        respuesta = self.enviar({"pedidos": [
+            self.pedido(),
+            self.pedido(lineas=[{"plato": self.ajeno.pk}]),
+            self.pedido(cliente=999999, reserva=reserva.pk),
+            self.pedido(lineas=[{"plato": self.plato.pk, "cantidad": 0}]),
+        ]})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(respuesta.json()["errores"], {
+            "1": {"lineas[0].plato": "Es de otro restaurante."},
+            "2": {"cliente": "No existe.", "reserva": "Es de otro restaurante."},
+            "3": {"lineas[0].cantidad": "Valor no válido."},
+        })
+        self.assertFalse(Pedido.objects.exists())
+        self.assertFalse(ResumenVentasDiario.objects.exists())
+
+    def test_reserva_solo_admite_un_pedido(self):
+        reserva = Reserva.objects.create(
+            cliente=self.cliente, mesa=self.restaurante.mesa_set.first(), fecha=datetime.date(2030, 1, 1),
+            hora=datetime.time(21, 0),
+        )
+        respuesta = self.enviar({"pedidos": [self.pedido(reserva=reserva.pk)] * 2})
+        self.assertEqual(respuesta.json()["errores"], {"1": {"reserva": "Ya tiene un pedido."}})
+        self.assertEqual(self.enviar(self.pedido(reserva=reserva.pk)).status_code, 201)
+        self.assertEqual(self.enviar(self.pedido(reserva=reserva.pk)).json(), {"errores": {"reserva": "Ya tiene un pedido."}})
+
+    def test_requiere_permiso_post_y_json(self):
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+        self.assertEqual(self.client.post(self.url, "no es json", content_type="application/json").status_code, 400)
+        self.client.force_login(Usuario.objects.create_user("camarero", password="x"))
+        self.assertEqual(self.enviar(self.pedido()).status_code, 403)
+
+
+class PermisosCacheadosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user("gerente", password="x", rol=Usuario.ROL_GERENTE)
+        self.grupo = Group.objects.create(name=Usuario.GRUPOS_POR_ROL[Usuario.ROL_GERENTE])
+        self.grupo.permissions.add(Permission.objects.get(codename="view_cliente"))
+        self.usuario.groups.add(self.grupo)
+        self.client.force_login(self.usuario)
+
+    def test_sin_consultas_de_permisos_tras_calentar(self):
+        self.client.get(reverse("crud_clientes:listar"))
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get(reverse("crud_clientes:listar")).status_code, 200)
+        self.assertFalse([q for q in consultas.captured_queries if "auth_permission" in q["sql"]])
+
+    def test_invalida_al_cambiar_grupo_y_permisos(self):
+        self.client.get(reverse("index"))
+        self.assertEqual(self.client.session["rol_usuario"], "Gerente")
+        self.grupo.permissions.clear()
+        self.assertEqual(self.client.get(reverse("crud_clientes:listar")).status_code, 302)
+        self.grupo.user_set.remove(self.usuario)
+        self.usuario.rol = Usuario.ROL_EMPLEADO
+        self.usuario.save()
+        self.client.get(reverse("index"))
+        self.assertEqual(self.client.session["rol_usuario"], "Empleado")
+
+
+class CabeceraSesionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user("ana", password="x")
+        self.client.force_login(self.usuario)
+
+    def test_index_no_reescribe_la_sesion(self):
+        self.client.get(reverse("index"))
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse("index"))
+        escrituras = [q for q in consultas.captured_queries if "django_session" in q["sql"] and "UPDATE" in q["sql"]]
+        self.assertEqual(escrituras, [])
+        self.assertFalse([q for q in consultas.captured_queries if "restaurante_reserva" in q["sql"]])
+
+    def test_contador_de_reservas_se_invalida(self):
+        restaurante = crear_restaurante(mesas=1)
+        cliente = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        self.assertContains(self.client.get(reverse("index")), "Reservas activas: 0")
+        with self.captureOnCommitCallbacks(execute=True):
+            Reserva.objects.create(
+                cliente=cliente, mesa=restaurante.mesa_set.get(), fecha=datetime.date.today(), hora=datetime.time(21)
+            )
+        self.assertContains(self.client.get(reverse("index")), "Reservas activas: 1")
+
+
+class CacheMenusTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.restaurante = crear_restaurante(mesas=1)
+        self.plato = Plato.objects.create(restaurante=self.restaurante, nombre="Salmorejo", precio=6)
+        self.url = reverse("detalle_restaurante", args=[self.restaurante.pk])
+
+    def test_pagina_cacheada_hasta_que_cambia_un_plato(self):
+        self.client.get(self.url)
+        # Solo la consulta del validador de peticiones condicionales
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url)["X-Cache-Pagina"], "HIT")
+        self.plato.nombre = "Gazpacho"
+        self.plato.save()
+        self.assertContains(self.client.get(self.url), "Gazpacho")
+
+    def test_un_solo_toque_para_etag_y_cache(self):
+        etag = self.client.get(self.url)["ETag"]
+        with CaptureQueriesContext(connection) as consultas:
+            self.plato.nombre = "Gazpacho"
+            self.plato.save()
+        toques = [q for q in consultas.captured_queries if q["sql"].startswith('UPDATE "restaurante_restaurante"')]
+        self.assertEqual(len(toques), 1)
+        respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((respuesta.status_code, respuesta["X-Cache-Pagina"]), (200, "MISS"))
+        self.assertContains(respuesta, "Gazpacho")
+
+    def test_ficha_sigue_a_clientes_frecuentes(self):
+        cliente = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        self.client.get(self.url)
+        self.restaurante.clientes_frecuentes.add(cliente)
+        self.assertContains(self.client.get(self.url), "Ana")
+        cliente.nombre = "Ana María"
+        cliente.save()
+        self.assertContains(self.client.get(self.url), "Ana María")
+
+    def test_fragmento_de_restaurante_compartido(self):
+        self.client.get(self.url)
+        self.restaurante.refresh_from_db()
+        clave = make_template_fragment_key("restaurante_item", [self.restaurante.pk, self.restaurante.updated_at])
+        self.assertIn("Platos: 1", cache.get(clave))
+        # Sin señales updated_at no cambia: el listado reutiliza el fragmento de la ficha
+        # (lista_restaurantes no tiene URL, se llama a la vista directamente)
+        Restaurante.objects.filter(pk=self.restaurante.pk).update(nombre="Otro nombre")
+        self.assertNotContains(views.lista_restaurantes(RequestFactory().get("/")), "Otro nombre")
+        self.restaurante.refresh_from_db()
+        self.restaurante.save()
+        self.assertContains(views.lista_restaurantes(RequestFactory().get("/")), "Otro nombre")
+
+    async def test_version_de_vista_asincrona_fuera_del_bucle(self):
+        bucles = []
+
+        def version():
+            # Fuera del bucle de eventos no hay bucle en marcha
+            try:
+                bucles.append(asyncio.get_running_loop())
+            except RuntimeError:
+                bucles.append(None)
+            return "v1"
+
+        @cache_menus.pagina_cacheada(version)
+        async def vista(request):
+            return HttpResponse("hola")
+
+        for cabecera in ("MISS", "HIT"):
+            self.assertEqual((await vista(RequestFactory().get("/x/")))[cache_menus.CABECERA], cabecera)
+        self.assertEqual(bucles, [None, None])
+
+    def test_fragmento_de_platos_no_consulta_platos(self):
+        self.client.get(reverse("lista_platos"))
+        with CaptureQueriesContext(connection) as consultas:
+            self.assertContains(self.client.get(reverse("lista_platos")), "Salmorejo")
+        self.assertFalse([q for q in consultas.captured_queries if "restaurante_plato" in q["sql"]])
+
+
+class PeticionesCondicionalesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.restaurante = crear_restaurante(mesas=1)
+        self.plato = Plato.objects.create(restaurante=self.restaurante, nombre="Salmorejo", precio=6)
+        self.url = reverse("detalle_restaurante", args=[self.restaurante.pk])
+
+    def test_ficha_responde_304_con_una_consulta(self):
+        respuesta = self.client.get(self.url)
+        self.assertIn("no-cache", respuesta["Cache-Control"])
+        with self.assertNumQueries(1):
+            respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=respuesta["ETag"])
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta.content, b"")
+
+    def test_cambios_en_hijos_renuevan_la_etag(self):
+        etag = self.client.get(self.url)["ETag"]
+        for cambio in (
+            lambda: Plato.objects.create(restaurante=self.restaurante, nombre="Gazpacho", precio=5),
+            lambda: self.restaurante.mesa_set.first().delete(),
+            lambda: self.restaurante.clientes_frecuentes.add(Cliente.objects.create(nombre="Ana", email="a@e.com")),
+            lambda: Cliente.objects.filter(nombre="Ana").first().restaurantes_favoritos.clear(),
+        ):
+            cambio()
+            respuesta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(respuesta.status_code, 200)
+            etag = respuesta["ETag"]
+
+    def test_categoria_cambia_al_borrar_un_plato(self):
+        url = reverse("platos_por_categoria", args=["principal"])
+        Plato.objects.create(restaurante=self.restaurante, nombre="Gazpacho", precio=5)
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.plato.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_last_modified(self):
+        respuesta = self.client.get(self.url)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=respuesta["Last-Modified"]).status_code, 304
+        )
+
+
+class ExportacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.casa = crear_restaurante(mesas=1)
+        cls.otro = crear_restaurante("Otro", mesas=1)
+        cls.ana = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        cls.luis = Cliente.objects.create(nombre="Luis", email="luis@example.com")
+        cls.casa.clientes_frecuentes.add(cls.ana)
+        plato = Plato.objects.create(restaurante=cls.casa, nombre="Salmorejo, grande", precio=Decimal("6.00"))
+        cls.pedidos = []
+        for restaurante, cliente, dia in ((cls.casa, cls.ana, 1), (cls.casa, cls.luis, 2), (cls.otro, cls.ana, 3)):
+            fecha = datetime.date(2030, 1, dia)
+            Reserva.objects.create(cliente=cliente, mesa=restaurante.mesa_set.get(), fecha=fecha, hora=datetime.time(21))
+            cls.pedidos.append(Pedido.objects.create(
+                cliente=cliente, restaurante=restaurante, fecha=fecha, total=Decimal("12.00"),
+            ))
+        for comentario in ("", "Sin sal"):
+            LineaPedido.objects.create(
+                pedido=cls.pedidos[0], plato=plato, cantidad=1, precio_unitario=plato.precio, comentario=comentario,
+            )
+        cls.usuario = Usuario.objects.create_superuser("admin", "admin@example.com", "x")
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def descargar(self, modelo, **params):
+        respuesta = self.client.get(reverse("exportar", args=[modelo]), params)
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta, b"".join(respuesta.streaming_content).decode()
+
+    def test_csv(self):
+        respuesta, contenido = self.descargar("pedidos", formato="csv")
+        self.assertTrue(respuesta["Content-Type"].startswith("text/csv"))
+        self.assertIn('filename="pedidos.csv"', respuesta["Content-Disposition"])
+        filas = list(csv.DictReader(StringIO(contenido)))
+        self.assertEqual(list(filas[0]), ExportacionPedidos().columnas)
+        # Una fila por línea; el pedido sin líneas sale una vez con las columnas de línea vacías
+        self.assertEqual([int(f["id"]) for f in filas], [self.pedidos[0].pk] * 2 + [p.pk for p in self.pedidos[1:]])
+        self.assertEqual([f["linea_comentario"] for f in filas[:2]], ["", "Sin sal"])
+        self.assertEqual(filas[0]["linea_plato__nombre"], "Salmorejo, grande")
+        self.assertEqual(filas[2]["linea_plato_id"], "")
+
+    def test_jsonl(self):
+        respuesta, contenido = self.descargar("pedidos", formato="jsonl")
+        self.assertTrue(respuesta["Content-Type"].startswith("application/x-ndjson"))
+        filas = [json.loads(linea) for linea in contenido.splitlines()]
+        self.assertEqual([f["id"] for f in filas], [p.pk for p in self.pedidos])
+        self.assertEqual([len(f["lineas"]) for f in filas], [2, 0, 0])
+        self.assertEqual((filas[0]["fecha"], filas[0]["total"]), ("2030-01-01", "12.00"))
+
+    def test_filtros_de_restaurante_y_fechas(self):
+        def ids(modelo, **params):
+            _, contenido = self.descargar(modelo, formato="jsonl", **params)
+            return [json.loads(linea)["id"] for linea in contenido.splitlines()]
+
+        pedidos = [p.pk for p in self.pedidos]
+        self.assertEqual(ids("pedidos", restaurante=self.casa.pk), pedidos[:2])
+        self.assertEqual(ids("pedidos", desde="2030-01-02"), pedidos[1:])
+        self.assertEqual(ids("pedidos", desde="2030-01-02", hasta="2030-01-02"), pedidos[1:2])
+        self.assertEqual(ids("pedidos", restaurante=self.otro.pk, hasta="2030-01-02"), [])
+        reservas = list(Reserva.objects.order_by("pk").values_list("pk", flat=True))
+        self.assertEqual(ids("reservas", restaurante=self.otro.pk), reservas[2:])
+        self.assertEqual(ids("reservas", hasta="2030-01-01"), reservas[:1])
+        # Clientes: con restaurante, los que lo tienen de favorito
+        self.assertEqual(ids("clientes", restaurante=self.casa.pk), [self.ana.pk])
+
+    def test_errores(self):
+        url = reverse("exportar", args=["pedidos"])
+        for params in ({"formato": "xml"}, {"desde": "ayer"}, {"restaurante": "casa"}):
+            with self.subTest(params=params):
+                respuesta = self.client.get(url, params)
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertIn("error", respuesta.json())
+        self.assertEqual(self.client.get(reverse("exportar", args=["platos"])).status_code, 404)
+        self.client.force_login(Usuario.objects.create_user("ana", "a@example.com", "x"))
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.restaurante = crear_restaurante(mesas=2)
+        etiqueta = Etiqueta.objects.create(nombre="Vegano", slug="vegano")
+        self.platos = [
+            Plato.objects.create(restaurante=self.restaurante, nombre=n, precio=p)
+            for n, p in (("Salmorejo", 6), ("Gazpacho", 5), ("Flamenquín", 9))
+        ]
+        self.platos[0].etiquetas.add(etiqueta)
+
+    def test_platos_por_precio_con_cursor_y_campos(self):
+        url = reverse("api_v1:platos")
+        datos = json.loads(self.client.get(url, {"fields": "nombre,precio,etiquetas", "orden": "precio", "limite": 2}).content)
+        self.assertEqual(
+            datos["resultados"],
+            [{"nombre": "Gazpacho", "precio": "5.00", "etiquetas": []},
+             {"nombre": "Salmorejo", "precio": "6.00", "etiquetas": ["vegano"]}],
+        )
+        siguiente = json.loads(self.client.get(url, {"fields": "nombre", "orden": "precio", "limite": 2, "cursor": datos["siguiente"]}).content)
+        self.assertEqual(siguiente["resultados"], [{"nombre": "Flamenquín"}])
+        self.assertIsNone(siguiente["siguiente"])
+
+    def test_detalle_con_mesas_y_errores(self):
+        datos = json.loads(self.client.get(reverse("api_v1:restaurante", args=[self.restaurante.pk])).content)
+        self.assertEqual(datos["ciudad"], "Sevilla")
+        self.assertEqual(datos["mesas"], {"total": 2, "activas": 2})
+        self.assertEqual(len(datos["platos"]), 3)
+        self.assertEqual(self.client.get(reverse("api_v1:platos"), {"fields": "secreto"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("api_v1:restaurante", args=[0])).status_code, 404)
+
+    def test_gzip_y_cache_de_menus(self):
+        respuesta = self.client.get(reverse("api_v1:platos"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(respuesta["Content-Encoding"], "gzip")
+        url = reverse("api_v1:categorias")
+        self.client.get(url)
+        # Solo la consulta de la versión (Restaurante.updated_at)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url)["X-Cache-Pagina"], "HIT")
+        Plato.objects.create(restaurante=self.restaurante, nombre="Tarta", precio=4, categoria="postre")
+        categorias = [c["categoria"] for c in json.loads(self.client.get(url).content)["resultados"]]
+        self.assertEqual(categorias, ["postre", "principal"])
+
+
+class VistasAsincronasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.restaurante = crear_restaurante(mesas=2)
+        Plato.objects.create(restaurante=self.restaurante, nombre="Salmorejo", precio=6)
+        self.restaurante.clientes_frecuentes.add(Cliente.objects.create(nombre="Salvador", email="s@example.com"))
+        self.async_client.force_login(Usuario.objects.create_superuser("admin", "admin@example.com", "x"))
+
+    async def test_detalle_y_busqueda(self):
+        respuesta = await self.async_client.get(reverse("detalle_restaurante", args=[self.restaurante.pk]))
+        self.assertContains(respuesta, "Salmorejo")
+        self.assertContains(respuesta, "Salvador")
+        self.assertContains(respuesta, "Mesa 2")
+        respuesta = await self.async_client.get(reverse("detalle_restaurante", args=[0]))
+        self.assertEqual(respuesta.status_code, 404)
+        respuesta = await self.async_client.get(reverse("buscar_simple", args=["salva"]))
+        self.assertContains(respuesta, "Salvador")
+        respuesta = await self.async_client.get(reverse("buscar_simple", args=["salmo"]))
+        self.assertContains(respuesta, "Salmorejo")
+
+    async def test_lista_platos_y_mesas_libres(self):
+        for _ in range(2):
+            self.assertContains(await self.async_client.get(reverse("lista_platos")), "Salmorejo")
+        respuesta = await self.async_client.get(
+            reverse("mesas_libres"), {"restaurante": self.restaurante.pk, "fecha": "2030-01-01", "hora": "21:00"}
+        )
+        self.assertEqual([m["numero"] for m in json.loads(respuesta.content)["mesas"]], [1, 2])
+
+    async def test_cuenta_consultas_con_asgi(self):
+        # El ORM va por sync_to_async: las consultas se hacen en otro hilo y con otra conexión
+        for url in (reverse("detalle_restaurante", args=[self.restaurante.pk]), reverse("restaurantes_listar")):
+            with self.subTest(url=url):
+                respuesta = await self.async_client.get(url)
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertGreater(int(respuesta[CABECERA]), 0)
+
+
+class TableroReservasTests(TestCase):
+    def setUp(self):
+        tablero._repartos.clear()
+        self.restaurante = crear_restaurante(mesas=1)
+        self.cliente = Cliente.objects.create(nombre="Ana", email="ana@example.com")
+        self.client.force_login(Usuario.objects.create_superuser("admin", "admin@example.com", "x"))
+        self.url = reverse("tablero_eventos", args=[self.restaurante.pk])
+
+    def _cambios(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            reserva = Reserva.objects.create(
+                cliente=self.cliente, mesa=self.restaurante.mesa_set.get(), fecha=datetime.date.today(),
+                hora=datetime.time(21, 0),
+            )
+        with self.captureOnCommitCallbacks(execute=True):
+            reserva.estado = "confirmada"
+            reserva.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            reserva.delete()
+
+    def _eventos(self, **parametros):
+        respuesta = self.client.get(self.url, {"desde": 0, **parametros})
+        self.assertEqual(respuesta["Content-Type"], "text/event-stream; charset=utf-8")
+        texto = contenido(respuesta).decode()
+        return [linea.split(": ", 1)[1] for linea in texto.splitlines() if linea.startswith("event: ")]
+
+    def test_reparto_local(self):
+        self._cambios()
+        self.assertEqual(self._eventos(segundos=0.2), ["creada", "actualizada", "borrada"])
+
+    @override_settings(TABLERO_BROKER="bd", TABLERO_INTERVALO_BD=0.05)
+    def test_reparto_bd(self):
+        self._cambios()
+        self.assertEqual(EventoTablero.objects.filter(restaurante_id=self.restaurante.pk).count(), 3)
+        self.assertEqual(self._eventos(segundos=0.3), ["creada", "actualizada", "borrada"])
+
+    def test_pagina_del_tablero(self):
+        self._cambios()
+        respuesta = self.client.get(reverse("tablero_reservas", args=[self.restaurante.pk]))
+        self.assertContains(respuesta, "EventSource")
+
+
+class RepartoLocalTests(SimpleTestCase):
+    async def test_entrega_lo_publicado_desde_otro_hilo(self):
+        reparto = tablero.RepartoLocal()
+        eventos = reparto.escuchar(1, espera=5)
+        primero = asyncio.ensure_future(anext(eventos))
+        await asyncio.sleep(0)
+        await sync_to_async(reparto.publicar, thread_sensitive=False)(1, {"tipo": "creada", "reserva": 7})
+        self.assertEqual(await asyncio.wait_for(primero, 5), {"id": 1, "tipo": "creada", "reserva": 7})
+        await eventos.aclose()
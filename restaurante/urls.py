@@ -1,5 +1,5 @@
 from django.urls import include, path, re_path
-from . import views
+from . import api, views
 
 crud_restaurante_patterns = [
     path('', views.restaurantes_listar, name='listar'),
@@ -23,11 +23,21 @@ crud_platos_patterns = [
     path('eliminar/<int:pk>/', views.platos_eliminar, name='eliminar'),
 ]
 
+api_v1_patterns = [
+    path('restaurantes/', api.restaurantes, name='restaurantes'),
+    path('restaurantes/<int:id>/', api.restaurante, name='restaurante'),
+    path('platos/', api.platos, name='platos'),
+    path('categorias/', api.categorias, name='categorias'),
+    path('mesas/', api.mesas, name='mesas'),
+]
+
 urlpatterns = [
     # CRUD RESTAURANTE 
     path('crud_restaurante/', include((crud_restaurante_patterns, 'crud_restaurante'), namespace='crud_restaurante')),
     path('crud_clientes/', include((crud_clientes_patterns, 'crud_clientes'), namespace='crud_clientes')),
     path('crud_platos/', include((crud_platos_patterns, 'crud_platos'), namespace='crud_platos')),
+    # API JSON de solo lectura
+    path('api/v1/', include((api_v1_patterns, 'api_v1'), namespace='api_v1')),
 
     path('', views.index, name='index'),
     path('restaurante/', views.restaurantes_listar, name='restaurantes_listar'),
@@ -45,13 +55,23 @@ urlpatterns = [
     path('platos/categoria/<str:categoria>/', views.platos_por_categoria, name='platos_por_categoria'),
     path('platos/buscar/<str:texto>/<int:precio_min>/', views.buscar_platos, name='buscar_platos'),
     path('pedidos/', views.lista_pedidos, name='lista_pedidos'),
+    path('pedidos/crear/', views.pedidos_crear, name='pedidos_crear'),
     # CRUD para Reservas
     path('reservas/', views.reservas_listar, name='reservas_listar'),
     path('reservas/crear/', views.reservas_crear, name='reservas_crear'),
     path('reservas/editar/<int:pk>/', views.reservas_editar, name='reservas_editar'),
     path('reservas/eliminar/<int:pk>/', views.reservas_eliminar, name='reservas_eliminar'),
+    path('reservas/mesas-libres/', views.mesas_libres, name='mesas_libres'),
+    path('reservas/tablero/<int:restaurante_id>/', views.tablero_reservas, name='tablero_reservas'),
+    path('reservas/tablero/<int:restaurante_id>/eventos/', views.tablero_eventos, name='tablero_eventos'),
     path('pedidos/sin-lineas/', views.pedidos_sin_lineas, name='pedidos_sin_lineas'),
     path('clientes/frecuentes/', views.clientes_frecuentes, name='clientes_frecuentes'),
+    path('exportar/<str:modelo>/', views.exportar, name='exportar'),
+    path('autocompletar/<str:fuente>/', views.autocompletar, name='autocompletar'),
+    # Tareas en segundo plano
+    path('tareas/', views.tareas_listar, name='tareas_listar'),
+    path('tareas/<int:pk>/', views.tarea_estado, name='tarea_estado'),
+    path('tareas/<int:pk>/descargar/', views.tarea_descargar, name='tarea_descargar'),
     # CRUD para PerfilCliente
     path('perfiles/', views.perfil_listar, name='perfil_listar'),
     path('perfiles/crear/', views.perfil_crear, name='perfil_crear'),
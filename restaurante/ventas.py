@@ -0,0 +1,185 @@
+"""Mantenimiento incremental de ``ResumenVentasDiario``.
+
+Cada cambio en un pedido o una línea se traduce en un "delta" (pedidos, total,
+líneas, unidades) que se suma con ``F()`` a la fila del restaurante y día
+correspondiente. Así el resumen de ``lista_pedidos`` lee una fila por día en
+lugar de agregar toda la tabla de pedidos.
+"""
+
+import threading
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from .models import LineaPedido, LineaPedidoArchivada, Pedido, PedidoArchivado, ResumenVentasDiario
+
+_local = threading.local()
+
+
+def aplicar(restaurante_id, fecha, pedidos=0, total=Decimal("0"), lineas=0, unidades=0):
+    """Suma el delta a la fila (restaurante, fecha), creándola si no existe."""
+    if not (pedidos or total or lineas or unidades):
+        return
+    cambios = dict(
+        num_pedidos=F("num_pedidos") + pedidos,
+        total=F("total") + total,
+        num_lineas=F("num_lineas") + lineas,
+        unidades=F("unidades") + unidades,
+    )
+    filtro = ResumenVentasDiario.objects.filter(restaurante_id=restaurante_id, fecha=fecha)
+    if filtro.update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            ResumenVentasDiario.objects.create(
+                restaurante_id=restaurante_id, fecha=fecha,
+                num_pedidos=pedidos, total=total, num_lineas=lineas, unidades=unidades,
+            )
+    except IntegrityError:
+        # Otra transacción creó la fila entre el UPDATE y el INSERT
+        filtro.update(**cambios)
+
+
+def _lineas_de(pedido_id):
+    datos = LineaPedido.objects.filter(pedido_id=pedido_id).aggregate(n=Count("id"), u=Sum("cantidad"))
+    return datos["n"], datos["u"] or 0
+
+
+def pedidos_en_borrado() -> set:
+    if not hasattr(_local, "borrando"):
+        _local.borrando = set()
+    return _local.borrando
+
+
+# ------------------------------ Pedido ------------------------------
+
+
+def pedido_antes_de_guardar(pedido):
+    pedido._venta_anterior = None
+    if pedido.pk:
+        pedido._venta_anterior = (
+            Pedido.objects.filter(pk=pedido.pk).values_list("restaurante_id", "fecha", "total").first()
+        )
+
+
+def pedido_guardado(pedido, created):
+    anterior = getattr(pedido, "_venta_anterior", None)
+    if created or anterior is None:
+        aplicar(pedido.restaurante_id, pedido.fecha, pedidos=1, total=pedido.total)
+        return
+
+    restaurante_id, fecha, total = anterior
+    if (restaurante_id, fecha) == (pedido.restaurante_id, pedido.fecha):
+        aplicar(restaurante_id, fecha, total=pedido.total - total)
+        return
+
+    # Cambió de restaurante o de día: el pedido y sus líneas se mudan de fila
+    lineas, unidades = _lineas_de(pedido.pk)
+    aplicar(restaurante_id, fecha, pedidos=-1, total=-total, lineas=-lineas, unidades=-unidades)
+    aplicar(pedido.restaurante_id, pedido.fecha, pedidos=1, total=pedido.total, lineas=lineas, unidades=unidades)
+
+
+def pedido_antes_de_borrar(pedido):
+    """Descuenta el pedido entero (con sus líneas) antes de que el borrado en cascada las elimine."""
+    lineas, unidades = _lineas_de(pedido.pk)
+    aplicar(pedido.restaurante_id, pedido.fecha, pedidos=-1, total=-pedido.total, lineas=-lineas, unidades=-unidades)
+    pedidos_en_borrado().add(pedido.pk)
+
+
+def pedido_borrado(pedido):
+    pedidos_en_borrado().discard(pedido.pk)
+
+
+# --------------------------- LineaPedido ----------------------------
+
+
+def _clave_pedido(pedido_id):
+    return Pedido.objects.filter(pk=pedido_id).values_list("restaurante_id", "fecha").first()
+
+
+def linea_antes_de_guardar(linea):
+    linea._venta_anterior = None
+    if linea.pk:
+        linea._venta_anterior = (
+            LineaPedido.objects.filter(pk=linea.pk).values_list("pedido_id", "cantidad").first()
+        )
+
+
+def linea_guardada(linea, created):
+    anterior = getattr(linea, "_venta_anterior", None)
+    if not created and anterior is not None:
+        pedido_id, cantidad = anterior
+        if pedido_id == linea.pedido_id:
+            clave = _clave_pedido(pedido_id)
+            if clave:
+                aplicar(*clave, unidades=linea.cantidad - cantidad)
+            return
+        clave = _clave_pedido(pedido_id)
+        if clave:
+            aplicar(*clave, lineas=-1, unidades=-cantidad)
+
+    clave = _clave_pedido(linea.pedido_id)
+    if clave:
+        aplicar(*clave, lineas=1, unidades=linea.cantidad)
+
+
+def linea_borrada(linea):
+    if linea.pedido_id in pedidos_en_borrado():
+        return  # ya descontada junto con su pedido
+    clave = _clave_pedido(linea.pedido_id)
+    if clave:
+        aplicar(*clave, lineas=-1, unidades=-linea.cantidad)
+
+
+# ---------------------------- Reconstrucción ----------------------------
+
+
+def reconstruir(desde=None, hasta=None, lote: int = 5000, progreso=None):
+    """Recalcula los resúmenes (de un rango de fechas o de todo) por lotes de pedidos.
+
+    Borra las filas del rango y vuelve a sumar los pedidos por tramos de id, de
+    modo que nunca se agrega la tabla entera de golpe. Los pedidos archivados
+    (ver ``archivo.py``) también cuentan. Conviene ejecutarlo sin escrituras
+    concurrentes sobre pedidos de ese rango.
+    """
+    resumenes = ResumenVentasDiario.objects.all()
+    if desde:
+        resumenes = resumenes.filter(fecha__gte=desde)
+    if hasta:
+        resumenes = resumenes.filter(fecha__lte=hasta)
+    resumenes.delete()
+
+    procesados = 0
+    for modelo, lineas_modelo in ((Pedido, LineaPedido), (PedidoArchivado, LineaPedidoArchivada)):
+        pedidos = modelo.objects.all()
+        if desde:
+            pedidos = pedidos.filter(fecha__gte=desde)
+        if hasta:
+            pedidos = pedidos.filter(fecha__lte=hasta)
+        ultimo = 0
+        while True:
+            ids = list(pedidos.filter(pk__gt=ultimo).order_by("pk").values_list("pk", flat=True)[:lote])
+            if not ids:
+                break
+            tramo = pedidos.filter(pk__gte=ids[0], pk__lte=ids[-1])
+            acumulado = {}
+            for fila in tramo.values("restaurante_id", "fecha").annotate(n=Count("id"), t=Sum("total")).order_by():
+                acumulado[(fila["restaurante_id"], fila["fecha"])] = [fila["n"], fila["t"], 0, 0]
+            lineas = (
+                lineas_modelo.objects.filter(pedido__in=tramo)
+                .values("pedido__restaurante_id", "pedido__fecha")
+                .annotate(n=Count("id"), u=Sum("cantidad"))
+                .order_by()
+            )
+            for fila in lineas:
+                delta = acumulado[(fila["pedido__restaurante_id"], fila["pedido__fecha"])]
+                delta[2], delta[3] = fila["n"], fila["u"]
+            with transaction.atomic():
+                for (restaurante_id, fecha), (n, t, lin, uds) in acumulado.items():
+                    aplicar(restaurante_id, fecha, pedidos=n, total=t, lineas=lin, unidades=uds)
+            ultimo = ids[-1]
+            procesados += len(ids)
+            if progreso:
+                progreso(procesados)
+    return procesados
@@ -0,0 +1,28 @@
+"""Testigos de versión en la caché para invalidar grupos de claves de golpe.
+
+Cada testigo es un valor aleatorio guardado sin caducidad. Quien cachea algo
+mete en la clave los testigos de los que depende; para invalidar basta con
+renovar el testigo, y las entradas viejas dejan de encontrarse y caducan
+solas. Como el valor nuevo es aleatorio (no un contador), si la caché pierde
+un testigo no puede reaparecer una versión antigua.
+"""
+
+import uuid
+
+from django.core.cache import cache
+
+
+def leer(*claves) -> str:
+    """Testigos de ``claves`` unidos en una cadena, creando los que falten."""
+    testigos = cache.get_many(claves)
+    faltan = [c for c in claves if c not in testigos]
+    if faltan:
+        for clave in faltan:
+            # add() por si otro proceso lo ha creado entretanto
+            cache.add(clave, uuid.uuid4().hex, None)
+        testigos.update(cache.get_many(faltan))
+    return ":".join(testigos.get(c, "") for c in claves)
+
+
+def renovar(*claves):
+    cache.set_many({c: uuid.uuid4().hex for c in claves}, None)
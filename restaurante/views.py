@@ -1,13 +1,36 @@
 import datetime
+import json
+import os
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.exceptions import PermissionDenied
+from django.views.decorators.http import require_POST
 from django.views.defaults import page_not_found
-from django.db.models import Q, Count, Sum, Avg
+from django.db.models import Sum
 from django.contrib import messages
-from django.utils import timezone
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required, permission_required
-from restaurante.form import (RestauranteBusquedaAvanzadaForm,RestauranteForm,RestauranteCreateForm,DireccionForm,ClienteForm,PlatoForm,ReservaForm,ReservaCreateForm,PerfilClienteForm,PerfilClienteCreateForm,RegistroForm,)
-from .models import (Restaurante,Direccion,Plato,Etiqueta,Mesa,Cliente,PerfilCliente,Reserva,Pedido,LineaPedido,Usuario,)
+from django.conf import settings
+from restaurante.form import (RestauranteBusquedaAvanzadaForm,RestauranteForm,RestauranteCreateForm,DireccionForm,ClienteForm,PlatoForm,ReservaForm,ReservaCreateForm,PerfilClienteForm,PerfilClienteCreateForm,RegistroForm,ClientesFrecuentesFiltroForm,)
+from .models import (Restaurante,Direccion,Plato,Etiqueta,Mesa,Cliente,PerfilCliente,Reserva,Pedido,LineaPedido,Usuario,ResumenVentasDiario,EstadisticaCliente,Tarea,)
+from .asincrono import alistar, arender
+from .disponibilidad import amesas_libres
+from .reservas import MesaNoDisponible, reservar_mesa
+from .paginacion import KeysetPaginator
+from .pedidos import PedidoInvalido, registrar_pedidos
+from .busqueda import buscar
+from .basedatos import alias_lectura
+from .autocompletar import FILTROS, FUENTES, LIMITE, LIMITE_MAXIMO
+from .exportacion import EXPORTACIONES, FORMATOS, generar
+from . import cache_menus, tablero, tareas
+from .cache_menus import pagina_cacheada, version_listados, version_restaurante
+from .condicional import condicional, validador_categoria, validador_restaurante, validador_restaurantes
+from .permisos import rol_de
+from .sesiones import actualizar_sesion
 
 def index(request):
     """Índice con enlaces."""
@@ -25,36 +48,41 @@ def error_404(request, exception=None):
 def error_500(request, exception=None):
     return render(request, 'errores/500.html', None, None, 500)
 
+@condicional(validador_restaurantes)
+@pagina_cacheada(version_listados)
 def lista_restaurantes(request):
     
     """
     restaurantes con su dirección (OneToOne) y contadores de platos/mesas.
+    Los contadores son columnas de Restaurante mantenidas por señales (ver
+    contadores.py): no hace falta el JOIN con platos y mesas ni el GROUP BY.
+    Cada restaurante se pinta con el fragmento cacheado de su ficha, con su
+    updated_at en la clave.
    
     SQL:
-      SELECT r.*, d.*, COUNT(DISTINCT p.id) AS num_platos, COUNT(DISTINCT m.id) AS num_mesas
+      SELECT r.*, d.*
       FROM restaurante_restaurante r
       JOIN restaurante_direccion d ON r.direccion_id=d.id
-      LEFT JOIN restaurante_plato p ON p.restaurante_id=r.id
-      LEFT JOIN restaurante_mesa  m ON m.restaurante_id=r.id
-      GROUP BY r.id, d.id
       ORDER BY r.nombre ASC;
     """
     qs = (
         Restaurante.objects
         .select_related('direccion')
-        .annotate(
-            num_platos=Count('plato', distinct=True),
-            num_mesas=Count('mesa', distinct=True),
-        )
         .order_by('nombre')
     )
-    return render(request, 'restaurante/restaurantes.html', {'restaurantes': qs})
+    return render(request, 'restaurante/restaurantes.html', {
+        'restaurantes': qs,
+        'segundos_cache': cache_menus.segundos(),
+    })
 
 
-def detalle_restaurante(request, id: int):
+@condicional(validador_restaurante)
+@pagina_cacheada(lambda id: version_restaurante(id))
+async def detalle_restaurante(request, id: int):
     """
     Muestra un restaurante con dirección, platos, mesas y clientes frecuentes.
-    
+    Asíncrona: mientras esperan las consultas, el bucle de eventos atiende
+    otras peticiones (el ORM las hace una tras otra en su hilo).
 
     SQL:
       SELECT * FROM restaurante_restaurante WHERE id=%s;
@@ -65,19 +93,27 @@ def detalle_restaurante(request, id: int):
         JOIN restaurante_cliente c ON c.id=rc.cliente_id
        WHERE rc.restaurante_id=%s;
     """
-    r = (
-        Restaurante.objects
-        .select_related('direccion')
-        .prefetch_related('clientes_frecuentes', 'plato_set', 'mesa_set')
-        .get(pk=id)
-    )
-    return render(request, 'restaurante/restaurante_detalle.html', {'r': r})
+    try:
+        r = await Restaurante.objects.select_related('direccion').aget(pk=id)
+    except Restaurante.DoesNotExist:
+        raise Http404
+    platos = await alistar(Plato.objects.filter(restaurante_id=id).order_by('nombre'))
+    mesas = await alistar(Mesa.objects.filter(restaurante_id=id).order_by('numero'))
+    clientes = await alistar(Cliente.objects.filter(restaurantes_favoritos=id))
+    return await arender(request, 'restaurante/restaurante_detalle.html', {
+        'r': r,
+        'platos': platos,
+        'mesas': mesas,
+        'clientes': clientes,
+        'segundos_cache': cache_menus.segundos(),
+    })
 
 
-def lista_platos(request):
+async def lista_platos(request):
     """
     Lista platos con su restaurante y etiquetas (M2M), ordenado por precio.
     Optimización: select_related (FK) + prefetch_related (M2M) + limit.
+    Asíncrona: solo consulta si el fragmento de la lista no está en caché.
 
     SQL:
       SELECT p.*, r.*
@@ -92,9 +128,20 @@ def lista_platos(request):
         .prefetch_related('etiquetas')
         .order_by('precio')[:100]
     )
-    return render(request, 'restaurante/platos.html', {'platos': platos})
+    # La lista se cachea como fragmento (la página lleva datos de la sesión en
+    # base.html): si el fragmento está en caché, el queryset no se evalúa.
+    version = await sync_to_async(version_listados)()
+    if not await cache.ahas_key(make_template_fragment_key('lista_platos', [version])):
+        platos = await alistar(platos)
+    return await arender(request, 'restaurante/platos.html', {
+        'platos': platos,
+        'version_menu': version,
+        'segundos_cache': cache_menus.segundos(),
+    })
 
 
+@condicional(validador_categoria)
+@pagina_cacheada(lambda categoria: version_listados())
 def platos_por_categoria(request, categoria: str):
     """
     Filtra platos por categoría exacta (param str).
@@ -118,34 +165,28 @@ def platos_por_categoria(request, categoria: str):
     })
 
 
-def buscar_platos(request, texto: str, precio_min: int):
+async def buscar_platos(request, texto: str, precio_min: int):
     """
     Búsqueda con AND/OR:
       - AND: precio >= precio_min
-      - OR : nombre contiene 'texto'  OR  etiqueta.nombre = 'texto'
-    Optimización: select_related + prefetch_related + distinct (por M2M).
+      - OR : nombre o alguna etiqueta contiene una palabra que empieza por 'texto'
+    Optimización: índice FTS5 (nombre + etiquetas en el mismo documento, sin
+    JOIN ni DISTINCT) + select_related + prefetch_related. Orden por relevancia.
 
     SQL:
-      SELECT DISTINCT p.*
+      SELECT f.rank AS relevancia, p.*, r.*
         FROM restaurante_plato p
-   LEFT JOIN restaurante_plato_etiquetas pe ON pe.plato_id=p.id
-   LEFT JOIN restaurante_etiqueta e        ON e.id=pe.etiqueta_id
-       WHERE p.precio >= %s
-         AND (p.nombre LIKE %texto% OR e.nombre = %s)
-       ORDER BY p.precio ASC;
+        JOIN restaurante_restaurante r ON p.restaurante_id=r.id
+        JOIN restaurante_fts_plato f ON f.rowid=p.id
+       WHERE p.precio >= %s AND f MATCH %s
+       ORDER BY relevancia ASC, p.id;
     """
-    platos = (
-        Plato.objects
-        .filter(
-            Q(precio__gte=precio_min) &
-            (Q(nombre__icontains=texto) | Q(etiquetas__nombre__iexact=texto))
-        )
+    platos = await alistar(
+        buscar(Plato.objects.filter(precio__gte=precio_min), texto)
         .select_related('restaurante')
         .prefetch_related('etiquetas')
-        .order_by('precio')
-        .distinct()
     )
-    return render(request, 'restaurante/platos_buscar.html', {
+    return await arender(request, 'restaurante/platos_buscar.html', {
         'platos': platos,
         'texto': texto,
         'precio_min': precio_min,
@@ -155,25 +196,32 @@ def buscar_platos(request, texto: str, precio_min: int):
 def lista_pedidos(request):
     """
     Muestra pedidos recientes y un resumen global (SUM/AVG).
-    Optimización: select_related (FK/O2O) + prefetch_related (reversa de líneas).
+    Optimización: el resumen sale de ResumenVentasDiario (una fila por
+    restaurante y día, mantenida por señales) en vez de agregar todos los
+    pedidos; select_related (FK/O2O) + prefetch_related (reversa de líneas).
+    Las consultas van a la conexión de solo lectura si existe (basedatos.py).
 
     SQL:
-      SELECT SUM(total) AS suma, AVG(total) AS promedio
-        FROM restaurante_pedido;
+      SELECT SUM(total) AS suma, SUM(num_pedidos) AS num_pedidos
+        FROM restaurante_resumenventasdiario;
 
       SELECT p.*, c.*, r.*
         FROM restaurante_pedido p
         JOIN restaurante_cliente c     ON p.cliente_id=c.id
         JOIN restaurante_restaurante r ON p.restaurante_id=r.id
-       ORDER BY p.creado DESC
+       ORDER BY p.id DESC
        LIMIT 100;
     """
-    resumen = Pedido.objects.aggregate(
+    bd = alias_lectura()
+    resumen = ResumenVentasDiario.objects.using(bd).aggregate(
         suma=Sum('total'),
-        promedio=Avg('total')
+        num_pedidos=Sum('num_pedidos'),
+    )
+    resumen['promedio'] = (
+        round(resumen['suma'] / resumen['num_pedidos'], 2) if resumen['num_pedidos'] else None
     )
     pedidos = (
-        Pedido.objects
+        Pedido.objects.using(bd)
         .select_related('cliente', 'restaurante', 'reserva')
         .prefetch_related('lineapedido_set__plato')
         .order_by('-id')[:100]
@@ -185,6 +233,46 @@ def lista_pedidos(request):
     })
 
 
+@login_required(login_url='login')
+@require_POST
+def pedidos_crear(request):
+    """
+    Alta de pedidos con sus líneas en JSON, uno suelto o un lote del TPV.
+
+    POST {"cliente", "restaurante", "reserva"?, "fecha"?, "lineas": [{"plato", "cantidad"?,
+          "descuento_porcentaje"?, "comentario"?}]}
+    POST {"pedidos": [<pedido>, ...]}
+
+    El precio de cada línea se copia del plato y el total se calcula en la
+    misma transacción. Las consultas no crecen con el tamaño del lote (ver
+    pedidos.py):
+
+    SQL:
+      SELECT id, precio, restaurante_id FROM restaurante_plato WHERE id IN (...);
+      SELECT id FROM restaurante_cliente WHERE id IN (...);
+      SELECT id FROM restaurante_restaurante WHERE id IN (...);
+      INSERT INTO restaurante_pedido (...) VALUES (...), (...) RETURNING id;
+      INSERT INTO restaurante_lineapedido (...) VALUES (...), (...), (...);
+      UPDATE restaurante_resumenventasdiario SET total = total + ... WHERE restaurante_id = ... AND fecha = ...;
+    """
+    if not request.user.has_perm('restaurante.add_pedido'):
+        raise PermissionDenied
+    try:
+        cuerpo = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'El cuerpo debe ser JSON.'}, status=400)
+
+    lote = isinstance(cuerpo, dict) and 'pedidos' in cuerpo
+    try:
+        pedidos = registrar_pedidos(cuerpo['pedidos'] if lote else [cuerpo], creado_por=request.user)
+    except PedidoInvalido as e:
+        errores = e.errores if lote else e.errores.get(0, e.errores)
+        return JsonResponse({'errores': errores}, status=400)
+
+    creados = [{'id': p.pk, 'total': str(p.total), 'lineas': p.num_lineas} for p in pedidos]
+    return JsonResponse({'pedidos': creados} if lote else creados[0], status=201)
+
+
 def pedidos_sin_lineas(request):
     """
     Lista pedidos que no tienen ninguna línea (reversa isnull=True).
@@ -196,7 +284,7 @@ def pedidos_sin_lineas(request):
        WHERE lp.id IS NULL;
     """
     pedidos = (
-        Pedido.objects
+        Pedido.objects.using(alias_lectura())
         .filter(lineapedido__isnull=True)
         .select_related('cliente', 'restaurante', 'reserva')
         .order_by('id')
@@ -206,55 +294,66 @@ def pedidos_sin_lineas(request):
 
 def clientes_frecuentes(request):
     """
-    Clientes con nº de pedidos (aggregate por fila) y favoritos (M2M).
-    Requisito HAVING: filtrar por anotación (num_pedidos >= 1).
+    Clientes con pedidos, su gasto, último pedido, restaurante habitual y
+    favoritos (M2M). Optimización: todo sale de EstadisticaCliente (una fila
+    por cliente con pedidos, mantenida por señales) en vez de agrupar la tabla
+    de pedidos con HAVING; los filtros y órdenes por gasto, pedidos o fecha
+    usan sus índices.
+
+    GET ?orden=nombre|gasto|pedidos|recientes|inactivos&min_pedidos=&min_gasto=&sin_pedir_dias=
 
     SQL:
-      SELECT c.*, COUNT(p.id) AS num_pedidos
-        FROM restaurante_cliente c
-   LEFT JOIN restaurante_pedido p ON p.cliente_id=c.id
-    GROUP BY c.id
-      HAVING COUNT(p.id) >= 1
-    ORDER BY c.nombre ASC;
+      SELECT e.*, c.*, r.*
+        FROM restaurante_estadisticacliente e
+        JOIN restaurante_cliente c          ON e.cliente_id=c.id
+   LEFT JOIN restaurante_restaurante r      ON e.restaurante_favorito_id=r.id
+       WHERE e.total_gastado >= %s AND e.ultimo_pedido <= %s
+    ORDER BY e.total_gastado DESC, e.cliente_id
+       LIMIT 100;
     """
-    clientes = (
-        Cliente.objects
-        .annotate(num_pedidos=Count('pedido'))
-        .filter(num_pedidos__gte=1)
-        .prefetch_related('restaurantes_favoritos')
-        .order_by('nombre')
+    form = ClientesFrecuentesFiltroForm(request.GET or None)
+    qs = EstadisticaCliente.objects.using(alias_lectura()).select_related('cliente', 'restaurante_favorito')
+    orden = ClientesFrecuentesFiltroForm.ORDENES['nombre']
+    if form.is_bound and form.is_valid():
+        datos = form.cleaned_data
+        if datos['min_pedidos']:
+            qs = qs.filter(num_pedidos__gte=datos['min_pedidos'])
+        if datos['min_gasto'] is not None:
+            qs = qs.filter(total_gastado__gte=datos['min_gasto'])
+        if datos['sin_pedir_dias']:
+            qs = qs.filter(ultimo_pedido__lte=datetime.date.today() - datetime.timedelta(days=datos['sin_pedir_dias']))
+        orden = ClientesFrecuentesFiltroForm.ORDENES[datos['orden'] or 'nombre']
+    estadisticas = (
+        qs.prefetch_related('cliente__restaurantes_favoritos')
+        .order_by(*orden)[:100]
     )
-    return render(request, 'restaurante/clientes_frecuentes.html', {'clientes': clientes})
+    return render(request, 'restaurante/clientes_frecuentes.html', {'form': form, 'estadisticas': estadisticas})
 
 
-def buscar_simple(request, texto: str):
+async def buscar_simple(request, texto: str):
     """
     Búsqueda sencilla con re_path: clientes y platos por nombre (OR).
-    Optimización: order_by + limit; select_related para mostrar restaurante.
+    Optimización: índice FTS5 (sin tildes, por prefijo) ordenado por relevancia
+    + limit; select_related para mostrar restaurante. Asíncrona: no ocupa
+    el bucle de eventos mientras esperan las dos búsquedas.
 
     SQL:
-      SELECT * FROM restaurante_cliente
-       WHERE nombre LIKE %texto%
-       ORDER BY nombre ASC
+      SELECT f.rank AS relevancia, c.* FROM restaurante_cliente c
+        JOIN restaurante_fts_cliente f ON f.rowid=c.id
+       WHERE f MATCH 'nombre : "texto"*'
+       ORDER BY relevancia, c.id
        LIMIT 50;
 
-      SELECT * FROM restaurante_plato
-       WHERE nombre LIKE %texto%
-       ORDER BY nombre ASC
+      SELECT f.rank AS relevancia, p.*, r.* FROM restaurante_plato p
+        JOIN restaurante_restaurante r ON p.restaurante_id=r.id
+        JOIN restaurante_fts_plato f ON f.rowid=p.id
+       WHERE f MATCH 'nombre : "texto"*'
+       ORDER BY relevancia, p.id
        LIMIT 50;
     """
-    clientes = (
-        Cliente.objects
-        .filter(nombre__icontains=texto)
-        .order_by('nombre')[:50]
-    )
-    platos = (
-        Plato.objects
-        .filter(nombre__icontains=texto)
-        .select_related('restaurante')
-        .order_by('nombre')[:50]
-    )
-    return render(request, 'restaurante/buscar_simple.html', {
+    clientes = await alistar(buscar(Cliente.objects.all(), nombre=texto)[:50])
+    platos = await alistar(buscar(Plato.objects.all(), nombre=texto).select_related('restaurante')[:50])
+    return await arender(request, 'restaurante/buscar_simple.html', {
         'texto': texto,
         'clientes': clientes,
         'platos': platos,
@@ -263,8 +362,10 @@ def buscar_simple(request, texto: str):
 @login_required(login_url='login')
 @permission_required('restaurante.view_restaurante', login_url='login')
 def restaurantes_listar(request):
-    restaurantes = Restaurante.objects.all()
-    return render(request, 'restaurante/CRUD_direccion/listar.html', {'restaurantes': restaurantes})
+    """Listado de gestión, con los contadores guardados en cada restaurante (ver contadores.py)."""
+    restaurantes = Restaurante.objects.select_related('direccion').prefetch_related('clientes_frecuentes')
+    pagina = KeysetPaginator(restaurantes, ('nombre', 'id')).pagina(request.GET.get('cursor'))
+    return render(request, 'restaurante/CRUD_direccion/listar.html', {'restaurantes': pagina, 'pagina': pagina})
 
 @login_required(login_url='login')
 @permission_required('restaurante.add_restaurante', login_url='login')
@@ -295,19 +396,7 @@ def restaurantes_editar(request, pk):
         if form.is_valid():
             restaurante.nombre = form.cleaned_data['nombre']
             restaurante.telefono = form.cleaned_data['telefono']
-            
-            if 'email' in form.cleaned_data:
-                restaurante.email = form.cleaned_data.get('email') or ''
-            if 'web' in form.cleaned_data:
-                restaurante.web = form.cleaned_data.get('web') or ''
-            if 'abierto' in form.cleaned_data:
-                restaurante.abierto = form.cleaned_data.get('abierto', True)
             restaurante.direccion = form.cleaned_data['direccion']
-            
-            if restaurante.email is None:
-                restaurante.email = ''
-            if restaurante.web is None:
-                restaurante.web = ''
             restaurante.save()
             clientes = form.cleaned_data.get('clientes_frecuentes')
             if clientes is not None:
@@ -319,9 +408,6 @@ def restaurantes_editar(request, pk):
         initial = {
             'nombre': restaurante.nombre,
             'telefono': restaurante.telefono,
-            'email': restaurante.email,
-            'web': restaurante.web,
-            'abierto': restaurante.abierto,
             'direccion': restaurante.direccion,
             'clientes_frecuentes': restaurante.clientes_frecuentes.all(),
         }
@@ -330,11 +416,20 @@ def restaurantes_editar(request, pk):
 @login_required(login_url='login')
 @permission_required('restaurante.delete_restaurante', login_url='login')
 def restaurantes_eliminar(request, pk):
+    """Encola el borrado del restaurante y lleva a la página de la tarea.
+
+    Un trabajador (``trabajar_tareas``) borra por tramos sus pedidos,
+    reservas, platos y mesas (ver borrado.py); hasta que termina, el
+    restaurante sigue apareciendo. Si ya había un borrado pendiente, se
+    muestra ese.
+    """
     restaurante = get_object_or_404(Restaurante, pk=pk)
     if request.method == 'POST':
-        restaurante.delete()
-        messages.success(request, 'Restaurante eliminado correctamente.')
-        return redirect('restaurantes_listar')
+        tarea = tareas.sin_terminar('borrar_restaurante', restaurante=restaurante.pk)
+        if tarea is None:
+            tarea = tareas.encolar('borrar_restaurante', creado_por=request.user, restaurante=restaurante.pk)
+        messages.success(request, f'El restaurante "{restaurante.nombre}" se está eliminando en segundo plano.')
+        return redirect('tarea_estado', pk=tarea.pk)
    
     return redirect('restaurantes_listar')
 
@@ -344,8 +439,8 @@ def restaurantes_eliminar(request, pk):
 @login_required(login_url='login')
 @permission_required('restaurante.view_direccion', login_url='login')
 def direccion_listar(request):
-    direcciones = Direccion.objects.all()
-    return render(request, 'restaurante/direcciones.html', {'direcciones': direcciones})
+    pagina = KeysetPaginator(Direccion.objects.all(), ('id',)).pagina(request.GET.get('cursor'))
+    return render(request, 'restaurante/direcciones.html', {'direcciones': pagina, 'pagina': pagina})
 
 @login_required(login_url='login')
 @permission_required('restaurante.add_direccion', login_url='login')
@@ -392,8 +487,9 @@ from restaurante.form import ReservaForm, ReservaCreateForm, PerfilClienteForm,
 @login_required(login_url='login')
 @permission_required('restaurante.view_reserva', login_url='login')
 def reservas_listar(request):
-    reservas = Reserva.objects.select_related('cliente', 'mesa').order_by('-fecha', '-hora')
-    return render(request, 'restaurante/crud_reservas/listar.html', {'reservas': reservas})
+    reservas = Reserva.objects.select_related('cliente', 'mesa')
+    pagina = KeysetPaginator(reservas, ('-fecha', '-hora', 'id')).pagina(request.GET.get('cursor'))
+    return render(request, 'restaurante/crud_reservas/listar.html', {'reservas': pagina, 'pagina': pagina})
 
 @login_required(login_url='login')
 @permission_required('restaurante.add_reserva', login_url='login')
@@ -401,17 +497,20 @@ def reservas_crear(request):
     if request.method == 'POST':
         form = ReservaCreateForm(request.POST, request=request)
         if form.is_valid():
-            r = Reserva.objects.create(
-                cliente=form.cleaned_data['cliente'],
-                mesa=form.cleaned_data['mesa'],
-                fecha=form.cleaned_data['fecha'],
-                hora=form.cleaned_data['hora'],
-                estado='pendiente',
-                notas=form.cleaned_data.get('notas', ''),
-                creado_por=request.user,
-            )
-            messages.success(request, 'Reserva creada correctamente.')
-            return redirect('reservas_listar')
+            try:
+                reservar_mesa(
+                    cliente=form.cleaned_data['cliente'],
+                    mesa=form.cleaned_data['mesa'],
+                    fecha=form.cleaned_data['fecha'],
+                    hora=form.cleaned_data['hora'],
+                    notas=form.cleaned_data.get('notas', ''),
+                    creado_por=request.user,
+                )
+            except MesaNoDisponible as exc:
+                form.add_error('mesa', str(exc))
+            else:
+                messages.success(request, 'Reserva creada correctamente.')
+                return redirect('reservas_listar')
     else:
         form = ReservaCreateForm(request=request)
     return render(request, 'restaurante/crud_reservas/crear.html', {'form': form})
@@ -421,17 +520,23 @@ def reservas_crear(request):
 def reservas_editar(request, pk):
     reserva = get_object_or_404(Reserva, pk=pk)
     if request.method == 'POST':
-        form = ReservaForm(request.POST)
+        form = ReservaForm(request.POST, reserva=reserva)
         if form.is_valid():
-            reserva.cliente = form.cleaned_data['cliente']
-            reserva.mesa = form.cleaned_data['mesa']
-            reserva.fecha = form.cleaned_data['fecha']
-            reserva.hora = form.cleaned_data['hora']
-            reserva.estado = form.cleaned_data.get('estado', reserva.estado)
-            reserva.notas = form.cleaned_data.get('notas', reserva.notas)
-            reserva.save()
-            messages.success(request, 'Reserva actualizada correctamente.')
-            return redirect('reservas_listar')
+            try:
+                reservar_mesa(
+                    cliente=form.cleaned_data['cliente'],
+                    mesa=form.cleaned_data['mesa'],
+                    fecha=form.cleaned_data['fecha'],
+                    hora=form.cleaned_data['hora'],
+                    estado=form.cleaned_data.get('estado', reserva.estado),
+                    notas=form.cleaned_data.get('notas', reserva.notas),
+                    reserva=reserva,
+                )
+            except MesaNoDisponible as exc:
+                form.add_error('mesa', str(exc))
+            else:
+                messages.success(request, 'Reserva actualizada correctamente.')
+                return redirect('reservas_listar')
     else:
         initial = {
             'cliente': reserva.cliente,
@@ -441,7 +546,7 @@ def reservas_editar(request, pk):
             'estado': reserva.estado,
             'notas': reserva.notas,
         }
-        form = ReservaForm(initial=initial)
+        form = ReservaForm(initial=initial, reserva=reserva)
     return render(request, 'restaurante/crud_reservas/editar.html', {'form': form, 'reserva': reserva})
 
 @login_required(login_url='login')
@@ -460,8 +565,9 @@ def reservas_eliminar(request, pk):
 @login_required(login_url='login')
 @permission_required('restaurante.view_perfilcliente', login_url='login')
 def perfil_listar(request):
-    perfiles = PerfilCliente.objects.select_related('cliente').order_by('cliente__nombre')
-    return render(request, 'restaurante/crud_perfilClientes/listar.html', {'perfiles': perfiles})
+    perfiles = PerfilCliente.objects.select_related('cliente')
+    pagina = KeysetPaginator(perfiles, ('cliente__nombre', 'id')).pagina(request.GET.get('cursor'))
+    return render(request, 'restaurante/crud_perfilClientes/listar.html', {'perfiles': pagina, 'pagina': pagina})
 
 @login_required(login_url='login')
 @permission_required('restaurante.add_perfilcliente', login_url='login')
@@ -519,8 +625,8 @@ def perfil_eliminar(request, pk):
 @login_required(login_url='login')
 @permission_required('restaurante.view_cliente', login_url='login')
 def clientes_listar(request):
-    clientes = Cliente.objects.order_by('nombre')
-    return render(request, 'restaurante/crud_clientes/listar.html', {'clientes': clientes})
+    pagina = KeysetPaginator(Cliente.objects.all(), ('nombre', 'id')).pagina(request.GET.get('cursor'))
+    return render(request, 'restaurante/crud_clientes/listar.html', {'clientes': pagina, 'pagina': pagina})
 
 @login_required(login_url='login')
 @permission_required('restaurante.add_cliente', login_url='login')
@@ -568,8 +674,9 @@ def clientes_eliminar(request, pk):
 @login_required(login_url='login')
 @permission_required('restaurante.view_plato', login_url='login')
 def platos_listar(request):
-    platos = Plato.objects.select_related('restaurante').order_by('nombre')
-    return render(request, 'restaurante/crud_platos/listar.html', {'platos': platos})
+    platos = Plato.objects.select_related('restaurante')
+    pagina = KeysetPaginator(platos, ('nombre', 'id')).pagina(request.GET.get('cursor'))
+    return render(request, 'restaurante/crud_platos/listar.html', {'platos': pagina, 'pagina': pagina})
 
 @login_required(login_url='login')
 @permission_required('restaurante.add_plato', login_url='login')
@@ -645,33 +752,18 @@ def index(request):
     - Usuario autenticado: ve el panel de inicio con los bloques según sus permisos.
     """
 
-    # Datos de la sesion
+    # Datos de la sesion (solo se escribe la primera vez; las reservas activas
+    # las pone el context processor "contadores_cabecera" desde la caché)
     if "fecha_inicio_sesion" not in request.session:
         request.session["fecha_inicio_sesion"] = datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
         request.session["ultimo_acceso_menu"] = "Nunca"
-        request.session["total_reservas_activas"] = 0
-
-    hoy = timezone.now().date()
-    activas = Reserva.objects.filter(fecha__gte=hoy).count()
-    request.session["total_reservas_activas"] = activas
 
     # Si no hay usuario autenticado, mostrar solo la lista de restaurantes
     if not request.user.is_authenticated:
         return redirect('restaurantes_listar')
 
-    rol_label = None
-    user = request.user
-
-    if user.groups.filter(name="Administradores").exists():
-        rol_label = "Administrador"
-    elif user.groups.filter(name="Gerentes").exists():
-        rol_label = "Gerente"
-    elif user.groups.filter(name="Empleados").exists():
-        rol_label = "Empleado"
-    else:
-        rol_label = user.get_rol_display()
-
-    request.session["rol_usuario"] = rol_label
+    # Rol según el grupo (o el campo rol), desde la caché de permisos
+    actualizar_sesion(request, rol_usuario=rol_de(request.user))
 
     return render(request, 'restaurante/index.html')
 
@@ -723,17 +815,20 @@ def reserva_create(request):
     if request.method == "POST":
         form = ReservaCreateForm(request.POST, request=request)
         if form.is_valid():
-            Reserva.objects.create(
-                cliente=form.cleaned_data["cliente"],
-                mesa=form.cleaned_data["mesa"],
-                fecha=form.cleaned_data["fecha"],
-                hora=form.cleaned_data["hora"],
-                estado="pendiente",
-                notas=form.cleaned_data.get("notas", ""),
-                creado_por=request.user,
-            )
-            messages.success(request, "Reserva creada correctamente.")
-            return redirect("reservas_listar")
+            try:
+                reservar_mesa(
+                    cliente=form.cleaned_data["cliente"],
+                    mesa=form.cleaned_data["mesa"],
+                    fecha=form.cleaned_data["fecha"],
+                    hora=form.cleaned_data["hora"],
+                    notas=form.cleaned_data.get("notas", ""),
+                    creado_por=request.user,
+                )
+            except MesaNoDisponible as exc:
+                form.add_error("mesa", str(exc))
+            else:
+                messages.success(request, "Reserva creada correctamente.")
+                return redirect("reservas_listar")
     else:
         form = ReservaCreateForm(request=request)
 
@@ -745,9 +840,238 @@ def reserva_create(request):
 def lista_mis_reservas(request):
     """Listado de reservas creadas por el usuario autenticado."""
 
-    reservas = Reserva.objects.filter(creado_por=request.user).order_by("-fecha", "-hora")
+    reservas = Reserva.objects.filter(creado_por=request.user).select_related("cliente", "mesa")
+    pagina = KeysetPaginator(reservas, ("-fecha", "-hora", "id")).pagina(request.GET.get("cursor"))
 
-    request.session["ultimo_acceso_menu"] = datetime.datetime.now().strftime("%d/%m/%Y %H:%M")
+    actualizar_sesion(request, ultimo_acceso_menu=datetime.datetime.now().strftime("%d/%m/%Y %H:%M"))
 
     
-    return render(request, "restaurante/crud_reservas/listar.html", {"reservas": reservas})
+    return render(request, "restaurante/crud_reservas/listar.html", {"reservas": pagina, "pagina": pagina})
+
+
+@login_required(login_url='login')
+async def mesas_libres(request):
+    """Mesas libres (JSON) de un restaurante para una fecha y hora.
+
+    GET ?restaurante=<id>&fecha=AAAA-MM-DD&hora=HH:MM
+
+    SQL:
+      SELECT * FROM restaurante_mesa WHERE restaurante_id=%s AND activa ORDER BY numero;
+      SELECT r.mesa_id, r.fecha, r.hora FROM restaurante_reserva r
+        JOIN restaurante_mesa m ON m.id=r.mesa_id
+       WHERE r.fecha=%s AND m.restaurante_id=%s AND NOT r.estado='cancelada';
+    """
+    try:
+        restaurante_id = int(request.GET["restaurante"])
+        fecha = datetime.date.fromisoformat(request.GET["fecha"])
+        hora = datetime.time.fromisoformat(request.GET["hora"])
+    except (KeyError, ValueError):
+        return JsonResponse(
+            {"error": "Parámetros obligatorios: restaurante, fecha (AAAA-MM-DD) y hora (HH:MM)."},
+            status=400,
+        )
+
+    mesas = await amesas_libres(restaurante_id, fecha, hora)
+    return JsonResponse({
+        "restaurante": restaurante_id,
+        "fecha": fecha.isoformat(),
+        "hora": hora.strftime("%H:%M"),
+        "mesas": [{"id": m.id, "numero": m.numero} for m in mesas],
+    })
+
+
+@login_required(login_url='login')
+@permission_required('restaurante.view_reserva', login_url='login')
+def tablero_reservas(request, restaurante_id: int):
+    """Tablero en directo de las reservas de un restaurante para un día (hoy por defecto).
+
+    Pinta las reservas del día una vez y después las mantiene al día con los
+    eventos de ``tablero_eventos`` (EventSource), sin recargar la página.
+
+    SQL:
+      SELECT r.id, r.fecha, r.hora, r.estado, r.notas, m.numero, c.nombre
+        FROM restaurante_reserva r
+        JOIN restaurante_mesa m ON m.id=r.mesa_id
+        JOIN restaurante_cliente c ON c.id=r.cliente_id
+       WHERE m.restaurante_id=%s AND r.fecha=%s
+       ORDER BY r.hora, m.numero;
+    """
+    restaurante = get_object_or_404(Restaurante, pk=restaurante_id)
+    try:
+        fecha = datetime.date.fromisoformat(request.GET['fecha']) if request.GET.get('fecha') else datetime.date.today()
+    except ValueError:
+        fecha = datetime.date.today()
+    return render(request, 'restaurante/tablero.html', {
+        'restaurante': restaurante,
+        'fecha': fecha,
+        'reservas': tablero.reservas_del_dia(restaurante_id, fecha),
+    })
+
+
+@login_required(login_url='login')
+@permission_required('restaurante.view_reserva', login_url='login')
+async def tablero_eventos(request, restaurante_id: int):
+    """Flujo SSE con las reservas creadas, cambiadas o borradas del restaurante.
+
+    GET ?segundos=<n> acorta la conexión (como mucho TABLERO_SSE_SEGUNDOS).
+    Con la cabecera Last-Event-ID (la manda el navegador al reconectar) se
+    envían antes los eventos que se perdieron. Solo se mantiene abierto de
+    verdad con ASGI: con WSGI la respuesta se entrega entera al terminar.
+    """
+    try:
+        desde = request.headers.get('Last-Event-ID') or request.GET.get('desde')
+        desde = int(desde) if desde else None
+        segundos = float(request.GET['segundos']) if request.GET.get('segundos') else None
+    except ValueError:
+        return JsonResponse({'error': 'desde debe ser un id de evento y segundos un número.'}, status=400)
+    maximo = getattr(settings, 'TABLERO_SSE_SEGUNDOS', 300)
+    segundos = maximo if segundos is None else max(0, min(segundos, maximo))
+    response = StreamingHttpResponse(
+        tablero.flujo_sse(restaurante_id, desde, segundos), content_type='text/event-stream; charset=utf-8'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required(login_url='login')
+def exportar(request, modelo: str):
+    """Descarga en streaming (CSV o JSONL) de pedidos, reservas o clientes.
+
+    GET ?formato=csv|jsonl&restaurante=<id>&desde=AAAA-MM-DD&hasta=AAAA-MM-DD&archivo=1&segundo_plano=1
+
+    Las filas se leen por lotes de id y se envían según se generan, así que la
+    memoria no crece con el tamaño de la tabla. Con archivo=1 se incluyen las
+    reservas y pedidos archivados (ver archivo.py). Con segundo_plano=1 se
+    encola una tarea que escribe el fichero y se redirige a su página, desde
+    la que se descarga al terminar.
+    """
+    clase = EXPORTACIONES.get(modelo)
+    if clase is None:
+        return error_404(request)
+    if not request.user.has_perm(f'restaurante.view_{clase.modelo._meta.model_name}'):
+        raise PermissionDenied
+
+    formato = request.GET.get('formato', 'csv')
+    try:
+        restaurante = int(request.GET['restaurante']) if request.GET.get('restaurante') else None
+        desde = datetime.date.fromisoformat(request.GET['desde']) if request.GET.get('desde') else None
+        hasta = datetime.date.fromisoformat(request.GET['hasta']) if request.GET.get('hasta') else None
+    except ValueError:
+        return JsonResponse({'error': 'restaurante debe ser un id y las fechas AAAA-MM-DD.'}, status=400)
+    if formato not in FORMATOS:
+        return JsonResponse({'error': f'Formato no soportado: {formato}.'}, status=400)
+
+    if request.GET.get('segundo_plano'):
+        tarea = tareas.encolar(
+            'exportar', creado_por=request.user, modelo=modelo, formato=formato, restaurante=restaurante,
+            desde=desde.isoformat() if desde else None, hasta=hasta.isoformat() if hasta else None,
+            archivo=bool(request.GET.get('archivo')),
+        )
+        return redirect('tarea_estado', pk=tarea.pk)
+
+    exportacion = clase(restaurante=restaurante, desde=desde, hasta=hasta, archivo=bool(request.GET.get('archivo')))
+    tipo = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(generar(exportacion, formato), content_type=f'{tipo}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{modelo}.{formato}"'
+    return response
+
+
+@login_required(login_url='login')
+def autocompletar(request, fuente: str):
+    """Opciones para los select con ``AutocompletarField`` (clientes o direcciones).
+
+    GET ?q=<texto>&limite=<n>&sin_perfil=1|propios=1|libres=1
+
+    Devuelve ``{"resultados": [{"id", "texto"}]}`` con como mucho
+    ``LIMITE_MAXIMO`` filas; con menos de dos letras no consulta nada. Sin
+    ninguno de los permisos de la fuente (``Fuente.permisos``) responde 403.
+
+    SQL (clientes, ?q=mar):
+      SELECT f.rank AS relevancia, c.* FROM restaurante_cliente c
+        JOIN restaurante_fts_cliente f ON f.rowid=c.id
+      WHERE f MATCH '("mar"*)'
+      ORDER BY relevancia, c.id
+      LIMIT 10;
+    """
+    origen = FUENTES.get(fuente)
+    if origen is None:
+        return error_404(request)
+    if not origen.permitida(request.user):
+        raise PermissionDenied
+    try:
+        limite = min(max(int(request.GET.get('limite', LIMITE)), 1), LIMITE_MAXIMO)
+    except ValueError:
+        return JsonResponse({'error': 'limite debe ser un número.'}, status=400)
+    filtros = [f for f in FILTROS if request.GET.get(f)]
+    resultados = origen.buscar(request.user, request.GET.get('q', ''), filtros, limite)
+    return JsonResponse({'resultados': resultados})
+
+
+# Tareas en segundo plano (ver tareas.py)
+
+def _tareas_de(usuario):
+    """Las tareas que puede ver el usuario: las suyas, o todas si es personal."""
+    if usuario.is_staff:
+        return Tarea.objects.all()
+    return Tarea.objects.filter(creado_por=usuario)
+
+
+def _fichero_de(tarea):
+    """Nombre del fichero de la tarea, si terminó y aún no lo ha borrado ``tareas.limpiar_ficheros``."""
+    if tarea.estado == Tarea.HECHA and isinstance(tarea.resultado, dict) and tarea.resultado.get('fichero'):
+        fichero = os.path.basename(tarea.resultado['fichero'])
+        if os.path.exists(os.path.join(settings.TAREAS_DIR, fichero)):
+            return fichero
+    return None
+
+
+@login_required(login_url='login')
+def tareas_listar(request):
+    """Tareas del usuario, de la más reciente a la más antigua.
+
+    SQL:
+      SELECT * FROM restaurante_tarea WHERE creado_por_id = %s
+      ORDER BY id DESC LIMIT 51;
+    """
+    pagina = KeysetPaginator(_tareas_de(request.user), ('-id',)).pagina(request.GET.get('cursor'))
+    return render(request, 'restaurante/tareas/listar.html', {'tareas': pagina, 'pagina': pagina})
+
+
+@login_required(login_url='login')
+def tarea_estado(request, pk):
+    """Estado y progreso de una tarea.
+
+    GET ?formato=json devuelve el estado en JSON, para sondearlo desde un
+    script. La página HTML se recarga sola (cabecera Refresh) mientras la
+    tarea no termina. La traza de una tarea fallida solo la ve el personal.
+    """
+    tarea = get_object_or_404(_tareas_de(request.user), pk=pk)
+    fichero = _fichero_de(tarea)
+    descarga = reverse('tarea_descargar', args=[tarea.pk]) if fichero else None
+    if request.GET.get('formato') == 'json':
+        return JsonResponse({
+            'id': tarea.pk, 'tipo': tarea.tipo, 'estado': tarea.estado, 'intentos': tarea.intentos,
+            'hechos': tarea.hechos, 'total': tarea.total, 'porcentaje': tarea.porcentaje, 'mensaje': tarea.mensaje,
+            'resultado': tarea.resultado,
+            'error': tarea.error if tarea.estado == Tarea.FALLIDA and request.user.is_staff else '',
+            'descarga': descarga,
+        })
+    response = render(request, 'restaurante/tareas/estado.html', {'tarea': tarea, 'descarga': descarga})
+    if not tarea.acabada:
+        response['Refresh'] = '3'
+    return response
+
+
+@login_required(login_url='login')
+def tarea_descargar(request, pk):
+    """Fichero generado por una tarea de exportación, si ya ha terminado."""
+    tarea = get_object_or_404(_tareas_de(request.user), pk=pk)
+    fichero = _fichero_de(tarea)
+    if not fichero:
+        if tarea.estado == Tarea.HECHA:
+            raise Http404('El fichero de la tarea ya no existe.')
+        messages.info(request, 'La tarea no tiene ningún fichero para descargar (todavía).')
+        return redirect('tarea_estado', pk=tarea.pk)
+    ruta = os.path.join(settings.TAREAS_DIR, fichero)
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=fichero)
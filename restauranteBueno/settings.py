@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import environ
 import os
+import tempfile
 
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -51,6 +52,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'restaurante.middleware.PresupuestoConsultasMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -71,6 +73,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'restaurante.context_processors.contadores_cabecera',
             ],
         },
     },
@@ -82,13 +85,71 @@ WSGI_APPLICATION = 'restauranteBueno.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Perfil de SQLite (ver "Base de datos SQLite" en el README). Cada conexión
+# nueva ejecuta los PRAGMA de SQLITE_PRAGMAS; con WAL los lectores no bloquean
+# a quien escribe ni al revés. Las transacciones empiezan con BEGIN IMMEDIATE
+# para que dos escrituras a la vez esperen (busy_timeout) en lugar de fallar
+# con "database is locked" al pasar de lectura a escritura. SQLITE_WAL=False
+# deja el modo de diario clásico (DELETE), por ejemplo en discos de red.
+SQLITE_NOMBRE = env.str('SQLITE_NOMBRE', default=str(BASE_DIR / 'db.sqlite3'))
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL' if env.bool('SQLITE_WAL', default=True) else 'DELETE',
+    # NORMAL con WAL no corrompe la base si se cae el proceso, solo puede
+    # perder las últimas transacciones si se cae la máquina
+    'synchronous': env.str('SQLITE_SYNCHRONOUS', default='NORMAL'),
+    # En KiB (negativo para SQLite) y bytes
+    'cache_size': -env.int('SQLITE_CACHE_KB', default=20000),
+    'mmap_size': env.int('SQLITE_MMAP_BYTES', default=128 * 1024 * 1024),
+    'busy_timeout': env.int('SQLITE_BUSY_TIMEOUT_MS', default=5000),
+    'temp_store': 'MEMORY',
+}
+
+
+def sqlite_init_command(pragmas):
+    return '; '.join(f'PRAGMA {nombre} = {valor}' for nombre, valor in pragmas.items())
+
+
+SQLITE_OPCIONES = {
+    'init_command': sqlite_init_command(SQLITE_PRAGMAS),
+    'transaction_mode': env.str('SQLITE_TRANSACCIONES', default='IMMEDIATE'),
+    # El timeout del módulo sqlite3 (segundos) es el mismo busy_timeout
+    'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+}
+
+# Conexiones persistentes: cada hilo de WSGI reutiliza la suya durante
+# DB_CONN_MAX_AGE segundos (comprobando antes que sigue viva). Con ASGI
+# conviene DB_CONN_MAX_AGE=0: los hilos de sync_to_async no las cierran.
+DB_CONN_MAX_AGE = env.int('DB_CONN_MAX_AGE', default=60)
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': SQLITE_NOMBRE,
+        'OPTIONS': SQLITE_OPCIONES,
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Conexión de solo lectura "lectura" para los informes (restaurante/basedatos.py):
+# el mismo fichero abierto con mode=ro, sin journal_mode (no se puede cambiar
+# sin escribir) y con query_only por si acaso. En los tests apunta a "default".
+if env.bool('SQLITE_LECTURA', default=False):
+    DATABASES['lectura'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{SQLITE_NOMBRE}?mode=ro',
+        'OPTIONS': {
+            **SQLITE_OPCIONES,
+            'init_command': sqlite_init_command(
+                {**{k: v for k, v in SQLITE_PRAGMAS.items() if k != 'journal_mode'}, 'query_only': 'ON'}
+            ),
+            'transaction_mode': None,
+        },
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -108,6 +169,90 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Minutos que una reserva mantiene ocupada su mesa (motor de disponibilidad)
+RESERVA_DURACION_MINUTOS = env.int('RESERVA_DURACION_MINUTOS', default=90)
+
+# Filas por página en los listados del CRUD (paginación por cursor)
+PAGINACION_POR_PAGINA = env.int('PAGINACION_POR_PAGINA', default=50)
+
+# Presupuesto de consultas SQL por nombre de URL ("default" para el resto).
+# Se avisa en el log "restaurante.consultas" al superarlo o al detectar un N+1
+# (la misma consulta N_MAS_1_UMBRAL veces); en modo estricto se lanza excepción.
+PRESUPUESTO_CONSULTAS = {
+    'default': env.int('PRESUPUESTO_CONSULTAS', default=15),
+    # Fijo por lote, más el resumen de ventas de cada restaurante y día del lote
+    'pedidos_crear': env.int('PRESUPUESTO_CONSULTAS_PEDIDOS', default=25),
+}
+N_MAS_1_UMBRAL = env.int('N_MAS_1_UMBRAL', default=5)
+PRESUPUESTO_CONSULTAS_ESTRICTO = env.bool('PRESUPUESTO_CONSULTAS_ESTRICTO', default=False)
+
+# Permisos y rol de cada usuario cacheados entre peticiones (ver restaurante/permisos.py).
+# Las señales invalidan la caché al cambiar grupos o permisos; la caducidad
+# acota lo que puede durar un dato viejo si la caché no es compartida entre procesos.
+AUTHENTICATION_BACKENDS = ['restaurante.permisos.BackendPermisosCacheados']
+PERMISOS_CACHE_SEGUNDOS = env.int('PERMISOS_CACHE_SEGUNDOS', default=300)
+
+# Segundos que se cachea el contador de reservas activas de la cabecera
+# (las señales de Reserva lo borran antes si cambia alguna reserva)
+RESERVAS_ACTIVAS_CACHE_SEGUNDOS = env.int('RESERVAS_ACTIVAS_CACHE_SEGUNDOS', default=300)
+
+# Dónde se guardan las sesiones: "db" (por defecto), "cache", "cached_db" o
+# "signed_cookies". "cache" necesita una caché compartida entre procesos.
+SESIONES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_ENGINE = SESIONES[env.str('SESIONES', default='db')]
+
+# Caché: "locmem" (por defecto, propia de cada proceso) o "file" (compartida
+# por los procesos de la misma máquina, en CACHE_DIR). Con varios procesos
+# conviene "file" para que las invalidaciones lleguen a todos.
+CACHES_DISPONIBLES = {
+    'locmem': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'restaurante'},
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': env.str('CACHE_DIR', default=os.path.join(tempfile.gettempdir(), 'restaurante-cache')),
+    },
+}
+CACHES = {'default': CACHES_DISPONIBLES[env.str('CACHE', default='locmem')]}
+
+# Segundos que se guardan las páginas y fragmentos de menús públicos (las
+# señales los invalidan antes si cambian platos, mesas, restaurantes...)
+MENU_CACHE_SEGUNDOS = env.int('MENU_CACHE_SEGUNDOS', default=600)
+
+# Tablero de reservas en directo (SSE, ver restaurante/tablero.py). El
+# reparto de eventos es "local" (memoria del proceso: un solo proceso ASGI) o
+# "bd" (tabla EventoTablero consultada cada TABLERO_INTERVALO_BD segundos:
+# varios procesos o eventos publicados desde comandos). Cada conexión dura
+# como mucho TABLERO_SSE_SEGUNDOS; el navegador se vuelve a conectar solo.
+TABLERO_BROKER = env.str('TABLERO_BROKER', default='local')
+TABLERO_SSE_SEGUNDOS = env.int('TABLERO_SSE_SEGUNDOS', default=300)
+TABLERO_LATIDO_SEGUNDOS = env.int('TABLERO_LATIDO_SEGUNDOS', default=15)
+TABLERO_INTERVALO_BD = env.float('TABLERO_INTERVALO_BD', default=1.0)
+
+# Alta de pedidos por JSON (ver restaurante/pedidos.py): tamaño máximo de un
+# lote enviado por el TPV y de las líneas de cada pedido
+PEDIDOS_LOTE_MAXIMO = env.int('PEDIDOS_LOTE_MAXIMO', default=500)
+PEDIDOS_LINEAS_MAXIMO = env.int('PEDIDOS_LINEAS_MAXIMO', default=100)
+
+# Reservas y pedidos con más de ARCHIVO_DIAS días se pueden mover a las tablas
+# de archivo con "python manage.py archivar" (ver restaurante/archivo.py)
+ARCHIVO_DIAS = env.int('ARCHIVO_DIAS', default=365)
+
+# Cola de tareas en segundo plano (ver restaurante/tareas.py): borrados de
+# restaurantes, exportaciones grandes y reconstrucciones. Las ejecuta
+# "python manage.py trabajar_tareas"; las exportaciones se guardan en TAREAS_DIR.
+TAREAS_INTENTOS = env.int('TAREAS_INTENTOS', default=3)
+TAREAS_ESPERA_REINTENTO = env.float('TAREAS_ESPERA_REINTENTO', default=30.0)
+TAREAS_BLOQUEO_SEGUNDOS = env.int('TAREAS_BLOQUEO_SEGUNDOS', default=300)
+TAREAS_ESPERA = env.float('TAREAS_ESPERA', default=1.0)
+TAREAS_LOTE = env.int('TAREAS_LOTE', default=500)
+TAREAS_DIR = env.str('TAREAS_DIR', default=str(BASE_DIR / 'tareas'))
+# Días que se guardan las exportaciones en TAREAS_DIR; luego las borran los trabajadores
+TAREAS_CONSERVAR_DIAS = env.int('TAREAS_CONSERVAR_DIAS', default=7)
+
 # Redirecciones después de login/logout
 LOGIN_REDIRECT_URL = '/'
 LOGOUT_REDIRECT_URL = '/'